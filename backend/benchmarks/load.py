@@ -0,0 +1,303 @@
+"""Lasttest av API:t mot den lokala mock-LLM:en (src/mock_llm.py).
+
+Startar mock-servern och API:t (uvicorn, valfritt antal workers) som egna processer och driver
+/health, /analyze och /generate med ett antal samtidiga klienter per nivå. Rapporterar
+genomströmning, p50/p95/p99, serverns event-loop-lag (från /metrics) och RSS per worker, och
+sparar allt som JSON så att körningar kan jämföras mellan commits.
+
+    cd backend
+    python -m benchmarks.load --concurrency 1,16,64 --requests 500
+    python -m benchmarks.load --compare benchmarks/results/load-....json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from .common import BACKEND_DIR, format_delta, load_results, metadata, percentile, write_results
+
+ENDPOINTS = ("health", "analyze", "generate")
+STARTUP_TIMEOUT_SECONDS = 30.0
+SAMPLE_TEXT = (
+    "Vi har under våren arbetat med att förbättra kundtjänsten och ser redan tydliga resultat. "
+    "Väntetiderna i telefon har minskat, fler ärenden löses vid första kontakten och kunderna "
+    "ger oss högre betyg i enkäterna. Samtidigt återstår arbete med skriftliga svar, där tonen "
+    "ibland upplevs som stel och formell. Nästa steg är att ta fram gemensamma riktlinjer, "
+    "utbilda nya medarbetare och följa upp resultaten varje månad tillsammans med teamledarna."
+)
+LAG_METRIC = "event_loop_lag_seconds"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port: int = sock.getsockname()[1]
+        return port
+
+
+def _start(args: list[str], env: dict[str, str]) -> subprocess.Popen[bytes]:
+    return subprocess.Popen(
+        args,
+        cwd=BACKEND_DIR,
+        env={**os.environ, **env},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def _wait_ready(url: str, process: subprocess.Popen[bytes]) -> None:
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process exited during startup: {process.args}")
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def _worker_rss_mb(master_pid: int) -> list[float]:
+    """RSS per serverprocess via /proc (Linux); med en worker serverar master-processen själv."""
+    proc = Path("/proc")
+    if not proc.exists():
+        return []
+    children = []
+    for stat in proc.glob("[0-9]*/stat"):
+        try:
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == master_pid:
+            children.append(int(stat.parent.name))
+    rss = []
+    for pid in children or [master_pid]:
+        try:
+            status = (proc / str(pid) / "status").read_text()
+        except OSError:
+            continue
+        match = re.search(r"VmRSS:\s+(\d+) kB", status)
+        if match:
+            rss.append(round(int(match.group(1)) / 1024, 1))
+    return rss
+
+
+def _histogram(text: str, name: str) -> tuple[dict[float, float], float, float]:
+    buckets: dict[float, float] = {}
+    total = count = 0.0
+    for line in text.splitlines():
+        if line.startswith(f"{name}_bucket"):
+            le = re.search(r'le="([^"]+)"', line)
+            if le:
+                buckets[float(le.group(1))] = float(line.rsplit(" ", 1)[1])
+        elif line.startswith(f"{name}_sum"):
+            total = float(line.rsplit(" ", 1)[1])
+        elif line.startswith(f"{name}_count"):
+            count = float(line.rsplit(" ", 1)[1])
+    return buckets, total, count
+
+
+def _loop_lag(before: str, after: str) -> dict[str, float]:
+    """Medel och approximativ p99 (bucket-gräns) för lag-observationer mellan två scrapes."""
+    b_buckets, b_sum, b_count = _histogram(before, LAG_METRIC)
+    a_buckets, a_sum, a_count = _histogram(after, LAG_METRIC)
+    count = a_count - b_count
+    if count <= 0:
+        return {"mean_ms": 0.0, "p99_ms": 0.0, "samples": 0}
+    p99 = float("inf")
+    for bound in sorted(a_buckets):
+        if a_buckets[bound] - b_buckets.get(bound, 0.0) >= 0.99 * count:
+            p99 = bound
+            break
+    return {
+        "mean_ms": round((a_sum - b_sum) / count * 1000, 3),
+        "p99_ms": round(p99 * 1000, 3) if p99 != float("inf") else -1.0,
+        "samples": int(count),
+    }
+
+
+def _request(endpoint: str, i: int) -> tuple[str, str, dict[str, Any] | None]:
+    # Unik text per request så att varken cache eller single-flight slår ihop anropen
+    text = f"{SAMPLE_TEXT} (#{i})"
+    if endpoint == "health":
+        return "GET", "/health", None
+    if endpoint == "analyze":
+        return "POST", "/analyze", {"text": text, "temperature": 0.7}
+    return "POST", "/generate", {
+        "text": text,
+        "suggestions": ["Förkorta meningarna", "Använd aktiva verb"],
+        "selected_suggestions": [True, False],
+        "temperature": 0.7,
+    }
+
+
+async def _drive(
+    client: httpx.AsyncClient, endpoint: str, concurrency: int, total: int
+) -> tuple[list[float], Counter[str], float]:
+    counter = itertools.count()
+    latencies: list[float] = []
+    statuses: Counter[str] = Counter()
+
+    async def worker() -> None:
+        while (i := next(counter)) < total:
+            method, path, body = _request(endpoint, i)
+            started = time.perf_counter()
+            try:
+                resp = await client.request(method, path, json=body)
+                statuses[str(resp.status_code)] += 1
+            except httpx.HTTPError as exc:
+                statuses[type(exc).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - started
+
+
+async def run_levels(base_url: str, server_pid: int, args: argparse.Namespace) -> list[dict[str, Any]]:
+    peak = max(args.concurrency)
+    limits = httpx.Limits(max_connections=peak, max_keepalive_connections=peak)
+    results: list[dict[str, Any]] = []
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        for endpoint in args.endpoints:
+            for concurrency in args.concurrency:
+                # Uppvärmning så att anslutningar och lata importer inte hamnar i mätningen
+                await _drive(client, endpoint, min(concurrency, 4), min(args.requests, 20))
+                before = (await client.get("/metrics")).text
+                latencies, statuses, elapsed = await _drive(client, endpoint, concurrency, args.requests)
+                after = (await client.get("/metrics")).text
+                latencies.sort()
+                ok = statuses.get("200", 0)
+                result = {
+                    "endpoint": endpoint,
+                    "concurrency": concurrency,
+                    "requests": len(latencies),
+                    "errors": len(latencies) - ok,
+                    "status_counts": dict(statuses),
+                    "duration_seconds": round(elapsed, 3),
+                    "throughput_rps": round(ok / elapsed, 1) if elapsed else 0.0,
+                    "latency_ms": {
+                        "p50": round(percentile(latencies, 50) * 1000, 2),
+                        "p95": round(percentile(latencies, 95) * 1000, 2),
+                        "p99": round(percentile(latencies, 99) * 1000, 2),
+                        "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+                        "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+                    },
+                    "loop_lag": _loop_lag(before, after),
+                    "worker_rss_mb": _worker_rss_mb(server_pid),
+                }
+                results.append(result)
+                print(
+                    f"{endpoint:>8} c={concurrency:<4} {result['throughput_rps']:>8} rps  "
+                    f"p50={result['latency_ms']['p50']}ms p95={result['latency_ms']['p95']}ms "
+                    f"p99={result['latency_ms']['p99']}ms errors={result['errors']} "
+                    f"lag_p99={result['loop_lag']['p99_ms']}ms rss={result['worker_rss_mb']}MB"
+                )
+    return results
+
+
+def _compare(current: list[dict[str, Any]], baseline_path: str) -> None:
+    baseline = {
+        (r["endpoint"], r["concurrency"]): r for r in load_results(baseline_path)["results"]
+    }
+    print(f"\nJämfört med {baseline_path}:")
+    for result in current:
+        base = baseline.get((result["endpoint"], result["concurrency"]))
+        if base is None:
+            continue
+        print(
+            f"{result['endpoint']:>8} c={result['concurrency']:<4} "
+            f"rps {format_delta(result['throughput_rps'], base['throughput_rps'])}  "
+            f"p99 {format_delta(result['latency_ms']['p99'], base['latency_ms']['p99'])}"
+        )
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--concurrency", default="1,8,32", help="Kommaseparerade nivåer")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per nivå och endpoint")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn-workers för API:t")
+    parser.add_argument("--mock-latency-ms", type=float, default=0.0)
+    parser.add_argument("--mock-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--mock-distribution", default="fixed")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--out", help="Sökväg för JSON-resultatet (default: benchmarks/results/)")
+    parser.add_argument("--compare", help="Tidigare resultatfil att jämföra mot")
+    args = parser.parse_args(argv)
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    args.endpoints = [e for e in args.endpoints.split(",") if e]
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = parse_args(argv)
+    mock_port, api_port = _free_port(), _free_port()
+    mock_env = {
+        "MOCK_LLM_PORT": str(mock_port),
+        "MOCK_LLM_LATENCY_MS": str(args.mock_latency_ms),
+        "MOCK_LLM_LATENCY_JITTER_MS": str(args.mock_jitter_ms),
+        "MOCK_LLM_LATENCY_DISTRIBUTION": args.mock_distribution,
+        "MOCK_LLM_TOKEN_DELAY_MS": "0",
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        api_env = {
+            "LLM_BACKEND": "mock",
+            "LLM_BASE_URL": f"http://127.0.0.1:{mock_port}/v1",
+            # Mät hela vägen till upstream: ingen cache och ingen rate limit i governorn
+            "CACHE_BACKEND": "none",
+            "UPSTREAM_RPS": "0",
+            "UPSTREAM_CONCURRENCY_INITIAL": "1024",
+            "UPSTREAM_CONCURRENCY_MAX": "1024",
+            "JOBS_DB_PATH": str(Path(tmp) / "jobs.sqlite3"),
+            "HISTORY_ENABLED": "0",
+            "SIMILARITY_ENABLED": "0",
+            "SCHEDULER_CLIENT_RPM": "0",
+        }
+        mock = _start([sys.executable, "-m", "src.mock_llm"], mock_env)
+        api = _start(
+            [
+                sys.executable, "-m", "uvicorn", "src.main:app",
+                "--host", "127.0.0.1", "--port", str(api_port),
+                "--workers", str(args.workers), "--log-level", "warning",
+            ],
+            api_env,
+        )
+        try:
+            _wait_ready(f"http://127.0.0.1:{mock_port}/", mock)
+            _wait_ready(f"http://127.0.0.1:{api_port}/health", api)
+            results = asyncio.run(run_levels(f"http://127.0.0.1:{api_port}", api.pid, args))
+        finally:
+            for process in (api, mock):
+                process.terminate()
+                process.wait(timeout=10)
+
+    config = {key: value for key, value in vars(args).items() if key not in {"out", "compare"}}
+    path = write_results("load", {"meta": metadata("load", config), "results": results}, args.out)
+    print(f"\nResultat sparat i {path}")
+    if args.compare:
+        _compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
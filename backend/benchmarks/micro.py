@@ -0,0 +1,190 @@
+"""Mikrobenchmarks för hot paths: promptbygge, JSON-extraktion ur LLM-svaret och loggformatering.
+
+Serialiseringsfallen körs i par, förut (FastAPI/json) och nu (utils.serialization), och
+besparingen skrivs ut som CPU-tid per request och andel av en kärna vid REFERENCE_RPS.
+
+    cd backend
+    python -m benchmarks.micro
+    python -m benchmarks.micro --compare benchmarks/results/micro-....json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import timeit
+from collections.abc import Callable
+from typing import Any
+
+import httpx
+from fastapi.responses import JSONResponse, Response
+from fastapi.utils import create_model_field
+
+from src.models.schemas import AnalyzeResponse, HistoryItem, HistoryPage
+from src.services.analyzer import DeepSeekAnalyzer
+from src.services.governor import create_governor
+from src.utils.errors import ErrorResponse
+from src.utils.logging import JsonLogFormatter
+from src.utils.serialization import loads, model_response
+from src.utils.sse import sse_event
+
+from .common import format_delta, load_results, metadata, write_results
+
+WORD = "förbättring"
+LLM_CONTENT = (
+    "Här är analysen:\n"
+    + json.dumps(
+        {
+            "suggestions": [
+                "Dela upp långa meningar så att varje mening bär en tanke.",
+                "Byt passiva formuleringar mot aktiva verb.",
+                "Inled med huvudbudskapet.",
+            ],
+            "tone": "neutral",
+            "alternative_text": " ".join([WORD] * 300),
+        },
+        ensure_ascii=False,
+    )
+    + "\nHoppas det hjälper!"
+)
+
+
+REFERENCE_RPS = 1000
+# Namn -> (förut, nu); båda fallen måste finnas i cases()
+SERIALIZATION_PAIRS = {
+    "upstream_decode": ("upstream_decode_resp_json", "upstream_decode_fast"),
+    "analyze_response": ("analyze_response_dump_json", "analyze_response_direct"),
+    "history_response": ("history_response_fastapi", "history_response_direct"),
+    "error_response": ("error_response_json", "error_response_direct"),
+    "sse_event": ("sse_event_json", "sse_event_fast"),
+}
+
+
+def _words(count: int) -> str:
+    return " ".join([WORD] * count)
+
+
+def bench(fn: Callable[[], Any], repeat: int) -> dict[str, float]:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    return {"ns_per_op": round(best * 1e9, 1), "ops_per_second": round(1 / best, 1), "loops": number}
+
+
+def cases() -> dict[str, Callable[[], Any]]:
+    analyzer = DeepSeekAnalyzer("bench-key", governor=create_governor())
+    formatter = JsonLogFormatter()
+    record = logging.LogRecord(
+        "src.api.routes", logging.INFO, __file__, 1, "Analysis successful", None, None
+    )
+    record.correlation_id = "0d4f1c52-7b8e-4c1a-9f7e-2f9a4a3e8b10"
+    texts = {n: _words(n) for n in (100, 1000, 5000)}
+
+    completion = {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "model": "deepseek-chat",
+        "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": LLM_CONTENT}, "finish_reason": "stop"}
+        ],
+        "usage": {"prompt_tokens": 600, "completion_tokens": 450, "total_tokens": 1050},
+    }
+    upstream = httpx.Response(
+        200, content=json.dumps(completion).encode(), headers={"content-type": "application/json"}
+    )
+    analysis = AnalyzeResponse(
+        suggestions=["Dela upp långa meningar.", "Byt passiva formuleringar."],
+        tone="neutral",
+        alternative_text=texts[100],
+    )
+    page = HistoryPage(
+        items=[
+            HistoryItem(
+                id=i, kind="analyze", created_at=1.7e9, tone="neutral", text=texts[100],
+                result=analysis.model_dump(),
+            )
+            for i in range(20)
+        ]
+    )
+    error = ErrorResponse(code="http_error_503", message="AI service unavailable - please try again later")
+    event = {"suggestions": analysis.suggestions, "tone": "neutral", "alternative_text": texts[100]}
+
+    # Byggs en gång per route i FastAPI, precis som här
+    fields = {HistoryPage: create_model_field("Response", HistoryPage)}
+
+    def fastapi_response(model: Any) -> bytes:
+        # Som FastAPI med response_model: validera returvärdet igen och serialisera via fältet
+        field = fields[type(model)]
+        value, _ = field.validate(model, {}, loc=("response",))
+        return field.serialize_json(value)
+
+    return {
+        "build_prompt_100w": lambda: analyzer._analyze_messages(texts[100]),
+        "build_prompt_1000w": lambda: analyzer._analyze_messages(texts[1000]),
+        "build_prompt_5000w": lambda: analyzer._analyze_messages(texts[5000]),
+        "parse_analysis_json": lambda: analyzer._parse_analysis(LLM_CONTENT, texts[100]),
+        "json_log_format": lambda: formatter.format(record),
+        "upstream_decode_resp_json": lambda: upstream.json(),
+        "upstream_decode_fast": lambda: loads(upstream.content),
+        "analyze_response_dump_json": lambda: Response(analysis.model_dump_json()).body,
+        "analyze_response_direct": lambda: model_response(analysis).body,
+        "history_response_fastapi": lambda: fastapi_response(page),
+        "history_response_direct": lambda: model_response(page).body,
+        "error_response_json": lambda: JSONResponse(error.model_dump(), 503).body,
+        "error_response_direct": lambda: model_response(error, 503).body,
+        "sse_event_json": lambda: f"event: result\ndata: {json.dumps(event, ensure_ascii=False)}\n\n",
+        "sse_event_fast": lambda: sse_event("result", event),
+    }
+
+
+def print_savings(results: dict[str, dict[str, float]]) -> None:
+    """CPU-tid som sparas per request för varje par, och vad det blir vid REFERENCE_RPS."""
+    pairs = {
+        name: (results[before]["ns_per_op"], results[after]["ns_per_op"])
+        for name, (before, after) in SERIALIZATION_PAIRS.items()
+        if before in results and after in results
+    }
+    if not pairs:
+        return
+    print(f"\nSerialisering, sparad CPU-tid (vid {REFERENCE_RPS} req/s):")
+    for name, (before, after) in pairs.items():
+        saved_us = (before - after) / 1000
+        core_pct = saved_us * REFERENCE_RPS / 1e6 * 100
+        print(f"{name:<26} {saved_us:>8.1f} µs/req  {core_pct:>6.2f} % av en kärna")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="Kommaseparerade fall att köra")
+    parser.add_argument("--out", help="Sökväg för JSON-resultatet (default: benchmarks/results/)")
+    parser.add_argument("--compare", help="Tidigare resultatfil att jämföra mot")
+    args = parser.parse_args(argv)
+
+    selected = set(args.only.split(",")) if args.only else None
+    results: dict[str, dict[str, float]] = {}
+    for name, fn in cases().items():
+        if selected is not None and name not in selected:
+            continue
+        results[name] = bench(fn, args.repeat)
+        print(f"{name:<26} {results[name]['ns_per_op']:>12.1f} ns/op")
+
+    print_savings(results)
+
+    config = {"repeat": args.repeat, "only": args.only}
+    path = write_results("micro", {"meta": metadata("micro", config), "results": results}, args.out)
+    print(f"\nResultat sparat i {path}")
+    if args.compare:
+        baseline = load_results(args.compare)["results"]
+        print(f"\nJämfört med {args.compare}:")
+        for name, result in results.items():
+            if name in baseline:
+                delta = format_delta(result["ns_per_op"], baseline[name]["ns_per_op"])
+                print(f"{name:<26} {delta}")
+
+
+if __name__ == "__main__":
+    main()
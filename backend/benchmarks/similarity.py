@@ -0,0 +1,144 @@
+"""Närdubblettindexet (src/services/similarity.py) med många lagrade texter.
+
+Fyller indexet med syntetiska signaturer (default en miljon) och mäter uppslagstid för
+närdubbletter (några positioner ändrade, ska hittas) och för okända texter (ska missa),
+samt signaturtid per textlängd, byggtid och processens RSS.
+
+    cd backend
+    python -m benchmarks.similarity
+    python -m benchmarks.similarity --documents 100000 --compare benchmarks/results/similarity-....json
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import resource
+import time
+from array import array
+from typing import Any
+
+from src.services.similarity import SIGNATURE_SIZE, SimilarityIndex, signature
+
+from .common import format_delta, load_results, metadata, percentile, write_results
+
+SAMPLE_SENTENCE = "Kvartalsrapporten blir försenad eftersom siffrorna från ekonomi inte är klara. "
+RESULT = {"suggestions": ["A", "B"], "tone": "neutral", "alternative_text": "Alt"}
+SCOPE = ("benchmark", 0.7)
+
+
+def _rss_mb() -> float:
+    # ru_maxrss är i kB på Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def _random_signatures(count: int, rng: random.Random) -> array[int]:
+    values: array[int] = array("I")
+    values.frombytes(rng.randbytes(count * SIGNATURE_SIZE * 4))
+    return values
+
+
+def _near_duplicate(sig: array[int], changed: int, rng: random.Random) -> list[int]:
+    # Som en liten redigering: några fack får nya minimivärden
+    edited = list(sig)
+    for position in rng.sample(range(SIGNATURE_SIZE), changed):
+        edited[position] = rng.getrandbits(32)
+    return edited
+
+
+def _latency_us(samples: list[float]) -> dict[str, float]:
+    ordered = sorted(samples)
+    return {
+        "p50_us": round(percentile(ordered, 50) * 1e6, 1),
+        "p95_us": round(percentile(ordered, 95) * 1e6, 1),
+        "p99_us": round(percentile(ordered, 99) * 1e6, 1),
+    }
+
+
+def run(documents: int, queries: int, changed: int, seed: int) -> dict[str, Any]:
+    rng = random.Random(seed)
+    index = SimilarityIndex(threshold=0.9, max_entries=documents)
+    signatures = _random_signatures(documents, rng)
+
+    started = time.perf_counter()
+    for doc in range(documents):
+        index.add_signature(signatures[doc * SIGNATURE_SIZE : (doc + 1) * SIGNATURE_SIZE], SCOPE, RESULT)
+    build_seconds = time.perf_counter() - started
+
+    near: list[float] = []
+    found = 0
+    for _ in range(queries):
+        doc = rng.randrange(documents)
+        query = _near_duplicate(signatures[doc * SIGNATURE_SIZE : (doc + 1) * SIGNATURE_SIZE], changed, rng)
+        started = time.perf_counter()
+        match = index.lookup_signature(query, SCOPE)
+        near.append(time.perf_counter() - started)
+        found += match is not None
+
+    unknown: list[float] = []
+    for _ in range(queries):
+        query = [rng.getrandbits(32) for _ in range(SIGNATURE_SIZE)]
+        started = time.perf_counter()
+        index.lookup_signature(query, SCOPE)
+        unknown.append(time.perf_counter() - started)
+
+    signature_ms: dict[str, float] = {}
+    for chars in (500, 5000, 50_000):
+        text = (SAMPLE_SENTENCE * (chars // len(SAMPLE_SENTENCE) + 1))[:chars]
+        started = time.perf_counter()
+        for i in range(20):
+            # Unik text per varv så att signaturcachen inte används
+            signature(f"{i} {text}")
+        signature_ms[str(chars)] = round((time.perf_counter() - started) / 20 * 1000, 3)
+
+    return {
+        "documents": documents,
+        "build_seconds": round(build_seconds, 2),
+        "rss_mb": _rss_mb(),
+        "near_duplicate": {**_latency_us(near), "recall": round(found / queries, 4)},
+        "unknown": _latency_us(unknown),
+        "signature_ms_by_chars": signature_ms,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--documents", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=10_000)
+    parser.add_argument(
+        "--changed", type=int, default=3, help="Ändrade signaturpositioner per närdubblett (av 64)"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="Sökväg för JSON-resultatet (default: benchmarks/results/)")
+    parser.add_argument("--compare", help="Tidigare resultatfil att jämföra mot")
+    args = parser.parse_args(argv)
+
+    results = run(args.documents, args.queries, args.changed, args.seed)
+    print(f"Dokument            {results['documents']:>12,}")
+    print(f"Byggtid             {results['build_seconds']:>12.2f} s")
+    print(f"RSS                 {results['rss_mb']:>12.1f} MB")
+    for name in ("near_duplicate", "unknown"):
+        latency = results[name]
+        print(f"{name:<19} p50 {latency['p50_us']:>8.1f} µs  p95 {latency['p95_us']:>8.1f} µs  "
+              f"p99 {latency['p99_us']:>8.1f} µs")
+    print(f"Recall närdubbletter {results['near_duplicate']['recall']:>11.4f}")
+    for chars, ms in results["signature_ms_by_chars"].items():
+        print(f"Signatur {chars:>6} tecken {ms:>9.3f} ms")
+
+    config = {"documents": args.documents, "queries": args.queries, "changed": args.changed, "seed": args.seed}
+    path = write_results("similarity", {"meta": metadata("similarity", config), "results": results}, args.out)
+    print(f"\nResultat sparat i {path}")
+    if args.compare:
+        baseline = load_results(args.compare)["results"]
+        print(f"\nJämfört med {args.compare}:")
+        for name in ("near_duplicate", "unknown"):
+            for key in ("p50_us", "p99_us"):
+                print(f"{name}.{key:<8} {format_delta(results[name][key], baseline[name][key])}")
+        print(f"build_seconds     {format_delta(results['build_seconds'], baseline['build_seconds'])}")
+        print(f"rss_mb            {format_delta(results['rss_mb'], baseline['rss_mb'])}")
+
+
+if __name__ == "__main__":
+    main()
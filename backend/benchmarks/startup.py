@@ -0,0 +1,173 @@
+"""Kallstart: importkostnad per modul och tid för varje startfas.
+
+Kör ett antal nystartade processer med `python -X importtime` som importerar src.main, läser
+inställningarna, bygger appen (create_app) och kör lifespan-starten. Rapporterar median per
+fas, importtid (self) per egen modul och per tredjepartspaket samt i vilken fas modulen
+importerades, och sparar allt som JSON så att regressioner syns mellan commits.
+
+    cd backend
+    python -m benchmarks.startup
+    python -m benchmarks.startup --runs 10 --compare benchmarks/results/startup-....json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Any
+
+from .common import BACKEND_DIR, format_delta, load_results, metadata, write_results
+
+PHASES = ("import_main", "settings", "create_app", "lifespan_startup")
+OWN_PACKAGE = "src"
+
+# Körs i en ny process; skriver faserna som JSON på sista raden av stdout
+PROBE = """
+import asyncio, json, sys, time
+
+phases, imported = {}, {}
+
+def phase(name, fn):
+    before = set(sys.modules)
+    started = time.perf_counter()
+    result = fn()
+    phases[name] = (time.perf_counter() - started) * 1000
+    imported[name] = sorted(set(sys.modules) - before)
+    return result
+
+main = phase("import_main", lambda: __import__("src.main", fromlist=["create_app"]))
+phase("settings", main.get_settings)
+app = phase("create_app", main.create_app)
+
+async def lifespan():
+    context = app.router.lifespan_context(app)
+    started = time.perf_counter()
+    before = set(sys.modules)
+    await context.__aenter__()
+    phases["lifespan_startup"] = (time.perf_counter() - started) * 1000
+    imported["lifespan_startup"] = sorted(set(sys.modules) - before)
+    await context.__aexit__(None, None, None)
+
+asyncio.run(lifespan())
+print(json.dumps({"phases": phases, "imported": imported}))
+"""
+
+
+def parse_importtime(stderr: str) -> dict[str, int]:
+    """Modul -> egen importtid i µs ur `-X importtime`-utskriften."""
+    costs: dict[str, int] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line.removeprefix("import time:").split("|", 2)
+        costs[name.strip()] = int(self_us)
+    return costs
+
+
+def is_own(module: str) -> bool:
+    return module.split(".")[0] == OWN_PACKAGE
+
+
+def package_of(module: str) -> str:
+    # Egna moduler redovisas var för sig, allt annat per toppaket
+    return module if is_own(module) else module.split(".")[0]
+
+
+def run_once(db_dir: str) -> tuple[dict[str, float], dict[str, int], dict[str, str]]:
+    env = {
+        **os.environ,
+        "JOBS_DB_PATH": os.path.join(db_dir, "jobs.sqlite3"),
+        "CACHE_BACKEND": "memory",
+        "LOG_ASYNC": "false",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    }
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    phase_of = {module: name for name, modules in probe["imported"].items() for module in modules}
+    return probe["phases"], parse_importtime(result.stderr), phase_of
+
+
+def profile(runs: int) -> dict[str, Any]:
+    phase_samples: dict[str, list[float]] = defaultdict(list)
+    module_samples: dict[str, list[int]] = defaultdict(list)
+    phase_of: dict[str, str] = {}
+    with tempfile.TemporaryDirectory() as db_dir:
+        for _ in range(runs):
+            phases, costs, imported = run_once(db_dir)
+            for name, ms in phases.items():
+                phase_samples[name].append(ms)
+            for module, us in costs.items():
+                module_samples[module].append(us)
+            phase_of.update(imported)
+
+    packages: dict[str, dict[str, Any]] = {}
+    for module, samples in module_samples.items():
+        package = package_of(module)
+        entry = packages.setdefault(package, {"self_ms": 0.0, "modules": 0, "phase": None})
+        entry["self_ms"] += statistics.median(samples) / 1000
+        entry["modules"] += 1
+        if package == module or entry["phase"] is None:
+            entry["phase"] = phase_of.get(module, "startup")
+    return {
+        "phases": {name: round(statistics.median(phase_samples[name]), 2) for name in PHASES},
+        "packages": {
+            name: {**entry, "self_ms": round(entry["self_ms"], 2)}
+            for name, entry in sorted(packages.items(), key=lambda item: -item[1]["self_ms"])
+        },
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Antal tredjepartspaket att visa")
+    parser.add_argument("--out", help="Sökväg för JSON-resultatet (default: benchmarks/results/)")
+    parser.add_argument("--compare", help="Tidigare resultatfil att jämföra mot")
+    args = parser.parse_args(argv)
+
+    results = profile(args.runs)
+    print("Fas                        median ms")
+    for name, ms in results["phases"].items():
+        print(f"{name:<26} {ms:>10.1f}")
+
+    own = [(name, entry) for name, entry in results["packages"].items() if is_own(name)]
+    others = [(name, entry) for name, entry in results["packages"].items() if not is_own(name)]
+    print("\nEgna moduler               self ms  fas")
+    for name, entry in own:
+        print(f"{name:<26} {entry['self_ms']:>8.2f}  {entry['phase']}")
+    print("\nTredjepartspaket           self ms  moduler  fas")
+    for name, entry in others[: args.top]:
+        print(f"{name:<26} {entry['self_ms']:>8.2f}  {entry['modules']:>7}  {entry['phase']}")
+
+    config = {"runs": args.runs}
+    path = write_results("startup", {"meta": metadata("startup", config), "results": results}, args.out)
+    print(f"\nResultat sparat i {path}")
+    if args.compare:
+        baseline = load_results(args.compare)["results"]
+        print(f"\nJämfört med {args.compare}:")
+        for name, ms in results["phases"].items():
+            if name in baseline["phases"]:
+                print(f"{name:<26} {format_delta(ms, baseline['phases'][name])}")
+        for name, entry in list(results["packages"].items())[: args.top]:
+            if name in baseline["packages"]:
+                delta = format_delta(entry["self_ms"], baseline["packages"][name]["self_ms"])
+                print(f"{name:<26} {delta}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Lokala textmått (src/services/text_metrics.py): tid per text och genomströmning för batchar.
+
+Mäter compute_metrics() för olika textlängder och compute_batch() med Python-aggregering
+respektive NumPy (om det är installerat).
+
+    cd backend
+    python -m benchmarks.text_metrics
+    python -m benchmarks.text_metrics --compare benchmarks/results/text_metrics-....json
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from typing import Any
+
+from src.services.text_metrics import compute_batch, compute_metrics, np
+
+from .common import format_delta, load_results, metadata, write_results
+
+SENTENCES = [
+    "Kvartalsrapporten blir tyvärr försenad med en vecka eftersom siffrorna inte är klara.",
+    "Vi skickar den så snart allt är kontrollerat.",
+    "Tack för ett fantastiskt arbete med lanseringen av den nya kundportalen!",
+    "Beslutet fattades av styrelsen efter en lång diskussion om budgeten för nästa år.",
+    "Leveransen stoppades när felet upptäcktes i testmiljön.",
+    "Alla är välkomna till genomgången på fredag klockan tio.",
+]
+
+
+def _text(chars: int, rng: random.Random) -> str:
+    # Slumpade meningar med ett unikt ord per mening så att ordcachen inte blir orealistiskt varm
+    parts: list[str] = []
+    length = 0
+    while length < chars:
+        sentence = f"{rng.choice(SENTENCES)[:-1]} ord{rng.randrange(10**6)}."
+        parts.append(sentence)
+        length += len(sentence) + 1
+    return " ".join(parts)[:chars]
+
+
+def _per_text_ms(texts: list[str]) -> float:
+    started = time.perf_counter()
+    for text in texts:
+        compute_metrics(text)
+    return round((time.perf_counter() - started) / len(texts) * 1000, 3)
+
+
+def _batch_per_second(texts: list[str], use_numpy: bool) -> float:
+    started = time.perf_counter()
+    compute_batch(texts, use_numpy=use_numpy)
+    return round(len(texts) / (time.perf_counter() - started), 1)
+
+
+def run(batch_size: int, seed: int) -> dict[str, Any]:
+    rng = random.Random(seed)
+    per_text_ms = {
+        str(chars): _per_text_ms([_text(chars, rng) for _ in range(20)]) for chars in (500, 5000, 50_000)
+    }
+    batch = [_text(rng.randrange(200, 2000), rng) for _ in range(batch_size)]
+    throughput = {"python": _batch_per_second(batch, use_numpy=False)}
+    if np is not None:
+        throughput["numpy"] = _batch_per_second(batch, use_numpy=True)
+    return {"per_text_ms_by_chars": per_text_ms, "batch_texts_per_second": throughput}
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="Sökväg för JSON-resultatet (default: benchmarks/results/)")
+    parser.add_argument("--compare", help="Tidigare resultatfil att jämföra mot")
+    args = parser.parse_args(argv)
+
+    results = run(args.batch_size, args.seed)
+    for chars, ms in results["per_text_ms_by_chars"].items():
+        print(f"Text {chars:>6} tecken {ms:>9.3f} ms")
+    for name, rate in results["batch_texts_per_second"].items():
+        print(f"Batch ({name:<6})       {rate:>9.1f} texter/s")
+    if np is None:
+        print("NumPy saknas; bara Python-aggregeringen mättes")
+
+    config = {"batch_size": args.batch_size, "seed": args.seed}
+    path = write_results("text_metrics", {"meta": metadata("text_metrics", config), "results": results}, args.out)
+    print(f"\nResultat sparat i {path}")
+    if args.compare:
+        baseline = load_results(args.compare)["results"]
+        print(f"\nJämfört med {args.compare}:")
+        for chars, ms in results["per_text_ms_by_chars"].items():
+            print(f"per_text_ms[{chars}] {format_delta(ms, baseline['per_text_ms_by_chars'][chars])}")
+        for name, rate in results["batch_texts_per_second"].items():
+            if name in baseline["batch_texts_per_second"]:
+                print(f"batch[{name}]      {format_delta(rate, baseline['batch_texts_per_second'][name])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import PlainTextResponse
+
+from ..utils.config import get_settings
+from ..utils.tracing import TRACE_HEADER, Trace, admin_token_matches, get_trace_store
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+MAX_LISTED_TRACES = 200
+
+
+def debug_access(request: Request) -> None:
+    # Med TRACE_ADMIN_TOKEN krävs samma header som för att slå på spårningen
+    if get_settings().trace_admin_token and not admin_token_matches(request.headers.get(TRACE_HEADER)):
+        raise HTTPException(status_code=403, detail="Debug endpoints require X-Debug-Trace")
+
+
+def _trace_or_404(correlation_id: str) -> Trace:
+    trace = get_trace_store().get(correlation_id)
+    if trace is None:
+        # Spåren ligger i minnet per worker; med flera workers kan det ha hamnat i en annan
+        raise HTTPException(status_code=404, detail="Trace not found in this worker")
+    return trace
+
+
+@router.get("/traces", dependencies=[Depends(debug_access)])
+def list_traces(limit: int = Query(default=50, ge=1, le=MAX_LISTED_TRACES)) -> dict[str, object]:
+    """De senaste spåren i den här workern, nyast först."""
+    return {"traces": get_trace_store().recent(limit)}
+
+
+@router.get("/traces/{correlation_id}", dependencies=[Depends(debug_access)], response_model=None)
+def get_trace(
+    correlation_id: str, format: str = Query(default="json", pattern="^(json|waterfall)$")
+) -> Response | dict[str, object]:
+    """Spårets spans (start och längd i ms), summerat per span-namn; format=waterfall ger text."""
+    trace = _trace_or_404(correlation_id)
+    if format == "waterfall":
+        return PlainTextResponse(trace.waterfall())
+    return trace.as_dict()
+
+
+@router.get("/traces/{correlation_id}/profile", dependencies=[Depends(debug_access)])
+def get_profile(correlation_id: str) -> PlainTextResponse:
+    """CPU-stackar i collapsed-format (flamegraph.pl, speedscope, inferno)."""
+    trace = _trace_or_404(correlation_id)
+    if trace.profile is None:
+        raise HTTPException(status_code=404, detail="Trace was not profiled")
+    return PlainTextResponse(trace.profile.collapsed())
@@ -0,0 +1,88 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+
+from ..models.llm import Tone
+from ..models.schemas import HistoryImportRequest, HistoryPage, JobKind
+from ..services.history import HistoryEntry, HistoryWriter
+from ..utils.client import ANONYMOUS_CLIENT, client_id
+from ..utils.serialization import model_response
+
+router = APIRouter(prefix="/history", tags=["history"])
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_QUERY_CHARS = 200
+
+
+def history_dependency(request: Request) -> HistoryWriter:
+    history: HistoryWriter | None = getattr(request.app.state, "history", None)
+    if history is None:
+        raise HTTPException(status_code=503, detail="History is not enabled")
+    return history
+
+
+def history_client(request: Request) -> str:
+    # Utan id skulle alla anrop dela samma historik, som vem som helst kunde läsa och rensa
+    owner = client_id(request)
+    if owner == ANONYMOUS_CLIENT:
+        raise HTTPException(status_code=400, detail="History requires an X-Client-Id header")
+    return owner
+
+
+@router.get("", response_model=HistoryPage)
+async def list_history(
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    tone: Tone | None = None,
+    kind: JobKind | None = None,
+    history: HistoryWriter = Depends(history_dependency),
+    owner: str = Depends(history_client),
+) -> Response:
+    """Klientens historik, nyast först; hämta nästa sida med `cursor=next_cursor`."""
+    return model_response(await history.store.page(owner, limit, cursor, tone, kind))
+
+
+@router.get("/search", response_model=HistoryPage)
+async def search_history(
+    q: str = Query(..., min_length=1, max_length=MAX_QUERY_CHARS),
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    history: HistoryWriter = Depends(history_dependency),
+    owner: str = Depends(history_client),
+) -> Response:
+    """Fulltextsökning i analyserade texter, bäst träff först."""
+    return model_response(await history.store.search(owner, q, limit, cursor))
+
+
+@router.post("/import")
+async def import_history(
+    req: HistoryImportRequest,
+    history: HistoryWriter = Depends(history_dependency),
+    owner: str = Depends(history_client),
+) -> dict[str, int]:
+    """Frontends gamla localStorage-historik; en post som redan finns importeras inte igen."""
+    entries = [
+        HistoryEntry(owner, "analyze", item.text, item.result.model_dump(), item.timestamp / 1000)
+        for item in req.items
+    ]
+    # Skrivs direkt och inte via kön: klienten tar bort sin lokala kopia när svaret kommit
+    return {"imported": await asyncio.to_thread(history.store.import_many, entries)}
+
+
+@router.delete("/{item_id}", status_code=204)
+async def delete_history_item(
+    item_id: int,
+    history: HistoryWriter = Depends(history_dependency),
+    owner: str = Depends(history_client),
+) -> Response:
+    if not await history.store.delete(owner, item_id):
+        raise HTTPException(status_code=404, detail="History item not found")
+    return Response(status_code=204)
+
+
+@router.delete("")
+async def clear_history(
+    history: HistoryWriter = Depends(history_dependency), owner: str = Depends(history_client)
+) -> dict[str, int]:
+    return {"deleted": await history.store.clear(owner)}
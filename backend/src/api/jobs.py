@@ -0,0 +1,97 @@
+from collections.abc import AsyncIterator
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+
+from ..models.schemas import GenerateJobRequest, JobRequest, JobResponse
+from ..services.jobs import POLL_SECONDS, TERMINAL_STATUSES, JobQueue, QueueFullError
+from ..utils.config import get_settings
+from ..utils.errors import ErrorResponse
+from ..utils.logging import get_logger
+from ..utils.serialization import model_response
+from ..utils.sse import SSE_HEADERS, sse_event
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+logger = get_logger(__name__)
+
+MAX_WAIT_SECONDS = 60.0
+
+
+def job_queue_dependency(request: Request) -> JobQueue:
+    queue: JobQueue | None = getattr(request.app.state, "job_queue", None)
+    if queue is None:
+        raise HTTPException(status_code=503, detail="Job queue is not running")
+    return queue
+
+
+async def _get_job_or_404(queue: JobQueue, job_id: str) -> JobResponse:
+    job = await queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("", status_code=202, response_model=JobResponse)
+async def create_job(
+    request: Request,
+    job: JobRequest = Body(...),
+    queue: JobQueue = Depends(job_queue_dependency),
+) -> Response:
+    cid = getattr(request.state, "correlation_id", "unknown")
+    if not job.request.text.strip():
+        raise HTTPException(status_code=400, detail="Text may not be empty")
+    if isinstance(job, GenerateJobRequest) and not any(job.request.selected_suggestions):
+        raise HTTPException(status_code=400, detail="At least one suggestion must be selected")
+
+    try:
+        created = await queue.submit(job)
+    except QueueFullError:
+        logger.warning("Job queue full", extra={"correlation_id": cid})
+        body = ErrorResponse(code="http_error_429", message="Job queue is full - retry later")
+        return model_response(
+            body, 429, headers={"Retry-After": str(get_settings().jobs_retry_after_seconds)}
+        )
+
+    logger.info("Job queued", extra={"correlation_id": cid, "job_id": created.id, "kind": job.kind})
+    return model_response(created, 202)
+
+
+@router.get("/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str, queue: JobQueue = Depends(job_queue_dependency)) -> Response:
+    return model_response(await _get_job_or_404(queue, job_id))
+
+
+@router.get("/{job_id}/wait", response_model=JobResponse)
+async def wait_for_job(
+    job_id: str,
+    timeout: float = Query(default=30.0, gt=0, le=MAX_WAIT_SECONDS),
+    queue: JobQueue = Depends(job_queue_dependency),
+) -> Response:
+    """Long-poll: svarar när jobbet är klart, eller med aktuell status efter `timeout` sekunder."""
+    job = await queue.wait(job_id, timeout)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return model_response(job)
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str, queue: JobQueue = Depends(job_queue_dependency)) -> StreamingResponse:
+    """Server-Sent Events med en "status"-händelse per statusändring tills jobbet är klart."""
+    await _get_job_or_404(queue, job_id)
+
+    async def events() -> AsyncIterator[str]:
+        updates = queue.subscribe(job_id)
+        try:
+            job = await _get_job_or_404(queue, job_id)
+            yield sse_event("status", job.model_dump())
+            while job.status not in TERMINAL_STATUSES:
+                update = await queue.next_update(job_id, updates, POLL_SECONDS)
+                if update is None:
+                    return
+                if update.status != job.status:
+                    yield sse_event("status", update.model_dump())
+                job = update
+        finally:
+            queue.unsubscribe(job_id, updates)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -1,23 +1,305 @@
-from fastapi import APIRouter, HTTPException, Request
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
+from functools import partial
+from typing import Any
 
-from ..models.schemas import AnalyzeRequest, AnalyzeResponse, GenerateRequest, GenerateResponse
-from ..services.analyzer import get_analyzer
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel
+from starlette.requests import HTTPConnection
+
+from ..models.schemas import (
+    GENERATE_MAX_CHARS,
+    AnalyzeRequest,
+    AnalyzeResponse,
+    BatchAnalyzeRequest,
+    FastAnalyzeResponse,
+    FastBatchRequest,
+    FastBatchResponse,
+    GenerateRequest,
+    GenerateResponse,
+    TextMetrics,
+)
+from ..services.analyzer import Analyzer, StreamEvent, get_analyzer
+from ..services.batch import ndjson_lines, resolve_concurrency, run_batch
+from ..services.cache import get_response_cache
+from ..services.coalescing import get_singleflight
+from ..services.governor import get_governor
+from ..services.history import HistoryWriter
+from ..services.prefetch import Prefetcher
+from ..services.routing import get_model_router
+from ..services.similarity import get_similarity_index
+from ..services.text_metrics import compute_batch, fallback_suggestions, measure
+from ..utils.client import ANONYMOUS_CLIENT, client_id
+from ..utils.config import get_settings
+from ..utils.errors import ErrorResponse
+from ..utils.instrumentation import FALLBACKS, stage
 from ..utils.logging import get_logger
+from ..utils.metrics import REGISTRY
+from ..utils.serialization import model_response
+from ..utils.sse import SSE_HEADERS, sse_event
 
 router = APIRouter()
 logger = get_logger(__name__)
 
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Bara förslag och ton återanvänds från en närdubblett; omskrivningen gällde den andra texten
+REUSED_FIELDS = ("suggestions", "tone")
+
+
+def _cache_samples() -> dict[tuple[str, ...], float]:
+    cache = get_response_cache()
+    if cache is None:
+        return {}
+    return {(name,): float(value) for name, value in cache.stats.as_dict().items()}
+
+
+def _singleflight_samples() -> dict[tuple[str, ...], float]:
+    flight = get_singleflight()
+    samples: dict[tuple[str, ...], float] = {
+        (name,): float(value) for name, value in flight.stats.as_dict().items()
+    }
+    samples[("inflight",)] = float(flight.inflight())
+    return samples
+
+
+def _governor_samples() -> dict[tuple[str, ...], float]:
+    # Endast numeriska fält; circuit_state exponeras som 0/1 per tillstånd nedan
+    snapshot = get_governor().snapshot()
+    return {
+        (name,): float(value)
+        for name, value in snapshot.items()
+        if isinstance(value, int | float) and not isinstance(value, bool)
+    }
+
+
+def _circuit_samples() -> dict[tuple[str, ...], float]:
+    state = get_governor().breaker.state
+    return {(name,): float(name == state) for name in ("closed", "open", "half_open")}
+
+
+REGISTRY.gauge(
+    "response_cache", "Cache-räknare (hits, misses, sets, evictions, expirations)", ("stat",), _cache_samples
+)
+REGISTRY.gauge(
+    "singleflight", "Single-flight: ledare, sammanslagna, övergivna och pågående", ("stat",), _singleflight_samples
+)
+REGISTRY.gauge("upstream_governor", "Governor-tillstånd enligt /upstream/status", ("stat",), _governor_samples)
+REGISTRY.gauge("upstream_circuit_state", "1 för aktuellt circuit breaker-tillstånd", ("state",), _circuit_samples)
+JOB_QUEUE_DEPTH = REGISTRY.gauge("job_queue_depth", "Köade jobb som väntar på en worker")
+
+
+def analyzer_dependency(request: HTTPConnection) -> Analyzer:
+    # Klienten skapas i lifespan; saknas den (t.ex. TestClient utan context) används en per anrop
+    return get_analyzer(getattr(request.app.state, "http_client", None))
+
+
+def _json_response(model: BaseModel, operation: str) -> Response:
+    # Serialiseras här istället för i FastAPI (ingen omvalidering mot response_model) och mäts
+    with stage("serialization", operation):
+        return model_response(model)
+
+
+def _selected_suggestions(req: GenerateRequest, cid: str) -> list[str]:
+    # Filtrera valda förslag
+    selected = [s for s, selected in zip(req.suggestions, req.selected_suggestions, strict=True) if selected]
+    if not selected:
+        logger.warning("No suggestions selected", extra={"correlation_id": cid})
+        raise HTTPException(status_code=400, detail="At least one suggestion must be selected")
+    return selected
+
+
+def _record_history(request: HTTPConnection, kind: str, text: str, result: dict[str, Any]) -> None:
+    # Läggs bara i historikens kö; skrivningen sker i batchar utanför request-vägen.
+    # Anrop utan X-Client-Id sparas inte: de skulle hamna i en historik som alla delar.
+    history: HistoryWriter | None = getattr(request.app.state, "history", None)
+    owner = client_id(request)
+    if history is not None and owner != ANONYMOUS_CLIENT:
+        history.record(owner, kind, text, result)
+
+
+def _remember_analysis(
+    request: HTTPConnection, text: str, temperature: float, result: dict[str, Any]
+) -> None:
+    _record_history(request, "analyze", text, result)
+    similar = get_similarity_index()
+    owner = client_id(request)
+    if similar is None or owner == ANONYMOUS_CLIENT or result.get("reused") or result.get("fallback"):
+        return
+    similar.add(text, (owner, temperature), {name: result[name] for name in REUSED_FIELDS})
+
+
+async def _find_similar(
+    client: str, text: str, temperature: float
+) -> tuple[dict[str, Any], float] | None:
+    # Utan X-Client-Id återanvänds inget: en annan klients analys ska aldrig komma tillbaka
+    similar = get_similarity_index()
+    if similar is None or client == ANONYMOUS_CLIENT:
+        return None
+    return await similar.find(text, (client, temperature))
+
+
+def _prefetch_generate(
+    request: HTTPConnection, analyzer: Analyzer, text: str, temperature: float, result: dict[str, Any]
+) -> None:
+    # Användaren väljer oftast alla förslag; generera i bakgrunden medan de läser analysen
+    prefetcher: Prefetcher | None = getattr(request.app.state, "prefetcher", None)
+    if prefetcher is not None and not result.get("fallback") and len(text) <= GENERATE_MAX_CHARS:
+        prefetcher.schedule(analyzer, text, result["suggestions"], temperature)
+
+
+def _analysis_done(
+    request: HTTPConnection, analyzer: Analyzer, text: str, temperature: float, result: dict[str, Any]
+) -> None:
+    _remember_analysis(request, text, temperature, result)
+    _prefetch_generate(request, analyzer, text, temperature, result)
+
+
+async def _generated(
+    request: Request, analyzer: Analyzer, text: str, selected: list[str], temperature: float
+) -> tuple[str, bool]:
+    """Genererad text och om den kom från en förhämtning."""
+    prefetcher: Prefetcher | None = getattr(request.app.state, "prefetcher", None)
+    if prefetcher is not None:
+        prefetched = await prefetcher.take(text, selected, temperature)
+        if prefetched is not None:
+            return prefetched, True
+    return await analyzer.generate_text(text, selected, temperature=temperature), False
+
+
+async def _generate_events(
+    request: HTTPConnection, analyzer: Analyzer, text: str, selected: list[str], temperature: float
+) -> AsyncGenerator[StreamEvent, None]:
+    prefetcher: Prefetcher | None = getattr(request.app.state, "prefetcher", None)
+    prefetched = await prefetcher.take(text, selected, temperature) if prefetcher is not None else None
+    if prefetched is not None:
+        yield "delta", prefetched
+        yield "result", {"generated_text": prefetched}
+        return
+    async for event in analyzer.stream_generate(text, selected, temperature=temperature):
+        yield event
+
+
+async def _reused_events(
+    prior: dict[str, Any], text: str, similarity: float
+) -> AsyncIterator[StreamEvent]:
+    # Samma händelser som en cacheträff, men resultatet flaggas som återanvänt och
+    # alternative_text är den nya texten (som vid lokal fallback)
+    for suggestion in prior["suggestions"]:
+        yield "suggestion", suggestion
+    yield "tone", prior["tone"]
+    yield "alternative_text", text
+    yield "result", {**prior, "alternative_text": text, "reused": True, "similarity": similarity}
+
+
+def _local_analysis(text: str, metrics: TextMetrics) -> AnalyzeResponse:
+    # Ingen omskrivning utan LLM:en; alternative_text är originaltexten
+    return AnalyzeResponse(
+        suggestions=fallback_suggestions(metrics),
+        tone=metrics.tone,
+        alternative_text=text,
+        fallback=True,
+    )
+
+
+def _fast_response(metrics: TextMetrics) -> FastAnalyzeResponse:
+    return FastAnalyzeResponse(
+        suggestions=fallback_suggestions(metrics), tone=metrics.tone, metrics=metrics
+    )
+
+
+def _upstream_unavailable(exc: HTTPException) -> bool:
+    return exc.status_code == 503 and get_settings().analyze_local_fallback
+
+
+async def _analysis_events(
+    events: AsyncIterator[StreamEvent], text: str, metrics: TextMetrics
+) -> AsyncGenerator[StreamEvent, None]:
+    # Lokala mått först; LLM-händelserna sedan, eller lokala förslag om LLM:en inte svarar
+    yield "metrics", metrics.model_dump()
+    try:
+        async for event in events:
+            yield event
+    except HTTPException as exc:
+        if not _upstream_unavailable(exc):
+            raise
+        FALLBACKS.labels("analyze_stream", "upstream_unavailable").inc()
+        response = _local_analysis(text, metrics)
+        for suggestion in response.suggestions:
+            yield "suggestion", suggestion
+        yield "tone", response.tone
+        yield "alternative_text", response.alternative_text
+        yield "result", response.model_dump()
+
+
+async def _stream_analysis(
+    client: str, analyzer: Analyzer, text: str, temperature: float
+) -> AsyncGenerator[StreamEvent, None]:
+    """Händelserna för en strömmad analys, från klientens nästan likadana text om en sådan finns."""
+    match = await _find_similar(client, text, temperature)
+    if match is not None:
+        events = _reused_events(match[0], text, round(match[1], 3))
+    else:
+        events = analyzer.stream_analyze(text, temperature=temperature)
+    return _analysis_events(events, text, await measure(text))
+
+
+async def _sse_stream(
+    events: AsyncIterator[StreamEvent],
+    cid: str,
+    on_result: Callable[[dict[str, Any]], None] | None = None,
+) -> AsyncIterator[str]:
+    # Första händelsen skickas direkt så att klienten får första byten utan att vänta på LLM:en
+    yield sse_event("start", {"correlation_id": cid})
+    try:
+        async for name, data in events:
+            if name == "result" and on_result is not None:
+                on_result(data)
+            yield sse_event(name, data)
+    except HTTPException as exc:
+        logger.error("Streaming failed", extra={"correlation_id": cid})
+        body = ErrorResponse(code=f"http_error_{exc.status_code}", message=str(exc.detail))
+        yield sse_event("error", body.model_dump())
+        return
+    yield sse_event("done", {})
+
 
 @router.post("/analyze", response_model=AnalyzeResponse)
-async def analyze(req: AnalyzeRequest, request: Request) -> AnalyzeResponse:
+async def analyze(
+    req: AnalyzeRequest,
+    request: Request,
+    analyzer: Analyzer = Depends(analyzer_dependency),
+) -> Response:
     cid = getattr(request.state, "correlation_id", "unknown")
     text = req.text.strip()
     if not text:
         logger.warning("Empty text received", extra={"correlation_id": cid})
         raise HTTPException(status_code=400, detail="Text may not be empty")
 
-    analyzer = get_analyzer()
-    suggestions, tone, alternative_text = await analyzer.analyze_text(text, temperature=req.temperature)
+    match = await _find_similar(client_id(request), text, req.temperature)
+    if match is not None:
+        prior, similarity = match
+        logger.info(
+            "Analysis reused from near-duplicate",
+            extra={"correlation_id": cid, "similarity": round(similarity, 3)},
+        )
+        response = AnalyzeResponse(
+            **prior, alternative_text=text, reused=True, similarity=round(similarity, 3)
+        )
+        _record_history(request, "analyze", text, response.model_dump())
+        _prefetch_generate(request, analyzer, text, req.temperature, prior)
+        return _json_response(response, "analyze")
+
+    try:
+        suggestions, tone, alternative_text = await analyzer.analyze_text(text, temperature=req.temperature)
+    except HTTPException as exc:
+        if not _upstream_unavailable(exc):
+            raise
+        logger.warning("Upstream unavailable, using local text metrics", extra={"correlation_id": cid})
+        FALLBACKS.labels("analyze", "upstream_unavailable").inc()
+        response = _local_analysis(text, await measure(text))
+        _remember_analysis(request, text, req.temperature, response.model_dump())
+        return _json_response(response, "analyze")
     if not suggestions:
         logger.error("No suggestions from analyzer", extra={"correlation_id": cid})
         raise HTTPException(status_code=500, detail="Analyzer returned no suggestions")
@@ -26,28 +308,157 @@ async def analyze(req: AnalyzeRequest, request: Request) -> AnalyzeResponse:
         "Analysis successful",
         extra={"correlation_id": cid, "tone": tone, "suggestions_count": len(suggestions)},
     )
-    return AnalyzeResponse(suggestions=suggestions[:3], tone=tone, alternative_text=alternative_text)
+    response = AnalyzeResponse(suggestions=suggestions[:3], tone=tone, alternative_text=alternative_text)
+    _analysis_done(request, analyzer, text, req.temperature, response.model_dump())
+    return _json_response(response, "analyze")
 
 
 @router.post("/generate", response_model=GenerateResponse)
-async def generate(req: GenerateRequest, request: Request) -> GenerateResponse:
+async def generate(
+    req: GenerateRequest,
+    request: Request,
+    analyzer: Analyzer = Depends(analyzer_dependency),
+) -> Response:
     cid = getattr(request.state, "correlation_id", "unknown")
     text = req.text.strip()
     if not text:
         logger.warning("Empty text received in generate", extra={"correlation_id": cid})
         raise HTTPException(status_code=400, detail="Text may not be empty")
 
-    # Filtrera valda förslag
-    selected = [s for s, selected in zip(req.suggestions, req.selected_suggestions, strict=True) if selected]
-    if not selected:
-        logger.warning("No suggestions selected", extra={"correlation_id": cid})
-        raise HTTPException(status_code=400, detail="At least one suggestion must be selected")
-
-    analyzer = get_analyzer()
-    generated_text = await analyzer.generate_text(text, selected, temperature=req.temperature)
+    selected = _selected_suggestions(req, cid)
+    generated_text, prefetched = await _generated(request, analyzer, text, selected, req.temperature)
 
     logger.info(
         "Generation successful",
-        extra={"correlation_id": cid, "selected_count": len(selected)},
+        extra={"correlation_id": cid, "selected_count": len(selected), "prefetched": prefetched},
+    )
+    _record_history(request, "generate", text, {"generated_text": generated_text})
+    return _json_response(GenerateResponse(generated_text=generated_text), "generate")
+
+
+@router.post("/analyze/stream")
+async def analyze_stream(
+    req: AnalyzeRequest,
+    request: Request,
+    analyzer: Analyzer = Depends(analyzer_dependency),
+) -> StreamingResponse:
+    """Som /analyze men som Server-Sent Events: metrics, suggestion, tone, alternative_text(_delta), result."""
+    cid = getattr(request.state, "correlation_id", "unknown")
+    text = req.text.strip()
+    if not text:
+        logger.warning("Empty text received in analyze stream", extra={"correlation_id": cid})
+        raise HTTPException(status_code=400, detail="Text may not be empty")
+
+    events = await _stream_analysis(client_id(request), analyzer, text, req.temperature)
+    record = partial(_analysis_done, request, analyzer, text, req.temperature)
+    return StreamingResponse(
+        _sse_stream(events, cid, record), media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+
+@router.post("/analyze/fast", response_model=FastAnalyzeResponse)
+async def analyze_fast(req: AnalyzeRequest, request: Request) -> Response:
+    """Lokala textmått och förslag utan LLM: LIX, meningslängd, passiv form, upprepningar och ton."""
+    cid = getattr(request.state, "correlation_id", "unknown")
+    text = req.text.strip()
+    if not text:
+        logger.warning("Empty text received in fast analysis", extra={"correlation_id": cid})
+        raise HTTPException(status_code=400, detail="Text may not be empty")
+    return _json_response(_fast_response(await measure(text)), "analyze_fast")
+
+
+@router.post("/analyze/fast/batch", response_model=FastBatchResponse)
+async def analyze_fast_batch(req: FastBatchRequest) -> Response:
+    """Som /analyze/fast för många texter; svaren i samma ordning som items."""
+    texts = [item.text.strip() for item in req.items]
+    # Hela batchen räknas i en tråd; med NumPy aggregeras alla texter på en gång
+    metrics = await asyncio.to_thread(compute_batch, texts)
+    response = FastBatchResponse(items=[_fast_response(m) for m in metrics])
+    return _json_response(response, "analyze_fast_batch")
+
+
+@router.post("/generate/stream")
+async def generate_stream(
+    req: GenerateRequest,
+    request: Request,
+    analyzer: Analyzer = Depends(analyzer_dependency),
+) -> StreamingResponse:
+    """Som /generate men som Server-Sent Events: delta, reset, result."""
+    cid = getattr(request.state, "correlation_id", "unknown")
+    text = req.text.strip()
+    if not text:
+        logger.warning("Empty text received in generate stream", extra={"correlation_id": cid})
+        raise HTTPException(status_code=400, detail="Text may not be empty")
+
+    selected = _selected_suggestions(req, cid)
+    events = _generate_events(request, analyzer, text, selected, req.temperature)
+    record = partial(_record_history, request, "generate", text)
+    return StreamingResponse(
+        _sse_stream(events, cid, record), media_type="text/event-stream", headers=SSE_HEADERS
+    )
+
+
+@router.post("/analyze/batch")
+async def analyze_batch(
+    req: BatchAnalyzeRequest,
+    request: Request,
+    analyzer: Analyzer = Depends(analyzer_dependency),
+) -> StreamingResponse:
+    """Analysera många texter; en NDJSON-rad per item i färdigordning, sist en sammanfattning."""
+    cid = getattr(request.state, "correlation_id", "unknown")
+    concurrency = resolve_concurrency(req.concurrency)
+    logger.info(
+        "Batch analysis started",
+        extra={"correlation_id": cid, "items": len(req.items), "concurrency": concurrency},
     )
-    return GenerateResponse(generated_text=generated_text)
+
+    async def records() -> AsyncIterator[dict[str, object]]:
+        async for record in run_batch(analyzer, req.items, concurrency):
+            if "summary" in record:
+                logger.info("Batch analysis finished", extra={"correlation_id": cid, **record["summary"]})
+            yield record
+
+    return StreamingResponse(ndjson_lines(records()), media_type="application/x-ndjson")
+
+
+@router.get("/cache/stats")
+def cache_stats() -> dict[str, object]:
+    cache = get_response_cache()
+    flight = get_singleflight()
+    stats: dict[str, object] = cache.snapshot() if cache is not None else {"backend": "none"}
+    stats["singleflight"] = {**flight.stats.as_dict(), "inflight": flight.inflight()}
+    return stats
+
+
+@router.get("/upstream/status")
+def upstream_status() -> dict[str, object]:
+    """Governor-tillstånd: circuit breaker, samtidighetsgräns, token buckets och räknare."""
+    return get_governor().snapshot()
+
+
+@router.get("/upstream/clients")
+def upstream_clients() -> dict[str, object]:
+    """Per klient (API-nyckel eller IP): köade anrop, väntetider och kvar av kvoten."""
+    governor = get_governor()
+    queue = governor.limiter.queue
+    return {
+        "queued": {"interactive": queue.queued("interactive"), "batch": queue.queued("batch")},
+        "clients": governor.client_snapshot(),
+    }
+
+
+@router.get("/upstream/routes")
+def upstream_routes() -> dict[str, object]:
+    """Modellrouting: per route p50-latens, felkvot och poäng samt de senaste besluten."""
+    model_router = get_model_router()
+    if model_router is None:
+        raise HTTPException(status_code=404, detail="Model routing is not configured (LLM_ROUTES)")
+    return model_router.snapshot()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics(request: Request) -> PlainTextResponse:
+    """Prometheus text exposition av alla registrerade metrics."""
+    queue = getattr(request.app.state, "job_queue", None)
+    JOB_QUEUE_DEPTH.set(float(queue.depth()) if queue is not None else 0.0)
+    return PlainTextResponse(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
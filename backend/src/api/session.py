@@ -0,0 +1,220 @@
+"""Redigeringssession över WebSocket: /ws/session.
+
+En anslutning per editor istället för ett HTTP-anrop (med CORS-preflight och hela
+middleware-stacken) per analys. Klienten skickar texten, hel eller som delta, medan användaren
+skriver. Servern väntar SESSION_DEBOUNCE_MS efter senaste ändringen och strömmar sedan analysen.
+En nyare text avbryter pågående analys och generering för den äldre: tasken avbryts, vilket
+stänger httpx-strömmen mot upstream och lämnar tillbaka platsen i governorn.
+
+Händelser från servern är JSON-objekt {"event", "operation", "version", "data"} med samma
+namn som SSE-strömmarna (metrics, suggestion, tone, alternative_text, delta, reset, result),
+plus ready, cancelled och error.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import uuid
+from collections.abc import AsyncGenerator, Callable, Coroutine
+from contextlib import aclosing, suppress
+from functools import partial
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import TypeAdapter, ValidationError
+
+from ..models.schemas import (
+    ANALYZE_MAX_CHARS,
+    GENERATE_MAX_CHARS,
+    SessionCancel,
+    SessionDelta,
+    SessionGenerate,
+    SessionMessage,
+    SessionText,
+)
+from ..services.analyzer import Analyzer, StreamEvent
+from ..utils.client import client_id
+from ..utils.config import get_settings
+from ..utils.errors import ErrorResponse
+from ..utils.logging import correlation_id_var, get_logger
+from ..utils.metrics import REGISTRY
+from ..utils.serialization import dumps_str
+from .routes import (
+    _analysis_done,
+    _generate_events,
+    _record_history,
+    _stream_analysis,
+    analyzer_dependency,
+)
+
+router = APIRouter()
+logger = get_logger(__name__)
+
+SESSION_MESSAGE: TypeAdapter[SessionMessage] = TypeAdapter(SessionMessage)
+SESSION_RUNS = REGISTRY.counter(
+    "session_runs",
+    "Analyser och genereringar i /ws/session: completed, failed, cancelled eller debounced",
+    ("operation", "outcome"),
+)
+_sessions: set[EditorSession] = set()
+REGISTRY.gauge(
+    "session_active",
+    "Öppna /ws/session-anslutningar i den här workern",
+    collect=lambda: {(): float(len(_sessions))},
+)
+
+
+class EditorSession:
+    """Sessionens text och pågående tasks: högst en analys och en generering åt gången."""
+
+    def __init__(self, websocket: WebSocket, analyzer: Analyzer, debounce_seconds: float) -> None:
+        self.websocket = websocket
+        self.analyzer = analyzer
+        self.debounce_seconds = debounce_seconds
+        self.text = ""
+        self.version = 0
+        self.temperature = 0.7
+        self._tasks: dict[str, asyncio.Task[None]] = {}
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, event: str, operation: str, version: int, data: Any) -> None:
+        async with self._send_lock:
+            await self.websocket.send_text(
+                dumps_str({"event": event, "operation": operation, "version": version, "data": data})
+            )
+
+    async def error(self, operation: str, version: int, status_code: int, message: str) -> None:
+        body = ErrorResponse(code=f"http_error_{status_code}", message=message)
+        await self.send("error", operation, version, body.model_dump())
+
+    async def handle(self, message: SessionMessage) -> None:
+        if isinstance(message, SessionCancel):
+            self.cancel("analyze")
+            self.cancel("generate")
+        elif isinstance(message, SessionGenerate):
+            self._start("generate", self._generate(message))
+        else:
+            if not await self._apply(message):
+                return
+            # Resultat för en äldre text är inaktuella
+            self.cancel("generate")
+            self._start("analyze", self._analyze(self.text, self.temperature, self.version))
+
+    async def _apply(self, message: SessionText | SessionDelta) -> bool:
+        if isinstance(message, SessionText):
+            self.text = message.text
+            self.temperature = message.temperature
+        else:
+            if message.start > message.end or message.end > len(self.text):
+                # Klienten och servern är inte överens om texten; klienten skickar då hela texten
+                await self.error("session", message.version, 409, "Delta does not match text - resend")
+                return False
+            text = self.text[: message.start] + message.insert + self.text[message.end :]
+            if len(text) > ANALYZE_MAX_CHARS:
+                await self.error("session", message.version, 422, "Text is too long")
+                return False
+            self.text = text
+        self.version = message.version
+        return True
+
+    def _start(self, operation: str, coro: Coroutine[Any, Any, None]) -> None:
+        self.cancel(operation)
+        self._tasks[operation] = asyncio.create_task(coro)
+
+    def cancel(self, operation: str) -> None:
+        task = self._tasks.pop(operation, None)
+        if task is not None and not task.done():
+            task.cancel()
+
+    async def _run(
+        self,
+        operation: str,
+        version: int,
+        events: AsyncGenerator[StreamEvent, None],
+        on_result: Callable[[dict[str, Any]], None],
+    ) -> None:
+        try:
+            # aclosing: avbryts tasken medan en händelse skickas stängs strömmen (och upstream) direkt
+            async with aclosing(events):
+                async for name, data in events:
+                    if name == "result":
+                        on_result(data)
+                    await self.send(name, operation, version, data)
+        except asyncio.CancelledError:
+            SESSION_RUNS.labels(operation, "cancelled").inc()
+            with suppress(Exception):
+                await self.send("cancelled", operation, version, {})
+            raise
+        except HTTPException as exc:
+            SESSION_RUNS.labels(operation, "failed").inc()
+            logger.error(f"Session {operation} failed: {exc.detail}")
+            await self.error(operation, version, exc.status_code, str(exc.detail))
+            return
+        SESSION_RUNS.labels(operation, "completed").inc()
+
+    async def _analyze(self, text: str, temperature: float, version: int) -> None:
+        try:
+            await asyncio.sleep(self.debounce_seconds)
+        except asyncio.CancelledError:
+            SESSION_RUNS.labels("analyze", "debounced").inc()
+            raise
+        text = text.strip()
+        if not text:
+            return
+        events = await _stream_analysis(client_id(self.websocket), self.analyzer, text, temperature)
+        record = partial(_analysis_done, self.websocket, self.analyzer, text, temperature)
+        await self._run("analyze", version, events, record)
+
+    async def _generate(self, message: SessionGenerate) -> None:
+        text = self.text.strip()
+        version = self.version
+        if len(message.selected_suggestions) != len(message.suggestions):
+            await self.error("generate", version, 422, "selected_suggestions must match suggestions")
+            return
+        pairs = zip(message.suggestions, message.selected_suggestions, strict=True)
+        selected = [suggestion for suggestion, chosen in pairs if chosen]
+        if not selected:
+            await self.error("generate", version, 400, "At least one suggestion must be selected")
+            return
+        if not text or len(text) > GENERATE_MAX_CHARS:
+            await self.error("generate", version, 422, f"Text must be 1-{GENERATE_MAX_CHARS} characters")
+            return
+        events = _generate_events(self.websocket, self.analyzer, text, selected, message.temperature)
+        record = partial(_record_history, self.websocket, "generate", text)
+        await self._run("generate", version, events, record)
+
+    async def close(self) -> None:
+        # Avbrutna tasks avbryter i sin tur upstream-anropen
+        tasks = list(self._tasks.values())
+        for operation in list(self._tasks):
+            self.cancel(operation)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@router.websocket("/ws/session")
+async def editor_session(
+    websocket: WebSocket, analyzer: Analyzer = Depends(analyzer_dependency)
+) -> None:
+    config = get_settings()
+    await websocket.accept()
+    session_id = str(uuid.uuid4())
+    token = correlation_id_var.set(session_id)
+    session = EditorSession(websocket, analyzer, config.session_debounce_ms / 1000)
+    _sessions.add(session)
+    try:
+        ready = {"session_id": session_id, "debounce_ms": config.session_debounce_ms}
+        await session.send("ready", "session", 0, ready)
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                message = SESSION_MESSAGE.validate_json(raw)
+            except ValidationError as exc:
+                await session.error("session", session.version, 422, str(exc))
+                continue
+            await session.handle(message)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        _sessions.discard(session)
+        await session.close()
+        correlation_id_var.reset(token)
@@ -1,34 +1,159 @@
-import os
+"""FastAPI-appen.
 
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+`create_app()` bygger appen; modulens `app` skapas först vid åtkomst (t.ex. av uvicorn via
+`src.main:app`), så att import av paketet inte konfigurerar loggning eller drar in hela
+service-kedjan. Tunga moduler importeras i create_app respektive lifespan.
+"""
+
+import asyncio
+import logging
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager, suppress
+from typing import Any
 
-from .api.routes import router as api_router
-from .utils.errors import register_exception_handlers
-from .utils.logging import configure_json_logging, correlation_middleware
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-configure_json_logging()
+from .utils.config import get_settings
+from .utils.worker import WORKER, install_drain_handlers
 
-app = FastAPI(title="AI Feedback Dashboard API")
 
-# CORS
-cors_origins = os.getenv("CORS_ORIGINS", "http://localhost:5173").split(",")
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[origin.strip() for origin in cors_origins],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    from .services.analyzer import get_analyzer
+    from .services.cache import close_response_cache
+    from .services.history import create_history
+    from .services.http_client import create_http_client
+    from .services.jobs import create_job_queue
+    from .services.prefetch import create_prefetcher
+    from .services.prompts import get_prompts
+    from .services.similarity import get_similarity_index
+    from .services.text_metrics import BATCH_BACKEND
+    from .utils.instrumentation import monitor_event_loop_lag
+    from .utils.serialization import JSON_BACKEND
 
-correlation_middleware(app)
+    config = get_settings()
+    # Valfria paket (requirements-fast.txt) byter implementation; visa vilken som används
+    logging.getLogger(__name__).info(
+        f"Fast paths: json={JSON_BACKEND}, text_metrics={BATCH_BACKEND}"
+    )
+    # Promptmallarna läses från disk en gång, innan första requesten
+    get_prompts()
+    similar = get_similarity_index()
+    if similar is not None and config.similarity_index_path:
+        await asyncio.to_thread(similar.load, config.data_path(config.similarity_index_path))
+    # En delad, poolad HTTP-klient för hela processen (stängs vid shutdown)
+    app.state.http_client = create_http_client()
+    app.state.job_queue = create_job_queue(lambda: get_analyzer(app.state.http_client))
+    await app.state.job_queue.start()
+    app.state.history = create_history()
+    if app.state.history is not None:
+        app.state.history.start()
+    app.state.prefetcher = create_prefetcher()
+    loop_lag_monitor = asyncio.create_task(monitor_event_loop_lag())
+    WORKER.start()
+    install_drain_handlers()
+    try:
+        yield
+    finally:
+        # Servern har slutat ta emot och väntat in öppna requests; låt pågående jobb bli klara
+        WORKER.begin_drain()
+        loop_lag_monitor.cancel()
+        with suppress(asyncio.CancelledError):
+            await loop_lag_monitor
+        if app.state.prefetcher is not None:
+            # Spekulativa anrop som ingen väntar på är inte värda att dränera
+            await app.state.prefetcher.close()
+            app.state.prefetcher = None
+        await app.state.job_queue.stop(config.jobs_drain_seconds)
+        app.state.job_queue.store.close()
+        app.state.job_queue = None
+        if app.state.history is not None:
+            # Köade historikposter skrivs innan processen avslutas
+            await app.state.history.stop()
+            app.state.history.store.close()
+            app.state.history = None
+        if similar is not None and config.similarity_index_path:
+            await asyncio.to_thread(similar.save, config.data_path(config.similarity_index_path))
+        await app.state.http_client.aclose()
+        await close_response_cache()
 
 
-@app.get("/health")
 def health() -> dict[str, str]:
     return {"status": "ok"}
 
 
-app.include_router(api_router)
+async def worker_health(request: Request) -> JSONResponse:
+    """Hälsa för just den worker-process som svarar; 503 medan den dränerar."""
+    from .services.governor import get_governor
+
+    snapshot = WORKER.snapshot()
+    job_queue = getattr(request.app.state, "job_queue", None)
+    snapshot["upstream_inflight"] = get_governor().limiter.inflight
+    snapshot["jobs_active"] = job_queue.active if job_queue is not None else 0
+    return JSONResponse(snapshot, status_code=503 if WORKER.draining else 200)
+
+
+def create_app() -> FastAPI:
+    from .api.debug import router as debug_router
+    from .api.history import router as history_router
+    from .api.jobs import router as jobs_router
+    from .api.routes import router as api_router
+    from .api.session import router as session_router
+    from .utils.client import SchedulingMiddleware
+    from .utils.errors import register_exception_handlers
+    from .utils.instrumentation import MetricsMiddleware
+    from .utils.logging import configure_json_logging, correlation_middleware
+    from .utils.serialization import FastJSONResponse
+    from .utils.tracing import HandlerSpanMiddleware, TracingMiddleware
+
+    config = get_settings()
+    configure_json_logging(config=config)
+    app = FastAPI(
+        title="AI Feedback Dashboard API", lifespan=lifespan, default_response_class=FastJSONResponse
+    )
+
+    # Innerst: span "handler" i spårade requests (resten av requesten är middleware)
+    app.add_middleware(HandlerSpanMiddleware)
+
+    # CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=config.cors_origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    correlation_middleware(app)
+    # Klient och prioritet för upstream-schemaläggningen (services/scheduler.py)
+    app.add_middleware(SchedulingMiddleware)
+    # Ytterst så att tiden omfattar CORS, korrelation och felhanterare
+    app.add_middleware(MetricsMiddleware)
+    # Spårning per request (opt-in); ytterst så att spåret omfattar all middleware
+    app.add_middleware(TracingMiddleware)
+
+    app.add_api_route("/health", health, methods=["GET"])
+    app.add_api_route("/health/worker", worker_health, methods=["GET"])
+    app.include_router(api_router)
+    app.include_router(jobs_router)
+    app.include_router(history_router)
+    app.include_router(session_router)
+    app.include_router(debug_router)
+
+    register_exception_handlers(app)
+    return app
+
+
+_app: FastAPI | None = None
+
 
-register_exception_handlers(app)
+def __getattr__(name: str) -> Any:
+    # `from src.main import app` och `uvicorn src.main:app` bygger appen vid första åtkomst
+    if name == "app":
+        global _app
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,208 @@
+"""Lokal, deterministisk stub av ett OpenAI-kompatibelt /v1/chat/completions.
+
+Används för lasttester och benchmarks utan API-kostnad. Svaren är konserverade: analyze-promptar
+får ett giltigt JSON-objekt där alternative_text är originaltexten (klarar ordgränserna) och
+generate-promptar får originaltexten tillbaka. Alternativt spelas svar från en JSON-fil upp
+i tur och ordning. Latens, felfrekvens, 429:or och token-takt styrs via Settings.
+
+Körs fristående med `python -m src.mock_llm` (port MOCK_LLM_PORT) eller in-process via
+LLM_BACKEND=mock utan LLM_BASE_URL.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+import uuid
+from collections.abc import AsyncIterator, Iterator
+from pathlib import Path
+from typing import Any
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from .utils.config import Settings, get_settings
+
+CHARS_PER_TOKEN = 4
+STREAM_CHUNK_WORDS = 3
+RATE_LIMIT_RETRY_AFTER_SECONDS = 1
+
+PREFIX_CACHE_MAX_ENTRIES = 1024
+
+_ORIGINAL_TEXT = re.compile(r"ORIGINAL TEXT \(\d+ ord\):\n(?P<text>.*)\n\nORDGRÄNS:", re.DOTALL)
+_CANNED_SUGGESTIONS = [
+    "Dela upp de längsta meningarna så att varje mening bär en tanke.",
+    "Byt passiva formuleringar mot aktiva verb för ett tydligare tilltal.",
+    "Inled med huvudbudskapet och låt detaljerna följa efter.",
+]
+
+
+class LatencyModel:
+    """Drar latens (sekunder) ur en fördelning med en seedad generator för reproducerbarhet."""
+
+    def __init__(self, distribution: str, mean_ms: float, jitter_ms: float, rng: random.Random) -> None:
+        self.distribution = distribution
+        self.mean = mean_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rng = rng
+
+    def sample(self) -> float:
+        if self.mean <= 0:
+            return 0.0
+        if self.distribution == "fixed":
+            value = self.mean
+        elif self.distribution == "uniform":
+            value = self.rng.uniform(self.mean - self.jitter, self.mean + self.jitter)
+        elif self.distribution == "lognormal":
+            # Parametriserad så att medianen är `mean`; `jitter/mean` styr svansen
+            value = self.mean * self.rng.lognormvariate(0.0, self.jitter / self.mean)
+        elif self.distribution == "exponential":
+            value = self.rng.expovariate(1 / self.mean)
+        else:
+            value = self.rng.gauss(self.mean, self.jitter)
+        return max(value, 0.0)
+
+
+def _canned_content(prompt: str) -> str:
+    match = _ORIGINAL_TEXT.search(prompt)
+    original = match.group("text") if match else prompt
+    if "'suggestions'" in prompt:
+        return json.dumps(
+            {"suggestions": _CANNED_SUGGESTIONS, "tone": "neutral", "alternative_text": original},
+            ensure_ascii=False,
+        )
+    return original
+
+
+def _load_responses(path: str) -> Iterator[str] | None:
+    # Filen är en JSON-lista med completion-strängar som spelas upp i tur och ordning
+    if not path:
+        return None
+    responses = json.loads(Path(path).read_text(encoding="utf-8"))
+    return itertools.cycle([str(item) for item in responses])
+
+
+class PrefixCache:
+    """Efterliknar DeepSeeks context caching: ett system-meddelande som setts förut räknas som träff."""
+
+    def __init__(self) -> None:
+        self.seen: set[str] = set()
+
+    def hit_tokens(self, messages: list[dict[str, Any]]) -> int:
+        if not messages or messages[0].get("role") != "system":
+            return 0
+        prefix = str(messages[0].get("content", ""))
+        if prefix in self.seen:
+            return len(prefix) // CHARS_PER_TOKEN
+        if len(self.seen) >= PREFIX_CACHE_MAX_ENTRIES:
+            self.seen.clear()
+        self.seen.add(prefix)
+        return 0
+
+
+def _usage(prompt: str, content: str, cache_hit_tokens: int = 0) -> dict[str, int]:
+    prompt_tokens = len(prompt) // CHARS_PER_TOKEN
+    completion_tokens = len(content) // CHARS_PER_TOKEN
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_cache_hit_tokens": cache_hit_tokens,
+        "prompt_cache_miss_tokens": prompt_tokens - cache_hit_tokens,
+    }
+
+
+def _chunks(content: str) -> Iterator[str]:
+    words = content.split(" ")
+    for i in range(0, len(words), STREAM_CHUNK_WORDS):
+        chunk = " ".join(words[i : i + STREAM_CHUNK_WORDS])
+        yield chunk if i + STREAM_CHUNK_WORDS >= len(words) else chunk + " "
+
+
+def create_mock_app(config: Settings | None = None) -> FastAPI:
+    config = config or get_settings()
+    app = FastAPI(title="Mock LLM")
+    rng = random.Random(config.mock_llm_seed)
+    latency = LatencyModel(
+        config.mock_llm_latency_distribution,
+        config.mock_llm_latency_ms,
+        config.mock_llm_latency_jitter_ms,
+        rng,
+    )
+    responses = _load_responses(config.mock_llm_responses_path)
+    prefix_cache = PrefixCache()
+    app.state.requests = 0
+
+    @app.post("/v1/chat/completions", response_model=None)
+    async def chat_completions(request: Request) -> JSONResponse | StreamingResponse:
+        payload: dict[str, Any] = await request.json()
+        app.state.requests += 1
+        roll = rng.random()
+        if roll < config.mock_llm_rate_limit_rate:
+            return JSONResponse(
+                status_code=429,
+                content={"error": {"message": "Rate limit reached", "type": "rate_limit"}},
+                headers={"Retry-After": str(RATE_LIMIT_RETRY_AFTER_SECONDS)},
+            )
+        if roll < config.mock_llm_rate_limit_rate + config.mock_llm_error_rate:
+            await asyncio.sleep(latency.sample())
+            return JSONResponse(
+                status_code=500, content={"error": {"message": "Injected failure", "type": "server_error"}}
+            )
+
+        messages: list[dict[str, Any]] = payload.get("messages", [])
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        content = next(responses) if responses is not None else _canned_content(prompt)
+        usage = _usage(prompt, content, prefix_cache.hit_tokens(messages))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = payload.get("model", "mock")
+        await asyncio.sleep(latency.sample())
+
+        if payload.get("stream"):
+            token_delay = config.mock_llm_token_delay_ms / 1000
+
+            async def events() -> AsyncIterator[str]:
+                for chunk in _chunks(content):
+                    delta = {
+                        "id": completion_id,
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": chunk}}],
+                    }
+                    yield f"data: {json.dumps(delta, ensure_ascii=False)}\n\n"
+                    if token_delay:
+                        await asyncio.sleep(token_delay)
+                if (payload.get("stream_options") or {}).get("include_usage"):
+                    final = {"id": completion_id, "model": model, "choices": [], "usage": usage}
+                    yield f"data: {json.dumps(final)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        return JSONResponse(
+            {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+        )
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(create_mock_app(), host="127.0.0.1", port=get_settings().mock_llm_port, log_level="warning")
@@ -1,21 +1,59 @@
-from typing import Literal
+from collections.abc import Iterable
+from typing import Annotated, Any, Literal, Self
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+from .llm import Tone
+
+# Analys av långa texter delas upp i delar (se services/chunking.py); generering görs i ett anrop
+ANALYZE_MAX_CHARS = 50_000
+GENERATE_MAX_CHARS = 5000
 
 
 class AnalyzeRequest(BaseModel):
-    text: str = Field(..., min_length=1, max_length=5000)
+    text: str = Field(..., min_length=1, max_length=ANALYZE_MAX_CHARS)
     temperature: float = Field(default=0.7, ge=0.0, le=2.0)
 
 
 class AnalyzeResponse(BaseModel):
     suggestions: list[str] = Field(..., min_length=2, max_length=3)
-    tone: Literal["positive", "neutral", "negative"]
+    tone: Tone
     alternative_text: str
+    reused: bool = False  # True = tidigare analys av en nästan likadan text (se similarity)
+    similarity: float | None = None  # skattad Jaccard-likhet mot den texten när reused
+    fallback: bool = False  # True = förslag från lokala textmått eftersom LLM:en inte svarade
+
+
+class TextMetrics(BaseModel):
+    """Lokala textmått (services/text_metrics.py); ingen LLM inblandad."""
+
+    words: int
+    sentences: int
+    avg_sentence_length: float  # ord per mening
+    max_sentence_length: int
+    long_sentence_ratio: float  # andel meningar med fler än 25 ord
+    lix: float  # läsbarhetsindex: under 30 mycket lätt, över 50 svår, över 60 mycket svår
+    passive_ratio: float  # andel meningar med passiv form
+    repetition_ratio: float  # 1 - unika innehållsord / alla innehållsord
+    repeated_words: dict[str, int]  # innehållsord som förekommer minst tre gånger, vanligast först
+    positive_words: int
+    negative_words: int
+    tone: Tone
+    tone_score: float  # (positiva - negativa) / (positiva + negativa), -1..1
+
+
+class FastAnalyzeResponse(BaseModel):
+    suggestions: list[str] = Field(..., min_length=2, max_length=3)
+    tone: Tone
+    metrics: TextMetrics
+
+
+class FastBatchResponse(BaseModel):
+    items: list[FastAnalyzeResponse]  # samma ordning som FastBatchRequest.items
 
 
 class GenerateRequest(BaseModel):
-    text: str = Field(..., min_length=1, max_length=5000)
+    text: str = Field(..., min_length=1, max_length=GENERATE_MAX_CHARS)
     suggestions: list[str] = Field(..., min_length=1)
     selected_suggestions: list[bool] = Field(...)  # [True, False, True] = vilka förslag som ska appliceras
     temperature: float = Field(default=0.7, ge=0.0, le=2.0)
@@ -23,3 +61,150 @@ class GenerateRequest(BaseModel):
 
 class GenerateResponse(BaseModel):
     generated_text: str
+
+
+# /ws/session: meddelanden från klienten, ett JSON-objekt per WebSocket-meddelande
+class SessionText(BaseModel):
+    type: Literal["text"]
+    text: str = Field(..., max_length=ANALYZE_MAX_CHARS)
+    version: int = 0  # klientens löpnummer; ekas i alla händelser som hör till texten
+    temperature: float = Field(default=0.7, ge=0.0, le=2.0)
+
+
+class SessionDelta(BaseModel):
+    """Ersätt text[start:end] med insert i sessionens text (samma sak som en redigering i editorn)."""
+
+    type: Literal["delta"]
+    start: int = Field(..., ge=0)
+    end: int = Field(..., ge=0)
+    insert: str = Field(default="", max_length=ANALYZE_MAX_CHARS)
+    version: int = 0
+
+
+class SessionGenerate(BaseModel):
+    type: Literal["generate"]
+    suggestions: list[str] = Field(..., min_length=1)
+    selected_suggestions: list[bool] = Field(...)
+    temperature: float = Field(default=0.7, ge=0.0, le=2.0)
+
+
+class SessionCancel(BaseModel):
+    type: Literal["cancel"]
+
+
+SessionMessage = Annotated[
+    SessionText | SessionDelta | SessionGenerate | SessionCancel, Field(discriminator="type")
+]
+
+
+BATCH_MAX_ITEMS = 10_000
+BATCH_MAX_TOTAL_CHARS = 2_000_000  # Text i alla items tillsammans (~40 texter med maxlängd)
+
+
+def _stripped_text(text: str) -> str:
+    # Som /analyze: whitespace runt texten räknas inte, och en text med bara whitespace avvisas
+    text = text.strip()
+    if not text:
+        raise ValueError("Text may not be empty")
+    return text
+
+
+def _check_batch_chars(texts: Iterable[str]) -> None:
+    total = sum(len(text) for text in texts)
+    if total > BATCH_MAX_TOTAL_CHARS:
+        raise ValueError(
+            f"Batch text totals {total} characters; the limit is {BATCH_MAX_TOTAL_CHARS}"
+        )
+
+
+class BatchItem(BaseModel):
+    id: str | None = None  # valfritt klient-id som ekas tillbaka i resultatet
+    text: str = Field(..., min_length=1, max_length=ANALYZE_MAX_CHARS)
+    temperature: float = Field(default=0.7, ge=0.0, le=2.0)
+
+    _strip_text = field_validator("text")(_stripped_text)
+
+
+class BatchAnalyzeRequest(BaseModel):
+    items: list[BatchItem] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+    concurrency: int | None = Field(default=None, ge=1)  # begränsas av BATCH_MAX_CONCURRENCY
+
+    @model_validator(mode="after")
+    def _limit_total_chars(self) -> Self:
+        _check_batch_chars(item.text for item in self.items)
+        return self
+
+
+class FastBatchItem(BaseModel):
+    text: str = Field(..., min_length=1, max_length=ANALYZE_MAX_CHARS)
+
+    _strip_text = field_validator("text")(_stripped_text)
+
+
+class FastBatchRequest(BaseModel):
+    # Räknas lokalt och synkront: ingen concurrency, och temperaturen spelar ingen roll
+    items: list[FastBatchItem] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+    @model_validator(mode="after")
+    def _limit_total_chars(self) -> Self:
+        _check_batch_chars(item.text for item in self.items)
+        return self
+
+
+JobKind = Literal["analyze", "generate"]
+JobStatus = Literal["queued", "running", "succeeded", "failed"]
+
+
+class AnalyzeJobRequest(BaseModel):
+    kind: Literal["analyze"]
+    request: AnalyzeRequest
+
+
+class GenerateJobRequest(BaseModel):
+    kind: Literal["generate"]
+    request: GenerateRequest
+
+
+JobRequest = Annotated[AnalyzeJobRequest | GenerateJobRequest, Field(discriminator="kind")]
+
+
+class JobResponse(BaseModel):
+    id: str
+    kind: JobKind
+    status: JobStatus
+    created_at: float  # epoch-sekunder
+    started_at: float | None = None
+    finished_at: float | None = None
+    queue_ms: float | None = None  # tid i kö innan en worker tog jobbet
+    run_ms: float | None = None  # körtid inklusive upstream-retries
+    result: dict[str, Any] | None = None
+    error: dict[str, Any] | None = None
+
+
+class HistoryItem(BaseModel):
+    id: int
+    kind: JobKind
+    created_at: float  # epoch-sekunder
+    tone: Tone | None = None  # bara för analyze
+    text: str
+    result: dict[str, Any]
+
+
+HISTORY_IMPORT_MAX_ITEMS = 500
+
+
+class LegacyHistoryItem(BaseModel):
+    """En post ur frontends gamla localStorage-historik."""
+
+    text: str = Field(..., min_length=1, max_length=ANALYZE_MAX_CHARS)
+    result: AnalyzeResponse
+    timestamp: float = Field(..., ge=0)  # epoch-millisekunder (Date.now())
+
+
+class HistoryImportRequest(BaseModel):
+    items: list[LegacyHistoryItem] = Field(..., min_length=1, max_length=HISTORY_IMPORT_MAX_ITEMS)
+
+
+class HistoryPage(BaseModel):
+    items: list[HistoryItem]
+    next_cursor: str | None = None  # skickas som ?cursor= för nästa sida; None på sista sidan
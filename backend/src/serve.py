@@ -0,0 +1,137 @@
+"""Produktionsstart med flera worker-processer.
+
+    cd backend
+    python -m src.serve                  # WEB_CONCURRENCY workers (default: antal kärnor)
+    python -m src.serve --workers 4 --port 8002
+
+Med gunicorn installerat körs UvicornWorker med `preload_app`: appen, config, pydantic-modeller
+och promptmallar importeras en gång i master-processen innan den forkar. Utan gunicorn
+startar uvicorn själv sina workers (de importerar appen var för sig). uvloop och httptools
+används när de finns. Vid SIGTERM slutar varje worker ta emot nya anslutningar, väntar in
+pågående requests (och därmed LLM-anrop) i högst SERVE_GRACEFUL_TIMEOUT_SECONDS och låter
+sedan pågående jobb bli klara i högst JOBS_DRAIN_SECONDS.
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import os
+from typing import Any
+
+from .utils.config import Settings, get_settings
+
+APP_IMPORT_PATH = "src.main:app"
+MAX_REQUESTS_JITTER_RATIO = 0.1  # Sprid omstarterna så att inte alla workers startar om samtidigt
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def worker_count(config: Settings | None = None) -> int:
+    config = config or get_settings()
+    return config.serve_workers if config.serve_workers > 0 else (os.cpu_count() or 1)
+
+
+def event_loop() -> str:
+    return "uvloop" if _available("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    return "httptools" if _available("httptools") else "h11"
+
+
+def recover_jobs(config: Settings | None = None) -> None:
+    """Köa om jobb som stod som running en gång, innan workers startar.
+
+    Varje worker läser sedan bara köade jobb; SQLite-claimen avgör vem som kör vilket.
+    """
+    from .services.jobs import JobStore
+
+    config = config or get_settings()
+    store = JobStore(config.data_path(config.jobs_db_path))
+    try:
+        store.recover_running()
+    finally:
+        store.close()
+    # Ärvs av forkade (gunicorn) och nystartade (uvicorn) workers
+    os.environ["JOBS_RECOVER_RUNNING"] = "false"
+    config.jobs_recover_running = False
+
+
+def gunicorn_options(host: str, port: int, workers: int, config: Settings | None = None) -> dict[str, Any]:
+    config = config or get_settings()
+    worker_class = (
+        "uvicorn_worker.UvicornWorker" if _available("uvicorn_worker") else "uvicorn.workers.UvicornWorker"
+    )
+    options: dict[str, Any] = {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "worker_class": worker_class,
+        "preload_app": True,
+        "graceful_timeout": config.serve_graceful_timeout_seconds + config.jobs_drain_seconds,
+        "keepalive": 5,
+        "accesslog": None,
+    }
+    if config.serve_max_requests > 0:
+        options["max_requests"] = config.serve_max_requests
+        options["max_requests_jitter"] = int(config.serve_max_requests * MAX_REQUESTS_JITTER_RATIO)
+    return options
+
+
+def run_gunicorn(options: dict[str, Any]) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    from .main import app  # Förladdas i master-processen
+    from .services.prompts import get_prompts
+
+    get_prompts()
+
+    class Application(BaseApplication):  # type: ignore[misc]
+        def load_config(self) -> None:
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self) -> Any:
+            return app
+
+    Application().run()
+
+
+def run_uvicorn(host: str, port: int, workers: int, config: Settings | None = None) -> None:
+    config = config or get_settings()
+    import uvicorn
+
+    uvicorn.run(
+        APP_IMPORT_PATH,
+        host=host,
+        port=port,
+        workers=workers,
+        loop=event_loop(),
+        http=http_protocol(),
+        timeout_graceful_shutdown=config.serve_graceful_timeout_seconds,
+        limit_max_requests=config.serve_max_requests or None,
+        access_log=False,
+        proxy_headers=True,
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    config = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=config.serve_host)
+    parser.add_argument("--port", type=int, default=config.backend_port)
+    parser.add_argument("--workers", type=int, default=worker_count())
+    parser.add_argument("--no-gunicorn", action="store_true", help="Använd uvicorns egen processhantering")
+    args = parser.parse_args(argv)
+
+    recover_jobs()
+    if _available("gunicorn") and not args.no_gunicorn:
+        run_gunicorn(gunicorn_options(args.host, args.port, args.workers))
+    else:
+        run_uvicorn(args.host, args.port, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,121 +2,238 @@ from __future__ import annotations
 
 import asyncio
 import logging
+from collections.abc import AsyncGenerator, AsyncIterator
+from contextlib import aclosing
+from typing import Any, Protocol
 
 import httpx
 from fastapi import HTTPException
 from pydantic import ValidationError
 
 from ..models.llm import LLMAnalyzeOutput, Tone
-from ..utils.config import settings
+from ..utils.config import get_settings
+from ..utils.instrumentation import FALLBACKS, LENGTH_REJECTIONS, RETRIES, stage
+from ..utils.tracing import span
+from .cache import ResponseCache, get_response_cache, make_cache_key
+from .chunking import merge_analyses, split_text
+from .coalescing import SingleFlight, get_singleflight
+from .governor import UpstreamGovernor, get_governor, parse_retry_after
+from .json_stream import AnalyzeStreamParser
+from .llm_backend import DeepSeekBackend, LLMBackend, create_llm_backend
+from .prompts import PROMPT_VERSION, PromptSet, get_prompts
+from .routing import RoutedBackend, create_routed_backend, get_model_router
+from .text_metrics import compute_metrics, fallback_suggestions
+from .tokens import (
+    WordBounds,
+    analyze_max_tokens,
+    estimate_payload_tokens,
+    generate_max_tokens,
+    word_bounds,
+)
 
 # Constants
 MAX_RETRIES = 3
-SERVER_ERROR_CODE = 500
 MIN_SUGGESTIONS = 2
 MAX_SUGGESTIONS = 3
 WORD_COUNT_MARGIN = 50  # Allow ±50 words deviation from original
 MIN_WORD_COUNT = 50      # Minimum word count for valid text
 RETRY_BACKOFF_BASE = 0.5  # Exponential backoff: 0.5s, 1s, 2s
-API_TIMEOUT_SECONDS = 60.0
-CONNECT_TIMEOUT_SECONDS = 10.0
-PREVIEW_LENGTH = 150     # Preview length for fallback text
+
+# Strömmade händelser: ("suggestion", str), ("tone", str), ("alternative_text", str),
+# ("alternative_text_delta", str), ("delta", str), ("reset", dict), ("result", dict)
+StreamEvent = tuple[str, Any]
+
+
+class MissingJSONError(ValueError):
+    """Modellens svar innehöll inget JSON-objekt; försöks om som ett underkänt svar.
+
+    Ett sådant svar får aldrig bli ett vanligt resultat: det skulle cachas (CachedAnalyzer,
+    segmentcachen) och läggas i närdubblettindexet. Efter sista försöket blir det 503, och
+    /analyze svarar då med den lokala analysen flaggad som fallback.
+    """
+
+
+def _retry_reason(exc: Exception) -> str:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return f"http_{exc.response.status_code}"
+    if isinstance(exc, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(exc, MissingJSONError):
+        return "no_json"
+    return "validation"
+
+
+class Analyzer(Protocol):
+    async def analyze_text(self, text: str, temperature: float = 0.7) -> tuple[list[str], Tone, str]: ...
+
+    async def generate_text(self, text: str, selected_suggestions: list[str], temperature: float = 0.7) -> str: ...
+
+    def stream_analyze(self, text: str, temperature: float = 0.7) -> AsyncIterator[StreamEvent]: ...
+
+    def stream_generate(
+        self, text: str, selected_suggestions: list[str], temperature: float = 0.7
+    ) -> AsyncIterator[StreamEvent]: ...
 
 
 class DeepSeekAnalyzer:
-    def __init__(self, api_key: str) -> None:
-        self.api_key = api_key
-        self.model = "deepseek-chat"
-        self.base_url = "https://api.deepseek.com/v1/chat/completions"
-
-    def _build_prompt(self, text: str) -> str:
-        word_count = len(text.split())
-        min_words = max(word_count - WORD_COUNT_MARGIN, MIN_WORD_COUNT)
-        max_words = word_count + WORD_COUNT_MARGIN
-        
-        return (
-            "Du är en professionell språkexpert som specialiserar dig på att ge konstruktiv feedback på skrivna texter. "
-            "Din uppgift är att analysera texten nedan och ge konkreta, användbara förbättringsförslag.\n\n"
-            "INSTRUKTIONER:\n"
-            "1. Ge 2-3 KONKRETA och SPECIFISKA förbättringsförslag som direkt adresserar texten.\n"
-            "2. Förslagen ska fokusera på: struktur, klarhet, ordval, meningsbyggnad, tydlighet och engagement.\n"
-            "3. Ge exempel eller kontextuell förklaring för varje förslag.\n"
-            "4. Analysera TONEN och returnera EXAKT en av dessa: 'positive', 'neutral', eller 'negative'.\n"
-            "5. Skapa en FÖRBÄTTRAD VERSION av texten som applicerar de viktigaste förslagen.\n"
-            f"   - VIKTIGT: alternative_text måste ha mellan {min_words}-{max_words} ord (original: {word_count} ord)\n"
-            "   - Behåll ~80-90% av originaltext\n"
-            "   - Gör minimala ändringar för att implementera förslagen\n"
-            "   - INTE en sammanfattning - samma längd och struktur som original\n"
-            "6. Returnera ENDAST JSON-objektet (inget extra text) med dessa EXAKTA nycklar:\n"
-            "   - 'suggestions': array av 2-3 strings\n"
-            "   - 'tone': ONE OF: 'positive', 'neutral', 'negative'\n"
-            f"   - 'alternative_text': förbättrad text ({min_words}-{max_words} ord)\n\n"
-            "VIKTIGT: Tone måste vara EXAKT en av: positive, neutral, negative\n"
-            "VIKTIGT: alternative_text MÅSTE ha samma längd som original (±50 ord), INTE kortare!\n\n"
-            "EXEMPEL PÅ FÖRVÄNTAD JSON:\n"
-            "{\n"
-            "  \"suggestions\": [\"Förslag 1 med detalj\", \"Förslag 2 med detalj\"],\n"
-            '  \"tone\": "neutral",\n'
-            '  \"alternative_text\": "Förbättrad version på ungefär samma längd som original, med samma struktur men förbättrad enligt förslagen."\n'
-            "}\n\n"
-            f"ORIGINAL TEXT ({word_count} ord):\n" + text + "\n\n"
-            "Returnera ENDAST JSON-objektet, inget annat."
+    """Promptar, validering och retries; själva HTTP-anropet görs av en LLMBackend."""
+
+    def __init__(
+        self,
+        api_key: str | None,
+        client: httpx.AsyncClient | None = None,
+        governor: UpstreamGovernor | None = None,
+        backend: LLMBackend | None = None,
+        prompts: PromptSet | None = None,
+    ) -> None:
+        self.backend = backend or DeepSeekBackend(api_key, client)
+        self.model = self.backend.model
+        # Med en router väljs nivå per anrop och underkända svar går vidare i kaskaden
+        self.router = backend.router if isinstance(backend, RoutedBackend) else None
+        self.governor = governor or get_governor()
+        self.prompts = prompts or get_prompts()
+
+    @staticmethod
+    def _retry_delay(attempt: int, exc: Exception | None = None) -> float:
+        # Honorera Retry-After från upstream, annars exponentiell backoff
+        if isinstance(exc, httpx.HTTPStatusError):
+            retry_after: float | None = parse_retry_after(exc.response)
+            if retry_after is not None:
+                return retry_after
+        # int ** int är Any för mypy (negativ exponent ger float)
+        return float(RETRY_BACKOFF_BASE * 2**attempt)
+
+    @staticmethod
+    async def _backoff(seconds: float, operation: str, attempt: int) -> None:
+        # Egen span så att pausen före omförsöket syns i spåret (utils/tracing.py)
+        with span("backoff", operation=operation, attempt=attempt, seconds=round(seconds, 3)):
+            await asyncio.sleep(seconds)
+
+    async def _post(self, payload: dict[str, Any], operation: str) -> dict[str, Any]:
+        async with self.governor.slot(estimate_payload_tokens(payload)) as permit:
+            return await self.backend.complete(payload, operation, permit)
+
+    async def _stream(self, payload: dict[str, Any], operation: str) -> AsyncGenerator[str, None]:
+        # aclosing: avbryts konsumenten stängs httpx-strömmen och platsen lämnas tillbaka direkt
+        async with self.governor.slot(estimate_payload_tokens(payload)) as permit, aclosing(
+            self.backend.stream(payload, operation, permit)
+        ) as deltas:
+            async for delta in deltas:
+                yield delta
+
+    def _model_for(self, operation: str, text: str) -> str:
+        return self.router.select_tier(operation, len(text)) if self.router is not None else self.model
+
+    def _escalate(self, payload: dict[str, Any], operation: str) -> dict[str, Any]:
+        """Nästa försök på nästa nivå i kaskaden; utan router (eller på sista nivån) samma payload."""
+        if self.router is None:
+            return payload
+        tier = self.router.escalate(payload["model"], operation)
+        return payload if tier is None else {**payload, "model": tier}
+
+    def _analyze_messages(self, text: str, bounds: WordBounds | None = None) -> list[dict[str, str]]:
+        bounds = bounds or word_bounds(text, WORD_COUNT_MARGIN, MIN_WORD_COUNT)
+        return self.prompts.analyze.messages(
+            text=text,
+            word_count=bounds.word_count,
+            min_words=bounds.min_words,
+            max_words=bounds.max_words,
         )
 
-    async def analyze_text(self, text: str, temperature: float = 0.7) -> tuple[list[str], Tone, str]:
-        payload = {
-            "model": self.model,
-            "messages": [
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": self._build_prompt(text)},
-            ],
+    def _analyze_payload(self, text: str, temperature: float) -> dict[str, Any]:
+        bounds = word_bounds(text, WORD_COUNT_MARGIN, MIN_WORD_COUNT)
+        return {
+            "model": self._model_for("analyze", text),
+            "messages": self._analyze_messages(text, bounds),
             "temperature": temperature,
+            "max_tokens": analyze_max_tokens(bounds),
         }
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
+
+    def _parse_analysis(self, content: str, text: str) -> tuple[list[str], Tone, str]:
+        start = content.find("{")
+        end = content.rfind("}")
+        if start == -1 or end == -1 or end <= start:
+            raise MissingJSONError("No JSON object in model response")
+        fragment = content[start : end + 1]
+
+        parsed = LLMAnalyzeOutput.model_validate_json(fragment)
+        suggestions = [s.strip() for s in parsed.suggestions if s.strip()]
+        if len(suggestions) < MIN_SUGGESTIONS:
+            FALLBACKS.labels("analyze", "too_few_suggestions").inc()
+            local = fallback_suggestions(compute_metrics(text), MAX_SUGGESTIONS)
+            suggestions += [s for s in local if s not in suggestions]
+        suggestions = suggestions[:MAX_SUGGESTIONS]
+        return suggestions, parsed.tone, parsed.alternative_text
+
+    async def analyze_text(self, text: str, temperature: float = 0.7) -> tuple[list[str], Tone, str]:
+        with stage("prompt_build", "analyze"):
+            payload = self._analyze_payload(text, temperature)
 
         attempt = 0
         while attempt < MAX_RETRIES:
             try:
-                async with httpx.AsyncClient(timeout=httpx.Timeout(API_TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS)) as client:
-                    resp = await client.post(self.base_url, json=payload, headers=headers)
-                    if resp.status_code >= SERVER_ERROR_CODE:
-                        raise httpx.HTTPStatusError(
-                            "Server error", request=resp.request, response=resp
-                        )
-                    resp.raise_for_status()
-                    data = resp.json()
+                data = await self._post(payload, "analyze")
                 content: str = data["choices"][0]["message"]["content"]
-                start = content.find("{")
-                end = content.rfind("}")
-                if start == -1 or end == -1 or end <= start:
-                    short_summary = (text[:PREVIEW_LENGTH] + "...") if len(text) > PREVIEW_LENGTH else text
-                    return [
-                        "Förkorta längre meningar",
-                        "Använd mer aktiva verb",
-                    ], "neutral", short_summary
-                fragment = content[start : end + 1]
-
-                parsed = LLMAnalyzeOutput.model_validate_json(fragment)
-                suggestions = [s.strip() for s in parsed.suggestions if s.strip()]
-                if len(suggestions) < MIN_SUGGESTIONS:
-                    suggestions += ["Använd mer aktiva verb", "Förkorta meningarna"]
-                suggestions = suggestions[:MAX_SUGGESTIONS]
-                return suggestions, parsed.tone, parsed.alternative_text
-            except (httpx.TimeoutException, httpx.HTTPStatusError):
-                await asyncio.sleep(RETRY_BACKOFF_BASE * (2**attempt))
+                with stage("json_extraction", "analyze"):
+                    return self._parse_analysis(content, text)
+            except (httpx.TimeoutException, httpx.HTTPStatusError) as e:
+                RETRIES.labels("analyze", _retry_reason(e)).inc()
+                await self._backoff(self._retry_delay(attempt, e), "analyze", attempt)
                 attempt += 1
-            except ValidationError as e:
+            except (ValidationError, MissingJSONError) as e:
                 # Log error men försök återhämta sig
                 logging.error(f"JSON validation failed: {e}")
-                await asyncio.sleep(RETRY_BACKOFF_BASE * (2**attempt))
+                RETRIES.labels("analyze", _retry_reason(e)).inc()
+                payload = self._escalate(payload, "analyze")
+                await self._backoff(RETRY_BACKOFF_BASE * (2**attempt), "analyze", attempt)
                 attempt += 1
         # Efter retries
         logging.error(f"Failed to analyze text after {MAX_RETRIES} attempts")
         raise HTTPException(status_code=503, detail="AI service unavailable - please try again later")
 
+    async def stream_analyze(self, text: str, temperature: float = 0.7) -> AsyncIterator[StreamEvent]:
+        """Strömmande analys: förslag och ton skickas vidare så fort respektive fält är komplett.
+
+        Misslyckas ett försök efter att händelser redan skickats ges ("reset", ...) så att
+        klienten kan kasta delresultatet innan nästa försök börjar strömma.
+        """
+        with stage("prompt_build", "analyze"):
+            payload = self._analyze_payload(text, temperature)
+
+        attempt = 0
+        while attempt < MAX_RETRIES:
+            parser = AnalyzeStreamParser()
+            parts: list[str] = []
+            emitted = False
+            try:
+                async with aclosing(self._stream(payload, "analyze_stream")) as deltas:
+                    async for delta in deltas:
+                        parts.append(delta)
+                        for event in parser.feed(delta):
+                            emitted = True
+                            yield event
+                with stage("json_extraction", "analyze_stream"):
+                    suggestions, tone, alternative_text = self._parse_analysis("".join(parts), text)
+                yield "result", {
+                    "suggestions": suggestions,
+                    "tone": tone,
+                    "alternative_text": alternative_text,
+                }
+                return
+            except (
+                httpx.TimeoutException, httpx.HTTPStatusError, ValidationError, MissingJSONError
+            ) as e:
+                logging.error(f"Streaming analysis attempt failed: {e}")
+                RETRIES.labels("analyze_stream", _retry_reason(e)).inc()
+                if emitted:
+                    yield "reset", {"attempt": attempt + 1}
+                if isinstance(e, (ValidationError, MissingJSONError)):
+                    payload = self._escalate(payload, "analyze")
+                await self._backoff(self._retry_delay(attempt, e), "analyze_stream", attempt)
+                attempt += 1
+        logging.error(f"Failed to stream analysis after {MAX_RETRIES} attempts")
+        raise HTTPException(status_code=503, detail="AI service unavailable - please try again later")
+
 
     async def generate_text(self, text: str, selected_suggestions: list[str], temperature: float = 0.7) -> str:
         """
@@ -127,74 +244,270 @@ class DeepSeekAnalyzer:
         """
         if not selected_suggestions:
             return text
-        
-        word_count = len(text.split())
-        min_words = max(word_count - WORD_COUNT_MARGIN, MIN_WORD_COUNT)
-        max_words = word_count + WORD_COUNT_MARGIN
-        suggestions_str = "\n".join(f"- {s}" for s in selected_suggestions)
-        
-        prompt = (
-            "Du är en erfaren redaktör. Din ENDA uppgift är att tillämpa DESSA redigerings-förslag och INGET ANNAT.\n\n"
-            "DESSA FÖRSLAG MÅSTE APPLICERAS:\n"
-            f"{suggestions_str}\n\n"
-            "KRITISKA INSTRUKTIONER:\n"
-            f"1. Tillämpa ENDAST de förslag som listas ovan - IGNORERA alla andra möjliga förbättringar\n"
-            f"2. Returnerad text MÅSTE vara mellan {min_words}-{max_words} ord (original: {word_count} ord)\n"
-            "3. Behåll minst 80% av originaltext ordet för ordet\n"
-            "4. Gör ENDAST minimala, chirurgiska ändringar för dessa specifika förslag\n"
-            "5. INTE en sammanfattning - samma längd och struktur som original\n"
-            "6. Returnera ENBART den redigerade texten, inget annat\n\n"
-            f"ORIGINAL TEXT ({word_count} ord):\n"
-            f"{text}\n\n"
-            f"Tillämpa ENBART de {len(selected_suggestions)} förslag ovan. Returnera den redigerade texten mellan {min_words}-{max_words} ord."
-        )
-        
-        payload = {
-            "model": self.model,
-            "messages": [
-                {"role": "system", "content": "You are a precise editor. Apply ONLY the specific suggestions provided. Ignore all other possible improvements. Make MINIMAL changes. Keep at least 80% of text identical. CRITICAL: The returned text MUST be between the specified word count range. Never summarize - edit only to apply the given suggestions."},
-                {"role": "user", "content": prompt},
-            ],
-            "temperature": temperature,
-        }
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
+
+        with stage("prompt_build", "generate"):
+            payload, min_words, max_words = self._generate_payload(text, selected_suggestions, temperature)
 
         attempt = 0
         while attempt < MAX_RETRIES:
             try:
-                async with httpx.AsyncClient(timeout=httpx.Timeout(API_TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS)) as client:
-                    resp = await client.post(self.base_url, json=payload, headers=headers)
-                    if resp.status_code >= SERVER_ERROR_CODE:
-                        raise httpx.HTTPStatusError(
-                            "Server error", request=resp.request, response=resp
-                        )
-                    resp.raise_for_status()
-                    data = resp.json()
-                    generated = data["choices"][0]["message"]["content"].strip()
-                    
-                    # Validera längden
-                    gen_words = len(generated.split())
-                    if min_words <= gen_words <= max_words:
-                        return generated
-                    else:
-                        # Om DeepSeek inte respekterar längd, försök igen
-                        attempt += 1
-                        await asyncio.sleep(RETRY_BACKOFF_BASE * (2**attempt))
-            except (httpx.TimeoutException, httpx.HTTPStatusError):
-                await asyncio.sleep(RETRY_BACKOFF_BASE * (2**attempt))
+                data = await self._post(payload, "generate")
+                generated = str(data["choices"][0]["message"]["content"]).strip()
+
+                # Validera längden
+                gen_words = len(generated.split())
+                if min_words <= gen_words <= max_words:
+                    return generated
+                else:
+                    # Om DeepSeek inte respekterar längd, försök igen
+                    LENGTH_REJECTIONS.labels("unary").inc()
+                    RETRIES.labels("generate", "word_count").inc()
+                    payload = self._escalate(payload, "generate")
+                    attempt += 1
+                    await self._backoff(RETRY_BACKOFF_BASE * (2**attempt), "generate", attempt)
+            except (httpx.TimeoutException, httpx.HTTPStatusError) as e:
+                RETRIES.labels("generate", _retry_reason(e)).inc()
+                await self._backoff(self._retry_delay(attempt, e), "generate", attempt)
                 attempt += 1
+            except HTTPException:
+                # Governorn avvisar direkt (öppen krets / rate limit) - ingen retry
+                raise
             except Exception as e:
                 logging.error(f"Generation error: {e}")
-                await asyncio.sleep(RETRY_BACKOFF_BASE * (2**attempt))
+                RETRIES.labels("generate", "error").inc()
+                await self._backoff(RETRY_BACKOFF_BASE * (2**attempt), "generate", attempt)
                 attempt += 1
 
         # Fallback: returnera original om allt misslyckas
         logging.error(f"Failed to generate text after {MAX_RETRIES} attempts")
         raise HTTPException(status_code=503, detail="Generation service unavailable")
 
+    def _generate_payload(
+        self, text: str, selected_suggestions: list[str], temperature: float
+    ) -> tuple[dict[str, Any], int, int]:
+        bounds = word_bounds(text, WORD_COUNT_MARGIN, MIN_WORD_COUNT)
+        messages = self.prompts.generate.messages(
+            text=text,
+            word_count=bounds.word_count,
+            min_words=bounds.min_words,
+            max_words=bounds.max_words,
+            suggestions="\n".join(f"- {s}" for s in selected_suggestions),
+            suggestion_count=len(selected_suggestions),
+        )
+        payload: dict[str, Any] = {
+            "model": self._model_for("generate", text),
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": generate_max_tokens(bounds),
+        }
+        return payload, bounds.min_words, bounds.max_words
+
+    async def stream_generate(
+        self, text: str, selected_suggestions: list[str], temperature: float = 0.7
+    ) -> AsyncIterator[StreamEvent]:
+        """Strömmande generering; texten skickas som ("delta", token) allteftersom den skrivs.
+
+        Längdvalideringen kan först göras när hela texten finns. Faller den utanför
+        ordgränserna ges ("reset", ...) och ett nytt försök strömmas.
+        """
+        if not selected_suggestions:
+            yield "result", {"generated_text": text}
+            return
+
+        with stage("prompt_build", "generate"):
+            payload, min_words, max_words = self._generate_payload(text, selected_suggestions, temperature)
+
+        attempt = 0
+        while attempt < MAX_RETRIES:
+            parts: list[str] = []
+            error: Exception | None = None
+            try:
+                async with aclosing(self._stream(payload, "generate_stream")) as deltas:
+                    async for delta in deltas:
+                        parts.append(delta)
+                        yield "delta", delta
+                generated = "".join(parts).strip()
+                gen_words = len(generated.split())
+                if min_words <= gen_words <= max_words:
+                    yield "result", {"generated_text": generated}
+                    return
+                LENGTH_REJECTIONS.labels("stream").inc()
+                RETRIES.labels("generate_stream", "word_count").inc()
+                payload = self._escalate(payload, "generate")
+                yield "reset", {"attempt": attempt + 1, "reason": "word_count", "words": gen_words}
+            except (httpx.TimeoutException, httpx.HTTPStatusError) as e:
+                logging.error(f"Streaming generation attempt failed: {e}")
+                RETRIES.labels("generate_stream", _retry_reason(e)).inc()
+                error = e
+                if parts:
+                    yield "reset", {"attempt": attempt + 1}
+            await self._backoff(self._retry_delay(attempt, error), "generate_stream", attempt)
+            attempt += 1
+
+        logging.error(f"Failed to stream generation after {MAX_RETRIES} attempts")
+        raise HTTPException(status_code=503, detail="Generation service unavailable")
+
+
+class CachedAnalyzer:
+    """Innehållsadresserad cache framför en Analyzer; upprepade anrop besvaras utan upstream."""
+
+    def __init__(self, inner: Analyzer, cache: ResponseCache) -> None:
+        self.inner = inner
+        self.cache = cache
+
+    async def analyze_text(self, text: str, temperature: float = 0.7) -> tuple[list[str], Tone, str]:
+        if not self.cache.should_cache(temperature):
+            return await self.inner.analyze_text(text, temperature=temperature)
+        key = make_cache_key("analyze", text, temperature, prompt_version=PROMPT_VERSION)
+        cached = await self.cache.get_json(key)
+        if cached is not None:
+            return cached["suggestions"], cached["tone"], cached["alternative_text"]
+        suggestions, tone, alternative_text = await self.inner.analyze_text(text, temperature=temperature)
+        await self.cache.set_json(
+            key,
+            {"suggestions": suggestions, "tone": tone, "alternative_text": alternative_text},
+            temperature,
+        )
+        return suggestions, tone, alternative_text
+
+    async def generate_text(self, text: str, selected_suggestions: list[str], temperature: float = 0.7) -> str:
+        if not self.cache.should_cache(temperature):
+            return await self.inner.generate_text(text, selected_suggestions, temperature=temperature)
+        key = make_cache_key(
+            "generate", text, temperature, selected_suggestions, prompt_version=PROMPT_VERSION
+        )
+        cached = await self.cache.get_json(key)
+        if cached is not None:
+            return str(cached["generated_text"])
+        generated = await self.inner.generate_text(text, selected_suggestions, temperature=temperature)
+        await self.cache.set_json(key, {"generated_text": generated}, temperature)
+        return generated
+
+    async def stream_analyze(self, text: str, temperature: float = 0.7) -> AsyncIterator[StreamEvent]:
+        key = make_cache_key("analyze", text, temperature, prompt_version=PROMPT_VERSION)
+        if self.cache.should_cache(temperature):
+            cached = await self.cache.get_json(key)
+            if cached is not None:
+                for suggestion in cached["suggestions"]:
+                    yield "suggestion", suggestion
+                yield "tone", cached["tone"]
+                yield "alternative_text", cached["alternative_text"]
+                yield "result", cached
+                return
+        async for event in self.inner.stream_analyze(text, temperature=temperature):
+            if event[0] == "result":
+                await self.cache.set_json(key, event[1], temperature)
+            yield event
+
+    async def stream_generate(
+        self, text: str, selected_suggestions: list[str], temperature: float = 0.7
+    ) -> AsyncIterator[StreamEvent]:
+        key = make_cache_key(
+            "generate", text, temperature, selected_suggestions, prompt_version=PROMPT_VERSION
+        )
+        if self.cache.should_cache(temperature):
+            cached = await self.cache.get_json(key)
+            if cached is not None:
+                yield "delta", cached["generated_text"]
+                yield "result", cached
+                return
+        async for event in self.inner.stream_generate(text, selected_suggestions, temperature=temperature):
+            if event[0] == "result":
+                await self.cache.set_json(key, event[1], temperature)
+            yield event
+
+
+class CoalescingAnalyzer:
+    """Single-flight: samtidiga identiska anrop delar på ett upstream-anrop."""
+
+    def __init__(self, inner: Analyzer, flight: SingleFlight) -> None:
+        self.inner = inner
+        self.flight = flight
+
+    async def analyze_text(self, text: str, temperature: float = 0.7) -> tuple[list[str], Tone, str]:
+        key = make_cache_key("analyze", text, temperature, prompt_version=PROMPT_VERSION)
+        return await self.flight.do(key, lambda: self.inner.analyze_text(text, temperature=temperature))
+
+    async def generate_text(self, text: str, selected_suggestions: list[str], temperature: float = 0.7) -> str:
+        key = make_cache_key(
+            "generate", text, temperature, selected_suggestions, prompt_version=PROMPT_VERSION
+        )
+        return await self.flight.do(
+            key, lambda: self.inner.generate_text(text, selected_suggestions, temperature=temperature)
+        )
+
+    def stream_analyze(self, text: str, temperature: float = 0.7) -> AsyncIterator[StreamEvent]:
+        # Strömmar är per klient och slås inte ihop
+        return self.inner.stream_analyze(text, temperature=temperature)
+
+    def stream_generate(
+        self, text: str, selected_suggestions: list[str], temperature: float = 0.7
+    ) -> AsyncIterator[StreamEvent]:
+        return self.inner.stream_generate(text, selected_suggestions, temperature=temperature)
+
+
+class ChunkingAnalyzer:
+    """Långa texter delas vid stycke-/meningsgränser och analyseras parallellt per del.
+
+    Förslag och ton slås ihop och de omskrivna delarna fogas samman i originalets ordning.
+    Generering skickas vidare oförändrad.
+    """
+
+    def __init__(self, inner: Analyzer, chunk_chars: int, concurrency: int) -> None:
+        self.inner = inner
+        self.chunk_chars = chunk_chars
+        self.concurrency = max(concurrency, 1)
+
+    async def analyze_text(self, text: str, temperature: float = 0.7) -> tuple[list[str], Tone, str]:
+        chunks = split_text(text, self.chunk_chars)
+        if len(chunks) <= 1:
+            return await self.inner.analyze_text(text, temperature=temperature)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def analyze_chunk(chunk_text: str) -> tuple[list[str], Tone, str]:
+            async with semaphore:
+                return await self.inner.analyze_text(chunk_text, temperature=temperature)
+
+        results = await asyncio.gather(*(analyze_chunk(chunk.text) for chunk in chunks))
+        return merge_analyses(chunks, results, MAX_SUGGESTIONS)
+
+    async def generate_text(self, text: str, selected_suggestions: list[str], temperature: float = 0.7) -> str:
+        return await self.inner.generate_text(text, selected_suggestions, temperature=temperature)
+
+    async def stream_analyze(self, text: str, temperature: float = 0.7) -> AsyncIterator[StreamEvent]:
+        if len(split_text(text, self.chunk_chars)) <= 1:
+            async for event in self.inner.stream_analyze(text, temperature=temperature):
+                yield event
+            return
+        # Sammanslagningen kräver alla delar, så händelserna skickas först när allt är klart
+        suggestions, tone, alternative_text = await self.analyze_text(text, temperature=temperature)
+        for suggestion in suggestions:
+            yield "suggestion", suggestion
+        yield "tone", tone
+        yield "alternative_text", alternative_text
+        yield "result", {"suggestions": suggestions, "tone": tone, "alternative_text": alternative_text}
+
+    def stream_generate(
+        self, text: str, selected_suggestions: list[str], temperature: float = 0.7
+    ) -> AsyncIterator[StreamEvent]:
+        return self.inner.stream_generate(text, selected_suggestions, temperature=temperature)
+
+
+def get_analyzer(client: httpx.AsyncClient | None = None) -> Analyzer:
+    config = get_settings()
+    router = get_model_router()
+    backend = create_routed_backend(router, client) if router is not None else create_llm_backend(client)
+    analyzer: Analyzer = DeepSeekAnalyzer(config.deepseek_api_key, backend=backend)
+    analyzer = CoalescingAnalyzer(analyzer, get_singleflight())
+    analyzer = ChunkingAnalyzer(analyzer, config.analyze_chunk_chars, config.analyze_chunk_concurrency)
+    cache = get_response_cache()
+    if cache is not None:
+        if config.incremental_enabled:
+            from .incremental import IncrementalAnalyzer
 
-def get_analyzer() -> DeepSeekAnalyzer:
-    return DeepSeekAnalyzer(settings.deepseek_api_key)
+            analyzer = IncrementalAnalyzer(
+                analyzer, cache, config.incremental_segment_chars, config.analyze_chunk_concurrency
+            )
+        analyzer = CachedAnalyzer(analyzer, cache)
+    return analyzer
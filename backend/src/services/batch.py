@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Iterator
+from typing import Any
+
+from fastapi import HTTPException
+
+from ..models.schemas import BatchItem
+from ..utils.config import get_settings
+from ..utils.serialization import dumps_str
+from .analyzer import Analyzer
+
+_DONE = object()
+
+_global_slots: asyncio.Semaphore | None = None
+
+
+def get_batch_semaphore() -> asyncio.Semaphore:
+    """Processgemensam gräns för upstream-anrop från batcher, oavsett antal samtidiga batcher."""
+    global _global_slots
+    if _global_slots is None:
+        _global_slots = asyncio.Semaphore(get_settings().batch_global_concurrency)
+    return _global_slots
+
+
+def resolve_concurrency(requested: int | None) -> int:
+    config = get_settings()
+    concurrency = requested or config.batch_default_concurrency
+    return max(1, min(concurrency, config.batch_max_concurrency))
+
+
+async def _analyze_item(
+    analyzer: Analyzer, index: int, item: BatchItem, slots: asyncio.Semaphore
+) -> dict[str, Any]:
+    started = time.perf_counter()
+    record: dict[str, Any] = {"index": index, "id": item.id}
+    try:
+        async with slots:
+            suggestions, tone, alternative_text = await analyzer.analyze_text(
+                item.text.strip(), temperature=item.temperature
+            )
+        record["status"] = "ok"
+        record["result"] = {
+            "suggestions": suggestions[:3],
+            "tone": tone,
+            "alternative_text": alternative_text,
+        }
+    except HTTPException as exc:
+        record["status"] = "error"
+        record["error"] = {"code": f"http_error_{exc.status_code}", "message": str(exc.detail)}
+    except Exception as exc:
+        logging.error(f"Batch item {index} failed: {exc}")
+        record["status"] = "error"
+        record["error"] = {"code": "internal_error", "message": "Internal server error"}
+    record["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return record
+
+
+async def run_batch(
+    analyzer: Analyzer, items: list[BatchItem], concurrency: int
+) -> AsyncIterator[dict[str, Any]]:
+    """Analysera items med högst `concurrency` samtidiga anrop och ge resultat i färdigordning.
+
+    Ett fast antal workers hämtar från en delad iterator, så antalet tasks är begränsat
+    oavsett batchstorlek. Resultatkön är begränsad: läser klienten långsamt pausas
+    workers i stället för att resultat samlas i minnet. Sist ges en sammanfattning.
+    """
+    slots = get_batch_semaphore()
+    pending: Iterator[tuple[int, BatchItem]] = iter(enumerate(items))
+    results: asyncio.Queue[Any] = asyncio.Queue(maxsize=concurrency * 2)
+    workers_count = min(concurrency, len(items))
+
+    async def worker() -> None:
+        # _analyze_item fångar alla fel per item, så en worker avslutas bara normalt eller avbruten
+        for index, item in pending:
+            await results.put(await _analyze_item(analyzer, index, item, slots))
+        await results.put(_DONE)
+
+    started = time.perf_counter()
+    workers = [asyncio.create_task(worker()) for _ in range(workers_count)]
+    succeeded = failed = 0
+    try:
+        finished_workers = 0
+        while finished_workers < workers_count:
+            record = await results.get()
+            if record is _DONE:
+                finished_workers += 1
+                continue
+            if record["status"] == "ok":
+                succeeded += 1
+            else:
+                failed += 1
+            yield record
+    finally:
+        # Klienten kan ha kopplat ner mitt i; stoppa kvarvarande arbete
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    elapsed = time.perf_counter() - started
+    yield {
+        "summary": {
+            "total": len(items),
+            "succeeded": succeeded,
+            "failed": failed,
+            "concurrency": concurrency,
+            "elapsed_seconds": round(elapsed, 3),
+            "items_per_second": round(len(items) / elapsed, 2) if elapsed > 0 else None,
+        }
+    }
+
+
+async def ndjson_lines(records: AsyncIterator[dict[str, Any]]) -> AsyncIterator[str]:
+    async for record in records:
+        yield dumps_str(record) + "\n"
@@ -0,0 +1,333 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Sequence
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Protocol
+
+from ..utils.config import Settings, get_settings
+from ..utils.serialization import dumps, loads
+
+DETERMINISTIC_TEMPERATURE = 0.0
+SQLITE_TRIM_INTERVAL = 100  # Skrivningar mellan rensningar av SQLite-cachen (utgångna + storlek)
+
+
+def normalize_text(text: str) -> str:
+    # Whitespace-skillnader ska inte ge olika cache-nycklar
+    return " ".join(text.split())
+
+
+def make_cache_key(
+    operation: str,
+    text: str,
+    temperature: float,
+    suggestions: Sequence[str] = (),
+    prompt_version: str = "",
+) -> str:
+    """Innehållsadresserad nyckel: hash av normaliserad text, temperatur, förslag och promptversion."""
+    material = json.dumps(
+        {
+            "op": operation,
+            "text": normalize_text(text),
+            "temperature": round(temperature, 3),
+            "suggestions": [normalize_text(s) for s in suggestions],
+            "prompt_version": prompt_version,
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return f"{operation}:{hashlib.sha256(material.encode('utf-8')).hexdigest()}"
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    sets: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return asdict(self)
+
+
+class CacheBackend(Protocol):
+    stats: CacheStats
+
+    async def get(self, key: str) -> bytes | None: ...
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None: ...
+
+    async def close(self) -> None: ...
+
+
+class MemoryLRUCache:
+    """In-process LRU begränsad av total storlek i bytes, med TTL per post."""
+
+    def __init__(self, max_bytes: int, clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.stats = CacheStats()
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            self._remove(key)
+            self.stats.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        entry_size = len(key) + len(value)
+        if entry_size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (self._clock() + ttl_seconds, value)
+        self.size_bytes += entry_size
+        while self.size_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats.evictions += 1
+
+    async def close(self) -> None:
+        self._entries.clear()
+        self.size_bytes = 0
+
+    def _remove(self, key: str) -> None:
+        _, value = self._entries.pop(key)
+        self.size_bytes -= len(key) + len(value)
+
+
+class SQLiteCache:
+    """Disk-cache i SQLite; anrop körs i trådpool så event-loopen inte blockeras.
+
+    Filen begränsas av max_bytes (nyckel + värde, som i minnes-cachen). Var trim_every:e
+    skrivning tas utgångna poster bort och, om filen fortfarande är för stor, de poster som
+    går ut först. Flera workers kan dela filen; storleken räknas därför i databasen.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_bytes: int,
+        clock: Callable[[], float] = time.time,
+        trim_every: int = SQLITE_TRIM_INTERVAL,
+    ) -> None:
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._clock = clock
+        self._trim_every = max(trim_every, 1)
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache "
+            "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS response_cache_expires ON response_cache (expires_at)"
+        )
+        with self._lock:
+            self._trim()
+        self._conn.commit()
+
+    def _get_sync(self, key: str) -> bytes | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= self._clock():
+                self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.stats.expirations += 1
+                return None
+            return bytes(row[0])
+
+    def _set_sync(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        if len(key) + len(value) > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, self._clock() + ttl_seconds),
+            )
+            self._writes += 1
+            if self._writes % self._trim_every == 0:
+                self._trim()
+            self._conn.commit()
+
+    def _trim(self) -> None:
+        # Anropas med låset taget; committas av anroparen
+        expired = self._conn.execute(
+            "DELETE FROM response_cache WHERE expires_at <= ?", (self._clock(),)
+        ).rowcount
+        self.stats.expirations += expired
+        size = self._conn.execute(
+            "SELECT COALESCE(SUM(length(key) + length(value)), 0) FROM response_cache"
+        ).fetchone()[0]
+        if size <= self.max_bytes:
+            return
+        # Ingen åtkomsttid sparas; de poster som ändå går ut först får ge plats
+        evict: list[tuple[str]] = []
+        rows = self._conn.execute(
+            "SELECT key, length(key) + length(value) FROM response_cache ORDER BY expires_at"
+        )
+        for key, entry_size in rows:
+            if size <= self.max_bytes:
+                break
+            evict.append((key,))
+            size -= entry_size
+        self._conn.executemany("DELETE FROM response_cache WHERE key = ?", evict)
+        self.stats.evictions += len(evict)
+
+    async def get(self, key: str) -> bytes | None:
+        return await asyncio.to_thread(self._get_sync, key)
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        await asyncio.to_thread(self._set_sync, key, value, ttl_seconds)
+
+    async def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RedisCache:
+    """Redis-kompatibel store (Redis, Valkey, KeyDB ...). Kräver paketet "redis"."""
+
+    def __init__(self, url: str, prefix: str = "aifd:") -> None:
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError as e:  # pragma: no cover - beror på installerade paket
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package") from e
+        self.stats = CacheStats()
+        self.prefix = prefix
+        self._redis = redis_asyncio.from_url(url)
+
+    async def get(self, key: str) -> bytes | None:
+        value: bytes | None = await self._redis.get(self.prefix + key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        await self._redis.set(self.prefix + key, value, px=max(int(ttl_seconds * 1000), 1))
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+class ResponseCache:
+    """Cache-policy ovanpå en backend: TTL per post, vilka temperaturer som cachas och hit/miss."""
+
+    def __init__(
+        self,
+        backend: CacheBackend,
+        ttl_seconds: float,
+        deterministic_ttl_seconds: float,
+        cache_sampled: bool = True,
+    ) -> None:
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.deterministic_ttl_seconds = deterministic_ttl_seconds
+        self.cache_sampled = cache_sampled
+
+    @property
+    def stats(self) -> CacheStats:
+        return self.backend.stats
+
+    def should_cache(self, temperature: float) -> bool:
+        # Temperatur 0 är deterministisk och cachas alltid
+        return temperature <= DETERMINISTIC_TEMPERATURE or self.cache_sampled
+
+    def ttl_for(self, temperature: float) -> float:
+        if temperature <= DETERMINISTIC_TEMPERATURE:
+            return self.deterministic_ttl_seconds
+        return self.ttl_seconds
+
+    async def get_json(self, key: str) -> Any | None:
+        raw = await self.backend.get(key)
+        if raw is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return loads(raw)
+
+    async def set_json(self, key: str, value: Any, temperature: float) -> None:
+        if not self.should_cache(temperature):
+            return
+        raw = dumps(value)
+        await self.backend.set(key, raw, self.ttl_for(temperature))
+        self.stats.sets += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        stats = self.stats.as_dict()
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            "backend": type(self.backend).__name__,
+            **stats,
+            "hit_ratio": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+def create_response_cache(config: Settings | None = None) -> ResponseCache | None:
+    config = config or get_settings()
+    backend: CacheBackend
+    if config.cache_backend == "none":
+        return None
+    if config.cache_backend == "sqlite":
+        backend = SQLiteCache(
+            config.data_path(config.cache_sqlite_path), config.cache_sqlite_max_bytes
+        )
+    elif config.cache_backend == "redis":
+        backend = RedisCache(config.cache_redis_url)
+    else:
+        backend = MemoryLRUCache(config.cache_max_bytes)
+    return ResponseCache(
+        backend,
+        ttl_seconds=config.cache_ttl_seconds,
+        deterministic_ttl_seconds=config.cache_deterministic_ttl_seconds,
+        cache_sampled=config.cache_sampled,
+    )
+
+
+_response_cache: ResponseCache | None = None
+_response_cache_initialized = False
+
+
+def get_response_cache() -> ResponseCache | None:
+    """Processens delade response-cache (None om CACHE_BACKEND=none)."""
+    global _response_cache, _response_cache_initialized
+    if not _response_cache_initialized:
+        _response_cache = create_response_cache()
+        _response_cache_initialized = True
+    return _response_cache
+
+
+async def close_response_cache() -> None:
+    global _response_cache, _response_cache_initialized
+    if _response_cache is not None:
+        await _response_cache.close()
+    _response_cache = None
+    _response_cache_initialized = False
@@ -0,0 +1,146 @@
+"""Uppdelning av långa texter i stycken/meningar och sammanslagning av analyser per del."""
+
+from __future__ import annotations
+
+import re
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from ..models.llm import Tone
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_BREAK = re.compile(r"(?<=[.!?…])\s+")
+TONE_SCORES: dict[str, float] = {"positive": 1.0, "neutral": 0.0, "negative": -1.0}
+TONE_THRESHOLD = 1 / 3  # Viktat medel över/under ±1/3 ger positiv/negativ ton
+
+
+@dataclass(frozen=True)
+class Chunk:
+    text: str
+    separator: str  # Blanktecknen som följde efter delen i originalet
+
+
+def _pieces(text: str, pattern: re.Pattern[str]) -> list[tuple[str, str]]:
+    pieces: list[tuple[str, str]] = []
+    position = 0
+    for match in pattern.finditer(text):
+        pieces.append((text[position : match.start()], match.group(0)))
+        position = match.end()
+    pieces.append((text[position:], ""))
+    return [(piece, sep) for piece, sep in pieces if piece.strip()]
+
+
+def _split_long(text: str, max_chars: int) -> list[tuple[str, str]]:
+    """Dela ett stycke vid meningsgränser; meningar längre än max_chars delas vid ord."""
+    pieces: list[tuple[str, str]] = []
+    for sentence, sep in _pieces(text, SENTENCE_BREAK):
+        if len(sentence) <= max_chars:
+            pieces.append((sentence, sep))
+            continue
+        words = sentence.split(" ")
+        current: list[str] = []
+        for word in words:
+            if current and len(" ".join([*current, word])) > max_chars:
+                pieces.append((" ".join(current), " "))
+                current = []
+            current.append(word)
+        pieces.append((" ".join(current), sep))
+    return pieces
+
+
+def split_text(text: str, max_chars: int) -> list[Chunk]:
+    """Packa stycken (och vid behov meningar) i delar om högst ungefär `max_chars` tecken."""
+    pieces: list[tuple[str, str]] = []
+    for paragraph, sep in _pieces(text, PARAGRAPH_BREAK):
+        if len(paragraph) <= max_chars:
+            pieces.append((paragraph, sep))
+        else:
+            sentences = _split_long(paragraph, max_chars)
+            sentences[-1] = (sentences[-1][0], sep)
+            pieces.extend(sentences)
+
+    chunks: list[Chunk] = []
+    current = ""
+    current_sep = ""
+    for piece, sep in pieces:
+        if current and len(current) + len(current_sep) + len(piece) > max_chars:
+            chunks.append(Chunk(current, current_sep))
+            current = ""
+        current = f"{current}{current_sep}{piece}" if current else piece
+        current_sep = sep
+    if current:
+        chunks.append(Chunk(current, ""))
+    return chunks
+
+
+def split_segments(text: str, max_chars: int, min_words: int) -> list[Chunk]:
+    """Innehållsdefinierade segment för inkrementell analys: en ändring flyttar inga andra gränser.
+
+    Varje stycke (långa stycken delas vid meningar) med minst `min_words` ord börjar ett nytt
+    segment; kortare stycken följer med segmentet före (inledande korta stycken med det första).
+    Gränserna beror bara på respektive stycke, till skillnad från split_text() där en ändring
+    i början kan flytta alla efterföljande gränser.
+    """
+    pieces: list[Chunk] = []
+    for paragraph, sep in _pieces(text, PARAGRAPH_BREAK):
+        if len(paragraph) <= max_chars:
+            pieces.append(Chunk(paragraph, sep))
+            continue
+        parts = split_text(paragraph, max_chars)
+        pieces.extend([*parts[:-1], Chunk(parts[-1].text, sep)])
+
+    segments: list[Chunk] = []
+    current = ""
+    current_sep = ""
+    seen_long = False
+    for piece in pieces:
+        long = len(piece.text.split()) >= min_words
+        if long and seen_long:
+            segments.append(Chunk(current, current_sep))
+            current = ""
+        seen_long = seen_long or long
+        current = f"{current}{current_sep}{piece.text}" if current else piece.text
+        current_sep = piece.separator
+    if current:
+        segments.append(Chunk(current, ""))
+    return segments
+
+
+def merge_tone(tones: Sequence[Tone], weights: Sequence[int]) -> Tone:
+    total = sum(weights) or 1
+    score = sum(TONE_SCORES[tone] * weight for tone, weight in zip(tones, weights, strict=True)) / total
+    if score > TONE_THRESHOLD:
+        return "positive"
+    if score < -TONE_THRESHOLD:
+        return "negative"
+    return "neutral"
+
+
+def merge_suggestions(per_chunk: Sequence[Sequence[str]], limit: int) -> list[str]:
+    """Turvis ett förslag från varje del (första förslaget är oftast det viktigaste), utan dubbletter."""
+    merged: list[str] = []
+    seen: set[str] = set()
+    longest = max((len(s) for s in per_chunk), default=0)
+    for rank in range(longest):
+        for suggestions in per_chunk:
+            if rank >= len(suggestions):
+                continue
+            key = suggestions[rank].strip().casefold()
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(suggestions[rank])
+            if len(merged) == limit:
+                return merged
+    return merged
+
+
+def merge_analyses(
+    chunks: Sequence[Chunk], results: Sequence[tuple[list[str], Tone, str]], limit: int
+) -> tuple[list[str], Tone, str]:
+    suggestions = merge_suggestions([r[0] for r in results], limit)
+    tone = merge_tone([r[1] for r in results], [len(c.text) for c in chunks])
+    alternative_text = "".join(
+        result[2] + chunk.separator for chunk, result in zip(chunks, results, strict=True)
+    )
+    return suggestions, tone, alternative_text
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from typing import Any, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Call(Generic[T]):
+    task: asyncio.Task[T]
+    waiters: int = 0
+
+
+@dataclass
+class SingleFlightStats:
+    leaders: int = 0
+    coalesced: int = 0
+    abandoned: int = 0
+
+    def as_dict(self) -> dict[str, int]:
+        return {"leaders": self.leaders, "coalesced": self.coalesced, "abandoned": self.abandoned}
+
+
+@dataclass
+class SingleFlight:
+    """Slår ihop samtidiga anrop med samma nyckel till ett enda delat upstream-anrop.
+
+    Varje väntare awaitar den delade tasken via asyncio.shield, så att en avbruten väntare
+    inte avbryter anropet för de andra. Först när sista väntaren har gett upp avbryts
+    upstream-anropet. Exceptions från det delade anropet når alla väntare.
+    """
+
+    stats: SingleFlightStats = field(default_factory=SingleFlightStats)
+    _calls: dict[str, _Call[Any]] = field(default_factory=dict)
+
+    def inflight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        call: _Call[T] | None = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.stats.leaders += 1
+        else:
+            self.stats.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if not call.task.done() and call.waiters == 1:
+                # Ingen annan väntar längre på resultatet. Nyckeln släpps direkt, så att en ny
+                # anropare inte hinner ansluta till den avbrutna tasken innan done-callbacken körts
+                self._forget(key, call)
+                call.task.cancel()
+                self.stats.abandoned += 1
+            raise
+        finally:
+            call.waiters -= 1
+
+    def _forget(self, key: str, call: _Call[Any]) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+_singleflight = SingleFlight()
+
+
+def get_singleflight() -> SingleFlight:
+    return _singleflight
@@ -0,0 +1,466 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any
+
+import httpx
+from fastapi import HTTPException
+
+from ..utils.client import INTERNAL_CLIENT, request_class_var
+from ..utils.config import Settings, get_settings
+from ..utils.metrics import REGISTRY
+from ..utils.tracing import span
+from .scheduler import FairScheduler
+
+TOO_MANY_REQUESTS = 429
+SERVER_ERROR_CODE = 500
+MAX_QUOTA_CLIENTS = 10_000  # Fulla (vilande) klientbuckets glöms därutöver
+
+QUOTA_REJECTIONS = REGISTRY.counter(
+    "scheduler_quota_rejections", "Upstream-anrop som nekades med 429 av klientkvoten", ("quota",)
+)
+
+
+def parse_retry_after(response: httpx.Response | None) -> float | None:
+    """Retry-After som sekunder (heltal) eller HTTP-datum; None om saknas/ogiltig."""
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def upstream_unavailable(retry_after: float, detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=503, detail=detail, headers={"Retry-After": str(max(math.ceil(retry_after), 1))}
+    )
+
+
+class TokenBucket:
+    """Klassisk token bucket: `rate` tokens/s fylls på upp till `capacity`."""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._clock = clock
+        self._updated = clock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Dra `amount` tokens (saldot får bli negativt) och returnera hur länge anroparen ska vänta."""
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, delta: float) -> None:
+        # Rätta en uppskattning i efterhand (t.ex. faktisk token-användning från upstream)
+        if self.enabled:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class AIMDLimiter:
+    """Adaptiv samtidighetsgräns: additiv ökning vid lyckade anrop, multiplikativ minskning vid överlast.
+
+    Anrop som inte får plats köar i en FairScheduler (prioritet, sedan viktad rättvisa per klient)
+    enligt request_class_var; `cost` är anropets uppskattade tokens.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        latency_threshold: float,
+        backoff_ratio: float = 0.5,
+        queue: FairScheduler | None = None,
+    ) -> None:
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_threshold = latency_threshold
+        self.backoff_ratio = backoff_ratio
+        self.inflight = 0
+        self.queue = queue if queue is not None else FairScheduler()
+
+    async def acquire(self, cost: float = 1.0) -> None:
+        request_class = request_class_var.get()
+        if self.inflight < int(self.limit) and not len(self.queue):
+            self.inflight += 1
+            self.queue.admit(request_class, cost)
+            return
+        waiter = self.queue.push(request_class, cost)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Platsen hann delas ut; lämna den vidare
+                self.inflight -= 1
+                self._wake()
+            else:
+                self.queue.remove(waiter)
+            raise
+
+    def release(self, overloaded: bool, latency: float | None) -> None:
+        self.inflight -= 1
+        if overloaded or (latency is not None and latency > self.latency_threshold):
+            self.limit = max(float(self.minimum), self.limit * self.backoff_ratio)
+        elif latency is not None:
+            self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self.inflight < int(self.limit):
+            waiter = self.queue.pop()
+            if waiter is None:
+                return
+            if not waiter.future.done():
+                self.inflight += 1
+                waiter.future.set_result(None)
+
+
+class CircuitBreaker:
+    """closed -> open efter N misslyckanden i rad -> half_open efter cooldown -> closed vid lyckad probe."""
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        cooldown_seconds: float,
+        half_open_probes: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.half_open_probes = half_open_probes
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_total = 0
+        self._clock = clock
+        self._open_until = 0.0
+        self._probes = 0
+
+    def retry_after(self) -> float:
+        return max(self._open_until - self._clock(), 0.0)
+
+    def before_call(self) -> None:
+        """Kasta 503 direkt när kretsen är öppen; släpp igenom ett begränsat antal prober i half_open."""
+        if self.state == "open":
+            if self._clock() < self._open_until:
+                raise upstream_unavailable(self.retry_after(), "AI service unavailable - circuit open")
+            self.state = "half_open"
+            self._probes = 0
+        if self.state == "half_open":
+            if self._probes >= self.half_open_probes:
+                raise upstream_unavailable(1.0, "AI service unavailable - probing recovery")
+            self._probes += 1
+
+    def release_probe(self) -> None:
+        # En probe som avbröts innan den gav något utfall ska inte låsa half_open
+        if self.state == "half_open" and self._probes > 0:
+            self._probes -= 1
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        if self.state != "closed":
+            logging.info("Upstream circuit closed")
+        self.state = "closed"
+
+    def record_failure(self, retry_after: float | None = None) -> None:
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            self.trip(retry_after)
+
+    def trip(self, retry_after: float | None = None) -> None:
+        if self.state != "open":
+            self.opened_total += 1
+            logging.warning("Upstream circuit opened")
+        self.state = "open"
+        self._open_until = self._clock() + max(self.cooldown_seconds, retry_after or 0.0)
+
+
+class ClientQuotas:
+    """Token buckets per klient (anrop/min och uppskattade tokens/min); överskridande ger 429."""
+
+    def __init__(
+        self, requests_per_minute: float, tokens_per_minute: float, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.rejected: dict[str, int] = {}
+        self._clock = clock
+        self._buckets: OrderedDict[str, tuple[TokenBucket, TokenBucket]] = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests_per_minute > 0 or self.tokens_per_minute > 0
+
+    def _buckets_for(self, client: str) -> tuple[TokenBucket, TokenBucket]:
+        buckets = self._buckets.get(client)
+        if buckets is None:
+            buckets = self._buckets[client] = (
+                TokenBucket(self.requests_per_minute / 60, max(self.requests_per_minute, 1.0), self._clock),
+                TokenBucket(self.tokens_per_minute / 60, max(self.tokens_per_minute, 1.0), self._clock),
+            )
+            if len(self._buckets) > MAX_QUOTA_CLIENTS:
+                # Den minst nyligen använda klienten har hunnit fylla på sin bucket; inget går förlorat
+                forgotten, _ = self._buckets.popitem(last=False)
+                self.rejected.pop(forgotten, None)
+        else:
+            self._buckets.move_to_end(client)
+        return buckets
+
+    def reserve(self, client: str, estimated_tokens: float, max_wait: float = 0.0) -> float:
+        """Dra klientens kvot och returnera väntetiden, eller kasta 429 med Retry-After om den
+        överstiger `max_wait` (då dras ingenting)."""
+        requests, tokens = self._buckets_for(client)
+        request_wait = requests.reserve(1.0)
+        token_wait = tokens.reserve(estimated_tokens)
+        if max(request_wait, token_wait) <= max_wait:
+            return max(request_wait, token_wait)
+        requests.adjust(-1.0)
+        tokens.adjust(-estimated_tokens)
+        quota = "requests" if request_wait >= token_wait else "tokens"
+        QUOTA_REJECTIONS.labels(quota).inc()
+        self.rejected[client] = self.rejected.get(client, 0) + 1
+        raise HTTPException(
+            status_code=TOO_MANY_REQUESTS,
+            detail=f"Client quota exceeded ({quota} per minute) - please try again later",
+            headers={"Retry-After": str(max(math.ceil(max(request_wait, token_wait)), 1))},
+        )
+
+    def remaining(self, client: str) -> dict[str, float | None] | None:
+        """Kvar av kvoten just nu; None för en gräns som är avstängd."""
+        buckets = self._buckets.get(client)
+        if buckets is None:
+            return None
+        requests, tokens = buckets
+        for bucket in buckets:
+            if bucket.enabled:
+                bucket._refill()
+        return {
+            "requests": round(requests.tokens, 2) if requests.enabled else None,
+            "tokens": round(tokens.tokens, 1) if tokens.enabled else None,
+        }
+
+
+@dataclass
+class Permit:
+    """Resultatet av ett upstream-anrop, ifyllt av anroparen inom UpstreamGovernor.slot()."""
+
+    estimated_tokens: float
+    status_code: int | None = None
+    retry_after: float | None = None
+    used_tokens: float | None = None
+
+    def observe(self, response: httpx.Response) -> None:
+        self.status_code = response.status_code
+        self.retry_after = parse_retry_after(response)
+
+
+@dataclass
+class GovernorStats:
+    requests: int = 0
+    successes: int = 0
+    overloads: int = 0
+    rejected_circuit_open: int = 0
+    rejected_rate_limited: int = 0
+    retry_after_pauses: int = 0
+    wait_seconds_total: float = 0.0
+    latencies: deque[float] = field(default_factory=lambda: deque(maxlen=256))
+
+
+class UpstreamGovernor:
+    """Global styrning av trafiken mot LLM-upstream, gemensam för alla requests i processen.
+
+    Varje upstream-försök går genom slot(): circuit breaker, klientens kvot, eventuell
+    Retry-After-paus, token buckets (requests/s och tokens/min) och AIMD-gränsen för samtidiga
+    anrop, där köordningen bestäms av FairScheduler.
+    """
+
+    def __init__(
+        self,
+        request_bucket: TokenBucket,
+        token_bucket: TokenBucket,
+        limiter: AIMDLimiter,
+        breaker: CircuitBreaker,
+        max_wait_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+        quotas: ClientQuotas | None = None,
+    ) -> None:
+        self.request_bucket = request_bucket
+        self.token_bucket = token_bucket
+        self.limiter = limiter
+        self.breaker = breaker
+        self.max_wait_seconds = max_wait_seconds
+        self.quotas = quotas
+        self.stats = GovernorStats()
+        self._clock = clock
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        """Honorera Retry-After globalt: inga nya anrop startar förrän tiden gått."""
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+        self.stats.retry_after_pauses += 1
+
+    async def _wait_for_capacity(self, estimated_tokens: float) -> None:
+        wait = max(self._paused_until - self._clock(), 0.0)
+        wait = max(wait, self.request_bucket.reserve(1.0), self.token_bucket.reserve(estimated_tokens))
+        if wait > self.max_wait_seconds:
+            # Ge tillbaka reservationen; anropet görs inte
+            self.request_bucket.adjust(-1.0)
+            self.token_bucket.adjust(-estimated_tokens)
+            self.stats.rejected_rate_limited += 1
+            raise upstream_unavailable(wait, "AI service rate limited - please try again later")
+        if wait > 0:
+            self.stats.wait_seconds_total += wait
+            await asyncio.sleep(wait)
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: float) -> AsyncIterator[Permit]:
+        try:
+            self.breaker.before_call()
+        except HTTPException:
+            self.stats.rejected_circuit_open += 1
+            raise
+        try:
+            request_class = request_class_var.get()
+            with span("upstream_wait", priority=request_class.priority):
+                # Internt arbete (jobb, förhämtning) har ingen klient att ransonera. Interaktiva
+                # anrop får 429 direkt; batch väntar in sin kvot så länge väntan ryms i max_wait_seconds
+                quotas = self.quotas
+                if quotas is not None and quotas.enabled and request_class.client != INTERNAL_CLIENT:
+                    max_wait = self.max_wait_seconds if request_class.priority == "batch" else 0.0
+                    wait = quotas.reserve(request_class.client, estimated_tokens, max_wait)
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                await self._wait_for_capacity(estimated_tokens)
+                await self.limiter.acquire(estimated_tokens)
+        except BaseException:
+            self.breaker.release_probe()
+            raise
+
+        permit = Permit(estimated_tokens)
+        started = self._clock()
+        overloaded = False
+        latency: float | None = None
+        self.stats.requests += 1
+        try:
+            yield permit
+        except httpx.TransportError:
+            # Timeouts och anslutningsfel räknas som överlast
+            overloaded = True
+            raise
+        finally:
+            latency = self._clock() - started
+            status = permit.status_code
+            if status is not None and (status == TOO_MANY_REQUESTS or status >= SERVER_ERROR_CODE):
+                overloaded = True
+            if overloaded:
+                self.stats.overloads += 1
+                self.breaker.record_failure(permit.retry_after)
+                if permit.retry_after:
+                    self.pause(permit.retry_after)
+            elif status is not None:
+                self.stats.successes += 1
+                self.stats.latencies.append(latency)
+                self.breaker.record_success()
+            else:
+                self.breaker.release_probe()
+            if permit.used_tokens is not None:
+                self.token_bucket.adjust(permit.used_tokens - estimated_tokens)
+            self.limiter.release(overloaded, latency if status is not None else None)
+
+    def snapshot(self) -> dict[str, Any]:
+        latencies = sorted(self.stats.latencies)
+        p50 = latencies[len(latencies) // 2] if latencies else None
+        return {
+            "circuit_state": self.breaker.state,
+            "circuit_retry_after_seconds": round(self.breaker.retry_after(), 3),
+            "circuit_opened_total": self.breaker.opened_total,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "inflight": self.limiter.inflight,
+            "queued": len(self.limiter.queue),
+            "queued_interactive": self.limiter.queue.queued("interactive"),
+            "queued_batch": self.limiter.queue.queued("batch"),
+            "request_tokens_available": round(self.request_bucket.tokens, 2),
+            "llm_tokens_available": round(self.token_bucket.tokens, 1),
+            "paused_seconds": round(max(self._paused_until - self._clock(), 0.0), 3),
+            "latency_p50_seconds": round(p50, 3) if p50 is not None else None,
+            "requests": self.stats.requests,
+            "successes": self.stats.successes,
+            "overloads": self.stats.overloads,
+            "rejected_circuit_open": self.stats.rejected_circuit_open,
+            "rejected_rate_limited": self.stats.rejected_rate_limited,
+            "retry_after_pauses": self.stats.retry_after_pauses,
+            "wait_seconds_total": round(self.stats.wait_seconds_total, 3),
+        }
+
+    def client_snapshot(self) -> dict[str, Any]:
+        """Kö, väntetid och kvar av kvoten per klient (de mest köade först)."""
+        clients: dict[str, Any] = {}
+        for client, stats in self.limiter.queue.client_snapshot().items():
+            entry: dict[str, Any] = dict(stats)
+            if self.quotas is not None:
+                entry["quota_remaining"] = self.quotas.remaining(client)
+                entry["quota_rejections"] = self.quotas.rejected.get(client, 0)
+            clients[client] = entry
+        return clients
+
+
+def create_governor(config: Settings | None = None) -> UpstreamGovernor:
+    config = config or get_settings()
+    return UpstreamGovernor(
+        request_bucket=TokenBucket(config.upstream_rps, max(config.upstream_burst, 1.0)),
+        token_bucket=TokenBucket(config.upstream_tpm / 60.0, max(config.upstream_tpm, 1.0)),
+        limiter=AIMDLimiter(
+            initial=config.upstream_concurrency_initial,
+            minimum=config.upstream_concurrency_min,
+            maximum=config.upstream_concurrency_max,
+            latency_threshold=config.upstream_latency_threshold_seconds,
+            queue=FairScheduler(config.scheduler_client_weights),
+        ),
+        breaker=CircuitBreaker(
+            failure_threshold=config.circuit_failure_threshold,
+            cooldown_seconds=config.circuit_cooldown_seconds,
+        ),
+        max_wait_seconds=config.upstream_max_wait_seconds,
+        quotas=ClientQuotas(config.scheduler_client_rpm, config.scheduler_client_tpm),
+    )
+
+
+_governor: UpstreamGovernor | None = None
+
+
+def get_governor() -> UpstreamGovernor:
+    global _governor
+    if _governor is None:
+        _governor = create_governor()
+    return _governor
@@ -0,0 +1,331 @@
+"""Serverhistorik: varje analyze/generate-resultat sparas i SQLite (WAL) med FTS5-index på texten.
+
+Skrivningar läggs i en begränsad kö och skrivs i batchar av en bakgrundstask, så att
+request-vägen aldrig väntar på disken. Läsningar går via en egen anslutning; i WAL-läge
+blockeras de inte av pågående skrivningar, inte heller från andra worker-processer.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from fastapi import HTTPException
+
+from ..models.schemas import HistoryItem, HistoryPage
+from ..utils.config import Settings, get_settings
+from ..utils.metrics import REGISTRY
+from ..utils.serialization import dumps_str, loads
+
+BUSY_TIMEOUT_MS = 5000  # Flera workers skriver till samma fil; vänta på låset istället för att fela
+
+HISTORY_WRITES = REGISTRY.counter(
+    "history_entries", "Historikposter per utfall: written, dropped (full kö), failed", ("outcome",)
+)
+HISTORY_BATCHES = REGISTRY.counter("history_batches", "Batchar skrivna till historikdatabasen")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    client_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    tone TEXT,
+    text TEXT NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_client_created ON history (client_id, created_at);
+CREATE INDEX IF NOT EXISTS history_client_tone_created ON history (client_id, tone, created_at);
+CREATE INDEX IF NOT EXISTS history_created ON history (created_at);
+"""
+
+# Extern content-tabell: FTS-indexet håller bara tokens, texten ligger kvar i history
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(
+    text, content='history', content_rowid='id', tokenize='unicode61 remove_diacritics 0'
+);
+CREATE TRIGGER IF NOT EXISTS history_fts_insert AFTER INSERT ON history BEGIN
+    INSERT INTO history_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS history_fts_delete AFTER DELETE ON history BEGIN
+    INSERT INTO history_fts (history_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+
+@dataclass(frozen=True)
+class HistoryEntry:
+    client_id: str
+    kind: str
+    text: str
+    result: dict[str, Any]
+    created_at: float
+
+
+def fts_query(query: str) -> str:
+    """Användarens sökord som FTS5-uttryck: alla ord krävs, det sista matchas som prefix."""
+    terms = [f'"{term}"' for term in re.findall(r"\w+", query)]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _encode_cursor(created_at: float, item_id: int) -> str:
+    return f"{created_at!r}:{item_id}"
+
+
+def _decode_cursor(cursor: str) -> tuple[float, int]:
+    try:
+        created_at, item_id = cursor.split(":")
+        return float(created_at), int(item_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail="Invalid cursor") from e
+
+
+def _to_item(row: sqlite3.Row) -> HistoryItem:
+    return HistoryItem(
+        id=row["id"],
+        kind=row["kind"],
+        created_at=row["created_at"],
+        tone=row["tone"],
+        text=row["text"],
+        result=loads(row["result"]),
+    )
+
+
+class HistoryStore:
+    """SQLite-lagring med separata anslutningar för skrivning (batchar) och läsning."""
+
+    def __init__(self, path: str | Path) -> None:
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._writer = self._connect(path)
+        self._writer.executescript(_SCHEMA)
+        try:
+            self._writer.executescript(_FTS_SCHEMA)
+            self.full_text = True
+        except sqlite3.OperationalError:
+            # SQLite utan FTS5: sökningen faller tillbaka på LIKE
+            logging.error("SQLite saknar FTS5 - historiksökning använder LIKE")
+            self.full_text = False
+        self._writer.commit()
+        self._reader = self._connect(path)
+
+    @staticmethod
+    def _connect(path: str | Path) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(path), check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        return conn
+
+    @staticmethod
+    def _row(entry: HistoryEntry) -> tuple[Any, ...]:
+        return (
+            entry.client_id,
+            entry.kind,
+            entry.created_at,
+            entry.result.get("tone"),
+            entry.text,
+            dumps_str(entry.result),
+        )
+
+    def insert_many(self, entries: Sequence[HistoryEntry]) -> None:
+        """En transaktion per batch; körs i en tråd från HistoryWriter."""
+        with self._write_lock, self._writer:
+            self._writer.executemany(
+                "INSERT INTO history (client_id, kind, created_at, tone, text, result)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [self._row(entry) for entry in entries],
+            )
+
+    def import_many(self, entries: Sequence[HistoryEntry]) -> int:
+        """Som insert_many, men poster som redan finns (klient, tid och text) hoppas över.
+
+        Då kan en avbruten uppladdning göras om utan dubbletter. Returnerar antal nya poster.
+        """
+        rows = [
+            (*self._row(entry), entry.client_id, entry.created_at, entry.text) for entry in entries
+        ]
+        with self._write_lock, self._writer:
+            return self._writer.executemany(
+                "INSERT INTO history (client_id, kind, created_at, tone, text, result)"
+                " SELECT ?, ?, ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM history"
+                " WHERE client_id = ? AND created_at = ? AND text = ?)",
+                rows,
+            ).rowcount
+
+    def _fetchall(self, sql: str, params: tuple[Any, ...]) -> list[sqlite3.Row]:
+        with self._read_lock:
+            return self._reader.execute(sql, params).fetchall()
+
+    def _execute(self, sql: str, params: tuple[Any, ...]) -> int:
+        with self._write_lock, self._writer:
+            return self._writer.execute(sql, params).rowcount
+
+    async def page(
+        self,
+        client_id: str,
+        limit: int,
+        cursor: str | None = None,
+        tone: str | None = None,
+        kind: str | None = None,
+    ) -> HistoryPage:
+        """Nyast först, keyset-paginerat på (created_at, id) så att djupa sidor är lika billiga."""
+        where = ["client_id = ?"]
+        params: list[Any] = [client_id]
+        if tone is not None:
+            where.append("tone = ?")
+            params.append(tone)
+        if kind is not None:
+            where.append("kind = ?")
+            params.append(kind)
+        if cursor is not None:
+            where.append("(created_at, id) < (?, ?)")
+            params.extend(_decode_cursor(cursor))
+        sql = (
+            f"SELECT * FROM history WHERE {' AND '.join(where)}"
+            " ORDER BY created_at DESC, id DESC LIMIT ?"
+        )
+        rows = await asyncio.to_thread(self._fetchall, sql, (*params, limit + 1))
+        items = [_to_item(row) for row in rows[:limit]]
+        next_cursor = (
+            _encode_cursor(items[-1].created_at, items[-1].id) if len(rows) > limit else None
+        )
+        return HistoryPage(items=items, next_cursor=next_cursor)
+
+    async def search(
+        self, client_id: str, query: str, limit: int, cursor: str | None = None
+    ) -> HistoryPage:
+        """Fulltextsökning rankad med bm25; markören är en offset i träfflistan."""
+        try:
+            offset = int(cursor) if cursor is not None else 0
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail="Invalid cursor") from e
+        if self.full_text:
+            match = fts_query(query)
+            if not match:
+                return HistoryPage(items=[])
+            sql = (
+                "SELECT h.* FROM history_fts JOIN history h ON h.id = history_fts.rowid"
+                " WHERE history_fts MATCH ? AND h.client_id = ?"
+                " ORDER BY bm25(history_fts), h.created_at DESC LIMIT ? OFFSET ?"
+            )
+            params: tuple[Any, ...] = (match, client_id, limit + 1, offset)
+        else:
+            sql = (
+                "SELECT * FROM history WHERE client_id = ? AND text LIKE ?"
+                " ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?"
+            )
+            params = (client_id, f"%{query}%", limit + 1, offset)
+        rows = await asyncio.to_thread(self._fetchall, sql, params)
+        next_cursor = str(offset + limit) if len(rows) > limit else None
+        return HistoryPage(items=[_to_item(row) for row in rows[:limit]], next_cursor=next_cursor)
+
+    async def delete(self, client_id: str, item_id: int) -> bool:
+        deleted = await asyncio.to_thread(
+            self._execute, "DELETE FROM history WHERE id = ? AND client_id = ?", (item_id, client_id)
+        )
+        return deleted == 1
+
+    async def clear(self, client_id: str) -> int:
+        return await asyncio.to_thread(
+            self._execute, "DELETE FROM history WHERE client_id = ?", (client_id,)
+        )
+
+    def close(self) -> None:
+        with self._write_lock, self._read_lock:
+            self._writer.close()
+            self._reader.close()
+
+
+class HistoryWriter:
+    """Begränsad kö framför HistoryStore; en task skriver en batch per `flush_seconds`.
+
+    `record` blockerar aldrig: är kön full släpps posten och räknas som dropped.
+    """
+
+    def __init__(
+        self, store: HistoryStore, batch_size: int, flush_seconds: float, max_queued: int
+    ) -> None:
+        self.store = store
+        self.batch_size = max(batch_size, 1)
+        self.flush_seconds = flush_seconds
+        self._queue: asyncio.Queue[HistoryEntry | None] = asyncio.Queue(maxsize=max_queued)
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    def record(self, client_id: str, kind: str, text: str, result: dict[str, Any]) -> None:
+        entry = HistoryEntry(client_id, kind, text, result, time.time())
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            HISTORY_WRITES.labels("dropped").inc()
+
+    async def stop(self) -> None:
+        """Skriv det som redan köats och avsluta."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    def _drain(self, batch: list[HistoryEntry]) -> bool:
+        # Returnerar True när stoppsignalen lästs
+        while len(batch) < self.batch_size:
+            try:
+                entry = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return False
+            if entry is None:
+                return True
+            batch.append(entry)
+        return False
+
+    async def _run(self) -> None:
+        while True:
+            first = await self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            stopping = self._drain(batch)
+            if not stopping and len(batch) < self.batch_size and self.flush_seconds > 0:
+                # Samla fler poster i högst flush_seconds innan batchen skrivs
+                await asyncio.sleep(self.flush_seconds)
+                stopping = self._drain(batch)
+            await self._write(batch)
+            if stopping:
+                return
+
+    async def _write(self, batch: list[HistoryEntry]) -> None:
+        try:
+            await asyncio.to_thread(self.store.insert_many, batch)
+        except sqlite3.Error as e:
+            logging.error(f"History write failed: {e}")
+            HISTORY_WRITES.labels("failed").inc(len(batch))
+            return
+        HISTORY_BATCHES.inc()
+        HISTORY_WRITES.labels("written").inc(len(batch))
+
+
+def create_history(config: Settings | None = None) -> HistoryWriter | None:
+    config = config or get_settings()
+    if not config.history_enabled:
+        return None
+    return HistoryWriter(
+        HistoryStore(config.data_path(config.history_db_path)),
+        batch_size=config.history_batch_size,
+        flush_seconds=config.history_flush_seconds,
+        max_queued=config.history_max_queued,
+    )
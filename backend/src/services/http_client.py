@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import importlib.util
+
+import httpx
+
+from ..utils.config import Settings, get_settings
+
+
+def _http2_available() -> bool:
+    # HTTP/2 i httpx kräver det valfria paketet "h2" (httpx[http2])
+    return importlib.util.find_spec("h2") is not None
+
+
+def create_http_client(config: Settings | None = None) -> httpx.AsyncClient:
+    """Skapa en AsyncClient med connection pool, keep-alive och timeouts från Settings.
+
+    Klienten är tänkt att leva lika länge som applikationen (skapas i lifespan i main.py)
+    så att TCP/TLS-anslutningar mot upstream återanvänds mellan anrop.
+    """
+    config = config or get_settings()
+    limits = httpx.Limits(
+        max_connections=config.http_max_connections,
+        max_keepalive_connections=config.http_max_keepalive_connections,
+        keepalive_expiry=config.http_keepalive_expiry,
+    )
+    timeout = httpx.Timeout(
+        config.http_timeout,
+        connect=config.http_connect_timeout,
+        pool=config.http_pool_timeout,
+    )
+    return httpx.AsyncClient(
+        limits=limits,
+        timeout=timeout,
+        http2=config.http2 and _http2_available(),
+    )
@@ -0,0 +1,151 @@
+"""Inkrementell analys och generering för iterativ redigering.
+
+Texten delas i innehållsdefinierade segment (stycken, se chunking.split_segments) och varje
+segment cachas för sig i response-cachen, nyckat på segmentets hash. När användaren ändrat en
+mening skickas bara de ändrade segmenten till upstream; övriga resultat återanvänds och allt
+fogas ihop som i ChunkingAnalyzer. Prompt-tokens och latens följer därför ändringens storlek
+istället för textens.
+
+Segmenten skickas utan omgivande text (som i ChunkingAnalyzer), så förslag som gäller hela
+texten kan bli per stycke. En hopfogad generering som hamnar utanför hela textens ordgränser
+kastas och texten genereras om i ett anrop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any, TypeVar
+
+from ..models.llm import Tone
+from ..utils.metrics import REGISTRY
+from .analyzer import MAX_SUGGESTIONS, MIN_WORD_COUNT, WORD_COUNT_MARGIN, Analyzer, StreamEvent
+from .cache import ResponseCache, make_cache_key
+from .chunking import Chunk, merge_analyses, split_segments
+from .prompts import PROMPT_VERSION
+from .tokens import word_bounds
+
+# Ett segment ska klara analyzerns ordgränser (minst MIN_WORD_COUNT ord i omskrivningen)
+MIN_SEGMENT_WORDS = 2 * MIN_WORD_COUNT
+
+INCREMENTAL_SEGMENTS = REGISTRY.counter(
+    "incremental_segments",
+    "Segment vid inkrementell analys/generering: reused (från cachen) eller sent (till upstream)",
+    ("operation", "outcome"),
+)
+INCREMENTAL_FALLBACKS = REGISTRY.counter(
+    "incremental_fallbacks",
+    "Hopfogade genereringar utanför textens ordgränser som gjordes om i ett anrop",
+)
+
+T = TypeVar("T")
+
+
+class IncrementalAnalyzer:
+    """Per-segment-cache framför en Analyzer; texter med ett enda segment skickas vidare oförändrade."""
+
+    def __init__(self, inner: Analyzer, cache: ResponseCache, segment_chars: int, concurrency: int) -> None:
+        self.inner = inner
+        self.cache = cache
+        self.segment_chars = segment_chars
+        self.concurrency = max(concurrency, 1)
+
+    def _segments(self, text: str, temperature: float) -> list[Chunk] | None:
+        if not self.cache.should_cache(temperature):
+            return None
+        segments = split_segments(text, self.segment_chars, MIN_SEGMENT_WORDS)
+        return segments if len(segments) > 1 else None
+
+    async def _each(
+        self,
+        operation: str,
+        segments: list[Chunk],
+        temperature: float,
+        key: Callable[[str], str],
+        call: Callable[[str], Awaitable[T]],
+        encode: Callable[[T], dict[str, Any]],
+        decode: Callable[[dict[str, Any]], T],
+    ) -> list[T]:
+        """Cachade segment återanvänds; övriga körs parallellt (högst `concurrency`) och sparas."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def one(segment_text: str) -> T:
+            segment_key = key(segment_text)
+            cached = await self.cache.get_json(segment_key)
+            if cached is not None:
+                INCREMENTAL_SEGMENTS.labels(operation, "reused").inc()
+                return decode(cached)
+            INCREMENTAL_SEGMENTS.labels(operation, "sent").inc()
+            async with semaphore:
+                result = await call(segment_text)
+            await self.cache.set_json(segment_key, encode(result), temperature)
+            return result
+
+        return await asyncio.gather(*(one(segment.text) for segment in segments))
+
+    async def _analyze_segments(
+        self, segments: list[Chunk], temperature: float
+    ) -> tuple[list[str], Tone, str]:
+        results = await self._each(
+            "analyze",
+            segments,
+            temperature,
+            lambda t: make_cache_key("analyze_segment", t, temperature, prompt_version=PROMPT_VERSION),
+            lambda t: self.inner.analyze_text(t, temperature=temperature),
+            lambda r: {"suggestions": r[0], "tone": r[1], "alternative_text": r[2]},
+            lambda d: (d["suggestions"], d["tone"], d["alternative_text"]),
+        )
+        return merge_analyses(segments, results, MAX_SUGGESTIONS)
+
+    async def analyze_text(self, text: str, temperature: float = 0.7) -> tuple[list[str], Tone, str]:
+        segments = self._segments(text, temperature)
+        if segments is None:
+            return await self.inner.analyze_text(text, temperature=temperature)
+        return await self._analyze_segments(segments, temperature)
+
+    async def generate_text(self, text: str, selected_suggestions: list[str], temperature: float = 0.7) -> str:
+        segments = self._segments(text, temperature)
+        if segments is None or not selected_suggestions:
+            return await self.inner.generate_text(text, selected_suggestions, temperature=temperature)
+        results = await self._each(
+            "generate",
+            segments,
+            temperature,
+            lambda t: make_cache_key(
+                "generate_segment", t, temperature, selected_suggestions, prompt_version=PROMPT_VERSION
+            ),
+            lambda t: self.inner.generate_text(t, selected_suggestions, temperature=temperature),
+            lambda r: {"generated_text": r},
+            lambda d: str(d["generated_text"]),
+        )
+        generated = "".join(result + segment.separator for segment, result in zip(segments, results, strict=True))
+        bounds = word_bounds(text, WORD_COUNT_MARGIN, MIN_WORD_COUNT)
+        if bounds.min_words <= len(generated.split()) <= bounds.max_words:
+            return generated
+        INCREMENTAL_FALLBACKS.inc()
+        return await self.inner.generate_text(text, selected_suggestions, temperature=temperature)
+
+    async def stream_analyze(self, text: str, temperature: float = 0.7) -> AsyncIterator[StreamEvent]:
+        segments = self._segments(text, temperature)
+        if segments is None:
+            async for event in self.inner.stream_analyze(text, temperature=temperature):
+                yield event
+            return
+        # Sammanslagningen kräver alla segment, så händelserna skickas när allt är klart
+        suggestions, tone, alternative_text = await self._analyze_segments(segments, temperature)
+        for suggestion in suggestions:
+            yield "suggestion", suggestion
+        yield "tone", tone
+        yield "alternative_text", alternative_text
+        yield "result", {"suggestions": suggestions, "tone": tone, "alternative_text": alternative_text}
+
+    async def stream_generate(
+        self, text: str, selected_suggestions: list[str], temperature: float = 0.7
+    ) -> AsyncIterator[StreamEvent]:
+        if self._segments(text, temperature) is None or not selected_suggestions:
+            async for event in self.inner.stream_generate(text, selected_suggestions, temperature=temperature):
+                yield event
+            return
+        generated = await self.generate_text(text, selected_suggestions, temperature=temperature)
+        yield "delta", generated
+        yield "result", {"generated_text": generated}
@@ -0,0 +1,342 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from contextlib import suppress
+from pathlib import Path
+from typing import Any
+
+from fastapi import HTTPException
+
+from ..models.schemas import (
+    AnalyzeJobRequest,
+    AnalyzeRequest,
+    GenerateJobRequest,
+    GenerateRequest,
+    JobResponse,
+)
+from ..utils.config import Settings, get_settings
+from ..utils.serialization import dumps_str, loads
+from .analyzer import Analyzer
+
+TERMINAL_STATUSES = {"succeeded", "failed"}
+POLL_SECONDS = 1.0  # Med flera processer kan jobbet köras i en annan worker; läs om databasen
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def _to_response(row: sqlite3.Row) -> JobResponse:
+    started_at = row["started_at"]
+    finished_at = row["finished_at"]
+    return JobResponse(
+        id=row["id"],
+        kind=row["kind"],
+        status=row["status"],
+        created_at=row["created_at"],
+        started_at=started_at,
+        finished_at=finished_at,
+        queue_ms=round((started_at - row["created_at"]) * 1000, 1) if started_at else None,
+        run_ms=round((finished_at - started_at) * 1000, 1) if finished_at and started_at else None,
+        result=loads(row["result"]) if row["result"] else None,
+        error=loads(row["error"]) if row["error"] else None,
+    )
+
+
+class JobStore:
+    """SQLite-persistens för jobb så att köade och avbrutna jobb överlever omstarter."""
+
+    def __init__(self, path: str | Path) -> None:
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def _execute(self, sql: str, params: tuple[Any, ...]) -> int:
+        with self._lock:
+            rowcount = self._conn.execute(sql, params).rowcount
+            self._conn.commit()
+            return rowcount
+
+    def _fetchone(self, sql: str, params: tuple[Any, ...]) -> sqlite3.Row | None:
+        with self._lock:
+            row: sqlite3.Row | None = self._conn.execute(sql, params).fetchone()
+            return row
+
+    async def insert(self, job_id: str, kind: str, request: str, created_at: float) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "INSERT INTO jobs (id, kind, status, request, created_at) VALUES (?, ?, 'queued', ?, ?)",
+            (job_id, kind, request, created_at),
+        )
+
+    async def claim(self, job_id: str, started_at: float) -> bool:
+        """Markera ett köat jobb som running; False om en annan worker redan tagit det."""
+        updated = await asyncio.to_thread(
+            self._execute,
+            "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ? AND status = 'queued'",
+            (started_at, job_id),
+        )
+        return updated == 1
+
+    async def mark_finished(
+        self,
+        job_id: str,
+        status: str,
+        finished_at: float,
+        result: dict[str, Any] | None = None,
+        error: dict[str, Any] | None = None,
+    ) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ? WHERE id = ?",
+            (
+                status,
+                finished_at,
+                dumps_str(result) if result is not None else None,
+                dumps_str(error) if error is not None else None,
+                job_id,
+            ),
+        )
+
+    async def get(self, job_id: str) -> JobResponse | None:
+        row = await asyncio.to_thread(self._fetchone, "SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return _to_response(row) if row is not None else None
+
+    async def get_request(self, job_id: str) -> tuple[str, str] | None:
+        row = await asyncio.to_thread(
+            self._fetchone, "SELECT kind, request FROM jobs WHERE id = ?", (job_id,)
+        )
+        return (row["kind"], row["request"]) if row is not None else None
+
+    def recover_running(self) -> int:
+        """Jobb som körde vid förra avstängningen blir köade igen.
+
+        Får bara köras när ingen annan process kör jobb (en gång innan workers forkas).
+        """
+        return self._execute(
+            "UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'", ()
+        )
+
+    def queued_ids(self) -> list[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at"
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def requeue_unfinished(self) -> list[str]:
+        """Jobb som var köade eller körde vid förra avstängningen läggs i kö igen."""
+        self.recover_running()
+        return self.queued_ids()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class JobQueue:
+    """Asynkron jobbkö: POST /jobs lägger till, en pool av asyncio-workers kör via Analyzer.
+
+    Kön är begränsad (QueueFullError -> HTTP 429). Statusändringar publiceras till
+    prenumeranter så att long-poll och SSE kan vänta utan att polla databasen.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        analyzer_factory: Callable[[], Analyzer],
+        workers: int,
+        max_queued: int,
+        timeout_seconds: float,
+        recover_running: bool = True,
+    ) -> None:
+        self.store = store
+        self.analyzer_factory = analyzer_factory
+        self.workers = workers
+        self.max_queued = max_queued
+        self.timeout_seconds = timeout_seconds
+        self.recover_running = recover_running
+        self.active = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._draining = False
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._tasks: list[asyncio.Task[None]] = []
+        self._subscribers: dict[str, set[asyncio.Queue[JobResponse]]] = {}
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    async def start(self) -> None:
+        load = self.store.requeue_unfinished if self.recover_running else self.store.queued_ids
+        for job_id in await asyncio.to_thread(load):
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, drain_seconds: float = 0.0) -> None:
+        """Sluta ta nya jobb och låt pågående bli klara i högst `drain_seconds`."""
+        self._draining = True
+        if drain_seconds > 0:
+            with suppress(TimeoutError):
+                await asyncio.wait_for(self._idle.wait(), timeout=drain_seconds)
+        # Avbrutna jobb står kvar som "running" och köas om vid nästa start
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, job: AnalyzeJobRequest | GenerateJobRequest) -> JobResponse:
+        if self._queue.qsize() >= self.max_queued:
+            raise QueueFullError
+        job_id = uuid.uuid4().hex
+        created_at = time.time()
+        await self.store.insert(job_id, job.kind, job.request.model_dump_json(), created_at)
+        self._queue.put_nowait(job_id)
+        return JobResponse(id=job_id, kind=job.kind, status="queued", created_at=created_at)
+
+    async def get(self, job_id: str) -> JobResponse | None:
+        return await self.store.get(job_id)
+
+    def subscribe(self, job_id: str) -> asyncio.Queue[JobResponse]:
+        updates: asyncio.Queue[JobResponse] = asyncio.Queue()
+        self._subscribers.setdefault(job_id, set()).add(updates)
+        return updates
+
+    def unsubscribe(self, job_id: str, updates: asyncio.Queue[JobResponse]) -> None:
+        subscribers = self._subscribers.get(job_id)
+        if subscribers is not None:
+            subscribers.discard(updates)
+            if not subscribers:
+                del self._subscribers[job_id]
+
+    async def wait(self, job_id: str, timeout: float) -> JobResponse | None:
+        """Long-poll: vänta tills jobbet är klart eller timeout, returnera senaste status."""
+        updates = self.subscribe(job_id)
+        try:
+            job = await self.store.get(job_id)
+            deadline = time.monotonic() + timeout
+            while job is not None and job.status not in TERMINAL_STATUSES:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                job = await self.next_update(job_id, updates, remaining)
+            return job
+        finally:
+            self.unsubscribe(job_id, updates)
+
+    async def next_update(
+        self, job_id: str, updates: asyncio.Queue[JobResponse], timeout: float
+    ) -> JobResponse | None:
+        """Nästa publicerade status, eller aktuell status ur databasen efter högst POLL_SECONDS."""
+        try:
+            return await asyncio.wait_for(updates.get(), timeout=min(timeout, POLL_SECONDS))
+        except TimeoutError:
+            return await self.store.get(job_id)
+
+    async def _publish(self, job_id: str) -> None:
+        if job_id not in self._subscribers:
+            return
+        job = await self.store.get(job_id)
+        if job is None:
+            return
+        for updates in self._subscribers.get(job_id, ()):
+            updates.put_nowait(job)
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            if self._draining:
+                # Jobbet står kvar som köat i databasen och tas vid nästa start
+                self._queue.task_done()
+                continue
+            self.active += 1
+            self._idle.clear()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logging.error(f"Job {job_id} crashed: {e}")
+            finally:
+                self.active -= 1
+                if self.active == 0:
+                    self._idle.set()
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        stored = await self.store.get_request(job_id)
+        if stored is None:
+            return
+        kind, raw_request = stored
+        if not await self.store.claim(job_id, time.time()):
+            return
+        await self._publish(job_id)
+
+        try:
+            result = await asyncio.wait_for(
+                self._execute(kind, raw_request), timeout=self.timeout_seconds
+            )
+        except TimeoutError:
+            error = {"code": "job_timeout", "message": f"Job exceeded {self.timeout_seconds:.0f}s"}
+            await self.store.mark_finished(job_id, "failed", time.time(), error=error)
+        except HTTPException as exc:
+            error = {"code": f"http_error_{exc.status_code}", "message": str(exc.detail)}
+            await self.store.mark_finished(job_id, "failed", time.time(), error=error)
+        except Exception as exc:
+            logging.error(f"Job {job_id} failed: {exc}")
+            error = {"code": "internal_error", "message": "Internal server error"}
+            await self.store.mark_finished(job_id, "failed", time.time(), error=error)
+        else:
+            await self.store.mark_finished(job_id, "succeeded", time.time(), result=result)
+        await self._publish(job_id)
+
+    async def _execute(self, kind: str, raw_request: str) -> dict[str, Any]:
+        analyzer = self.analyzer_factory()
+        if kind == "analyze":
+            req = AnalyzeRequest.model_validate_json(raw_request)
+            suggestions, tone, alternative_text = await analyzer.analyze_text(
+                req.text.strip(), temperature=req.temperature
+            )
+            return {"suggestions": suggestions[:3], "tone": tone, "alternative_text": alternative_text}
+        gen = GenerateRequest.model_validate_json(raw_request)
+        selected = [
+            s for s, chosen in zip(gen.suggestions, gen.selected_suggestions, strict=True) if chosen
+        ]
+        generated = await analyzer.generate_text(gen.text.strip(), selected, temperature=gen.temperature)
+        return {"generated_text": generated}
+
+
+def create_job_queue(
+    analyzer_factory: Callable[[], Analyzer], config: Settings | None = None
+) -> JobQueue:
+    config = config or get_settings()
+    return JobQueue(
+        JobStore(config.data_path(config.jobs_db_path)),
+        analyzer_factory,
+        workers=config.jobs_workers,
+        max_queued=config.jobs_max_queued,
+        timeout_seconds=config.jobs_timeout_seconds,
+        recover_running=config.jobs_recover_running,
+    )
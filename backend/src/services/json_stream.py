@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+ANALYZE_ROOT_FIELDS = {"tone", "alternative_text"}
+SUGGESTIONS_KEY = "suggestions"
+STREAMED_TEXT_KEY = "alternative_text"
+REPLACEMENT_CHAR = "\ufffd"  # Ersätter surrogat utan par; ensamma surrogat går inte att serialisera
+HIGH_SURROGATES = range(0xD800, 0xDC00)
+LOW_SURROGATES = range(0xDC00, 0xE000)
+
+_SIMPLE_ESCAPES = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+
+@dataclass
+class _Container:
+    kind: str  # "object" | "array"
+    key: str | None  # nyckeln containern ligger under i föräldern
+    current_key: str | None = None
+    expecting_key: bool = True
+
+
+@dataclass
+class AnalyzeStreamParser:
+    """Inkrementell JSON-parser för LLM-svaret från /analyze.
+
+    Matas med godtyckliga textbitar (tokens) och returnerar händelser så fort ett fält är
+    komplett: varje förslag i "suggestions", "tone" och "alternative_text". För
+    alternative_text returneras även deltan medan strängen fortfarande skrivs.
+    Text före första "{" (t.ex. ```json-staket) ignoreras, liksom allt efter rotobjektet.
+    """
+
+    done: bool = False
+    _stack: list[_Container] = field(default_factory=list)
+    _in_string: bool = False
+    _string_is_key: bool = False
+    _escape: str | None = None
+    _high_surrogate: int | None = None  # Första halvan av ett surrogatpar, t.ex. en emoji
+    _buffer: list[str] = field(default_factory=list)
+    _emitted_len: int = 0
+
+    def feed(self, chunk: str) -> list[tuple[str, str]]:
+        events: list[tuple[str, str]] = []
+        for ch in chunk:
+            if self.done:
+                break
+            if self._in_string:
+                self._feed_string_char(ch, events)
+            else:
+                self._feed_structural_char(ch)
+        if self._in_string and self._is_streamed_text():
+            text = "".join(self._buffer)
+            if len(text) > self._emitted_len:
+                events.append(("alternative_text_delta", text[self._emitted_len :]))
+                self._emitted_len = len(text)
+        return events
+
+    def _feed_string_char(self, ch: str, events: list[tuple[str, str]]) -> None:
+        if self._escape is not None:
+            self._escape += ch
+            if self._escape.startswith("u"):
+                if len(self._escape) == 5:
+                    self._append_unicode_escape(self._escape)
+                    self._escape = None
+                return
+            self._append(_SIMPLE_ESCAPES.get(ch, ch))
+            self._escape = None
+        elif ch == "\\":
+            self._escape = ""
+        elif ch == '"':
+            self._flush_surrogate()
+            self._in_string = False
+            self._end_string(events)
+        else:
+            self._append(ch)
+
+    def _append(self, text: str) -> None:
+        self._flush_surrogate()
+        self._buffer.append(text)
+
+    def _flush_surrogate(self) -> None:
+        if self._high_surrogate is not None:
+            self._buffer.append(REPLACEMENT_CHAR)
+            self._high_surrogate = None
+
+    def _append_unicode_escape(self, escape: str) -> None:
+        """Avkoda \\uXXXX; ett surrogatpar (\\ud83d\\ude00) blir ett tecken utanför BMP."""
+        try:
+            code = int(escape[1:], 16)
+        except ValueError:
+            self._append(escape)
+            return
+        if code in HIGH_SURROGATES:
+            # Hålls tillbaka tills andra halvan kommit, så att inget delta delar paret
+            self._flush_surrogate()
+            self._high_surrogate = code
+        elif code in LOW_SURROGATES:
+            high, self._high_surrogate = self._high_surrogate, None
+            if high is None:
+                self._buffer.append(REPLACEMENT_CHAR)
+            else:
+                self._buffer.append(chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00)))
+        else:
+            self._append(chr(code))
+
+    def _feed_structural_char(self, ch: str) -> None:
+        top = self._stack[-1] if self._stack else None
+        if top is None:
+            if ch == "{":
+                self._stack.append(_Container("object", None))
+            return
+        if ch == '"':
+            self._in_string = True
+            self._string_is_key = top.kind == "object" and top.expecting_key
+            self._buffer = []
+            self._emitted_len = 0
+        elif ch in "{[":
+            key = top.current_key if top.kind == "object" else top.key
+            self._stack.append(_Container("object" if ch == "{" else "array", key))
+        elif ch in "}]":
+            self._stack.pop()
+            if not self._stack:
+                self.done = True
+        elif ch == ":" and top.kind == "object":
+            top.expecting_key = False
+        elif ch == "," and top.kind == "object":
+            top.expecting_key = True
+
+    def _end_string(self, events: list[tuple[str, str]]) -> None:
+        value = "".join(self._buffer)
+        top = self._stack[-1]
+        if self._string_is_key:
+            top.current_key = value
+            return
+        if len(self._stack) == 1 and top.current_key in ANALYZE_ROOT_FIELDS:
+            if top.current_key == STREAMED_TEXT_KEY and len(value) > self._emitted_len:
+                events.append(("alternative_text_delta", value[self._emitted_len :]))
+            events.append((top.current_key, value))
+        elif len(self._stack) == 2 and top.kind == "array" and top.key == SUGGESTIONS_KEY:
+            events.append(("suggestion", value))
+        self._emitted_len = len(value)
+
+    def _is_streamed_text(self) -> bool:
+        return (
+            not self._string_is_key
+            and len(self._stack) == 1
+            and self._stack[0].current_key == STREAMED_TEXT_KEY
+        )
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+from collections.abc import AsyncGenerator, AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any, Protocol
+
+import httpx
+
+from ..utils.config import Settings, get_settings
+from ..utils.instrumentation import LLM_TOKENS, upstream_attempt
+from ..utils.serialization import loads
+from .governor import Permit
+from .http_client import create_http_client
+
+SERVER_ERROR_CODE = 500
+SSE_DATA_PREFIX = "data:"
+SSE_DONE = "[DONE]"
+
+DEEPSEEK_BASE_URL = "https://api.deepseek.com/v1"
+DEEPSEEK_MODEL = "deepseek-chat"
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+OPENAI_MODEL = "gpt-4o-mini"
+MOCK_BASE_URL = "http://mock-llm/v1"  # Når den in-process-monterade stubben
+MOCK_MODEL = "mock-chat"
+
+
+def record_usage(operation: str, usage: dict[str, Any], permit: Permit) -> None:
+    """Räkna tokens ur svarets usage-block och justera governorns token bucket.
+
+    DeepSeek anger prefix-cachens träffar som prompt_cache_hit_tokens/_miss_tokens,
+    OpenAI som prompt_tokens_details.cached_tokens.
+    """
+    if "total_tokens" in usage:
+        permit.used_tokens = usage["total_tokens"]
+    prompt_tokens = int(usage.get("prompt_tokens") or 0)
+    LLM_TOKENS.labels(operation, "prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels(operation, "completion").inc(int(usage.get("completion_tokens") or 0))
+    hit = usage.get("prompt_cache_hit_tokens")
+    if hit is None:
+        hit = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+    if hit is not None:
+        miss = usage.get("prompt_cache_miss_tokens", prompt_tokens - int(hit))
+        LLM_TOKENS.labels(operation, "prompt_cache_hit").inc(int(hit))
+        LLM_TOKENS.labels(operation, "prompt_cache_miss").inc(int(miss))
+
+
+class LLMBackend(Protocol):
+    """Transport mot en chat completions-upstream; prompter, retries och governor ligger i analyzern."""
+
+    name: str
+    model: str
+
+    async def complete(self, payload: dict[str, Any], operation: str, permit: Permit) -> dict[str, Any]: ...
+
+    def stream(
+        self, payload: dict[str, Any], operation: str, permit: Permit
+    ) -> AsyncGenerator[str, None]: ...
+
+
+class OpenAICompatibleBackend:
+    """Valfri upstream med OpenAI:s /chat/completions-format (DeepSeek, OpenAI, vLLM, mock, ...)."""
+
+    name = "openai"
+
+    def __init__(
+        self,
+        base_url: str,
+        api_key: str | None,
+        model: str,
+        client: httpx.AsyncClient | None = None,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.url = f"{self.base_url}/chat/completions"
+        self.api_key = api_key
+        self.model = model
+        # Delad klient från app-lifespan; None = kortlivad klient per anrop (skript/tester)
+        self.client = client
+
+    @asynccontextmanager
+    async def _client_scope(self) -> AsyncIterator[httpx.AsyncClient]:
+        if self.client is not None:
+            yield self.client
+            return
+        async with create_http_client() as client:
+            yield client
+
+    def _headers(self) -> dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+    async def complete(self, payload: dict[str, Any], operation: str, permit: Permit) -> dict[str, Any]:
+        async with self._client_scope() as client:
+            with upstream_attempt(operation) as attempt:
+                resp = await client.post(self.url, json=payload, headers=self._headers())
+                attempt.outcome = str(resp.status_code)
+            permit.observe(resp)
+            if resp.status_code >= SERVER_ERROR_CODE:
+                raise httpx.HTTPStatusError("Server error", request=resp.request, response=resp)
+            resp.raise_for_status()
+            # orjson direkt på bytes; resp.json() går via charset-detektering och json.loads
+            data: dict[str, Any] = loads(resp.content)
+            record_usage(operation, data.get("usage") or {}, permit)
+        return data
+
+    async def stream(
+        self, payload: dict[str, Any], operation: str, permit: Permit
+    ) -> AsyncGenerator[str, None]:
+        """Anropa upstream med stream=true och ge content-deltan från SSE-flödet.
+
+        Med include_usage skickar upstream en sista chunk utan choices men med usage.
+        """
+        body = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+        async with self._client_scope() as client, client.stream(
+            "POST", self.url, json=body, headers=self._headers()
+        ) as resp:
+            # Strömmade försök mäts till sista token
+            with upstream_attempt(operation) as attempt:
+                attempt.outcome = str(resp.status_code)
+                permit.observe(resp)
+                if resp.status_code >= SERVER_ERROR_CODE:
+                    raise httpx.HTTPStatusError("Server error", request=resp.request, response=resp)
+                if resp.is_error:
+                    await resp.aread()
+                    resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if not line.startswith(SSE_DATA_PREFIX):
+                        continue
+                    data = line[len(SSE_DATA_PREFIX) :].strip()
+                    if data == SSE_DONE:
+                        return
+                    chunk = loads(data)
+                    if chunk.get("usage"):
+                        record_usage(operation, chunk["usage"], permit)
+                    choices = chunk.get("choices") or [{}]
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta:
+                        yield delta
+
+
+class DeepSeekBackend(OpenAICompatibleBackend):
+    name = "deepseek"
+
+    def __init__(
+        self,
+        api_key: str | None,
+        client: httpx.AsyncClient | None = None,
+        base_url: str = DEEPSEEK_BASE_URL,
+        model: str = DEEPSEEK_MODEL,
+    ) -> None:
+        super().__init__(base_url, api_key, model, client)
+
+
+class MockBackend(OpenAICompatibleBackend):
+    """Lokal stub (src.mock_llm); utan bas-URL körs den in-process via ASGITransport.
+
+    In-process buffras hela svaret innan det läses, så strömmade anrop kommer i ett svep.
+    Kör `python -m src.mock_llm` och peka LLM_BASE_URL dit för riktig strömning över nätverk.
+    """
+
+    name = "mock"
+
+    def __init__(
+        self, base_url: str = "", client: httpx.AsyncClient | None = None, model: str = MOCK_MODEL
+    ) -> None:
+        if not base_url:
+            base_url, client = MOCK_BASE_URL, get_mock_client()
+        super().__init__(base_url, "mock-key", model, client)
+
+
+_mock_client: httpx.AsyncClient | None = None
+
+
+def get_mock_client() -> httpx.AsyncClient:
+    global _mock_client
+    if _mock_client is None:
+        # Fördröjd import: stubben (FastAPI-app) laddas bara när den faktiskt används
+        from ..mock_llm import create_mock_app
+
+        _mock_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_mock_app()))
+    return _mock_client
+
+
+def create_llm_backend(client: httpx.AsyncClient | None = None, config: Settings | None = None) -> LLMBackend:
+    config = config or get_settings()
+    if config.llm_backend == "mock":
+        return MockBackend(config.llm_base_url, client, config.llm_model or MOCK_MODEL)
+    if config.llm_backend == "openai":
+        return OpenAICompatibleBackend(
+            config.llm_base_url or OPENAI_BASE_URL,
+            config.llm_api_key,
+            config.llm_model or OPENAI_MODEL,
+            client,
+        )
+    return DeepSeekBackend(
+        config.deepseek_api_key or config.llm_api_key,
+        client,
+        base_url=config.llm_base_url or DEEPSEEK_BASE_URL,
+        model=config.llm_model or DEEPSEEK_MODEL,
+    )
@@ -0,0 +1,190 @@
+"""Spekulativ förhämtning av /generate direkt efter en analys.
+
+Efter /analyze väljer användaren förslag och anropar /generate; oftast med alla förslag valda.
+Prefetcher startar generate_text i bakgrunden för de mest sannolika valen (alla förslag, sedan
+alla utom ett, från sista förslaget och bakåt) och sparar tasken i en kortlivad, begränsad
+tabell nyckad på text, temperatur och valda förslag. Ett /generate som matchar tar resultatet
+direkt eller väntar in den pågående tasken istället för att göra ett nytt upstream-anrop.
+
+Spekulationen får aldrig tränga undan riktig trafik: den hoppas över när för många förhämtningar
+redan pågår, när kostnadsbudgeten (uppskattade tokens per minut) är slut eller när kretsen mot
+upstream inte är stängd. Oanvända resultat som löper ut eller trängs undan räknas som "wasted".
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import logging
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Sequence
+from contextlib import suppress
+from dataclasses import dataclass
+
+from ..utils.client import RequestClass, request_class_var
+from ..utils.config import Settings, get_settings
+from ..utils.metrics import REGISTRY
+from .analyzer import MIN_WORD_COUNT, WORD_COUNT_MARGIN, Analyzer
+from .cache import make_cache_key
+from .governor import TokenBucket, UpstreamGovernor, get_governor
+from .prompts import PROMPT_VERSION
+from .tokens import estimate_tokens, generate_max_tokens, word_bounds
+
+PREFETCH_EVENTS = REGISTRY.counter(
+    "prefetch_events",
+    "Förhämtning av /generate: scheduled, hit, hit_inflight, miss, wasted, failed, skipped_*",
+    ("outcome",),
+)
+
+
+@dataclass
+class _Entry:
+    task: asyncio.Task[str]
+    expires_at: float
+
+
+def likely_selections(suggestions: Sequence[str], count: int) -> list[list[str]]:
+    """De `count` mest sannolika valen: alla förslag, sedan alla utom ett (sista först)."""
+    selections = [list(suggestions)]
+    if len(suggestions) > 1:
+        for skipped in reversed(range(len(suggestions))):
+            selections.append([s for i, s in enumerate(suggestions) if i != skipped])
+    return selections[: max(count, 0)]
+
+
+def estimate_generate_tokens(text: str, selected: Sequence[str]) -> int:
+    # Samma storleksordning som governorns uppskattning av generate-payloaden
+    bounds = word_bounds(text, WORD_COUNT_MARGIN, MIN_WORD_COUNT)
+    prompt = estimate_tokens(text) + sum(estimate_tokens(s) for s in selected)
+    return prompt + generate_max_tokens(bounds)
+
+
+class Prefetcher:
+    def __init__(
+        self,
+        max_inflight: int,
+        max_entries: int,
+        ttl_seconds: float,
+        tokens_per_minute: float,
+        selections: int,
+        governor: UpstreamGovernor | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_inflight = max(max_inflight, 1)
+        self.max_entries = max(max_entries, 1)
+        self.ttl_seconds = ttl_seconds
+        self.selections = selections
+        self.governor = governor or get_governor()
+        # 0 tokens/min = ingen kostnadsgräns, bara samtidighetsgränsen
+        self.budget = TokenBucket(tokens_per_minute / 60, tokens_per_minute, clock)
+        self._clock = clock
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def inflight(self) -> int:
+        return sum(not entry.task.done() for entry in self._entries.values())
+
+    @staticmethod
+    def key(text: str, selected: Sequence[str], temperature: float) -> str:
+        return make_cache_key("generate", text, temperature, selected, prompt_version=PROMPT_VERSION)
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        PREFETCH_EVENTS.labels("wasted").inc()
+        if not entry.task.done():
+            entry.task.cancel()
+
+    def _expire(self) -> None:
+        now = self._clock()
+        for key in [k for k, entry in self._entries.items() if entry.expires_at <= now]:
+            self._discard(key)
+
+    def _within_budget(self, cost: float) -> bool:
+        if self.budget.reserve(cost) > 0:
+            # Lämna tillbaka; hellre ingen spekulation än att vänta på budget
+            self.budget.adjust(-min(cost, self.budget.capacity))
+            return False
+        return True
+
+    def schedule(self, analyzer: Analyzer, text: str, suggestions: Sequence[str], temperature: float) -> int:
+        """Starta förhämtning för de sannolika valen; returnerar antalet startade tasks."""
+        self._expire()
+        started = 0
+        for selected in likely_selections(suggestions, self.selections):
+            key = self.key(text, selected, temperature)
+            if key in self._entries:
+                continue
+            # Återhämtning efter en öppen krets provas av riktig trafik, inte av spekulation
+            if self.governor.breaker.state != "closed":
+                PREFETCH_EVENTS.labels("skipped_circuit").inc()
+                break
+            if self.inflight() >= self.max_inflight:
+                PREFETCH_EVENTS.labels("skipped_concurrency").inc()
+                break
+            if not self._within_budget(estimate_generate_tokens(text, selected)):
+                PREFETCH_EVENTS.labels("skipped_budget").inc()
+                break
+            while len(self._entries) >= self.max_entries:
+                self._discard(next(iter(self._entries)))
+            # Spekulationen köar som batch så att den aldrig går före riktiga interaktiva anrop
+            context = contextvars.copy_context()
+            context.run(request_class_var.set, RequestClass(request_class_var.get().client, "batch"))
+            task = asyncio.create_task(
+                analyzer.generate_text(text, selected, temperature=temperature), context=context
+            )
+            task.add_done_callback(self._on_done)
+            self._entries[key] = _Entry(task, self._clock() + self.ttl_seconds)
+            PREFETCH_EVENTS.labels("scheduled").inc()
+            started += 1
+        return started
+
+    @staticmethod
+    def _on_done(task: asyncio.Task[str]) -> None:
+        # Hämta ut felet så att asyncio inte loggar "exception was never retrieved"
+        if not task.cancelled() and task.exception() is not None:
+            PREFETCH_EVENTS.labels("failed").inc()
+
+    async def take(self, text: str, selected: Sequence[str], temperature: float) -> str | None:
+        """Förhämtad text för exakt detta val, annars None (även om förhämtningen misslyckades)."""
+        self._expire()
+        entry = self._entries.pop(self.key(text, selected, temperature), None)
+        if entry is None:
+            PREFETCH_EVENTS.labels("miss").inc()
+            return None
+        outcome = "hit" if entry.task.done() else "hit_inflight"
+        try:
+            # shield: avbryts anroparen får tasken ändå köra klart (resultatet går då förlorat)
+            generated = await asyncio.shield(entry.task)
+        except asyncio.CancelledError:
+            if not entry.task.cancelled():
+                raise
+            generated = None
+        except Exception as e:
+            logging.error(f"Prefetched generation failed, generating again: {e}")
+            generated = None
+        PREFETCH_EVENTS.labels(outcome if generated is not None else "miss").inc()
+        return generated
+
+    async def close(self) -> None:
+        for key in list(self._entries):
+            entry = self._entries[key]
+            self._discard(key)
+            with suppress(asyncio.CancelledError, Exception):
+                await entry.task
+
+
+def create_prefetcher(config: Settings | None = None) -> Prefetcher | None:
+    """Skapas i lifespan (tasks hör till event loopen); None om PREFETCH_ENABLED=false."""
+    config = config or get_settings()
+    if not config.prefetch_enabled:
+        return None
+    return Prefetcher(
+        config.prefetch_max_inflight,
+        config.prefetch_max_entries,
+        config.prefetch_ttl_seconds,
+        config.prefetch_tokens_per_minute,
+        config.prefetch_selections,
+    )
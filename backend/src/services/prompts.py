@@ -0,0 +1,68 @@
+"""Versionerade promptmallar som läses in en gång per process.
+
+Instruktionerna ligger i system-meddelandet och är byte-identiska mellan anrop, så att
+upstreams prefix-cache (DeepSeek: context caching) kan återanvändas. Allt som varierar per
+anrop (text, ordgränser, valda förslag) ligger sist, i user-meddelandet.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from pathlib import Path
+from string import Template
+
+PROMPTS_DIR = Path(__file__).resolve().parent.parent / "prompts"
+PROMPT_VERSION = "2"  # Bumpa (ny katalog) vid promptändringar så cachade svar invalideras
+PREFIX_HASH_LENGTH = 12
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    name: str
+    system: str
+    user: Template
+
+    @property
+    def prefix_hash(self) -> str:
+        """Kort hash av det statiska prefixet; ändras den slutar upstreams prefix-cache träffa."""
+        return hashlib.sha256(self.system.encode()).hexdigest()[:PREFIX_HASH_LENGTH]
+
+    def messages(self, **values: object) -> list[dict[str, str]]:
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": self.user.substitute(values)},
+        ]
+
+
+@dataclass(frozen=True)
+class PromptSet:
+    version: str
+    analyze: PromptTemplate
+    generate: PromptTemplate
+
+
+def _load_template(directory: Path, name: str) -> PromptTemplate:
+    system = (directory / f"{name}.system.txt").read_text(encoding="utf-8").rstrip("\n")
+    user = (directory / f"{name}.user.txt").read_text(encoding="utf-8").rstrip("\n")
+    return PromptTemplate(name, system, Template(user))
+
+
+def load_prompts(version: str = PROMPT_VERSION, root: Path = PROMPTS_DIR) -> PromptSet:
+    directory = root / f"v{version}"
+    return PromptSet(
+        version=version,
+        analyze=_load_template(directory, "analyze"),
+        generate=_load_template(directory, "generate"),
+    )
+
+
+_prompts: PromptSet | None = None
+
+
+def get_prompts() -> PromptSet:
+    """Processens promptmallar; laddas vid uppstart (lifespan) eller vid första anropet."""
+    global _prompts
+    if _prompts is None:
+        _prompts = load_prompts()
+    return _prompts
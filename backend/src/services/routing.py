@@ -0,0 +1,343 @@
+"""Modellrouting: modell och endpoint väljs per anrop istället för en fast modell.
+
+Varje route är en OpenAI-kompatibel endpoint med en modell och en nivå (LLM_ROUTES,
+"namn=nivå:modell@bas-url"). Nivåerna är fast (snabb, billig) och strong. Analyzern väljer
+nivå per anrop ur operationen och textens längd, och routern väljer route inom nivån efter
+uppmätt p50-latens och felkvot. Det ger tre beteenden:
+
+- Routing: korta texter går till fast, långa texter och operationer i
+  LLM_ROUTE_STRONG_OPERATIONS direkt till strong.
+- Kaskad: underkänns svaret (LLMAnalyzeOutput eller ordgränserna) görs nästa försök på nästa
+  nivå istället för samma modell igen.
+- Failover: fel från en endpoint (transport, 429, 5xx, ...) gör att samma anrop provas mot
+  nästa route i nivån. En route med upprepade fel vilar LLM_ROUTE_COOLDOWN_SECONDS.
+
+I payloaden från analyzern står nivån som "model"; RoutedBackend byter till routens modell.
+Val, failovers och latens per route exponeras på GET /upstream/routes och i /metrics.
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+import time
+from collections import deque
+from collections.abc import AsyncGenerator, Callable
+from contextlib import aclosing
+from dataclasses import dataclass, field
+from typing import Any
+
+import httpx
+
+from ..utils.config import Settings, get_settings
+from ..utils.metrics import REGISTRY
+from .governor import Permit
+from .llm_backend import LLMBackend, MockBackend, OpenAICompatibleBackend
+
+ROUTE_TIERS = ("fast", "strong")  # Kaskadens ordning
+MOCK_ROUTE_URL = "mock"  # Bas-URL för den in-process-monterade stubben
+LATENCY_WINDOW = 100  # Senaste lyckade anropen per route som p50 räknas på
+ERROR_RATE_ALPHA = 0.1  # Vikt för senaste utfallet i felkvotens glidande medelvärde
+ERROR_PENALTY = 10.0  # Poäng = p50 * (1 + ERROR_PENALTY * felkvot)
+DECISION_HISTORY = 200
+
+ROUTE_SELECTIONS = REGISTRY.counter(
+    "llm_route_selections",
+    "Vald nivå per operation och skäl: default, length, operation eller only_tier",
+    ("operation", "tier", "reason"),
+)
+ROUTE_CALLS = REGISTRY.counter(
+    "llm_route_calls",
+    "Upstream-anrop per route och utfall (ok eller error)",
+    ("route", "operation", "outcome"),
+)
+ROUTE_FAILOVERS = REGISTRY.counter(
+    "llm_route_failovers", "Anrop som flyttades till nästa route i nivån efter ett fel", ("tier",)
+)
+ROUTE_ESCALATIONS = REGISTRY.counter(
+    "llm_route_escalations",
+    "Försök som gick vidare till nästa nivå efter underkänd validering eller ordgräns",
+    ("operation", "from_tier", "to_tier"),
+)
+
+
+@dataclass(frozen=True)
+class Route:
+    name: str
+    tier: str
+    model: str
+    base_url: str
+
+
+def parse_route(spec: str) -> Route:
+    """"namn=nivå:modell@bas-url" -> Route; bas-URL "mock" är den lokala stubben."""
+    name, _, rest = spec.strip().partition("=")
+    tier, _, rest = rest.partition(":")
+    model, _, base_url = rest.partition("@")
+    if not (name and model and base_url) or tier not in ROUTE_TIERS:
+        raise ValueError(f"Invalid route {spec!r}; expected name=fast|strong:model@base_url")
+    return Route(name.strip(), tier, model.strip(), base_url.strip())
+
+
+@dataclass
+class RouteStats:
+    latencies: deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+    error_rate: float = 0.0
+    consecutive_failures: int = 0
+    cooldown_until: float = 0.0
+    requests: int = 0
+    failures: int = 0
+
+    def p50(self) -> float | None:
+        if not self.latencies:
+            return None
+        return sorted(self.latencies)[len(self.latencies) // 2]
+
+    def score(self) -> float:
+        # Routes utan mätningar får 0 och provas därför först
+        return (self.p50() or 0.0) * (1 + ERROR_PENALTY * self.error_rate)
+
+
+class ModelRouter:
+    """Nivåval, kaskad och ordningen mellan routes; statistiken delas av alla anrop i processen."""
+
+    def __init__(
+        self,
+        routes: list[Route],
+        fast_max_chars: int,
+        strong_operations: list[str],
+        failure_threshold: int,
+        cooldown_seconds: float,
+        explore_rate: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+        rng: random.Random | None = None,
+    ) -> None:
+        self.routes = routes
+        self.tiers = [tier for tier in ROUTE_TIERS if any(route.tier == tier for route in routes)]
+        self.fast_max_chars = fast_max_chars
+        self.strong_operations = set(strong_operations)
+        self.failure_threshold = max(failure_threshold, 1)
+        self.cooldown_seconds = cooldown_seconds
+        self.explore_rate = explore_rate
+        self.stats = {route.name: RouteStats() for route in routes}
+        self.decisions: deque[dict[str, Any]] = deque(maxlen=DECISION_HISTORY)
+        self._clock = clock
+        self._rng = rng or random.Random()
+
+    def select_tier(self, operation: str, text_chars: int) -> str:
+        """Första försökets nivå: strong för långa texter och utpekade operationer, annars fast."""
+        if len(self.tiers) == 1:
+            tier, reason = self.tiers[0], "only_tier"
+        elif operation in self.strong_operations:
+            tier, reason = self.tiers[-1], "operation"
+        elif text_chars > self.fast_max_chars:
+            tier, reason = self.tiers[-1], "length"
+        else:
+            tier, reason = self.tiers[0], "default"
+        ROUTE_SELECTIONS.labels(operation, tier, reason).inc()
+        return tier
+
+    def escalate(self, tier: str, operation: str) -> str | None:
+        """Nästa nivå i kaskaden; None om `tier` redan är den starkaste (eller inte en nivå)."""
+        if tier not in self.tiers or tier == self.tiers[-1]:
+            return None
+        next_tier = self.tiers[self.tiers.index(tier) + 1]
+        ROUTE_ESCALATIONS.labels(operation, tier, next_tier).inc()
+        self._decide(operation, next_tier, None, "escalated", None)
+        return next_tier
+
+    def candidates(self, tier: str) -> list[Route]:
+        """Nivåns routes i den ordning de ska provas: lägst poäng först, vilande sist."""
+        routes = [route for route in self.routes if route.tier == tier] or self.routes
+        now = self._clock()
+        ready = sorted(
+            (route for route in routes if self.stats[route.name].cooldown_until <= now),
+            key=lambda route: self.stats[route.name].score(),
+        )
+        resting = [route for route in routes if self.stats[route.name].cooldown_until > now]
+        if len(ready) > 1 and self._rng.random() < self.explore_rate:
+            # Håll de andra routernas mätningar färska genom att ibland prova en annan först
+            ready.insert(0, ready.pop(self._rng.randrange(1, len(ready))))
+        return ready + resting
+
+    def record(self, route: Route, operation: str, latency: float, error: Exception | None) -> None:
+        stats = self.stats[route.name]
+        stats.requests += 1
+        stats.error_rate += ERROR_RATE_ALPHA * ((error is not None) - stats.error_rate)
+        if error is None:
+            stats.latencies.append(latency)
+            stats.consecutive_failures = 0
+        else:
+            stats.failures += 1
+            stats.consecutive_failures += 1
+            if stats.consecutive_failures >= self.failure_threshold:
+                stats.cooldown_until = self._clock() + self.cooldown_seconds
+                stats.consecutive_failures = 0
+        outcome = "ok" if error is None else "error"
+        ROUTE_CALLS.labels(route.name, operation, outcome).inc()
+        self._decide(operation, route.tier, route.name, outcome, latency)
+
+    def _decide(
+        self, operation: str, tier: str, route: str | None, outcome: str, latency: float | None
+    ) -> None:
+        self.decisions.append(
+            {
+                "at": time.time(),
+                "operation": operation,
+                "tier": tier,
+                "route": route,
+                "outcome": outcome,
+                "latency_seconds": round(latency, 3) if latency is not None else None,
+            }
+        )
+
+    def snapshot(self) -> dict[str, Any]:
+        now = self._clock()
+        routes = []
+        for route in self.routes:
+            stats = self.stats[route.name]
+            p50 = stats.p50()
+            routes.append(
+                {
+                    "name": route.name,
+                    "tier": route.tier,
+                    "model": route.model,
+                    "base_url": route.base_url,
+                    "latency_p50_seconds": round(p50, 3) if p50 is not None else None,
+                    "latency_samples": len(stats.latencies),
+                    "error_rate": round(stats.error_rate, 3),
+                    "score": round(stats.score(), 3),
+                    "requests": stats.requests,
+                    "failures": stats.failures,
+                    "cooldown_seconds": round(max(stats.cooldown_until - now, 0.0), 3),
+                }
+            )
+        return {
+            "tiers": self.tiers,
+            "fast_max_chars": self.fast_max_chars,
+            "strong_operations": sorted(self.strong_operations),
+            "routes": routes,
+            "decisions": list(self.decisions),
+        }
+
+
+class RoutedBackend:
+    """LLMBackend över routerns routes: payloadens "model" är nivån, failover sker inom nivån."""
+
+    name = "router"
+
+    def __init__(self, router: ModelRouter, backends: dict[str, LLMBackend]) -> None:
+        self.router = router
+        self.backends = backends
+        # Nivån som används när analyzern inte väljer någon (samma som första nivån i kaskaden)
+        self.model = router.tiers[0]
+
+    def _tier(self, payload: dict[str, Any]) -> str:
+        model = str(payload.get("model", ""))
+        return model if model in self.router.tiers else self.model
+
+    async def complete(self, payload: dict[str, Any], operation: str, permit: Permit) -> dict[str, Any]:
+        tier = self._tier(payload)
+        routes = self.router.candidates(tier)
+        for index, route in enumerate(routes):
+            started = time.perf_counter()
+            try:
+                data = await self.backends[route.name].complete(
+                    {**payload, "model": route.model}, operation, permit
+                )
+            except httpx.HTTPError as exc:
+                self.router.record(route, operation, time.perf_counter() - started, exc)
+                if index == len(routes) - 1:
+                    raise
+                logging.error(f"Route {route.name} failed, failing over: {exc!r}")
+                ROUTE_FAILOVERS.labels(tier).inc()
+                continue
+            self.router.record(route, operation, time.perf_counter() - started, None)
+            return data
+        raise AssertionError("unreachable: a tier always has at least one route")
+
+    async def stream(
+        self, payload: dict[str, Any], operation: str, permit: Permit
+    ) -> AsyncGenerator[str, None]:
+        """Som complete(), men failover bara innan första deltat; därefter är det analyzerns retry."""
+        tier = self._tier(payload)
+        routes = self.router.candidates(tier)
+        for index, route in enumerate(routes):
+            started = time.perf_counter()
+            emitted = False
+            try:
+                body = {**payload, "model": route.model}
+                async with aclosing(self.backends[route.name].stream(body, operation, permit)) as deltas:
+                    async for delta in deltas:
+                        emitted = True
+                        yield delta
+            except httpx.HTTPError as exc:
+                self.router.record(route, operation, time.perf_counter() - started, exc)
+                if emitted or index == len(routes) - 1:
+                    raise
+                logging.error(f"Route {route.name} failed, failing over: {exc!r}")
+                ROUTE_FAILOVERS.labels(tier).inc()
+                continue
+            self.router.record(route, operation, time.perf_counter() - started, None)
+            return
+
+
+def create_model_router(config: Settings | None = None) -> ModelRouter | None:
+    config = config or get_settings()
+    if not config.llm_routes:
+        return None
+    return ModelRouter(
+        [parse_route(spec) for spec in config.llm_routes],
+        fast_max_chars=config.llm_route_fast_max_chars,
+        strong_operations=config.llm_route_strong_operations,
+        failure_threshold=config.llm_route_failure_threshold,
+        cooldown_seconds=config.llm_route_cooldown_seconds,
+        explore_rate=config.llm_route_explore_rate,
+    )
+
+
+def create_routed_backend(
+    router: ModelRouter, client: httpx.AsyncClient | None = None, config: Settings | None = None
+) -> RoutedBackend:
+    config = config or get_settings()
+    default_key = config.llm_api_key or config.deepseek_api_key
+    backends: dict[str, LLMBackend] = {}
+    for route in router.routes:
+        if route.base_url == MOCK_ROUTE_URL:
+            backends[route.name] = MockBackend(model=route.model)
+        else:
+            api_key = config.llm_route_api_keys.get(route.name, default_key)
+            backends[route.name] = OpenAICompatibleBackend(route.base_url, api_key, route.model, client)
+    return RoutedBackend(router, backends)
+
+
+_router: ModelRouter | None = None
+_router_created = False
+
+
+def get_model_router() -> ModelRouter | None:
+    """Processens router (None utan LLM_ROUTES); latens och felkvot mäts över alla requests."""
+    global _router, _router_created
+    if not _router_created:
+        _router = create_model_router()
+        _router_created = True
+    return _router
+
+
+def _route_samples() -> dict[tuple[str, ...], float]:
+    router = _router
+    if router is None:
+        return {}
+    samples: dict[tuple[str, ...], float] = {}
+    for route in router.routes:
+        stats = router.stats[route.name]
+        p50 = stats.p50()
+        if p50 is not None:
+            samples[(route.name, "latency_p50_seconds")] = p50
+        samples[(route.name, "error_rate")] = stats.error_rate
+    return samples
+
+
+REGISTRY.gauge(
+    "llm_route", "Per route: p50-latens och felkvot som routern väljer på", ("route", "stat"), _route_samples
+)
@@ -0,0 +1,158 @@
+"""Rättvis köordning för upstream-kapaciteten: prioritet först, sedan viktad rättvisa per klient.
+
+När governorns samtidighetsgräns är nådd köar anropen här istället för i en FIFO. Interaktiv
+trafik (/analyze, /generate och strömmarna) går alltid före batch (/analyze/batch, jobb och
+spekulativ förhämtning). Inom en prioritet används start-time fair queueing: varje anrop får
+starttaggen max(virtuell tid, klientens förra sluttagg) och sluttaggen start + kostnad / vikt,
+där kostnaden är uppskattade tokens. Lägst starttagg släpps först, så en klient med hundra
+köade anrop får lika stor andel som en med ett, och stora texter kostar mer än små.
+
+Kvoter per klient (429 + Retry-After) ligger i governor.ClientQuotas; här finns bara ordningen.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, field
+
+from ..utils.client import Priority, RequestClass
+from ..utils.metrics import REGISTRY
+
+PRIORITY_RANK: dict[Priority, int] = {"interactive": 0, "batch": 1}
+MAX_TRACKED_CLIENTS = 10_000  # Klienter utan köade anrop glöms i LRU-ordning därutöver
+STATUS_MAX_CLIENTS = 100
+MIN_WEIGHT = 0.01
+
+SCHEDULER_WAIT_SECONDS = REGISTRY.histogram(
+    "scheduler_wait_seconds",
+    "Tid i schemaläggarens kö innan en upstream-plats delades ut",
+    ("priority",),
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+
+
+@dataclass
+class ClientStats:
+    weight: float = 1.0
+    last_finish: float = 0.0  # Sluttaggen för klientens senast köade anrop
+    queued: int = 0
+    dispatched: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+
+    def as_dict(self) -> dict[str, float | int]:
+        return {
+            "weight": self.weight,
+            "queued": self.queued,
+            "dispatched": self.dispatched,
+            "wait_avg_ms": round(self.wait_seconds_total / self.dispatched * 1000, 1) if self.dispatched else 0.0,
+            "wait_max_ms": round(self.wait_seconds_max * 1000, 1),
+        }
+
+
+@dataclass(order=True)
+class Waiter:
+    rank: int
+    start: float
+    seq: int
+    request_class: RequestClass = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    future: asyncio.Future[None] = field(compare=False)
+    removed: bool = field(default=False, compare=False)
+
+
+class FairScheduler:
+    """Kö för AIMDLimiter; anroparen håller reda på kapaciteten, schemaläggaren på ordningen."""
+
+    def __init__(
+        self, weights: Mapping[str, float] | None = None, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.weights = dict(weights or {})
+        self._clock = clock
+        self._heap: list[Waiter] = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._queued: dict[Priority, int] = {"interactive": 0, "batch": 0}
+        self._clients: OrderedDict[str, ClientStats] = OrderedDict()
+
+    def __len__(self) -> int:
+        return sum(self._queued.values())
+
+    def queued(self, priority: Priority) -> int:
+        return self._queued[priority]
+
+    def _client(self, client: str) -> ClientStats:
+        stats = self._clients.get(client)
+        if stats is None:
+            stats = self._clients[client] = ClientStats(weight=max(self.weights.get(client, 1.0), MIN_WEIGHT))
+            if len(self._clients) > MAX_TRACKED_CLIENTS:
+                self._forget_idle()
+        else:
+            self._clients.move_to_end(client)
+        return stats
+
+    def _forget_idle(self) -> None:
+        for name in [name for name, stats in self._clients.items() if not stats.queued]:
+            if len(self._clients) <= MAX_TRACKED_CLIENTS:
+                break
+            del self._clients[name]
+
+    def _tag(self, request_class: RequestClass, cost: float) -> float:
+        stats = self._client(request_class.client)
+        start = max(self._virtual_time, stats.last_finish)
+        stats.last_finish = start + max(cost, 1.0) / stats.weight
+        return start
+
+    def admit(self, request_class: RequestClass, cost: float) -> None:
+        """Anrop som fick plats direkt: bara taggar och statistik, ingen kö."""
+        self._virtual_time = max(self._virtual_time, self._tag(request_class, cost))
+        self._client(request_class.client).dispatched += 1
+        SCHEDULER_WAIT_SECONDS.labels(request_class.priority).observe(0.0)
+
+    def push(self, request_class: RequestClass, cost: float) -> Waiter:
+        waiter = Waiter(
+            PRIORITY_RANK[request_class.priority],
+            self._tag(request_class, cost),
+            next(self._seq),
+            request_class,
+            self._clock(),
+            asyncio.get_running_loop().create_future(),
+        )
+        heapq.heappush(self._heap, waiter)
+        self._queued[request_class.priority] += 1
+        self._client(request_class.client).queued += 1
+        return waiter
+
+    def remove(self, waiter: Waiter) -> None:
+        # Ligger kvar i heapen och hoppas över i pop(); räknarna uppdateras direkt
+        if not waiter.removed:
+            waiter.removed = True
+            self._queued[waiter.request_class.priority] -= 1
+            self._client(waiter.request_class.client).queued -= 1
+
+    def pop(self) -> Waiter | None:
+        while self._heap:
+            waiter = heapq.heappop(self._heap)
+            if waiter.removed:
+                continue
+            self.remove(waiter)
+            self._virtual_time = max(self._virtual_time, waiter.start)
+            waited = self._clock() - waiter.enqueued_at
+            stats = self._client(waiter.request_class.client)
+            stats.dispatched += 1
+            stats.wait_seconds_total += waited
+            stats.wait_seconds_max = max(stats.wait_seconds_max, waited)
+            SCHEDULER_WAIT_SECONDS.labels(waiter.request_class.priority).observe(waited)
+            return waiter
+        return None
+
+    def client_snapshot(self, limit: int = STATUS_MAX_CLIENTS) -> dict[str, dict[str, float | int]]:
+        """Klienterna med flest köade anrop (sedan senast aktiva först)."""
+        ordered = sorted(reversed(self._clients.items()), key=lambda item: -item[1].queued)
+        return {name: stats.as_dict() for name, stats in ordered[:limit]}
+
@@ -0,0 +1,257 @@
+"""Närdubbletter: MinHash-signaturer med LSH-index över tidigare analyserade texter.
+
+En normaliserad text delas i överlappande bytesekvenser (shingles). Varje shingle hashas en gång och
+sorteras in i SIGNATURE_SIZE fack (one permutation hashing); minsta värdet per fack blir
+signaturen. Andelen lika positioner i två signaturer skattar Jaccard-likheten mellan
+texternas shingle-mängder, så att byta ett ord i en lång text ger hög likhet.
+
+LSH: de första BANDS * ROWS_PER_BAND positionerna delas i band; texter som delar minst ett
+helt band blir kandidater och jämförs sedan med hela signaturen. Klienten och temperaturen
+(Scope) ingår i bandnycklarna, så en analys återanvänds bara för samma klient och temperatur.
+Signaturerna ligger i en sammanhängande array('I') och banden i en dict, så indexet klarar
+miljontals texter.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import os
+import zlib
+from array import array
+from collections.abc import Iterable, Sequence
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+from ..utils.config import Settings, get_settings
+from ..utils.metrics import REGISTRY
+from .cache import normalize_text
+from .prompts import PROMPT_VERSION
+
+SHINGLE_BYTES = 5
+OFFLOAD_CHARS = 5000  # Längre texter får sin signatur beräknad i en tråd (ca 0,3 ms per 1000 tecken)
+SIGNATURE_SIZE = 64
+BIN_BITS = 6  # 2**BIN_BITS == SIGNATURE_SIZE
+BANDS = 8
+ROWS_PER_BAND = 4
+EMPTY_BIN = 0xFFFFFFFF
+MIX_MULTIPLIER = 0x9E3779B1  # Udda konstant: multiplikationen permuterar 32-bitarsrummet
+INDEX_FORMAT_VERSION = 3  # 2: temperatur per post, 3: även klient
+SIGNATURE_CACHE_SIZE = 64  # Samma text slås upp och läggs sedan till; räkna signaturen en gång
+
+SIMILARITY_LOOKUPS = REGISTRY.counter(
+    "similarity_lookups", "Uppslag i närdubblettindexet: reused, miss, too_short", ("outcome",)
+)
+
+Signature = Sequence[int]
+# Klient (X-Client-Id) och temperatur; en analys återanvänds bara inom samma scope
+Scope = tuple[str, float]
+
+
+def shingle_hashes(text: str) -> set[int]:
+    # Bytes istället för tecken: en slice av bytes är billigare än slice + encode per shingle
+    data = normalize_text(text).lower().encode("utf-8")
+    if len(data) <= SHINGLE_BYTES:
+        return {zlib.crc32(data)}
+    crc32 = zlib.crc32
+    return {crc32(data[i : i + SHINGLE_BYTES]) for i in range(len(data) - SHINGLE_BYTES + 1)}
+
+
+def minhash(hashes: Iterable[int]) -> list[int]:
+    """One permutation hashing: en hash per shingle, minsta värdet per fack."""
+    mins = [EMPTY_BIN] * SIGNATURE_SIZE
+    mask = SIGNATURE_SIZE - 1
+    for h in hashes:
+        mixed = (h * MIX_MULTIPLIER) & 0xFFFFFFFF
+        slot = mixed & mask
+        value = mixed >> BIN_BITS
+        if value < mins[slot]:
+            mins[slot] = value
+    # Tomma fack (korta texter) lånar nästa icke-tomma facks värde, förskjutet per avstånd
+    if EMPTY_BIN not in mins or all(value == EMPTY_BIN for value in mins):
+        return mins
+    original = mins[:]
+    for i in range(SIGNATURE_SIZE):
+        if original[i] == EMPTY_BIN:
+            distance = next(
+                d for d in range(1, SIGNATURE_SIZE) if original[(i + d) % SIGNATURE_SIZE] != EMPTY_BIN
+            )
+            value = original[(i + distance) % SIGNATURE_SIZE]
+            mins[i] = (value + (distance << (32 - BIN_BITS))) & 0xFFFFFFFF
+    return mins
+
+
+@lru_cache(maxsize=SIGNATURE_CACHE_SIZE)
+def signature(text: str) -> tuple[int, ...]:
+    return tuple(minhash(shingle_hashes(text)))
+
+
+def band_keys(sig: Signature, scope: Scope) -> list[int]:
+    # Nycklarna sparas aldrig (load() räknar om dem), så hash-randomiseringen av str spelar ingen roll
+    return [
+        hash((scope, band, *sig[band * ROWS_PER_BAND : (band + 1) * ROWS_PER_BAND]))
+        for band in range(BANDS)
+    ]
+
+
+def estimate_similarity(a: Signature, b: Signature) -> float:
+    return sum(x == y for x, y in zip(a, b, strict=True)) / SIGNATURE_SIZE
+
+
+class SimilarityIndex:
+    """Begränsat minnesindex (äldsta posten ersätts när det är fullt) med valfri persistens."""
+
+    def __init__(self, threshold: float, max_entries: int, min_chars: int = 0) -> None:
+        self.threshold = threshold
+        self.max_entries = max(max_entries, 1)
+        self.min_chars = min_chars
+        self._signatures: array[int] = array("I")
+        self._results: list[dict[str, Any]] = []
+        self._scopes: list[Scope] = []
+        self._buckets: dict[int, int | list[int]] = {}
+        self._next_slot = 0  # Nästa plats att skriva över när indexet är fullt
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def _stored(self, slot: int) -> array[int]:
+        return self._signatures[slot * SIGNATURE_SIZE : (slot + 1) * SIGNATURE_SIZE]
+
+    def _link(self, key: int, slot: int) -> None:
+        existing = self._buckets.get(key)
+        if existing is None:
+            self._buckets[key] = slot
+        elif isinstance(existing, list):
+            existing.append(slot)
+        else:
+            self._buckets[key] = [existing, slot]
+
+    def _unlink(self, key: int, slot: int) -> None:
+        existing = self._buckets.get(key)
+        if existing == slot:
+            del self._buckets[key]
+        elif isinstance(existing, list):
+            existing.remove(slot)
+            if len(existing) == 1:
+                self._buckets[key] = existing[0]
+
+    def _candidates(self, sig: Signature, scope: Scope) -> set[int]:
+        candidates: set[int] = set()
+        for key in band_keys(sig, scope):
+            found = self._buckets.get(key)
+            if isinstance(found, list):
+                candidates.update(found)
+            elif found is not None:
+                candidates.add(found)
+        return candidates
+
+    def add_signature(self, sig: Signature, scope: Scope, result: dict[str, Any]) -> None:
+        if len(self._results) < self.max_entries:
+            slot = len(self._results)
+            self._signatures.extend(sig)
+            self._results.append(result)
+            self._scopes.append(scope)
+        else:
+            slot = self._next_slot
+            self._next_slot = (slot + 1) % self.max_entries
+            for key in band_keys(self._stored(slot), self._scopes[slot]):
+                self._unlink(key, slot)
+            self._signatures[slot * SIGNATURE_SIZE : (slot + 1) * SIGNATURE_SIZE] = array("I", sig)
+            self._results[slot] = result
+            self._scopes[slot] = scope
+        for key in band_keys(sig, scope):
+            self._link(key, slot)
+
+    def add(self, text: str, scope: Scope, result: dict[str, Any]) -> None:
+        if len(text) >= self.min_chars:
+            self.add_signature(signature(text), scope, result)
+
+    def lookup_signature(self, sig: Signature, scope: Scope) -> tuple[dict[str, Any], float] | None:
+        best: tuple[dict[str, Any], float] | None = None
+        for slot in self._candidates(sig, scope):
+            if self._scopes[slot] != scope:
+                continue  # Hashkollision mellan bandnycklar
+            similarity = estimate_similarity(sig, self._stored(slot))
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (self._results[slot], similarity)
+        return best
+
+    def lookup(self, text: str, scope: Scope) -> tuple[dict[str, Any], float] | None:
+        """Tidigare resultat i samma scope med likhet >= threshold (den mest lika), annars None."""
+        if len(text) < self.min_chars:
+            SIMILARITY_LOOKUPS.labels("too_short").inc()
+            return None
+        match = self.lookup_signature(signature(text), scope)
+        SIMILARITY_LOOKUPS.labels("reused" if match is not None else "miss").inc()
+        return match
+
+    async def find(self, text: str, scope: Scope) -> tuple[dict[str, Any], float] | None:
+        """Som lookup, men signaturen för långa texter räknas i en tråd och cachas för add()."""
+        if len(text) >= max(self.min_chars, OFFLOAD_CHARS):
+            await asyncio.to_thread(signature, text)
+        return self.lookup(text, scope)
+
+    def save(self, path: str | Path) -> None:
+        """En JSON-rad per post; promptversionen sparas så att gamla resultat inte återanvänds."""
+        # Flera workers kan spara samtidigt; var och en skriver sin egen fil och byter sedan namn
+        tmp = Path(f"{path}.{os.getpid()}.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            header = {"version": INDEX_FORMAT_VERSION, "prompt_version": PROMPT_VERSION}
+            f.write(json.dumps(header) + "\n")
+            # Äldst först så att ordningen för utbyte bevaras vid inläsning
+            count = len(self._results)
+            start = self._next_slot if count == self.max_entries else 0
+            for offset in range(count):
+                slot = (start + offset) % count
+                encoded = base64.b64encode(self._stored(slot).tobytes()).decode("ascii")
+                client, temperature = self._scopes[slot]
+                entry = {"s": encoded, "c": client, "t": temperature, "r": self._results[slot]}
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        tmp.replace(path)
+
+    def load(self, path: str | Path) -> int:
+        path = Path(path)
+        if not path.exists():
+            return 0
+        loaded = 0
+        with path.open(encoding="utf-8") as f:
+            header = json.loads(f.readline() or "{}")
+            if header != {"version": INDEX_FORMAT_VERSION, "prompt_version": PROMPT_VERSION}:
+                return 0
+            for line in f:
+                entry = json.loads(line)
+                stored: array[int] = array("I")
+                stored.frombytes(base64.b64decode(entry["s"]))
+                self.add_signature(stored, (entry["c"], entry["t"]), entry["r"])
+                loaded += 1
+        return loaded
+
+
+REGISTRY.gauge(
+    "similarity_index_entries",
+    "Texter i närdubblettindexet",
+    collect=lambda: {(): float(len(_index)) if _index is not None else 0.0},
+)
+
+_index: SimilarityIndex | None = None
+_index_initialized = False
+
+
+def create_similarity_index(config: Settings | None = None) -> SimilarityIndex | None:
+    config = config or get_settings()
+    if not config.similarity_enabled:
+        return None
+    return SimilarityIndex(
+        config.similarity_threshold, config.similarity_max_entries, config.similarity_min_chars
+    )
+
+
+def get_similarity_index() -> SimilarityIndex | None:
+    """Processens delade index (None om SIMILARITY_ENABLED=false)."""
+    global _index, _index_initialized
+    if not _index_initialized:
+        _index = create_similarity_index()
+        _index_initialized = True
+    return _index
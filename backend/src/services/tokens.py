@@ -0,0 +1,68 @@
+"""Token-uppskattning och budgetar innan anropet skickas.
+
+Uppskattningen är en heuristik (ingen tokenizer krävs): svenska texter ger ungefär fyra tecken
+per token men långa sammansättningar delas i fler bitar, så det största av tecken- och
+ordbaserat mått används. Budgetarna styr `max_tokens` så att ett svar som skenar avbryts
+istället för att öka latens och kostnad.
+"""
+
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Any
+
+from ..utils.config import get_settings
+
+CHARS_PER_TOKEN = 4
+TOKENS_PER_WORD = 1.8          # Svenska ord i BPE-tokenizers, med viss marginal
+COMPLETION_SAFETY_MARGIN = 1.25
+ANALYZE_OVERHEAD_TOKENS = 300  # JSON-skelett, ton och 2-3 förslag
+GENERATE_OVERHEAD_TOKENS = 64
+MIN_COMPLETION_TOKENS = 256
+MESSAGE_OVERHEAD_TOKENS = 4    # Roll och avgränsare per chat-meddelande
+
+
+@dataclass(frozen=True)
+class WordBounds:
+    word_count: int
+    min_words: int
+    max_words: int
+
+
+def word_bounds(text: str, margin: int, minimum: int) -> WordBounds:
+    """Tillåtet ordintervall för en omskrivning av `text`; beräknas en gång per anrop."""
+    word_count = len(text.split())
+    return WordBounds(word_count, max(word_count - margin, minimum), word_count + margin)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(math.ceil(len(text) / CHARS_PER_TOKEN), len(text.split()))
+
+
+def estimate_prompt_tokens(messages: list[dict[str, Any]]) -> int:
+    return sum(estimate_tokens(str(m["content"])) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def _completion_tokens(words: int, overhead: int, ceiling: int) -> int:
+    budget = math.ceil(words * TOKENS_PER_WORD * COMPLETION_SAFETY_MARGIN) + overhead
+    return min(max(budget, MIN_COMPLETION_TOKENS), ceiling)
+
+
+def analyze_max_tokens(bounds: WordBounds, ceiling: int | None = None) -> int:
+    """alternative_text får vara max_words ord; resten är JSON och förslag."""
+    return _completion_tokens(
+        bounds.max_words, ANALYZE_OVERHEAD_TOKENS, ceiling or get_settings().llm_max_completion_tokens
+    )
+
+
+def generate_max_tokens(bounds: WordBounds, ceiling: int | None = None) -> int:
+    return _completion_tokens(
+        bounds.max_words, GENERATE_OVERHEAD_TOKENS, ceiling or get_settings().llm_max_completion_tokens
+    )
+
+
+def estimate_payload_tokens(payload: dict[str, Any]) -> int:
+    """Prompt plus det längsta svar `max_tokens` tillåter (används av governorns token bucket)."""
+    prompt_tokens = estimate_prompt_tokens(payload["messages"])
+    return prompt_tokens + int(payload.get("max_tokens") or prompt_tokens)
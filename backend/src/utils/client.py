@@ -0,0 +1,86 @@
+"""Klientidentitet: frontend skickar ett slumpat id i X-Client-Id (det finns ingen inloggning).
+
+X-Client-Id är bara en etikett för historiken. För kvoter och schemaläggning mot upstream
+används requester_id(): en API-nyckel (hashad) om klienten skickar en, annars IP-adressen,
+så att ett skript inte kan byta id för att komma runt sin kvot.
+"""
+
+import hashlib
+import re
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Literal
+
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from .config import get_settings
+
+CLIENT_ID_HEADER = "x-client-id"
+API_KEY_HEADER = "x-api-key"
+FORWARDED_FOR_HEADER = "x-forwarded-for"
+ANONYMOUS_CLIENT = "anonymous"
+INTERNAL_CLIENT = "internal"
+API_KEY_HASH_CHARS = 16
+_CLIENT_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+# Bulkflöden som får vänta på interaktiv trafik
+BATCH_PATH_PREFIXES = ("/analyze/batch", "/jobs")
+
+Priority = Literal["interactive", "batch"]
+
+
+@dataclass(frozen=True)
+class RequestClass:
+    """Vem ett upstream-anrop görs åt och med vilken prioritet (se services/scheduler.py)."""
+
+    client: str
+    priority: Priority
+
+
+# Sätts per request av SchedulingMiddleware; jobb och annat bakgrundsarbete får default
+request_class_var: ContextVar[RequestClass] = ContextVar(
+    "request_class", default=RequestClass(INTERNAL_CLIENT, "batch")
+)
+
+
+def client_id(request: HTTPConnection) -> str:
+    # WebSocket i webbläsaren kan inte sätta headers; /ws/session skickar id:t som ?client_id=
+    value = request.headers.get(CLIENT_ID_HEADER) or request.query_params.get("client_id", "")
+    return value if _CLIENT_ID_PATTERN.fullmatch(value) else ANONYMOUS_CLIENT
+
+
+def requester_id(request: HTTPConnection, trust_forwarded_for: bool = False) -> str:
+    """"key:<hash>" för X-API-Key eller Authorization: Bearer, annars "ip:<adress>"."""
+    key = request.headers.get(API_KEY_HEADER, "")
+    authorization = request.headers.get("authorization", "")
+    if not key and authorization.lower().startswith("bearer "):
+        key = authorization[len("bearer ") :].strip()
+    if key:
+        return "key:" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:API_KEY_HASH_CHARS]
+    if trust_forwarded_for:
+        # Första adressen är klienten; resten är proxies på vägen
+        forwarded = request.headers.get(FORWARDED_FOR_HEADER, "").split(",")[0].strip()
+        if forwarded:
+            return f"ip:{forwarded}"
+    host = request.client.host if request.client is not None else ANONYMOUS_CLIENT
+    return f"ip:{host}"
+
+
+class SchedulingMiddleware:
+    """Ren ASGI-middleware: sätter request_class_var (klient och prioritet) för hela requesten."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+        self.trust_forwarded_for = get_settings().scheduler_trust_forwarded_for
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        priority: Priority = "batch" if scope["path"].startswith(BATCH_PATH_PREFIXES) else "interactive"
+        client = requester_id(HTTPConnection(scope), self.trust_forwarded_for)
+        token = request_class_var.set(RequestClass(client, priority))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_class_var.reset(token)
@@ -1,21 +1,230 @@
 import os
+from functools import lru_cache
 from pathlib import Path
+from typing import Any
 
-from dotenv import load_dotenv
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator, model_validator
 
-# Ladda .env från projektrot
-env_path = Path(__file__).parent.parent.parent.parent / ".env"
-load_dotenv(dotenv_path=env_path)
+# .env i projektroten läses först när inställningarna behövs (get_settings)
+ENV_PATH = Path(__file__).parent.parent.parent.parent / ".env"
+# Relativa sökvägar till databaser och likhetsindex (se Settings.data_path) hamnar här, inte i processens arbetskatalog
+DEFAULT_DATA_DIR = Path(__file__).parent.parent.parent / "data"
+
+# Fält vars miljövariabel inte är fältnamnet i versaler; flera namn provas i tur och ordning
+ENV_ALIASES: dict[str, tuple[str, ...]] = {
+    "llm_api_key": ("LLM_API_KEY", "DEEPSEEK_API_KEY"),
+    "serve_workers": ("WEB_CONCURRENCY",),
+}
 
 
 class Settings(BaseModel):
-    deepseek_api_key: str | None = os.getenv("DEEPSEEK_API_KEY")
-    backend_port: int = int(os.getenv("BACKEND_PORT", "8000"))
-    debug: bool = os.getenv("DEBUG", "true").lower() in {"1", "true", "yes"}
-    cors_origins: list[str] = (
-        os.getenv("CORS_ORIGINS", "http://localhost:5173").split(",")
+    """Inställningar från miljövariabler (fältnamnet i versaler); explicita argument vinner.
+
+    Skapa inte direkt i appen – använd get_settings() så att .env läses och allt valideras en gång.
+    """
+
+    deepseek_api_key: str | None = None
+    backend_port: int = 8000
+    debug: bool = True
+    cors_origins: list[str] = ["http://localhost:5173"]
+
+    # Loggning: skrivning i egen tråd via en begränsad kö (drop | block) och sampling av INFO
+    log_async: bool = True
+    log_queue_size: int = 10000
+    log_queue_policy: str = "drop"
+    log_info_sample_rate: float = 1.0
+
+    # LLM-backend: deepseek | openai (valfri OpenAI-kompatibel bas-URL) | mock (lokal stub)
+    llm_backend: str = "deepseek"
+    llm_base_url: str = ""
+    llm_api_key: str | None = None
+    llm_model: str = ""
+    # Tak för max_tokens; den faktiska budgeten räknas fram per anrop ur textens längd
+    llm_max_completion_tokens: int = 8192
+
+    # Modellrouting (tom = en backend enligt ovan): "namn=fast|strong:modell@bas-url,...".
+    # Nivå efter längd/operation, kaskad fast -> strong vid underkänt svar, failover inom nivån
+    llm_routes: list[str] = []
+    llm_route_api_keys: dict[str, str] = {}  # "namn=nyckel,..."; saknas en används LLM_API_KEY
+    llm_route_fast_max_chars: int = 4000  # längre texter går direkt till strong
+    llm_route_strong_operations: list[str] = []  # t.ex. "generate": alltid strong
+    llm_route_failure_threshold: int = 3  # fel i följd innan routen vilar
+    llm_route_cooldown_seconds: float = 30
+    llm_route_explore_rate: float = 0.05  # andel anrop som provar en annan route än den snabbaste
+
+    # Långa texter analyseras i delar (stycken/meningar) som körs parallellt
+    analyze_chunk_chars: int = 4000
+    analyze_chunk_concurrency: int = 4
+
+    # Inkrementellt läge: bara ändrade stycken skickas till upstream (kräver response-cachen)
+    incremental_enabled: bool = False
+    incremental_segment_chars: int = 1500
+
+    # Mock-LLM: latens i ms enligt vald fördelning (fixed | uniform | normal | lognormal | exponential)
+    mock_llm_latency_ms: float = 200
+    mock_llm_latency_jitter_ms: float = 50
+    mock_llm_latency_distribution: str = "normal"
+    mock_llm_token_delay_ms: float = 5
+    mock_llm_error_rate: float = 0
+    mock_llm_rate_limit_rate: float = 0
+    mock_llm_responses_path: str = ""
+    mock_llm_seed: int = 0
+    mock_llm_port: int = 8100
+
+    # Delad HTTP-klient mot LLM-upstream (connection pool)
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    http2: bool = True
+    http_timeout: float = 60.0
+    http_connect_timeout: float = 10.0
+    http_pool_timeout: float = 10.0
+
+    # Response-cache för /analyze och /generate: memory | sqlite | redis | none
+    # Katalog för relativa sökvägar till cache-, jobb- och historikdatabaser och likhetsindexet
+    data_dir: str = str(DEFAULT_DATA_DIR)
+
+    cache_backend: str = "memory"
+    cache_max_bytes: int = 32 * 1024 * 1024
+    cache_ttl_seconds: float = 3600
+    cache_deterministic_ttl_seconds: float = 7 * 24 * 3600
+    cache_sampled: bool = True
+    cache_sqlite_path: str = "response_cache.sqlite3"
+    cache_sqlite_max_bytes: int = 256 * 1024 * 1024
+    cache_redis_url: str = "redis://localhost:6379/0"
+
+    # Batch-analys: parallellitet per batch och totalt över alla samtidiga batcher
+    batch_default_concurrency: int = 8
+    batch_max_concurrency: int = 32
+    batch_global_concurrency: int = 32
+
+    # Jobbkö för långkörande analyze/generate (persisteras i SQLite)
+    jobs_db_path: str = "jobs.sqlite3"
+    jobs_workers: int = 4
+    jobs_max_queued: int = 1000
+    jobs_timeout_seconds: float = 300
+    jobs_retry_after_seconds: int = 5
+    # Köra om jobb som stod som "running" vid start; src.serve gör det en gång innan fork
+    jobs_recover_running: bool = True
+    jobs_drain_seconds: float = 10
+
+    # Historik för analyze/generate (SQLite, WAL + FTS5); skrivs i batchar från en bakgrundstask
+    history_enabled: bool = True
+    history_db_path: str = "history.sqlite3"
+    history_batch_size: int = 100
+    history_flush_seconds: float = 0.5
+    history_max_queued: int = 10000
+
+    # Närdubbletter (opt-in): /analyze återanvänder en tidigare analys av en nästan likadan text
+    # med samma temperatur, utan upstream-anrop
+    similarity_enabled: bool = False
+    similarity_threshold: float = 0.9
+    similarity_max_entries: int = 100_000
+    similarity_min_chars: int = 50
+    similarity_index_path: str = ""  # Tom = bara i minnet; annars läses vid start och sparas vid stopp
+
+    # Svarar inte LLM:en (503 efter retries) ger /analyze förslag från lokala textmått istället
+    analyze_local_fallback: bool = True
+
+    # Spekulativ förhämtning av /generate efter /analyze (opt-in; kostar upstream-anrop som kan bli onödiga)
+    prefetch_enabled: bool = False
+    prefetch_selections: int = 1  # 1 = bara "alla förslag valda"; fler = även alla utom ett
+    prefetch_max_inflight: int = 4
+    prefetch_max_entries: int = 1000
+    prefetch_ttl_seconds: float = 300
+    prefetch_tokens_per_minute: float = 50_000  # uppskattade tokens; 0 = ingen kostnadsgräns
+
+    # /ws/session: väntetid efter senaste ändringen innan analysen startar
+    session_debounce_ms: float = 300
+
+    # Spårning per request (GET /debug/traces/{cid}): X-Debug-Trace med admin-token eller sampling
+    trace_sample_rate: float = 0.0  # andel requests som spåras utan header
+    trace_admin_token: str = ""  # tom = headern avstängd och /debug öppen
+    trace_buffer_size: int = 200  # spår som sparas per worker
+    trace_profile: bool = False  # CPU-profilera alla spårade requests (annars X-Debug-Profile: 1)
+    trace_profile_interval_ms: float = 5
+
+    # Produktionsstart (python -m src.serve): 0 workers = antal kärnor
+    serve_host: str = "0.0.0.0"
+    serve_workers: int = 0
+    serve_graceful_timeout_seconds: int = 30
+    serve_max_requests: int = 0
+
+    # Upstream-governor: rate limit, adaptiv samtidighet och circuit breaker (0 = avstängd gräns)
+    upstream_rps: float = 20
+    upstream_burst: float = 40
+    upstream_tpm: float = 0
+    upstream_concurrency_initial: int = 16
+    upstream_concurrency_min: int = 1
+    upstream_concurrency_max: int = 64
+    upstream_latency_threshold_seconds: float = 30
+    upstream_max_wait_seconds: float = 30
+    circuit_failure_threshold: int = 5
+    circuit_cooldown_seconds: float = 30
+
+    # Rättvis schemaläggning per klient (API-nyckel eller IP) framför governorn
+    scheduler_trust_forwarded_for: bool = False  # bara bakom en proxy som skriver X-Forwarded-For
+    scheduler_client_rpm: float = 0  # upstream-anrop per minut och klient; 0 = ingen kvot
+    scheduler_client_tpm: float = 0  # uppskattade tokens per minut och klient; 0 = ingen kvot
+    scheduler_client_weights: dict[str, float] = {}  # "ip:10.0.0.5=2,key:3f2a...=0.5"
+
+    def data_path(self, path: str) -> Path:
+        """Absoluta sökvägar används som de är, relativa läggs under data_dir (skapas vid behov)."""
+        resolved = Path(self.data_dir) / path
+        resolved.parent.mkdir(parents=True, exist_ok=True)
+        return resolved
+
+    @model_validator(mode="before")
+    @classmethod
+    def _from_environment(cls, data: Any) -> Any:
+        values = dict(data) if isinstance(data, dict) else {}
+        for name in cls.model_fields:
+            if name in values:
+                continue
+            for env_name in ENV_ALIASES.get(name, (name.upper(),)):
+                raw = os.environ.get(env_name)
+                if raw:
+                    values[name] = raw
+                    break
+        return values
+
+    @field_validator("cors_origins", "llm_routes", "llm_route_strong_operations", mode="before")
+    @classmethod
+    def _split_list(cls, value: Any) -> Any:
+        if not isinstance(value, str):
+            return value
+        return [item.strip() for item in value.split(",") if item.strip()]
+
+    @field_validator("scheduler_client_weights", "llm_route_api_keys", mode="before")
+    @classmethod
+    def _parse_pairs(cls, value: Any) -> Any:
+        if not isinstance(value, str):
+            return value
+        pairs = (item.strip().rpartition("=") for item in value.split(","))
+        return {name: weight for name, _, weight in pairs if name}
+
+    @field_validator(
+        "log_queue_policy",
+        "llm_backend",
+        "mock_llm_latency_distribution",
+        "cache_backend",
     )
+    @classmethod
+    def _lowercase(cls, value: str) -> str:
+        return value.lower()
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Processens inställningar: .env läses och allt valideras vid första anropet."""
+    from dotenv import load_dotenv
+
+    load_dotenv(dotenv_path=ENV_PATH)
+    return Settings()
 
 
-settings = Settings()
+def __getattr__(name: str) -> Any:
+    # `from ..utils.config import settings` fungerar fortfarande, men skapas först vid åtkomst
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
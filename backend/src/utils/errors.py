@@ -1,9 +1,10 @@
 from typing import Any
 
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Request, Response
 from pydantic import BaseModel
 
+from .serialization import model_response
+
 
 class ErrorResponse(BaseModel):
     code: str
@@ -13,11 +14,11 @@ class ErrorResponse(BaseModel):
 
 def register_exception_handlers(app: FastAPI) -> None:
     @app.exception_handler(HTTPException)
-    async def http_exception_handler(request: Request, exc: HTTPException) -> JSONResponse:
+    async def http_exception_handler(request: Request, exc: HTTPException) -> Response:
         body = ErrorResponse(code=f"http_error_{exc.status_code}", message=str(exc.detail))
-        return JSONResponse(status_code=exc.status_code, content=body.model_dump())
+        return model_response(body, exc.status_code, exc.headers)
 
     @app.exception_handler(Exception)
-    async def unhandled_exception_handler(request: Request, exc: Exception) -> JSONResponse:
+    async def unhandled_exception_handler(request: Request, exc: Exception) -> Response:
         body = ErrorResponse(code="internal_error", message="Internal server error")
-        return JSONResponse(status_code=500, content=body.model_dump())
+        return model_response(body, 500)
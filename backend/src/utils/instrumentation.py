@@ -0,0 +1,147 @@
+"""Applikationens metrics: request-tider, upstream-försök, pipeline-steg och räknare.
+
+Allt registreras i metrics.REGISTRY och exponeras av GET /metrics.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from types import TracebackType
+from typing import Any
+
+import httpx
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .metrics import REGISTRY, Histogram
+from .tracing import Span, end_span, start_span
+from .worker import WORKER
+
+UNMATCHED_ROUTE = "unmatched"
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds",
+    "Total tid per HTTP-request till sista byte, per route och statuskod",
+    ("route", "method", "outcome"),
+)
+UPSTREAM_SECONDS = REGISTRY.histogram(
+    "llm_upstream_attempt_seconds",
+    "Tid per upstream-försök mot LLM:en (exklusive governor-väntan)",
+    ("operation", "outcome"),
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "pipeline_stage_seconds",
+    "Tid för egna steg: prompt_build, json_extraction, serialization",
+    ("stage", "operation", "outcome"),
+)
+RETRIES = REGISTRY.counter(
+    "llm_retries", "Upstream-försök som gjordes om, per orsak", ("operation", "reason")
+)
+FALLBACKS = REGISTRY.counter(
+    "llm_fallbacks", "Svar där hårdkodade förslag användes istället för LLM:ens", ("operation", "reason")
+)
+LENGTH_REJECTIONS = REGISTRY.counter(
+    "generate_length_rejections", "Genererade texter som underkändes av ordgränserna", ("mode",)
+)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens",
+    "Tokens enligt upstreams usage: prompt, completion, prompt_cache_hit och prompt_cache_miss",
+    ("operation", "kind"),
+)
+EVENT_LOOP_LAG = REGISTRY.histogram(
+    "event_loop_lag_seconds",
+    "Fördröjning för en schemalagd väckning; höga värden betyder blockerande kod i event-loopen",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+LOOP_LAG_INTERVAL_SECONDS = 0.1
+
+
+class Timer:
+    """Mäter ett block och observerar tiden med `outcome` som sista label.
+
+    `outcome` kan sättas inne i blocket (t.ex. till HTTP-status); ett undantag som inte
+    redan gett ett outcome blir "timeout", "cancelled" eller "error". I en spårad request
+    blir blocket också en span med namnet `span` (se tracing.py).
+    """
+
+    __slots__ = ("_histogram", "_labels", "_span_name", "_span", "_started", "outcome")
+
+    def __init__(self, histogram: Histogram, *labels: str, span: str = "") -> None:
+        self._histogram = histogram
+        self._labels = labels
+        self._span_name = span
+        self._span: Span | None = None
+        self._started = 0.0
+        self.outcome = "ok"
+
+    def __enter__(self) -> Timer:
+        if self._span_name:
+            self._span = start_span(self._span_name, operation=self._labels[-1])
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        if exc_type is not None and self.outcome == "ok":
+            if issubclass(exc_type, httpx.TimeoutException | TimeoutError):
+                self.outcome = "timeout"
+            elif issubclass(exc_type, asyncio.CancelledError | GeneratorExit):
+                self.outcome = "cancelled"
+            else:
+                self.outcome = "error"
+        self._histogram.labels(*self._labels, self.outcome).observe(time.perf_counter() - self._started)
+        end_span(self._span, outcome=self.outcome)
+
+
+def stage(name: str, operation: str) -> Timer:
+    return Timer(STAGE_SECONDS, name, operation, span=name)
+
+
+def upstream_attempt(operation: str) -> Timer:
+    return Timer(UPSTREAM_SECONDS, operation, span="upstream_attempt")
+
+
+async def monitor_event_loop_lag(interval: float = LOOP_LAG_INTERVAL_SECONDS) -> None:
+    """Sov `interval` i taget och mät hur mycket senare än planerat loopen väckte oss."""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(loop.time() - started - interval, 0.0))
+
+
+class MetricsMiddleware:
+    """Ren ASGI-middleware: mäter till sista body-chunken så att även strömmar får rätt tid.
+
+    Route-labeln är mallen (t.ex. /jobs/{job_id}), inte sökvägen, så kardinaliteten hålls nere.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = "error"
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        WORKER.in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            WORKER.in_flight -= 1
+            route: Any = scope.get("route")
+            path = getattr(route, "path", UNMATCHED_ROUTE)
+            REQUEST_SECONDS.labels(path, scope["method"], status).observe(time.perf_counter() - started)
@@ -1,12 +1,46 @@
+import atexit
 import json
 import logging
+import os
+import queue
+import random
 import sys
 import uuid
+import zlib
 from collections.abc import Awaitable, Callable
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
 from typing import Any
 
 from fastapi import FastAPI, Request
 
+from .config import Settings, get_settings
+from .metrics import REGISTRY
+
+try:  # Valfritt: orjson är betydligt snabbare än json.dumps
+    import orjson
+except ImportError:  # pragma: no cover - beror på miljön
+    orjson = None  # type: ignore[assignment, unused-ignore]
+
+# Sätts av correlation_middleware så att även loggar utan extra={...} får request-id:t
+correlation_id_var: ContextVar[str | None] = ContextVar("correlation_id", default=None)
+
+LOG_RECORDS_DROPPED = REGISTRY.counter(
+    "log_records_dropped", "Loggposter som slängts för att loggkön var full"
+)
+LOG_RECORDS_SAMPLED_OUT = REGISTRY.counter(
+    "log_records_sampled_out", "INFO-loggar som valts bort av sampling"
+)
+
+_listener: QueueListener | None = None
+_configured: tuple[int, Settings] | None = None
+
+
+def _dumps(payload: dict[str, Any]) -> str:
+    if orjson is not None:
+        return orjson.dumps(payload, default=str).decode()
+    return json.dumps(payload, ensure_ascii=False, default=str)  # type: ignore[unreachable, unused-ignore]
+
 
 class JsonLogFormatter(logging.Formatter):
     def format(self, record: logging.LogRecord) -> str:
@@ -19,17 +53,118 @@ class JsonLogFormatter(logging.Formatter):
             payload["correlation_id"] = record.correlation_id
         if record.exc_info:
             payload["exc_info"] = self.formatException(record.exc_info)
-        return json.dumps(payload, ensure_ascii=False)
+        return _dumps(payload)
+
+
+class CorrelationFilter(logging.Filter):
+    """Sätter correlation_id från contextvar; måste köras i anroparens tråd/task."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "correlation_id"):
+            cid = correlation_id_var.get()
+            if cid is not None:
+                record.correlation_id = cid
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Släpp igenom en andel av INFO och lägre; WARNING och uppåt behålls alltid.
+
+    Beslutet tas per correlation id när det finns, så att en requests loggar hålls ihop.
+    """
+
+    def __init__(self, rate: float) -> None:
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate >= 1.0 or record.levelno >= logging.WARNING:
+            return True
+        cid = getattr(record, "correlation_id", None)
+        if cid is not None:
+            keep = zlib.crc32(str(cid).encode()) / 2**32 < self.rate
+        else:
+            keep = random.random() < self.rate
+        if not keep:
+            LOG_RECORDS_SAMPLED_OUT.inc()
+        return keep
+
 
+class BoundedQueueHandler(QueueHandler):
+    """QueueHandler som lämnar formatering och skrivning till lyssnartråden.
 
-def configure_json_logging(level: int = logging.INFO) -> None:
-    handler = logging.StreamHandler(sys.stdout)
-    handler.setFormatter(JsonLogFormatter())
+    Med policy "drop" slängs poster när kön är full (och räknas), med "block" väntar anroparen.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]", policy: str = "drop") -> None:
+        super().__init__(log_queue)
+        # QueueHandler.queue är bara typad som _QueueLike (utan put); behåll den riktiga typen
+        self.log_queue = log_queue
+        self.policy = policy
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Bara meddelandet slås ihop här (argumenten kan ändras efteråt); JSON görs i lyssnaren
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        if self.policy == "block":
+            self.log_queue.put(record)
+            return
+        try:
+            self.log_queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+
+def stop_json_logging() -> None:
+    """Töm kön och stoppa lyssnartråden (körs även vid processens slut)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure_json_logging(level: int = logging.INFO, config: Settings | None = None) -> None:
+    global _listener, _configured
+    config = config or get_settings()
+    _configured = (level, config)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonLogFormatter())
     root = logging.getLogger()
+    stop_json_logging()
     root.handlers.clear()
-    root.addHandler(handler)
     root.setLevel(level)
 
+    if not config.log_async:
+        handler: logging.Handler = stream_handler
+    else:
+        # Skrivningen till stdout sker i en egen tråd så att ett långsamt rör inte stoppar event-loopen
+        log_queue: queue.Queue[logging.LogRecord] = queue.Queue(maxsize=config.log_queue_size)
+        handler = BoundedQueueHandler(log_queue, config.log_queue_policy)
+        _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+
+    handler.addFilter(CorrelationFilter())
+    if config.log_info_sample_rate < 1.0:
+        handler.addFilter(SamplingFilter(config.log_info_sample_rate))
+    root.addHandler(handler)
+
+
+def _restart_after_fork() -> None:
+    # Lyssnartråden följer inte med vid fork (gunicorn --preload); barnet får en egen kö och tråd
+    global _listener
+    if _listener is not None and _configured is not None:
+        _listener = None
+        configure_json_logging(*_configured)
+
+
+atexit.register(stop_json_logging)
+os.register_at_fork(after_in_child=_restart_after_fork)
+
 
 def correlation_middleware(app: FastAPI) -> None:
     @app.middleware("http")
@@ -38,7 +173,11 @@ def correlation_middleware(app: FastAPI) -> None:
     ) -> Any:
         cid = request.headers.get("x-correlation-id") or str(uuid.uuid4())
         request.state.correlation_id = cid
-        response = await call_next(request)
+        token = correlation_id_var.set(cid)
+        try:
+            response = await call_next(request)
+        finally:
+            correlation_id_var.reset(token)
         response.headers["x-correlation-id"] = cid
         return response
 
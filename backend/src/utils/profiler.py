@@ -0,0 +1,88 @@
+"""Statistisk CPU-profilering av spårade requests (se tracing.py).
+
+En bakgrundstråd läser event-loop-trådens stack med sys._current_frames() var
+TRACE_PROFILE_INTERVAL_MS så länge någon profilerad request pågår. Stackarna räknas i
+collapsed-format ("modul:funktion;modul:funktion antal" per rad) som flamegraph.pl,
+speedscope och inferno läser direkt. Sampel där loopen väntar i selectorn räknas som idle.
+
+Alla requests delar event-loopen, så med samtidig trafik kommer även andra requests CPU-tid
+med i stackarna. Profilera helst en worker med låg last. Synkrona endpoints körs i trådpoolen
+och syns inte.
+"""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from types import FrameType
+
+MAX_STACK_DEPTH = 128
+IDLE_FRAME = "selectors:select"  # Loopen väntar på I/O
+
+
+@dataclass
+class ProfileSession:
+    thread_id: int
+    stacks: Counter[str] = field(default_factory=Counter)
+    idle_samples: int = 0
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+def _collapse(frame: FrameType | None) -> str:
+    names: list[str] = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """Samplar trådar åt pågående sessioner; tråden startas vid första och slutar efter sista."""
+
+    def __init__(self, interval_seconds: float) -> None:
+        self.interval_seconds = max(interval_seconds, 0.001)
+        self._sessions: dict[int, ProfileSession] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def start(self, key: object, thread_id: int | None = None) -> ProfileSession:
+        session = ProfileSession(thread_id if thread_id is not None else threading.get_ident())
+        with self._lock:
+            self._sessions[id(key)] = session
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-profiler", daemon=True)
+                self._thread.start()
+        return session
+
+    def stop(self, key: object) -> ProfileSession | None:
+        with self._lock:
+            return self._sessions.pop(id(key), None)
+
+    def sample(self) -> None:
+        frames = sys._current_frames()
+        with self._lock:
+            sessions = list(self._sessions.values())
+        stacks: dict[int, str] = {}
+        for session in sessions:
+            if session.thread_id not in stacks:
+                stacks[session.thread_id] = _collapse(frames.get(session.thread_id))
+            stack = stacks[session.thread_id]
+            if not stack or stack.endswith(IDLE_FRAME):
+                session.idle_samples += 1
+            else:
+                session.stacks[stack] += 1
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._sessions:
+                    self._thread = None
+                    return
+            self.sample()
+            time.sleep(self.interval_seconds)
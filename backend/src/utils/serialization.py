@@ -0,0 +1,63 @@
+"""Snabb JSON in och ut: orjson när det finns installerat, annars json.
+
+Pydantic-modeller som vi själva byggt (och redan validerat) serialiseras direkt till bytes av
+pydantic-core via model_response(), istället för att FastAPI validerar dem mot response_model
+en gång till och sedan går via dict och json.dumps. response_model ligger kvar på routerna för
+OpenAPI-schemat. Övrig JSON (SSE-händelser, NDJSON, cache, upstream-svar) går via dumps/loads.
+
+Mät skillnaden med `python -m benchmarks.micro`.
+"""
+
+from __future__ import annotations
+
+import json
+from collections.abc import Mapping
+from typing import Any
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+try:  # Valfritt: orjson är betydligt snabbare än json.dumps/json.loads
+    import orjson
+except ImportError:  # pragma: no cover - beror på miljön
+    orjson = None  # type: ignore[assignment]
+
+JSON_MEDIA_TYPE = "application/json"
+JSON_BACKEND = "orjson" if orjson is not None else "json"  # loggas vid start
+
+
+def dumps(value: Any) -> bytes:
+    """Kompakt UTF-8-JSON (icke-ASCII skrivs som det är, som ensure_ascii=False)."""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    text = json.dumps(value, ensure_ascii=False, separators=(",", ":"))  # type: ignore[unreachable]
+    return text.encode("utf-8")
+
+
+def dumps_str(value: Any) -> str:
+    return dumps(value).decode("utf-8")
+
+
+def loads(raw: bytes | str) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)  # type: ignore[unreachable]
+
+
+def model_json(model: BaseModel) -> bytes:
+    # Samma som model_dump_json() men direkt som bytes, utan str-steget
+    return model.__pydantic_serializer__.to_json(model)
+
+
+def model_response(
+    model: BaseModel, status_code: int = 200, headers: Mapping[str, str] | None = None
+) -> Response:
+    """Svar direkt från en betrodd modell; FastAPI validerar inte om den mot response_model."""
+    return Response(model_json(model), status_code, headers, media_type=JSON_MEDIA_TYPE)
+
+
+class FastJSONResponse(JSONResponse):
+    """Appens standardsvar för endpoints som returnerar dicts (status, statistik)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
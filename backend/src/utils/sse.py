@@ -0,0 +1,13 @@
+from typing import Any
+
+from .serialization import dumps_str
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",  # stäng av buffring i nginx-liknande proxies
+}
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Formatera en Server-Sent Event med JSON-data."""
+    return f"event: {event}\ndata: {dumps_str(data)}\n\n"
@@ -0,0 +1,269 @@
+"""Spårning per request: var tiden gick i en enskild långsam request.
+
+Spårningen är opt-in. En request spåras om den har headern X-Debug-Trace med
+TRACE_ADMIN_TOKEN, eller om den dras med sannolikheten TRACE_SAMPLE_RATE. Spåret är en lista
+spans med start och längd i ms, relativt requestens start:
+
+- request: hela requesten, inklusive all middleware.
+- handler: routing, validering av request-body, endpoint och serialisering. Skillnaden mot
+  request är middlewarens tid.
+- Steg och upstream-försök från instrumentation (prompt_build, json_extraction med validering
+  av LLM-svaret, serialization, upstream_attempt).
+- upstream_wait: väntan i governorn.
+- backoff: pausen före varje omförsök.
+
+Färdiga spår sparas per correlation id i en ringbuffert (TRACE_BUFFER_SIZE, per worker) och
+visas på GET /debug/traces/{cid}. Med TRACE_PROFILE, eller X-Debug-Profile: 1 tillsammans med
+admin-headern, samplas dessutom CPU-stacken (se profiler.py).
+"""
+
+from __future__ import annotations
+
+import hmac
+import random
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import Settings, get_settings
+from .profiler import ProfileSession, SamplingProfiler
+
+TRACE_HEADER = "x-debug-trace"
+PROFILE_HEADER = "x-debug-profile"
+CORRELATION_HEADER = "x-correlation-id"
+UNTRACED_PATH_PREFIXES = ("/debug", "/metrics", "/health")
+WATERFALL_WIDTH = 60
+
+
+@dataclass
+class Span:
+    name: str
+    started: float  # perf_counter
+    attributes: dict[str, Any] = field(default_factory=dict)
+    ended: float | None = None
+
+
+class Trace:
+    def __init__(self, method: str, path: str) -> None:
+        self.method = method
+        self.path = path
+        self.correlation_id: str | None = None
+        self.status: int | None = None
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+        self.spans: list[Span] = []
+        self.profile: ProfileSession | None = None
+
+    def start(self, name: str, attributes: dict[str, Any]) -> Span:
+        span = Span(name, time.perf_counter(), attributes)
+        self.spans.append(span)
+        return span
+
+    def _ms(self, moment: float) -> float:
+        return round((moment - self.origin) * 1000, 3)
+
+    def duration_ms(self, name: str) -> float | None:
+        for span in self.spans:
+            if span.name == name and span.ended is not None:
+                return round((span.ended - span.started) * 1000, 3)
+        return None
+
+    def summary(self) -> dict[str, Any]:
+        total = self.duration_ms("request")
+        handler = self.duration_ms("handler")
+        return {
+            "correlation_id": self.correlation_id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": total,
+            "middleware_ms": round(total - handler, 3) if total is not None and handler is not None else None,
+            "spans": len(self.spans),
+            "profiled": self.profile is not None,
+        }
+
+    def as_dict(self) -> dict[str, Any]:
+        spans: list[dict[str, Any]] = []
+        # Summerad tid per span-namn: hur mycket som gick till backoff, upstream, egen CPU ...
+        totals: dict[str, float] = {}
+        for span in sorted(self.spans, key=lambda s: s.started):
+            duration = round(self._ms(span.ended) - self._ms(span.started), 3) if span.ended else None
+            spans.append({
+                "name": span.name,
+                "start_ms": self._ms(span.started),
+                "duration_ms": duration,
+                **({"attributes": span.attributes} if span.attributes else {}),
+            })
+            if duration is not None:
+                totals[span.name] = round(totals.get(span.name, 0.0) + duration, 3)
+        profile = None
+        if self.profile is not None:
+            profile = {
+                "samples": sum(self.profile.stacks.values()),
+                "idle_samples": self.profile.idle_samples,
+            }
+        return {**self.summary(), "totals_ms": totals, "span_list": spans, "profile": profile}
+
+    def waterfall(self, width: int = WATERFALL_WIDTH) -> str:
+        """Spåret som text: en rad per span med en stapel över requestens tidslinje."""
+        data = self.as_dict()
+        total = data["duration_ms"] or max(
+            (s["start_ms"] + (s["duration_ms"] or 0.0) for s in data["span_list"]), default=1.0
+        )
+        lines = [f"{self.method} {self.path} {self.status} {total:.1f} ms ({self.correlation_id})"]
+        for span in data["span_list"]:
+            duration = span["duration_ms"] or 0.0
+            offset = int(span["start_ms"] / total * width) if total else 0
+            length = max(int(duration / total * width), 1) if total else 1
+            bar = (" " * offset + "#" * length).ljust(width)[:width]
+            attributes = " ".join(f"{k}={v}" for k, v in span.get("attributes", {}).items())
+            lines.append(
+                f"{span['start_ms']:>10.1f} {duration:>10.1f} ms |{bar}| {span['name']} {attributes}".rstrip()
+            )
+        return "\n".join(lines) + "\n"
+
+
+# Sätts av TracingMiddleware för spårade requests; None = ingen spårning (det vanliga)
+trace_var: ContextVar[Trace | None] = ContextVar("trace", default=None)
+
+
+def start_span(name: str, **attributes: Any) -> Span | None:
+    trace = trace_var.get()
+    return trace.start(name, attributes) if trace is not None else None
+
+
+def end_span(span: Span | None, **attributes: Any) -> None:
+    if span is not None:
+        span.ended = time.perf_counter()
+        span.attributes.update(attributes)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span | None]:
+    """Span runt ett block; utan pågående spår kostar den bara en contextvar-läsning."""
+    current = start_span(name, **attributes)
+    try:
+        yield current
+    except BaseException as exc:
+        end_span(current, outcome=type(exc).__name__)
+        raise
+    end_span(current)
+
+
+class TraceStore:
+    """Ringbuffert med de senaste spåren per correlation id."""
+
+    def __init__(self, max_traces: int) -> None:
+        self.max_traces = max(max_traces, 1)
+        self._traces: OrderedDict[str, Trace] = OrderedDict()
+
+    def add(self, trace: Trace) -> None:
+        if trace.correlation_id is None:
+            return
+        self._traces[trace.correlation_id] = trace
+        self._traces.move_to_end(trace.correlation_id)
+        while len(self._traces) > self.max_traces:
+            self._traces.popitem(last=False)
+
+    def get(self, correlation_id: str) -> Trace | None:
+        return self._traces.get(correlation_id)
+
+    def recent(self, limit: int) -> list[dict[str, Any]]:
+        return [trace.summary() for trace in reversed(list(self._traces.values())[-limit:])]
+
+
+def admin_token_matches(value: str | None, config: Settings | None = None) -> bool:
+    token = (config or get_settings()).trace_admin_token
+    if not token or value is None:
+        return False
+    return hmac.compare_digest(value.encode("utf-8"), token.encode("utf-8"))
+
+
+class TracingMiddleware:
+    """Ren ASGI-middleware (ytterst): väljer requests att spåra och sparar spåret när det är klart."""
+
+    def __init__(self, app: ASGIApp, config: Settings | None = None) -> None:
+        self.app = app
+        self.config = config or get_settings()
+
+    def _decide(self, headers: Headers) -> tuple[bool, bool]:
+        admin = admin_token_matches(headers.get(TRACE_HEADER), self.config)
+        traced = admin or random.random() < self.config.trace_sample_rate
+        profiled = traced and (self.config.trace_profile or (admin and headers.get(PROFILE_HEADER) == "1"))
+        return traced, profiled
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(UNTRACED_PATH_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        traced, profiled = self._decide(headers)
+        if not traced:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(scope["method"], scope["path"])
+        trace.correlation_id = headers.get(CORRELATION_HEADER)
+        root = trace.start("request", {})
+        profiler = get_profiler(self.config)
+        if profiled:
+            # Middlewaren körs i event-loopens tråd; det är den tråden som samplas
+            trace.profile = profiler.start(trace, threading.get_ident())
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                # correlation_middleware har satt id:t på svaret (nytt om klienten inte skickade något)
+                trace.correlation_id = MutableHeaders(scope=message).get(CORRELATION_HEADER) or trace.correlation_id
+            await send(message)
+
+        token = trace_var.set(trace)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            trace_var.reset(token)
+            end_span(root)
+            if profiled:
+                profiler.stop(trace)
+            get_trace_store(self.config).add(trace)
+
+
+class HandlerSpanMiddleware:
+    """Innerst: span "handler" runt routern, så att middlewarens andel syns i spåret."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or trace_var.get() is None:
+            await self.app(scope, receive, send)
+            return
+        with span("handler"):
+            await self.app(scope, receive, send)
+
+
+_store: TraceStore | None = None
+_profiler: SamplingProfiler | None = None
+
+
+def get_trace_store(config: Settings | None = None) -> TraceStore:
+    global _store
+    if _store is None:
+        _store = TraceStore((config or get_settings()).trace_buffer_size)
+    return _store
+
+
+def get_profiler(config: Settings | None = None) -> SamplingProfiler:
+    global _profiler
+    if _profiler is None:
+        _profiler = SamplingProfiler((config or get_settings()).trace_profile_interval_ms / 1000)
+    return _profiler
@@ -0,0 +1,84 @@
+"""Tillstånd per worker-process: upptid, pågående requests och dränering vid SIGTERM.
+
+Med flera workers (src.serve) har varje process egen event-loop, egen HTTP-pool och egen
+governor; GET /health/worker visar den process som svarade.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import signal
+import time
+from types import FrameType
+from typing import Any
+
+from .metrics import REGISTRY
+
+DRAIN_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+
+
+class WorkerState:
+    def __init__(self) -> None:
+        self.started_at = time.monotonic()
+        self.in_flight = 0
+        self.draining = False
+
+    def start(self) -> None:
+        # Anropas från lifespan; samma process kan starta appen flera gånger (tester)
+        self.started_at = time.monotonic()
+        self.draining = False
+
+    def begin_drain(self) -> None:
+        self.draining = True
+
+    def snapshot(self) -> dict[str, Any]:
+        try:
+            loop = type(asyncio.get_running_loop()).__module__.split(".")[0]
+        except RuntimeError:
+            loop = None
+        return {
+            "status": "draining" if self.draining else "ok",
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.monotonic() - self.started_at, 1),
+            "in_flight_requests": self.in_flight,
+            "event_loop": loop,
+        }
+
+
+WORKER = WorkerState()
+
+REGISTRY.gauge(
+    "http_requests_in_flight",
+    "Requests som pågår i den här worker-processen",
+    collect=lambda: {(): float(WORKER.in_flight)},
+)
+REGISTRY.gauge(
+    "worker_draining",
+    "1 när processen fått SIGTERM och väntar in pågående requests",
+    collect=lambda: {(): float(WORKER.draining)},
+)
+
+
+def install_drain_handlers(state: WorkerState = WORKER) -> None:
+    """Markera dränering vid SIGTERM/SIGINT och lämna sedan över till serverns egen hanterare.
+
+    Anropas från lifespan, efter att uvicorn (eller gunicorns worker) installerat sina.
+    """
+    for sig in DRAIN_SIGNALS:
+        previous = signal.getsignal(sig)
+
+        def handler(signum: int, frame: FrameType | None, previous: Any = previous) -> None:
+            state.begin_drain()
+            if callable(previous):
+                previous(signum, frame)
+            elif previous != signal.SIG_IGN:
+                # Ingen Python-hanterare: återställ standardbeteendet och skicka signalen igen
+                signal.signal(signum, signal.SIG_DFL)
+                signal.raise_signal(signum)
+
+        try:
+            signal.signal(sig, handler)
+        except ValueError:
+            # Inte i huvudtråden (t.ex. TestClient); dränering märks då bara via lifespan
+            return
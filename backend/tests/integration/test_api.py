@@ -1,11 +1,15 @@
+import json
 import sys
 from pathlib import Path
 
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
+from src.api.routes import analyzer_dependency
 from src.main import app
+from src.utils.client import RequestClass, request_class_var
 
 # HTTP Status codes
 HTTP_OK = 200
@@ -109,3 +113,265 @@ def test_generate_no_selection_fails():
         "temperature": 0.7
     })
     assert r.status_code == HTTP_BAD_REQUEST
+
+
+class FakeAnalyzer:
+    async def analyze_text(self, text, temperature=0.7):
+        if "fel" in text:
+            raise HTTPException(status_code=503, detail="AI service unavailable")
+        return ["Förslag 1", "Förslag 2"], "neutral", text
+
+
+def test_analyze_batch_streams_ndjson_per_item():
+    """Batch-endpointen ger en rad per item (även fel) och en sammanfattning sist."""
+    app.dependency_overrides[analyzer_dependency] = FakeAnalyzer
+    try:
+        r = client.post("/analyze/batch", json={
+            "items": [
+                {"id": "a", "text": "Första texten"},
+                {"id": "b", "text": "Den här ger fel"},
+                {"id": "c", "text": "Tredje texten"},
+            ],
+            "concurrency": 2,
+        })
+    finally:
+        app.dependency_overrides.clear()
+    assert r.status_code == HTTP_OK
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    items = {line["id"]: line for line in lines[:-1]}
+    assert items["a"]["status"] == "ok"
+    assert items["a"]["result"]["tone"] == "neutral"
+    assert items["b"]["status"] == "error"
+    assert items["b"]["error"]["code"] == "http_error_503"
+    summary = lines[-1]["summary"]
+    assert summary["total"] == 3
+    assert summary["succeeded"] == 2
+    assert summary["failed"] == 1
+
+
+def test_metrics_exposes_request_and_stage_histograms():
+    app.dependency_overrides[analyzer_dependency] = FakeAnalyzer
+    try:
+        r = client.post("/analyze", json={"text": "En text att mäta", "temperature": 0.7})
+    finally:
+        app.dependency_overrides.clear()
+    assert r.status_code == HTTP_OK
+    assert r.json()["tone"] == "neutral"
+
+    metrics = client.get("/metrics")
+    assert metrics.status_code == HTTP_OK
+    assert metrics.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_count{route="/analyze",method="POST",outcome="200"}' in metrics.text
+    assert 'pipeline_stage_seconds_count{stage="serialization",operation="analyze",outcome="ok"}' in metrics.text
+    assert "# TYPE upstream_governor gauge" in metrics.text
+
+
+class ClassRecordingAnalyzer(FakeAnalyzer):
+    seen: list[RequestClass] = []
+
+    async def analyze_text(self, text, temperature=0.7):
+        ClassRecordingAnalyzer.seen.append(request_class_var.get())
+        return await super().analyze_text(text, temperature)
+
+
+def test_requests_are_classified_by_api_key_and_path():
+    """Klient (hashad API-nyckel) och prioritet följer med till upstream-schemaläggningen."""
+    app.dependency_overrides[analyzer_dependency] = ClassRecordingAnalyzer
+    headers = {"X-API-Key": "testnyckel"}
+    try:
+        client.post("/analyze", json={"text": "Interaktiv text"}, headers=headers)
+        client.post("/analyze/batch", json={"items": [{"id": "a", "text": "Batchtext"}]}, headers=headers)
+    finally:
+        app.dependency_overrides.clear()
+    interactive, batch = ClassRecordingAnalyzer.seen[-2:]
+    assert interactive.client.startswith("key:") and interactive.client == batch.client
+    assert (interactive.priority, batch.priority) == ("interactive", "batch")
+
+    r = client.get("/upstream/clients")
+    assert r.status_code == HTTP_OK
+    assert set(r.json()["queued"]) == {"interactive", "batch"}
+
+
+class CountingAnalyzer(FakeAnalyzer):
+    calls = 0
+
+    async def analyze_text(self, text, temperature=0.7):
+        CountingAnalyzer.calls += 1
+        return await super().analyze_text(text, temperature)
+
+
+def test_near_duplicate_text_reuses_prior_analysis(monkeypatch):
+    """En lätt redigerad text från samma klient och med samma temperatur får den tidigare
+    analysens förslag och ton, flaggad som reused; omskrivningen återanvänds inte."""
+    from src.api import routes
+    from src.services.similarity import SimilarityIndex
+
+    index = SimilarityIndex(threshold=0.9, max_entries=100)
+    monkeypatch.setattr(routes, "get_similarity_index", lambda: index)
+    text = (
+        "Styrgruppen har beslutat att flytta lanseringen av den nya kundportalen till oktober, "
+        "eftersom integrationen mot faktureringssystemet behöver testas mer innan vi går live."
+    )
+    edited = text.replace("oktober", "november")
+    owner = {"X-Client-Id": "klient-a"}
+    app.dependency_overrides[analyzer_dependency] = CountingAnalyzer
+    CountingAnalyzer.calls = 0
+    try:
+        first = client.post("/analyze", json={"text": text}, headers=owner).json()
+        second = client.post("/analyze", json={"text": edited}, headers=owner).json()
+        stream = client.post(
+            "/analyze/stream", json={"text": text.replace("mer", "ännu mer")}, headers=owner
+        )
+        warmer = client.post("/analyze", json={"text": text, "temperature": 1.2}, headers=owner)
+        other = client.post("/analyze", json={"text": text}, headers={"X-Client-Id": "klient-b"})
+        anonymous = client.post("/analyze", json={"text": text})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert CountingAnalyzer.calls == 4
+    assert first["reused"] is False
+    assert second["reused"] is True
+    assert second["similarity"] >= 0.9
+    assert second["suggestions"] == first["suggestions"]
+    assert second["alternative_text"] == edited
+    assert '"reused":true' in stream.text
+    assert [r.json()["reused"] for r in (warmer, other, anonymous)] == [False, False, False]
+
+
+def test_analyze_fast_returns_local_metrics():
+    r = client.post("/analyze/fast", json={"text": "Mötet blev inställt. Tack för ett fantastiskt jobb!"})
+    assert r.status_code == HTTP_OK
+    data = r.json()
+    assert data["metrics"]["sentences"] == 2
+    assert data["metrics"]["passive_ratio"] == 0.5
+    assert data["tone"] == data["metrics"]["tone"] == "positive"
+    assert 2 <= len(data["suggestions"]) <= 3
+
+    batch = client.post("/analyze/fast/batch", json={"items": [{"text": "Hej hej"}, {"text": "Ett. Två. Tre."}]})
+    assert [item["metrics"]["sentences"] for item in batch.json()["items"]] == [1, 3]
+
+
+def test_batch_total_characters_are_capped(monkeypatch):
+    from src.models import schemas
+
+    monkeypatch.setattr(schemas, "BATCH_MAX_TOTAL_CHARS", 20)
+    items = [{"text": "Tolv tecken."}, {"text": "Tolv tecken."}]
+
+    for path in ("/analyze/batch", "/analyze/fast/batch"):
+        r = client.post(path, json={"items": items})
+        assert r.status_code == HTTP_UNPROCESSABLE_ENTITY
+        assert "limit is 20" in r.text
+    assert client.post("/analyze/fast/batch", json={"items": items[:1]}).status_code == HTTP_OK
+
+
+def test_batch_items_are_stripped_and_blank_items_rejected(monkeypatch):
+    from src.models import schemas
+
+    for path in ("/analyze/batch", "/analyze/fast/batch"):
+        r = client.post(path, json={"items": [{"text": "Hej"}, {"text": " \n\t "}]})
+        assert r.status_code == HTTP_UNPROCESSABLE_ENTITY
+        assert "Text may not be empty" in r.text
+    # Whitespace runt texterna räknas inte mot totalgränsen
+    monkeypatch.setattr(schemas, "BATCH_MAX_TOTAL_CHARS", 12)
+    padded = {"items": [{"text": "   Tolv tecken.   "}]}
+    assert client.post("/analyze/fast/batch", json=padded).status_code == HTTP_OK
+
+
+class UnavailableAnalyzer:
+    async def analyze_text(self, text, temperature=0.7):
+        raise HTTPException(status_code=503, detail="AI service unavailable")
+
+    async def stream_analyze(self, text, temperature=0.7):
+        yield "suggestion", "Hälften av ett förslag"
+        raise HTTPException(status_code=503, detail="AI service unavailable")
+
+
+def test_upstream_failure_falls_back_to_local_suggestions():
+    """503 från LLM:en ger förslag från textmåtten; strömmen börjar alltid med metrics."""
+    text = "Rapporten blev försenad. Beslutet fattades sent. Vi återkommer."
+    app.dependency_overrides[analyzer_dependency] = UnavailableAnalyzer
+    try:
+        r = client.post("/analyze", json={"text": text})
+        stream = client.post("/analyze/stream", json={"text": text})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert r.status_code == HTTP_OK
+    data = r.json()
+    assert data["fallback"] is True
+    assert data["alternative_text"] == text
+    assert data["suggestions"][0].startswith("Använd aktiva verb")
+
+    events = [line.removeprefix("event: ") for line in stream.text.splitlines() if line.startswith("event: ")]
+    assert events[:2] == ["start", "metrics"]
+    assert events[-2:] == ["result", "done"]
+    assert '"fallback":true' in stream.text
+
+
+class GeneratingAnalyzer(FakeAnalyzer):
+    generate_calls = 0
+
+    async def generate_text(self, text, selected_suggestions, temperature=0.7):
+        GeneratingAnalyzer.generate_calls += 1
+        return f"{text} ({len(selected_suggestions)} förslag)"
+
+
+def test_generate_uses_prefetched_result_after_analyze(tmp_path, monkeypatch):
+    """Med PREFETCH_ENABLED genereras "alla förslag valda" redan efter /analyze."""
+    from src.services.governor import get_governor
+    from src.services.prefetch import PREFETCH_EVENTS
+    from src.utils.config import settings
+
+    hits_before = PREFETCH_EVENTS.value("hit") + PREFETCH_EVENTS.value("hit_inflight")
+    # Tidigare tester utan nätverk kan ha öppnat kretsen; då hoppas förhämtningen över
+    monkeypatch.setattr(get_governor().breaker, "state", "closed")
+    monkeypatch.setattr(settings, "prefetch_enabled", True)
+    monkeypatch.setattr(settings, "history_enabled", False)
+    monkeypatch.setattr(settings, "jobs_db_path", str(tmp_path / "jobs.sqlite3"))
+    text = "En text som ska analyseras och sedan genereras om."
+    app.dependency_overrides[analyzer_dependency] = GeneratingAnalyzer
+    GeneratingAnalyzer.generate_calls = 0
+    try:
+        with TestClient(app) as lifespan_client:
+            analysis = lifespan_client.post("/analyze", json={"text": text}).json()
+            generated = lifespan_client.post("/generate", json={
+                "text": text,
+                "suggestions": analysis["suggestions"],
+                "selected_suggestions": [True] * len(analysis["suggestions"]),
+            })
+    finally:
+        app.dependency_overrides.clear()
+
+    assert generated.json() == {"generated_text": f"{text} (2 förslag)"}
+    assert GeneratingAnalyzer.generate_calls == 1
+    assert PREFETCH_EVENTS.value("hit") + PREFETCH_EVENTS.value("hit_inflight") == hits_before + 1
+
+
+def test_debug_trace_is_recorded_with_admin_header(monkeypatch):
+    """X-Debug-Trace med admin-token spårar requesten; spåret hämtas på correlation id:t."""
+    from src.utils.config import settings
+
+    monkeypatch.setattr(settings, "trace_admin_token", "hemligt")
+    app.dependency_overrides[analyzer_dependency] = FakeAnalyzer
+    try:
+        r = client.post(
+            "/analyze",
+            json={"text": "En text att spåra."},
+            headers={"X-Debug-Trace": "hemligt", "X-Correlation-ID": "trace-test-1"},
+        )
+    finally:
+        app.dependency_overrides.clear()
+    assert r.status_code == HTTP_OK
+
+    assert client.get("/debug/traces/trace-test-1").status_code == 403
+    trace = client.get("/debug/traces/trace-test-1", headers={"X-Debug-Trace": "hemligt"}).json()
+    assert trace["status"] == HTTP_OK
+    assert {"request", "handler"} <= set(trace["totals_ms"])
+    assert trace["middleware_ms"] >= 0
+    waterfall = client.get(
+        "/debug/traces/trace-test-1", params={"format": "waterfall"}, headers={"X-Debug-Trace": "hemligt"}
+    )
+    assert waterfall.headers["content-type"].startswith("text/plain")
+    assert "handler" in waterfall.text
+    missing = client.get("/debug/traces/okänt-id", headers={"X-Debug-Trace": "hemligt"})
+    assert missing.status_code == 404
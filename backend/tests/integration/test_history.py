@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api.routes import analyzer_dependency
+from src.main import app
+from src.utils.client import ANONYMOUS_CLIENT
+from src.utils.config import settings
+
+HTTP_OK = 200
+HTTP_NO_CONTENT = 204
+HTTP_BAD_REQUEST = 400
+HTTP_NOT_FOUND = 404
+CLIENT = {"X-Client-Id": "test-klient"}
+
+
+class FakeAnalyzer:
+    async def analyze_text(self, text, temperature=0.7):
+        return ["Förslag 1", "Förslag 2"], "positive", text
+
+
+@pytest.fixture
+def history_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "history_db_path", str(tmp_path / "history.sqlite3"))
+    monkeypatch.setattr(settings, "jobs_db_path", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(settings, "history_flush_seconds", 0)
+    app.dependency_overrides[analyzer_dependency] = FakeAnalyzer
+    try:
+        with TestClient(app) as client:
+            yield client
+    finally:
+        app.dependency_overrides.clear()
+
+
+def wait_for_items(client, count, timeout=2.0):
+    # Historiken skrivs asynkront i batchar; vänta tills posterna syns
+    deadline = time.monotonic() + timeout
+    while True:
+        page = client.get("/history", headers=CLIENT).json()
+        if len(page["items"]) >= count or time.monotonic() > deadline:
+            return page
+        time.sleep(0.02)
+
+
+def test_analyze_results_are_listed_and_searchable(history_client):
+    for text in ("Budgeten för hösten", "Protokoll från styrelsemötet", "Budgetuppföljning"):
+        assert history_client.post("/analyze", json={"text": text}, headers=CLIENT).status_code == HTTP_OK
+
+    page = wait_for_items(history_client, 3)
+    assert [item["text"] for item in page["items"]] == [
+        "Budgetuppföljning", "Protokoll från styrelsemötet", "Budgeten för hösten"
+    ]
+    assert page["items"][0]["tone"] == "positive"
+    assert history_client.get("/history", headers={"X-Client-Id": "annan"}).json()["items"] == []
+
+    first = history_client.get("/history", params={"limit": 2}, headers=CLIENT).json()
+    rest = history_client.get("/history", params={"limit": 2, "cursor": first["next_cursor"]}, headers=CLIENT)
+    assert [item["text"] for item in rest.json()["items"]] == ["Budgeten för hösten"]
+
+    hits = history_client.get("/history/search", params={"q": "budget"}, headers=CLIENT).json()
+    assert {item["text"] for item in hits["items"]} == {"Budgeten för hösten", "Budgetuppföljning"}
+
+
+def test_delete_and_clear_history(history_client):
+    history_client.post("/analyze", json={"text": "Ta bort mig"}, headers=CLIENT)
+    history_client.post("/analyze", json={"text": "Och mig"}, headers=CLIENT)
+    items = wait_for_items(history_client, 2)["items"]
+
+    assert history_client.delete(f"/history/{items[0]['id']}", headers=CLIENT).status_code == HTTP_NO_CONTENT
+    assert history_client.delete(f"/history/{items[0]['id']}", headers=CLIENT).status_code == HTTP_NOT_FOUND
+    assert history_client.delete("/history", headers=CLIENT).json() == {"deleted": 1}
+    assert history_client.get("/history", headers=CLIENT).json()["items"] == []
+
+
+def test_callers_without_client_id_share_no_history(history_client):
+    history_client.post("/analyze", json={"text": "Första anonyma texten"})
+    history_client.post("/analyze", json={"text": "Andra anonyma texten"})
+    history_client.post("/analyze", json={"text": "Med id"}, headers=CLIENT)
+    wait_for_items(history_client, 1)
+
+    # Inget sparades utan id, och ingen utan id kan lista, söka i eller rensa historik
+    assert history_client.get("/history").status_code == HTTP_BAD_REQUEST
+    assert history_client.get("/history/search", params={"q": "anonyma"}).status_code == HTTP_BAD_REQUEST
+    assert history_client.delete("/history").status_code == HTTP_BAD_REQUEST
+    anonymous = asyncio.run(app.state.history.store.page(ANONYMOUS_CLIENT, 10))
+    assert anonymous.items == []
+    assert [item["text"] for item in wait_for_items(history_client, 1)["items"]] == ["Med id"]
+
+
+def test_legacy_local_history_is_imported_once(history_client):
+    legacy = {
+        "items": [
+            {
+                "text": "Gammal analys från localStorage",
+                "result": {"suggestions": ["A", "B"], "tone": "negative", "alternative_text": "Ny"},
+                "timestamp": 1_700_000_000_000,
+            }
+        ]
+    }
+    assert history_client.post("/history/import", json=legacy).status_code == HTTP_BAD_REQUEST
+    assert history_client.post("/history/import", json=legacy, headers=CLIENT).json() == {"imported": 1}
+    # Ett omförsök efter ett avbrutet svar ger ingen dubblett
+    assert history_client.post("/history/import", json=legacy, headers=CLIENT).json() == {"imported": 0}
+
+    items = history_client.get("/history", headers=CLIENT).json()["items"]
+    assert [(item["text"], item["tone"], item["created_at"]) for item in items] == [
+        ("Gammal analys från localStorage", "negative", 1_700_000_000)
+    ]
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.main import app
+from src.services import jobs as jobs_module
+from src.utils.config import settings
+
+HTTP_ACCEPTED = 202
+HTTP_OK = 200
+HTTP_NOT_FOUND = 404
+HTTP_TOO_MANY_REQUESTS = 429
+
+
+class SlowAnalyzer:
+    async def analyze_text(self, text, temperature=0.7):
+        await asyncio.sleep(0.05)
+        return ["Förslag 1", "Förslag 2"], "positive", text
+
+    async def generate_text(self, text, selected_suggestions, temperature=0.7):
+        return f"{text} ({', '.join(selected_suggestions)})"
+
+
+@pytest.fixture
+def jobs_client(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "jobs_db_path", str(tmp_path / "jobs.sqlite3"))
+    original = jobs_module.create_job_queue
+
+    def create_with_fake(_factory, config=settings):
+        return original(SlowAnalyzer, config)
+
+    monkeypatch.setattr("src.services.jobs.create_job_queue", create_with_fake)
+    with TestClient(app) as client:
+        yield client
+
+
+def test_job_lifecycle_with_long_poll(jobs_client):
+    r = jobs_client.post("/jobs", json={"kind": "analyze", "request": {"text": "Jobbtext"}})
+    assert r.status_code == HTTP_ACCEPTED
+    job = r.json()
+    assert job["status"] == "queued"
+
+    r = jobs_client.get(f"/jobs/{job['id']}/wait", params={"timeout": 5})
+    assert r.status_code == HTTP_OK
+    done = r.json()
+    assert done["status"] == "succeeded"
+    assert done["result"]["tone"] == "positive"
+    assert done["queue_ms"] is not None
+    assert done["run_ms"] is not None
+
+
+def test_generate_job_and_unknown_job(jobs_client):
+    r = jobs_client.post("/jobs", json={
+        "kind": "generate",
+        "request": {"text": "Text", "suggestions": ["A", "B"], "selected_suggestions": [True, False]},
+    })
+    job_id = r.json()["id"]
+    done = jobs_client.get(f"/jobs/{job_id}/wait", params={"timeout": 5}).json()
+    assert done["result"] == {"generated_text": "Text (A)"}
+    assert jobs_client.get("/jobs/does-not-exist").status_code == HTTP_NOT_FOUND
+
+
+def test_full_queue_returns_429(jobs_client, monkeypatch):
+    monkeypatch.setattr(app.state.job_queue, "max_queued", 0)
+    r = jobs_client.post("/jobs", json={"kind": "analyze", "request": {"text": "Jobbtext"}})
+    assert r.status_code == HTTP_TOO_MANY_REQUESTS
+    assert r.headers["retry-after"] == str(settings.jobs_retry_after_seconds)
+
+
+def test_job_is_claimed_once_across_queues(tmp_path):
+    from src.models.schemas import AnalyzeJobRequest, AnalyzeRequest
+
+    async def scenario():
+        store = jobs_module.JobStore(tmp_path / "shared.sqlite3")
+        first = jobs_module.JobQueue(store, SlowAnalyzer, 1, 10, 5, recover_running=False)
+        job = await first.submit(AnalyzeJobRequest(kind="analyze", request=AnalyzeRequest(text="Hej")))
+        # En andra worker-process ser samma köade jobb i databasen
+        second = jobs_module.JobQueue(store, SlowAnalyzer, 1, 10, 5, recover_running=False)
+        claims = [await store.claim(job.id, 1.0), await store.claim(job.id, 2.0)]
+        await second._run(job.id)
+        store.close()
+        return claims, second.active
+
+    claims, active = asyncio.run(scenario())
+    assert claims == [True, False]
+    assert active == 0
+
+
+def test_worker_health_reports_process_state(jobs_client):
+    r = jobs_client.get("/health/worker")
+
+    assert r.status_code == HTTP_OK
+    body = r.json()
+    assert body["status"] == "ok"
+    assert body["in_flight_requests"] >= 1
+    assert body["jobs_active"] == 0
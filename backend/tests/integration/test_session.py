@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api.routes import analyzer_dependency
+from src.api.session import SESSION_RUNS
+from src.main import app
+from src.utils.config import settings
+
+client = TestClient(app)
+
+
+class StreamingAnalyzer:
+    """Strömmar ett förslag per anrop; texter som börjar med "Långsam" blir aldrig klara."""
+
+    def __init__(self) -> None:
+        self.started: list[str] = []
+        self.cancelled: list[str] = []
+
+    async def stream_analyze(self, text, temperature=0.7):
+        self.started.append(text)
+        try:
+            if text.startswith("Långsam"):
+                await asyncio.Event().wait()
+            yield "suggestion", f"Förslag för {text}"
+            yield "tone", "neutral"
+            yield "alternative_text", text.upper()
+            result = {"suggestions": [f"Förslag för {text}", "Två"], "tone": "neutral"}
+            yield "result", {**result, "alternative_text": text.upper()}
+        except asyncio.CancelledError:
+            self.cancelled.append(text)
+            raise
+
+    async def stream_generate(self, text, selected_suggestions, temperature=0.7):
+        yield "delta", f"{text} ({len(selected_suggestions)})"
+        yield "result", {"generated_text": f"{text} ({len(selected_suggestions)})"}
+
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    monkeypatch.setattr(settings, "session_debounce_ms", 50)
+    fake = StreamingAnalyzer()
+    app.dependency_overrides[analyzer_dependency] = lambda: fake
+    yield fake
+    app.dependency_overrides.clear()
+
+
+def receive_until(ws, event: str, operation: str) -> list[dict]:
+    messages = []
+    while True:
+        message = ws.receive_json()
+        messages.append(message)
+        if message["event"] == event and message["operation"] == operation:
+            return messages
+
+
+def test_session_debounces_and_applies_deltas(analyzer):
+    with client.websocket_connect("/ws/session") as ws:
+        assert ws.receive_json()["event"] == "ready"
+        ws.send_json({"type": "text", "text": "Hej", "version": 1})
+        ws.send_json({"type": "delta", "start": 3, "end": 3, "insert": " alla", "version": 2})
+
+        messages = receive_until(ws, "result", "analyze")
+        assert {m["version"] for m in messages} == {2}
+        assert [m["event"] for m in messages] == ["metrics", "suggestion", "tone", "alternative_text", "result"]
+        # Den första texten hann aldrig analyseras
+        assert analyzer.started == ["Hej alla"]
+
+        ws.send_json({"type": "delta", "start": 10, "end": 12, "insert": "x", "version": 3})
+        assert ws.receive_json()["data"]["code"] == "http_error_409"
+
+        ws.send_json({"type": "generate", "suggestions": ["A", "B"], "selected_suggestions": [True, True]})
+        generated = receive_until(ws, "result", "generate")
+        assert generated[-1]["data"] == {"generated_text": "Hej alla (2)"}
+
+
+def test_newer_text_cancels_inflight_analysis(analyzer):
+    cancelled_before = SESSION_RUNS.value("analyze", "cancelled")
+    with client.websocket_connect("/ws/session") as ws:
+        ws.receive_json()
+        ws.send_json({"type": "text", "text": "Långsam text", "version": 1})
+        assert ws.receive_json()["event"] == "metrics"
+        ws.send_json({"type": "text", "text": "Snabb text", "version": 2})
+
+        messages = receive_until(ws, "result", "analyze")
+        assert messages[0] == {"event": "cancelled", "operation": "analyze", "version": 1, "data": {}}
+        assert messages[-1]["version"] == 2
+
+    assert analyzer.cancelled == ["Långsam text"]
+    assert SESSION_RUNS.value("analyze", "cancelled") == cancelled_before + 1
+
+
+def test_invalid_message_keeps_session_open(analyzer):
+    with client.websocket_connect("/ws/session") as ws:
+        ws.receive_json()
+        ws.send_text('{"type": "okänd"}')
+        assert ws.receive_json()["event"] == "error"
+        ws.send_json({"type": "text", "text": "Fortfarande öppen", "version": 1})
+        assert receive_until(ws, "result", "analyze")[-1]["version"] == 1
@@ -0,0 +1,117 @@
+import json
+
+import httpx
+import pytest
+
+from src.services.analyzer import DeepSeekAnalyzer
+from src.services.governor import create_governor
+
+LLM_JSON = {
+    "suggestions": ["Förslag ett", "Förslag två"],
+    "tone": "positive",
+    "alternative_text": "En förbättrad text.",
+}
+
+
+def completion(content: str) -> dict:
+    return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+
+def make_client(handler) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def make_analyzer(client: httpx.AsyncClient) -> DeepSeekAnalyzer:
+    # Egen governor per test så att andra tester inte påverkar circuit breakern
+    return DeepSeekAnalyzer("test-key", client=client, governor=create_governor())
+
+
+@pytest.mark.asyncio
+async def test_analyze_uses_injected_client():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(200, json=completion(json.dumps(LLM_JSON)))
+
+    async with make_client(handler) as client:
+        analyzer = make_analyzer(client)
+        suggestions, tone, alternative = await analyzer.analyze_text("Hej hej")
+        await analyzer.analyze_text("Hej igen")
+        assert not client.is_closed
+
+    assert len(calls) == 2
+    assert calls[0].headers["authorization"] == "Bearer test-key"
+    assert suggestions == LLM_JSON["suggestions"]
+    assert tone == "positive"
+    assert alternative == "En förbättrad text."
+
+
+def sse_body(content: str, chunk_size: int = 7) -> bytes:
+    lines = []
+    for i in range(0, len(content), chunk_size):
+        chunk = {"choices": [{"delta": {"content": content[i : i + chunk_size]}}]}
+        lines.append(f"data: {json.dumps(chunk)}\n\n")
+    lines.append("data: [DONE]\n\n")
+    return "".join(lines).encode()
+
+
+@pytest.mark.asyncio
+async def test_stream_analyze_emits_partial_fields_then_result():
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(
+            200,
+            content=sse_body(json.dumps(LLM_JSON, ensure_ascii=False)),
+            headers={"content-type": "text/event-stream"},
+        )
+
+    async with make_client(handler) as client:
+        analyzer = make_analyzer(client)
+        events = [event async for event in analyzer.stream_analyze("Hej hej")]
+
+    names = [name for name, _ in events]
+    assert names[:2] == ["suggestion", "suggestion"]
+    assert names.index("tone") < names.index("result")
+    assert events[-1] == ("result", LLM_JSON)
+
+
+@pytest.mark.asyncio
+async def test_reply_without_json_is_retried_not_returned(monkeypatch):
+    from src.services import analyzer as analyzer_module
+    from src.utils.instrumentation import RETRIES, UPSTREAM_SECONDS
+
+    monkeypatch.setattr(analyzer_module, "RETRY_BACKOFF_BASE", 0)
+    retries_before = RETRIES.value("analyze", "no_json")
+    attempts_before = UPSTREAM_SECONDS.labels("analyze", "200").count
+    replies = iter(["Inget JSON här", json.dumps(LLM_JSON)])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=completion(next(replies)))
+
+    async with make_client(handler) as client:
+        suggestions, tone, alternative = await make_analyzer(client).analyze_text("Hej hej")
+
+    # Ett svar utan JSON blir aldrig ett resultat (som annars skulle cachas); nästa försök gäller
+    assert (suggestions, tone, alternative) == (
+        LLM_JSON["suggestions"], "positive", "En förbättrad text."
+    )
+    assert RETRIES.value("analyze", "no_json") == retries_before + 1
+    assert UPSTREAM_SECONDS.labels("analyze", "200").count == attempts_before + 2
+
+
+@pytest.mark.asyncio
+async def test_payload_sets_max_tokens_from_text_length():
+    bodies = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        bodies.append(json.loads(request.content))
+        return httpx.Response(200, json=completion(json.dumps(LLM_JSON)))
+
+    async with make_client(handler) as client:
+        analyzer = make_analyzer(client)
+        await analyzer.analyze_text("kort text")
+        await analyzer.analyze_text(" ".join(["ord"] * 2000))
+
+    short, long = (body["max_tokens"] for body in bodies)
+    assert 256 <= short < long <= 8192
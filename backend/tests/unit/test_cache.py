@@ -0,0 +1,112 @@
+import pytest
+
+from src.services.analyzer import CachedAnalyzer
+from src.services.cache import MemoryLRUCache, ResponseCache, SQLiteCache, make_cache_key
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingAnalyzer:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def analyze_text(self, text, temperature=0.7):
+        self.calls += 1
+        return ["Ett", "Två"], "neutral", text.upper()
+
+    async def generate_text(self, text, selected_suggestions, temperature=0.7):
+        self.calls += 1
+        return f"{text} ({len(selected_suggestions)})"
+
+
+def test_cache_key_normalizes_whitespace_and_separates_inputs():
+    base = make_cache_key("analyze", "Hej  där\n", 0.7, prompt_version="1")
+    assert base == make_cache_key("analyze", " Hej där", 0.7, prompt_version="1")
+    assert base != make_cache_key("analyze", "Hej där", 0.0, prompt_version="1")
+    assert base != make_cache_key("analyze", "Hej där", 0.7, prompt_version="2")
+    assert base != make_cache_key("generate", "Hej där", 0.7, ["A"], prompt_version="1")
+
+
+@pytest.mark.asyncio
+async def test_memory_lru_evicts_by_bytes_and_expires():
+    clock = FakeClock()
+    cache = MemoryLRUCache(max_bytes=30, clock=clock)
+    await cache.set("a", b"x" * 10, ttl_seconds=60)
+    await cache.set("b", b"x" * 10, ttl_seconds=60)
+    assert await cache.get("a") is not None  # a blir senast använd
+    await cache.set("c", b"x" * 10, ttl_seconds=5)
+    assert await cache.get("b") is None
+    assert cache.stats.evictions == 1
+    assert cache.size_bytes <= cache.max_bytes
+
+    clock.now += 10
+    assert await cache.get("c") is None
+    assert await cache.get("a") is not None
+    assert cache.stats.expirations == 1
+
+
+@pytest.mark.asyncio
+async def test_sqlite_cache_roundtrip(tmp_path):
+    cache = SQLiteCache(tmp_path / "cache.sqlite3", max_bytes=1024 * 1024)
+    await cache.set("k", b"value", ttl_seconds=60)
+    assert await cache.get("k") == b"value"
+    await cache.set("gone", b"value", ttl_seconds=-1)
+    assert await cache.get("gone") is None
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_cache_purges_expired_rows_and_stays_under_max_bytes(tmp_path):
+    clock = FakeClock()
+    cache = SQLiteCache(tmp_path / "cache.sqlite3", max_bytes=30, clock=clock, trim_every=1)
+    await cache.set("a", b"x" * 10, ttl_seconds=5)
+    await cache.set("b", b"x" * 10, ttl_seconds=60)
+    clock.now += 10
+    await cache.set("c", b"x" * 10, ttl_seconds=30)
+    assert cache.stats.expirations == 1
+
+    await cache.set("d", b"x" * 10, ttl_seconds=90)
+    # 3 * 11 bytes > 30: c går ut först och får ge plats
+    assert cache.stats.evictions == 1
+    assert await cache.get("c") is None
+    assert [await cache.get(key) for key in ("b", "d")] == [b"x" * 10, b"x" * 10]
+    await cache.set("stor", b"x" * 100, ttl_seconds=60)
+    assert await cache.get("stor") is None
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_cached_analyzer_serves_repeats_from_cache():
+    inner = CountingAnalyzer()
+    cache = ResponseCache(MemoryLRUCache(1024 * 1024), ttl_seconds=60, deterministic_ttl_seconds=600)
+    analyzer = CachedAnalyzer(inner, cache)
+
+    first = await analyzer.analyze_text("Samma text", temperature=0.0)
+    second = await analyzer.analyze_text("Samma   text", temperature=0.0)
+    await analyzer.generate_text("Samma text", ["Ett"], temperature=0.0)
+    await analyzer.generate_text("Samma text", ["Ett"], temperature=0.0)
+
+    assert first == second
+    assert inner.calls == 2
+    assert cache.stats.hits == 2
+    assert cache.stats.misses == 2
+
+
+@pytest.mark.asyncio
+async def test_sampled_temperatures_bypass_cache_when_disabled():
+    inner = CountingAnalyzer()
+    cache = ResponseCache(
+        MemoryLRUCache(1024 * 1024), ttl_seconds=60, deterministic_ttl_seconds=600, cache_sampled=False
+    )
+    analyzer = CachedAnalyzer(inner, cache)
+    await analyzer.analyze_text("Text", temperature=0.7)
+    await analyzer.analyze_text("Text", temperature=0.7)
+    await analyzer.analyze_text("Text", temperature=0.0)
+    await analyzer.analyze_text("Text", temperature=0.0)
+    assert inner.calls == 3
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+
+from src.services.analyzer import ChunkingAnalyzer
+from src.services.chunking import merge_suggestions, merge_tone, split_text
+
+
+def test_split_text_keeps_paragraphs_and_roundtrips():
+    paragraphs = [" ".join([f"ord{i}"] * 40) + "." for i in range(6)]
+    text = "\n\n".join(paragraphs)
+
+    chunks = split_text(text, 500)
+
+    assert len(chunks) > 1
+    assert all(len(chunk.text) <= 500 for chunk in chunks)
+    assert "".join(chunk.text + chunk.separator for chunk in chunks) == text
+
+
+def test_split_text_falls_back_to_sentences_and_words():
+    text = "Första meningen är här. " * 30 + "x" * 10 + " " + "ord " * 200
+
+    chunks = split_text(text.strip(), 200)
+
+    assert all(len(chunk.text) <= 200 for chunk in chunks)
+    assert " ".join(" ".join(c.text for c in chunks).split()) == " ".join(text.split())
+
+
+def test_merge_tone_and_suggestions():
+    assert merge_tone(["positive", "negative", "positive"], [10, 10, 10]) == "neutral"
+    assert merge_tone(["positive", "neutral"], [30, 10]) == "positive"
+    merged = merge_suggestions([["A", "B", "C"], ["a", "D"], ["E"]], 3)
+    assert merged == ["A", "E", "B"]
+
+
+class RecordingAnalyzer:
+    def __init__(self) -> None:
+        self.texts: list[str] = []
+        self.active = 0
+        self.peak = 0
+
+    async def analyze_text(self, text, temperature=0.7):
+        self.texts.append(text)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        tone = "negative" if "arg" in text else "positive"
+        return [f"Förslag {len(self.texts)}", "Gemensamt"], tone, text.upper()
+
+
+@pytest.mark.asyncio
+async def test_chunking_analyzer_runs_chunks_concurrently_and_merges():
+    inner = RecordingAnalyzer()
+    analyzer = ChunkingAnalyzer(inner, chunk_chars=100, concurrency=2)
+    text = "\n\n".join(" ".join(["glad"] * 15) for _ in range(5))
+
+    suggestions, tone, alternative = await analyzer.analyze_text(text)
+
+    assert len(inner.texts) == 5
+    assert inner.peak == 2
+    assert len(suggestions) == len(set(suggestions)) == 3
+    assert tone == "positive"
+    assert alternative == text.upper()
+
+
+@pytest.mark.asyncio
+async def test_chunking_analyzer_passes_short_text_through():
+    inner = RecordingAnalyzer()
+    analyzer = ChunkingAnalyzer(inner, chunk_chars=100, concurrency=2)
+
+    _, tone, _ = await analyzer.analyze_text("kort arg text")
+
+    assert inner.texts == ["kort arg text"]
+    assert tone == "negative"
+
+
+@pytest.mark.asyncio
+async def test_chunking_analyzer_streams_merged_result_for_long_text():
+    analyzer = ChunkingAnalyzer(RecordingAnalyzer(), chunk_chars=100, concurrency=2)
+    text = "\n\n".join(" ".join(["glad"] * 15) for _ in range(3))
+
+    events = [event async for event in analyzer.stream_analyze(text)]
+
+    names = [name for name, _ in events]
+    assert names == ["suggestion"] * 3 + ["tone", "alternative_text", "result"]
+    assert events[-1][1]["alternative_text"] == text.upper()
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from src.services.coalescing import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_upstream_call():
+    flight = SingleFlight()
+    started = 0
+    release = asyncio.Event()
+
+    async def upstream() -> str:
+        nonlocal started
+        started += 1
+        await release.wait()
+        return "svar"
+
+    waiters = [asyncio.create_task(flight.do("k", upstream)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters)
+
+    assert results == ["svar"] * 5
+    assert started == 1
+    assert flight.stats.coalesced == 4
+    assert flight.inflight() == 0
+
+
+@pytest.mark.asyncio
+async def test_failure_fans_out_to_all_waiters():
+    flight = SingleFlight()
+
+    async def upstream() -> str:
+        await asyncio.sleep(0)
+        raise RuntimeError("upstream nere")
+
+    results = await asyncio.gather(
+        *(flight.do("k", upstream) for _ in range(3)), return_exceptions=True
+    )
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+@pytest.mark.asyncio
+async def test_cancelling_one_waiter_keeps_shared_call_alive():
+    flight = SingleFlight()
+    release = asyncio.Event()
+    cancelled = False
+
+    async def upstream() -> str:
+        nonlocal cancelled
+        try:
+            await release.wait()
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        return "svar"
+
+    first = asyncio.create_task(flight.do("k", upstream))
+    second = asyncio.create_task(flight.do("k", upstream))
+    await asyncio.sleep(0)
+    first.cancel()
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await second == "svar"
+    assert first.cancelled()
+    assert not cancelled
+
+
+@pytest.mark.asyncio
+async def test_last_waiter_cancelling_cancels_upstream():
+    flight = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def upstream() -> str:
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+        return "aldrig"
+
+    only = asyncio.create_task(flight.do("k", upstream))
+    await asyncio.sleep(0)
+    only.cancel()
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    assert flight.stats.abandoned == 1
+
+
+@pytest.mark.asyncio
+async def test_new_caller_after_abandonment_starts_fresh_call():
+    flight = SingleFlight()
+    calls = 0
+
+    async def upstream() -> str:
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            await asyncio.Event().wait()
+        return "nytt svar"
+
+    only = asyncio.create_task(flight.do("k", upstream))
+    await asyncio.sleep(0)
+    only.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await only
+    # Den avbrutna tasken har inte hunnit köra sin done-callback; nyckeln ska ändå vara fri
+    assert await flight.do("k", upstream) == "nytt svar"
+    assert calls == 2
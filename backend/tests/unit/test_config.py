@@ -0,0 +1,58 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from src.utils.config import Settings, get_settings
+
+BACKEND_DIR = Path(__file__).parent.parent.parent
+
+
+def test_settings_are_created_once():
+    assert get_settings() is get_settings()
+
+
+def test_environment_fills_unset_fields(monkeypatch):
+    monkeypatch.setenv("JOBS_WORKERS", "7")
+    monkeypatch.setenv("CACHE_BACKEND", "SQLite")
+    monkeypatch.setenv("CORS_ORIGINS", "http://a.test, http://b.test")
+    monkeypatch.setenv("LLM_MODEL", "")
+
+    config = Settings(jobs_workers=2)
+
+    assert config.jobs_workers == 2
+    assert config.cache_backend == "sqlite"
+    assert config.cors_origins == ["http://a.test", "http://b.test"]
+    assert config.llm_model == ""
+
+
+def test_environment_aliases_in_order(monkeypatch):
+    monkeypatch.delenv("LLM_API_KEY", raising=False)
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "ds-key")
+    monkeypatch.setenv("WEB_CONCURRENCY", "3")
+
+    assert Settings().llm_api_key == "ds-key"
+    assert Settings().serve_workers == 3
+
+    monkeypatch.setenv("LLM_API_KEY", "llm-key")
+    assert Settings().llm_api_key == "llm-key"
+
+
+def test_importing_main_does_not_build_app():
+    probe = (
+        "import sys, src.main\n"
+        "print('src.api.routes' in sys.modules, src.utils.config.get_settings.cache_info().currsize)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", probe], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+
+    assert result.stdout.split() == ["False", "0"]
+
+
+def test_relative_data_paths_resolve_under_data_dir(tmp_path):
+    config = Settings(data_dir=str(tmp_path / "data"))
+
+    assert config.data_path("history.sqlite3") == tmp_path / "data" / "history.sqlite3"
+    assert (tmp_path / "data").is_dir()
+    absolute = tmp_path / "annan" / "history.sqlite3"
+    assert config.data_path(str(absolute)) == absolute
@@ -0,0 +1,102 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from src.services.governor import (
+    AIMDLimiter,
+    CircuitBreaker,
+    TokenBucket,
+    UpstreamGovernor,
+    parse_retry_after,
+)
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_governor(clock: FakeClock, **breaker_kwargs) -> UpstreamGovernor:
+    return UpstreamGovernor(
+        request_bucket=TokenBucket(rate=0, capacity=1, clock=clock),
+        token_bucket=TokenBucket(rate=0, capacity=1, clock=clock),
+        limiter=AIMDLimiter(initial=4, minimum=1, maximum=8, latency_threshold=10),
+        breaker=CircuitBreaker(
+            failure_threshold=breaker_kwargs.get("threshold", 2), cooldown_seconds=5, clock=clock
+        ),
+        max_wait_seconds=1,
+        clock=clock,
+    )
+
+
+def response(status: int, headers: dict[str, str] | None = None) -> httpx.Response:
+    return httpx.Response(status, headers=headers, request=httpx.Request("POST", "http://llm"))
+
+
+def test_token_bucket_reports_wait_when_empty():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, capacity=2, clock=clock)
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == 0
+    assert bucket.reserve(1) == pytest.approx(0.5)
+    clock.now += 1.5
+    assert bucket.reserve(1) == 0
+
+
+def test_retry_after_parsing():
+    assert parse_retry_after(response(429, {"Retry-After": "7"})) == 7
+    assert parse_retry_after(response(429, {"Retry-After": "soon"})) is None
+    assert parse_retry_after(response(429)) is None
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_fails_fast_and_recovers_through_half_open():
+    clock = FakeClock()
+    governor = make_governor(clock)
+
+    for _ in range(2):
+        async with governor.slot(10) as permit:
+            permit.observe(response(503))
+    assert governor.breaker.state == "open"
+
+    with pytest.raises(HTTPException) as exc_info:
+        async with governor.slot(10):
+            pass
+    assert exc_info.value.status_code == 503
+    assert "Retry-After" in exc_info.value.headers
+
+    clock.now += 6
+    async with governor.slot(10) as permit:
+        assert governor.breaker.state == "half_open"
+        permit.observe(response(200))
+    assert governor.breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_overload_halves_concurrency_and_retry_after_pauses():
+    clock = FakeClock()
+    governor = make_governor(clock, threshold=10)
+    async with governor.slot(10) as permit:
+        permit.observe(response(429, {"Retry-After": "30"}))
+    assert governor.limiter.limit == 2
+    # Pausen är längre än max_wait_seconds -> avvisa direkt i stället för att sova
+    with pytest.raises(HTTPException):
+        async with governor.slot(10):
+            pass
+
+
+@pytest.mark.asyncio
+async def test_aimd_limiter_queues_beyond_limit():
+    limiter = AIMDLimiter(initial=1, minimum=1, maximum=4, latency_threshold=10)
+    await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    limiter.release(overloaded=False, latency=0.1)
+    await asyncio.wait_for(waiter, timeout=1)
+    assert limiter.inflight == 1
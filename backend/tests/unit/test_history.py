@@ -0,0 +1,96 @@
+import pytest
+
+from src.services.history import (
+    HISTORY_BATCHES,
+    HISTORY_WRITES,
+    HistoryEntry,
+    HistoryStore,
+    HistoryWriter,
+    fts_query,
+)
+
+
+def analysis(tone: str) -> dict[str, object]:
+    return {"suggestions": ["A", "B"], "tone": tone, "alternative_text": "Alt"}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = HistoryStore(tmp_path / "history.sqlite3")
+    yield store
+    store.close()
+
+
+def test_fts_query_quotes_terms_and_prefixes_last():
+    assert fts_query('Årsrapport "OR" för*') == '"Årsrapport" "OR" "för"*'
+    assert fts_query("  ?! ") == ""
+
+
+@pytest.mark.asyncio
+async def test_pages_are_newest_first_and_filtered(store):
+    store.insert_many([
+        HistoryEntry("klient", "analyze", f"Text {i}", analysis("positive" if i % 2 else "neutral"), float(i))
+        for i in range(5)
+    ])
+    store.insert_many([HistoryEntry("annan", "analyze", "Annans text", analysis("neutral"), 10.0)])
+
+    first = await store.page("klient", limit=2)
+    second = await store.page("klient", limit=2, cursor=first.next_cursor)
+    last = await store.page("klient", limit=2, cursor=second.next_cursor)
+
+    assert [item.text for item in first.items + second.items + last.items] == [
+        "Text 4", "Text 3", "Text 2", "Text 1", "Text 0"
+    ]
+    assert last.next_cursor is None
+    positive = await store.page("klient", limit=10, tone="positive")
+    assert [item.text for item in positive.items] == ["Text 3", "Text 1"]
+
+
+@pytest.mark.asyncio
+async def test_search_matches_words_and_prefix_per_client(store):
+    store.insert_many([
+        HistoryEntry("klient", "analyze", "Kvartalsrapporten är försenad", analysis("negative"), 1.0),
+        HistoryEntry("klient", "generate", "Välkommen till mötet", {"generated_text": "Hej"}, 2.0),
+        HistoryEntry("annan", "analyze", "Kvartalsrapporten är klar", analysis("positive"), 3.0),
+    ])
+
+    hits = await store.search("klient", "kvartalsrapp", limit=10)
+    assert [item.text for item in hits.items] == ["Kvartalsrapporten är försenad"]
+    assert hits.items[0].tone == "negative"
+    assert (await store.search("klient", "välkommen mötet", limit=10)).items[0].kind == "generate"
+    assert (await store.search("klient", "klar", limit=10)).items == []
+
+
+@pytest.mark.asyncio
+async def test_delete_only_own_items(store):
+    store.insert_many([HistoryEntry("klient", "analyze", "Text", analysis("neutral"), 1.0)])
+    item_id = (await store.page("klient", limit=1)).items[0].id
+
+    assert not await store.delete("annan", item_id)
+    assert await store.delete("klient", item_id)
+    assert (await store.search("klient", "Text", limit=10)).items == []
+
+
+@pytest.mark.asyncio
+async def test_writer_batches_and_flushes_on_stop(store):
+    writer = HistoryWriter(store, batch_size=3, flush_seconds=60, max_queued=100)
+    batches_before = HISTORY_BATCHES.value()
+    writer.start()
+    for i in range(7):
+        writer.record("klient", "analyze", f"Text {i}", analysis("neutral"))
+
+    await writer.stop()
+
+    assert len((await store.page("klient", limit=10)).items) == 7
+    assert HISTORY_BATCHES.value() - batches_before == 3
+
+
+@pytest.mark.asyncio
+async def test_writer_drops_when_queue_is_full(store):
+    writer = HistoryWriter(store, batch_size=10, flush_seconds=0, max_queued=1)
+    dropped_before = HISTORY_WRITES.value("dropped")
+
+    writer.record("klient", "analyze", "Första", analysis("neutral"))
+    writer.record("klient", "analyze", "Andra", analysis("neutral"))
+
+    assert HISTORY_WRITES.value("dropped") - dropped_before == 1
@@ -0,0 +1,87 @@
+import pytest
+
+from src.services.cache import MemoryLRUCache, ResponseCache
+from src.services.chunking import split_segments
+from src.services.incremental import INCREMENTAL_FALLBACKS, MIN_SEGMENT_WORDS, IncrementalAnalyzer
+
+
+def paragraph(word: str, words: int = MIN_SEGMENT_WORDS) -> str:
+    return " ".join([word] * words) + "."
+
+
+PARAGRAPHS = [paragraph("första"), "Kort mellanrad.", paragraph("andra"), paragraph("tredje")]
+TEXT = "\n\n".join(PARAGRAPHS)
+
+
+class RecordingAnalyzer:
+    def __init__(self, stretch: int = 0) -> None:
+        self.analyzed: list[str] = []
+        self.generated: list[str] = []
+        self.stretch = stretch
+
+    async def analyze_text(self, text, temperature=0.7):
+        self.analyzed.append(text)
+        tone = "negative" if "arg" in text else "positive"
+        return [f"Förslag för {text.split()[0]}"], tone, text.upper()
+
+    async def generate_text(self, text, selected_suggestions, temperature=0.7):
+        self.generated.append(text)
+        return text.upper() + " extra" * self.stretch
+
+
+def make_analyzer(inner: RecordingAnalyzer) -> IncrementalAnalyzer:
+    cache = ResponseCache(MemoryLRUCache(1024 * 1024), ttl_seconds=60, deterministic_ttl_seconds=60)
+    return IncrementalAnalyzer(inner, cache, segment_chars=5000, concurrency=2)
+
+
+def test_segments_are_local_to_each_paragraph():
+    segments = split_segments(TEXT, 5000, MIN_SEGMENT_WORDS)
+    # Den korta raden följer med stycket före; texten går att foga ihop exakt
+    assert len(segments) == 3
+    assert "".join(s.text + s.separator for s in segments) == TEXT
+
+    edited = TEXT.replace(PARAGRAPHS[0], "Ny inledning. " + PARAGRAPHS[0])
+    edited_segments = split_segments(edited, 5000, MIN_SEGMENT_WORDS)
+    assert [s.text for s in edited_segments[1:]] == [s.text for s in segments[1:]]
+
+
+@pytest.mark.asyncio
+async def test_only_changed_segments_are_sent_again():
+    inner = RecordingAnalyzer()
+    analyzer = make_analyzer(inner)
+
+    suggestions, tone, alternative = await analyzer.analyze_text(TEXT)
+    assert len(inner.analyzed) == 3
+    assert alternative == TEXT.upper()
+    assert tone == "positive"
+    assert suggestions == ["Förslag för första", "Förslag för andra", "Förslag för tredje"]
+
+    edited = TEXT.replace(PARAGRAPHS[2], paragraph("arg"))
+    suggestions, tone, alternative = await analyzer.analyze_text(edited)
+    assert inner.analyzed[3:] == [paragraph("arg")]
+    assert alternative == edited.upper()
+    assert "Förslag för arg" in suggestions
+
+
+@pytest.mark.asyncio
+async def test_generation_is_stitched_and_falls_back_outside_word_bounds():
+    inner = RecordingAnalyzer()
+    analyzer = make_analyzer(inner)
+    assert await analyzer.generate_text(TEXT, ["Förslag"]) == TEXT.upper()
+    assert len(inner.generated) == 3
+
+    # Varje segment växer med 20 ord; hopfogat blir det fler än tillåtna +50 ord
+    stretched = RecordingAnalyzer(stretch=20)
+    fallbacks_before = INCREMENTAL_FALLBACKS.value()
+    generated = await make_analyzer(stretched).generate_text(TEXT, ["Förslag"])
+    assert stretched.generated[-1] == TEXT
+    assert generated.startswith(TEXT.upper())
+    assert INCREMENTAL_FALLBACKS.value() == fallbacks_before + 1
+
+
+@pytest.mark.asyncio
+async def test_single_segment_passes_through():
+    inner = RecordingAnalyzer()
+    analyzer = make_analyzer(inner)
+    await analyzer.analyze_text("En kort text.")
+    assert inner.analyzed == ["En kort text."]
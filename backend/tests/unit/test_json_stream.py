@@ -0,0 +1,64 @@
+import json
+
+from src.services.json_stream import AnalyzeStreamParser
+from src.utils.sse import sse_event
+
+CONTENT = "```json\n" + json.dumps(
+    {
+        "suggestions": ["Korta \"meningar\"", "Använd aktiva verb\nmer"],
+        "tone": "negative",
+        "alternative_text": "Ny text med \\u00e5 och radbrytning\n.",
+    },
+    ensure_ascii=False,
+) + "\n```"
+
+
+def collect(chunks):
+    parser = AnalyzeStreamParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    return parser, events
+
+
+def test_parser_emits_fields_as_they_complete_token_by_token():
+    parser, events = collect(list(CONTENT))
+    complete = [(name, value) for name, value in events if not name.endswith("_delta")]
+    assert complete == [
+        ("suggestion", 'Korta "meningar"'),
+        ("suggestion", "Använd aktiva verb\nmer"),
+        ("tone", "negative"),
+        ("alternative_text", "Ny text med \\u00e5 och radbrytning\n."),
+    ]
+    deltas = "".join(value for name, value in events if name == "alternative_text_delta")
+    assert deltas == "Ny text med \\u00e5 och radbrytning\n."
+    assert parser.done
+
+
+def test_parser_handles_unicode_escapes_split_across_chunks():
+    raw = '{"tone": "neu\\u0074ral", "suggestions": ["a"]}'
+    _, events = collect([raw[:16], raw[16:20], raw[20:]])
+    assert ("tone", "neutral") in events
+    assert ("suggestion", "a") in events
+
+
+def test_suggestion_is_emitted_before_rest_of_object_arrives():
+    parser = AnalyzeStreamParser()
+    assert parser.feed('{"suggestions": ["Första"') == [("suggestion", "Första")]
+    assert not parser.done
+
+
+def test_parser_combines_escaped_surrogate_pairs():
+    raw = (
+        '{"tone": "positive", "alternative_text": "Bra jobbat \\ud83d\\ude00!", '
+        '"suggestions": ["\\ud83d x"]}'
+    )
+    _, events = collect(list(raw))
+
+    assert ("alternative_text", "Bra jobbat \U0001F600!") in events
+    deltas = [value for name, value in events if name == "alternative_text_delta"]
+    assert "".join(deltas) == "Bra jobbat \U0001F600!"
+    # En hög surrogat utan sin andra halva ersätts, så att händelsen går att serialisera
+    assert ("suggestion", "\ufffd x") in events
+    for name, value in events:
+        sse_event(name, value)
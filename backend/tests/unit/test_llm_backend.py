@@ -0,0 +1,119 @@
+import asyncio
+from contextlib import aclosing
+
+import httpx
+import pytest
+
+from src.mock_llm import create_mock_app
+from src.services.analyzer import DeepSeekAnalyzer
+from src.services.governor import Permit, create_governor
+from src.services.llm_backend import (
+    DeepSeekBackend,
+    MockBackend,
+    OpenAICompatibleBackend,
+    create_llm_backend,
+)
+from src.utils.config import Settings
+
+TEXT = " ".join(f"ord{i}" for i in range(80))
+
+
+def mock_backend(**overrides) -> MockBackend:
+    config = Settings(mock_llm_latency_ms=0, mock_llm_token_delay_ms=0, **overrides)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_mock_app(config)))
+    return MockBackend("http://mock-llm/v1", client)
+
+
+def make_analyzer(backend: MockBackend) -> DeepSeekAnalyzer:
+    return DeepSeekAnalyzer(None, governor=create_governor(), backend=backend)
+
+
+@pytest.mark.asyncio
+async def test_mock_backend_serves_valid_analysis_and_generation():
+    analyzer = make_analyzer(mock_backend())
+
+    suggestions, tone, alternative = await analyzer.analyze_text(TEXT)
+    generated = await analyzer.generate_text(TEXT, ["Förslag"])
+
+    assert 2 <= len(suggestions) <= 3
+    assert tone == "neutral"
+    assert alternative == TEXT
+    assert generated == TEXT
+
+
+@pytest.mark.asyncio
+async def test_mock_backend_streams_generation():
+    analyzer = make_analyzer(mock_backend())
+
+    events = [event async for event in analyzer.stream_generate(TEXT, ["Förslag"])]
+
+    deltas = [data for name, data in events if name == "delta"]
+    assert len(deltas) > 1
+    assert "".join(deltas) == TEXT
+    assert events[-1] == ("result", {"generated_text": TEXT})
+
+
+@pytest.mark.asyncio
+async def test_mock_backend_injects_errors():
+    backend = mock_backend(mock_llm_error_rate=1.0)
+    payload = {"model": backend.model, "messages": [{"role": "user", "content": "Hej"}]}
+    permit = Permit(estimated_tokens=1)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await backend.complete(payload, "test", permit)
+    assert permit.status_code == 500
+
+
+def test_backend_selection_from_settings():
+    openai = create_llm_backend(config=Settings(llm_backend="openai", llm_base_url="http://vllm:8000/v1/"))
+    deepseek = create_llm_backend(config=Settings(llm_backend="deepseek", llm_model=""))
+
+    assert isinstance(openai, OpenAICompatibleBackend)
+    assert openai.url == "http://vllm:8000/v1/chat/completions"
+    assert isinstance(deepseek, DeepSeekBackend)
+    assert deepseek.url == "https://api.deepseek.com/v1/chat/completions"
+    assert deepseek.model == "deepseek-chat"
+
+
+@pytest.mark.asyncio
+async def test_usage_reports_prompt_cache_hits_for_shared_prefix():
+    from src.utils.instrumentation import LLM_TOKENS
+
+    analyzer = make_analyzer(mock_backend())
+    hits_before = LLM_TOKENS.value("analyze", "prompt_cache_hit")
+    streamed_before = LLM_TOKENS.value("generate_stream", "prompt")
+
+    await analyzer.analyze_text(TEXT)
+    first_hits = LLM_TOKENS.value("analyze", "prompt_cache_hit") - hits_before
+    await analyzer.analyze_text(TEXT + " igen")
+    [event async for event in analyzer.stream_generate(TEXT, ["Förslag"])]
+
+    assert first_hits == 0
+    assert LLM_TOKENS.value("analyze", "prompt_cache_hit") > hits_before
+    assert LLM_TOKENS.value("generate_stream", "prompt") > streamed_before
+
+
+@pytest.mark.asyncio
+async def test_cancelled_stream_releases_upstream_slot():
+    config = Settings(mock_llm_latency_ms=0, mock_llm_token_delay_ms=20)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_mock_app(config)))
+    analyzer = make_analyzer(MockBackend("http://mock-llm/v1", client))
+    started = asyncio.Event()
+
+    async def consume() -> None:
+        # Som /ws/session: klienten tar emot en händelse i taget och avbryts mitt i strömmen
+        async with aclosing(analyzer.stream_generate(TEXT, ["Förslag"])) as events:
+            async for _ in events:
+                started.set()
+                await asyncio.Event().wait()
+
+    task = asyncio.create_task(consume())
+    await asyncio.wait_for(started.wait(), timeout=5)
+    assert analyzer.governor.limiter.inflight == 1
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    # Avbrottet stänger httpx-strömmen och lämnar tillbaka platsen utan att räknas som fel
+    assert analyzer.governor.limiter.inflight == 0
+    assert analyzer.governor.breaker.consecutive_failures == 0
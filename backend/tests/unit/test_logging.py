@@ -0,0 +1,58 @@
+import json
+import logging
+import queue
+
+from src.utils.logging import (
+    LOG_RECORDS_DROPPED,
+    BoundedQueueHandler,
+    CorrelationFilter,
+    JsonLogFormatter,
+    SamplingFilter,
+    correlation_id_var,
+)
+
+
+def make_record(level: int = logging.INFO, msg: str = "Hej %s", args: tuple = ("världen",)) -> logging.LogRecord:
+    return logging.LogRecord("test", level, __file__, 1, msg, args, None)
+
+
+def test_queue_handler_defers_formatting_and_drops_when_full():
+    log_queue: queue.Queue[logging.LogRecord] = queue.Queue(maxsize=1)
+    handler = BoundedQueueHandler(log_queue, policy="drop")
+    dropped_before = LOG_RECORDS_DROPPED.value()
+
+    handler.handle(make_record())
+    handler.handle(make_record())
+
+    assert handler.dropped == 1
+    assert LOG_RECORDS_DROPPED.value() == dropped_before + 1
+    queued = log_queue.get_nowait()
+    assert queued.msg == "Hej världen"
+    assert queued.args is None
+    line = json.loads(JsonLogFormatter().format(queued))
+    assert line["message"] == "Hej världen"
+
+
+def test_correlation_id_is_taken_from_context():
+    handler = BoundedQueueHandler(queue.Queue(), policy="drop")
+    handler.addFilter(CorrelationFilter())
+    token = correlation_id_var.set("cid-123")
+    try:
+        handler.handle(make_record())
+    finally:
+        correlation_id_var.reset(token)
+
+    record = handler.queue.get_nowait()
+    assert json.loads(JsonLogFormatter().format(record))["correlation_id"] == "cid-123"
+
+
+def test_sampling_keeps_warnings_and_whole_requests():
+    sampler = SamplingFilter(rate=0.0)
+    assert sampler.filter(make_record(logging.WARNING)) is True
+    assert sampler.filter(make_record(logging.INFO)) is False
+
+    half = SamplingFilter(rate=0.5)
+    record = make_record()
+    record.correlation_id = "samma-request"
+    decisions = {half.filter(record) for _ in range(10)}
+    assert len(decisions) == 1
@@ -0,0 +1,65 @@
+import pytest
+
+from src.utils.instrumentation import Timer
+from src.utils.metrics import Registry
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latens", ("route",), buckets=(0.1, 1.0))
+    latency.labels("/analyze").observe(0.05)
+    latency.labels("/analyze").observe(0.1)
+    latency.labels("/analyze").observe(5.0)
+
+    text = registry.render()
+
+    assert "# TYPE latency_seconds histogram" in text
+    assert 'latency_seconds_bucket{route="/analyze",le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{route="/analyze",le="1"} 2' in text
+    assert 'latency_seconds_bucket{route="/analyze",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{route="/analyze"} 3' in text
+
+
+def test_counter_and_gauge_render_with_escaped_labels():
+    registry = Registry()
+    retries = registry.counter("retries", "Omförsök", ("reason",))
+    retries.labels('http "429"').inc()
+    retries.labels('http "429"').inc(2)
+    registry.gauge("depth", "Ködjup", ("queue",), lambda: {("jobs",): 4.0})
+
+    text = registry.render()
+
+    assert 'retries_total{reason="http \\"429\\""} 3' in text
+    assert 'depth{queue="jobs"} 4' in text
+    assert retries.value('http "429"') == 3
+
+
+def test_timer_records_outcome_from_exception():
+    registry = Registry()
+    stage = registry.histogram("stage_seconds", "Steg", ("stage", "outcome"))
+
+    with Timer(stage, "parse"):
+        pass
+    with pytest.raises(ValueError), Timer(stage, "parse"):
+        raise ValueError("trasig")
+    with Timer(stage, "upstream") as timer:
+        timer.outcome = "429"
+
+    text = registry.render()
+    assert 'stage_seconds_count{stage="parse",outcome="ok"} 1' in text
+    assert 'stage_seconds_count{stage="parse",outcome="error"} 1' in text
+    assert 'stage_seconds_count{stage="upstream",outcome="429"} 1' in text
+
+
+@pytest.mark.asyncio
+async def test_event_loop_lag_monitor_records_samples():
+    import asyncio
+
+    from src.utils.instrumentation import EVENT_LOOP_LAG, monitor_event_loop_lag
+
+    before = EVENT_LOOP_LAG.labels().count
+    task = asyncio.create_task(monitor_event_loop_lag(interval=0.01))
+    await asyncio.sleep(0.06)
+    task.cancel()
+
+    assert EVENT_LOOP_LAG.labels().count > before
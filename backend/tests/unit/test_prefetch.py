@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from src.services.governor import create_governor
+from src.services.prefetch import PREFETCH_EVENTS, Prefetcher, likely_selections
+
+TEXT = "Kvartalsrapporten blir försenad eftersom siffrorna från ekonomi inte är klara."
+SUGGESTIONS = ["Förslag A", "Förslag B", "Förslag C"]
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class SlowAnalyzer:
+    def __init__(self, fail: bool = False) -> None:
+        self.calls: list[list[str]] = []
+        self.release = asyncio.Event()
+        self.fail = fail
+
+    async def generate_text(self, text, selected_suggestions, temperature=0.7):
+        self.calls.append(list(selected_suggestions))
+        await self.release.wait()
+        if self.fail:
+            raise HTTPException(status_code=503, detail="Generation service unavailable")
+        return f"Genererad med {len(selected_suggestions)} förslag"
+
+
+def make_prefetcher(**overrides):
+    options = {
+        "max_inflight": 4, "max_entries": 10, "ttl_seconds": 60, "tokens_per_minute": 0, "selections": 1
+    }
+    return Prefetcher(**{**options, **overrides}, governor=create_governor())
+
+
+def test_likely_selections_start_with_all_suggestions():
+    assert likely_selections(SUGGESTIONS, 3) == [
+        SUGGESTIONS, ["Förslag A", "Förslag B"], ["Förslag A", "Förslag C"]
+    ]
+    assert likely_selections(["Bara ett"], 5) == [["Bara ett"]]
+
+
+@pytest.mark.asyncio
+async def test_take_attaches_to_inflight_and_returns_finished():
+    analyzer = SlowAnalyzer()
+    prefetcher = make_prefetcher(selections=2)
+    inflight_before = PREFETCH_EVENTS.value("hit_inflight")
+
+    assert prefetcher.schedule(analyzer, TEXT, SUGGESTIONS, 0.7) == 2
+    waiting = asyncio.create_task(prefetcher.take(TEXT, SUGGESTIONS, 0.7))
+    await asyncio.sleep(0)
+    analyzer.release.set()
+
+    assert await waiting == "Genererad med 3 förslag"
+    assert await prefetcher.take(TEXT, SUGGESTIONS[:2], 0.7) == "Genererad med 2 förslag"
+    # Annan temperatur eller ett val som inte förhämtats är en miss
+    assert await prefetcher.take(TEXT, SUGGESTIONS, 1.0) is None
+    assert await prefetcher.take(TEXT, SUGGESTIONS[1:], 0.7) is None
+    assert len(analyzer.calls) == 2
+    assert PREFETCH_EVENTS.value("hit_inflight") == inflight_before + 1
+
+
+@pytest.mark.asyncio
+async def test_concurrency_and_cost_budget_limit_speculation():
+    analyzer = SlowAnalyzer()
+    limited = make_prefetcher(max_inflight=1, selections=3)
+    assert limited.schedule(analyzer, TEXT, SUGGESTIONS, 0.7) == 1
+
+    skipped_before = PREFETCH_EVENTS.value("skipped_budget")
+    cheap = make_prefetcher(tokens_per_minute=100)
+    # Första anropet tömmer budgeten; nästa text får vänta tills den fyllts på
+    assert cheap.schedule(analyzer, TEXT, SUGGESTIONS, 0.7) == 1
+    assert cheap.schedule(analyzer, TEXT + " Igen.", SUGGESTIONS, 0.7) == 0
+    assert PREFETCH_EVENTS.value("skipped_budget") == skipped_before + 1
+
+    await limited.close()
+    await cheap.close()
+    assert limited.inflight() == 0
+
+
+@pytest.mark.asyncio
+async def test_expired_results_are_counted_as_wasted():
+    clock = FakeClock()
+    analyzer = SlowAnalyzer()
+    analyzer.release.set()
+    prefetcher = make_prefetcher(ttl_seconds=30, clock=clock)
+    wasted_before = PREFETCH_EVENTS.value("wasted")
+
+    prefetcher.schedule(analyzer, TEXT, SUGGESTIONS, 0.7)
+    await asyncio.sleep(0)
+    clock.now = 31
+
+    assert await prefetcher.take(TEXT, SUGGESTIONS, 0.7) is None
+    assert PREFETCH_EVENTS.value("wasted") == wasted_before + 1
+
+
+@pytest.mark.asyncio
+async def test_failed_prefetch_falls_back_to_none():
+    analyzer = SlowAnalyzer(fail=True)
+    analyzer.release.set()
+    prefetcher = make_prefetcher()
+
+    prefetcher.schedule(analyzer, TEXT, SUGGESTIONS, 0.7)
+    await asyncio.sleep(0.01)
+
+    assert await prefetcher.take(TEXT, SUGGESTIONS, 0.7) is None
@@ -0,0 +1,43 @@
+from src.services.analyzer import DeepSeekAnalyzer
+from src.services.governor import create_governor
+from src.services.prompts import PROMPT_VERSION, load_prompts
+
+TEXT = " ".join(f"ord{i}" for i in range(120))
+
+
+def make_analyzer() -> DeepSeekAnalyzer:
+    return DeepSeekAnalyzer("test-key", governor=create_governor())
+
+
+def test_system_prefix_is_identical_across_requests():
+    analyzer = make_analyzer()
+
+    short = analyzer._analyze_payload("Kort text", 0.7)["messages"]
+    long = analyzer._analyze_payload(TEXT, 0.2)["messages"]
+    generate_a, _, _ = analyzer._generate_payload("Kort text", ["A"], 0.7)
+    generate_b, _, _ = analyzer._generate_payload(TEXT, ["B", "C"], 0.7)
+
+    assert short[0] == long[0]
+    assert short[0]["role"] == "system"
+    assert generate_a["messages"][0] == generate_b["messages"][0]
+    assert "$" not in short[0]["content"]
+
+
+def test_variable_parts_are_rendered_in_user_message():
+    analyzer = make_analyzer()
+
+    payload, min_words, max_words = analyzer._generate_payload(TEXT, ["Byt ord", "Kortare"], 0.7)
+    user = payload["messages"][1]["content"]
+
+    assert user.startswith("ORIGINAL TEXT (120 ord):\n" + TEXT)
+    assert f"{min_words}-{max_words} ord" in user
+    assert "- Byt ord\n- Kortare" in user
+    assert str(min_words) not in payload["messages"][0]["content"]
+
+
+def test_prompts_are_loaded_per_version():
+    prompts = load_prompts()
+
+    assert prompts.version == PROMPT_VERSION
+    assert prompts.analyze.prefix_hash != prompts.generate.prefix_hash
+    assert len(prompts.analyze.prefix_hash) == 12
@@ -0,0 +1,142 @@
+import json
+
+import httpx
+import pytest
+
+from src.services import analyzer as analyzer_module
+from src.services.analyzer import DeepSeekAnalyzer
+from src.services.governor import Permit, create_governor
+from src.services.routing import (
+    ROUTE_ESCALATIONS,
+    ROUTE_FAILOVERS,
+    ModelRouter,
+    RoutedBackend,
+    create_model_router,
+    parse_route,
+)
+from src.utils.config import Settings
+
+TEXT = " ".join(f"ord{i}" for i in range(80))
+VALID = json.dumps({"suggestions": ["Ett", "Två"], "tone": "neutral", "alternative_text": TEXT})
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeBackend:
+    """Svarar med `content`, eller kastar ett anslutningsfel om `content` är None."""
+
+    def __init__(self, content: str | None) -> None:
+        self.content = content
+        self.models: list[str] = []
+
+    async def complete(self, payload, operation, permit):
+        self.models.append(payload["model"])
+        if self.content is None:
+            raise httpx.ConnectError("Endpoint nere")
+        permit.status_code = 200
+        return {"choices": [{"message": {"content": self.content}}]}
+
+    async def stream(self, payload, operation, permit):
+        self.models.append(payload["model"])
+        if self.content is None:
+            raise httpx.ConnectError("Endpoint nere")
+        for word in self.content.split(" "):
+            yield word + " "
+
+
+def make_router(*specs: str, clock=None) -> ModelRouter:
+    return ModelRouter(
+        [parse_route(spec) for spec in specs],
+        fast_max_chars=1000,
+        strong_operations=["generate"],
+        failure_threshold=2,
+        cooldown_seconds=30,
+        clock=clock or FakeClock(),
+    )
+
+
+def test_tier_follows_length_and_operation():
+    router = make_router("a=fast:small@http://a/v1", "b=strong:large@http://b/v1")
+
+    assert router.select_tier("analyze", 500) == "fast"
+    assert router.select_tier("analyze", 5000) == "strong"
+    assert router.select_tier("generate", 10) == "strong"
+    assert router.escalate("fast", "analyze") == "strong"
+    assert router.escalate("strong", "analyze") is None
+    with pytest.raises(ValueError):
+        parse_route("c=medium:x@http://c/v1")
+
+
+def test_routes_are_ordered_by_latency_and_errors():
+    clock = FakeClock()
+    router = make_router("slow=fast:m@http://slow/v1", "quick=fast:m@http://quick/v1", clock=clock)
+    slow, quick = router.routes
+
+    router.record(slow, "analyze", 2.0, None)
+    router.record(quick, "analyze", 0.5, None)
+    assert [r.name for r in router.candidates("fast")] == ["quick", "slow"]
+
+    # Två fel i följd: routen vilar och hamnar sist tills cooldown gått ut
+    router.record(quick, "analyze", 0.1, httpx.ConnectError("nere"))
+    router.record(quick, "analyze", 0.1, httpx.ConnectError("nere"))
+    assert [r.name for r in router.candidates("fast")] == ["slow", "quick"]
+    assert router.snapshot()["routes"][1]["cooldown_seconds"] == 30
+
+    clock.now = 31
+    router.record(slow, "analyze", 20.0, None)
+    assert router.candidates("fast")[0].name == "quick"
+
+
+@pytest.mark.asyncio
+async def test_failover_to_next_route_in_tier():
+    router = make_router("down=fast:m1@http://down/v1", "up=fast:m2@http://up/v1")
+    down, up = FakeBackend(None), FakeBackend(VALID)
+    backend = RoutedBackend(router, {"down": down, "up": up})
+    failovers_before = ROUTE_FAILOVERS.value("fast")
+
+    data = await backend.complete({"model": "fast"}, "analyze", Permit(1))
+    deltas = [delta async for delta in backend.stream({"model": "fast"}, "generate_stream", Permit(1))]
+
+    assert data["choices"][0]["message"]["content"] == VALID
+    assert "".join(deltas).strip() == VALID
+    assert down.models == ["m1", "m1"] and up.models == ["m2", "m2"]
+    assert ROUTE_FAILOVERS.value("fast") == failovers_before + 2
+    assert [d["outcome"] for d in router.snapshot()["decisions"]] == ["error", "ok", "error", "ok"]
+
+
+@pytest.mark.asyncio
+async def test_cascade_escalates_after_failed_validation(monkeypatch):
+    monkeypatch.setattr(analyzer_module, "RETRY_BACKOFF_BASE", 0)
+    router = make_router("cheap=fast:small@http://a/v1", "big=strong:large@http://b/v1")
+    cheap, big = FakeBackend('{"suggestions": "inte en lista"}'), FakeBackend(VALID)
+    backend = RoutedBackend(router, {"cheap": cheap, "big": big})
+    analyzer = DeepSeekAnalyzer(None, governor=create_governor(), backend=backend)
+    escalations_before = ROUTE_ESCALATIONS.value("analyze", "fast", "strong")
+
+    suggestions, tone, alternative = await analyzer.analyze_text(TEXT)
+
+    assert (suggestions, tone, alternative) == (["Ett", "Två"], "neutral", TEXT)
+    assert cheap.models == ["small"] and big.models == ["large"]
+    assert ROUTE_ESCALATIONS.value("analyze", "fast", "strong") == escalations_before + 1
+
+
+def test_router_from_settings():
+    config = Settings(
+        llm_routes="ds=fast:deepseek-chat@https://api.deepseek.com/v1, local=strong:mock-chat@mock",
+        llm_route_strong_operations="generate",
+    )
+    router = create_model_router(config)
+
+    assert router is not None
+    assert [(r.name, r.tier, r.base_url) for r in router.routes] == [
+        ("ds", "fast", "https://api.deepseek.com/v1"),
+        ("local", "strong", "mock"),
+    ]
+    assert router.strong_operations == {"generate"}
+    assert create_model_router(Settings(llm_routes="")) is None
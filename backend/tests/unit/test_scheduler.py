@@ -0,0 +1,126 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException, Request
+
+from src.services.governor import (
+    AIMDLimiter,
+    CircuitBreaker,
+    ClientQuotas,
+    TokenBucket,
+    UpstreamGovernor,
+)
+from src.services.scheduler import FairScheduler
+from src.utils.client import RequestClass, request_class_var, requester_id
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_request(headers: dict[str, str], host: str = "10.0.0.1") -> Request:
+    raw = [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "headers": raw, "client": (host, 1234)})
+
+
+async def queued_acquire(limiter: AIMDLimiter, client: str, priority: str, order: list[str]) -> None:
+    request_class_var.set(RequestClass(client, priority))  # type: ignore[arg-type]
+    await limiter.acquire()
+    order.append(client)
+    limiter.release(overloaded=False, latency=None)
+
+
+def test_requester_id_prefers_api_key_and_ignores_spoofable_headers():
+    by_key = requester_id(make_request({"X-API-Key": "hemlig", "X-Client-Id": "abc"}))
+    assert by_key.startswith("key:") and "hemlig" not in by_key
+    assert requester_id(make_request({"Authorization": "Bearer hemlig"})) == by_key
+    assert requester_id(make_request({"X-Forwarded-For": "1.2.3.4"})) == "ip:10.0.0.1"
+    trusted = make_request({"X-Forwarded-For": "1.2.3.4, 10.0.0.9"})
+    assert requester_id(trusted, trust_forwarded_for=True) == "ip:1.2.3.4"
+
+
+@pytest.mark.asyncio
+async def test_busy_client_cannot_starve_others_and_interactive_goes_first():
+    limiter = AIMDLimiter(initial=1, minimum=1, maximum=1, latency_threshold=10)
+    await limiter.acquire()
+    order: list[str] = []
+    # En batchklient och en flitig klient köar först; en annan klient kommer sist
+    tasks = [asyncio.create_task(queued_acquire(limiter, "batch", "batch", order))]
+    tasks += [asyncio.create_task(queued_acquire(limiter, "busy", "interactive", order)) for _ in range(3)]
+    tasks.append(asyncio.create_task(queued_acquire(limiter, "quiet", "interactive", order)))
+    await asyncio.sleep(0)
+    assert len(limiter.queue) == 5
+
+    limiter.release(overloaded=False, latency=None)
+    await asyncio.gather(*tasks)
+
+    assert order == ["busy", "quiet", "busy", "busy", "batch"]
+    assert limiter.queue.client_snapshot()["busy"]["dispatched"] == 3
+
+
+@pytest.mark.asyncio
+async def test_weights_decide_share():
+    queue = FairScheduler({"heavy": 2.0})
+    limiter = AIMDLimiter(initial=1, minimum=1, maximum=1, latency_threshold=10, queue=queue)
+    await limiter.acquire()
+    order: list[str] = []
+    tasks = [
+        asyncio.create_task(queued_acquire(limiter, name, "interactive", order))
+        for name in ("light", "light", "heavy", "heavy", "heavy", "heavy")
+    ]
+    await asyncio.sleep(0)
+    limiter.release(overloaded=False, latency=None)
+    await asyncio.gather(*tasks)
+
+    # Dubbel vikt ger dubbel andel
+    assert order == ["light", "heavy", "heavy", "light", "heavy", "heavy"]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_queue():
+    limiter = AIMDLimiter(initial=1, minimum=1, maximum=1, latency_threshold=10)
+    await limiter.acquire()
+    waiter = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert len(limiter.queue) == 0
+    limiter.release(overloaded=False, latency=None)
+    assert limiter.inflight == 0
+
+
+@pytest.mark.asyncio
+async def test_client_quota_rejects_interactive_with_retry_after():
+    clock = FakeClock()
+    governor = UpstreamGovernor(
+        request_bucket=TokenBucket(rate=0, capacity=1, clock=clock),
+        token_bucket=TokenBucket(rate=0, capacity=1, clock=clock),
+        limiter=AIMDLimiter(initial=4, minimum=1, maximum=8, latency_threshold=10),
+        breaker=CircuitBreaker(failure_threshold=5, cooldown_seconds=5, clock=clock),
+        max_wait_seconds=1,
+        clock=clock,
+        quotas=ClientQuotas(requests_per_minute=2, tokens_per_minute=0, clock=clock),
+    )
+    request_class_var.set(RequestClass("ip:1.2.3.4", "interactive"))
+    for _ in range(2):
+        async with governor.slot(10):
+            pass
+    with pytest.raises(HTTPException) as exc_info:
+        async with governor.slot(10):
+            pass
+    assert exc_info.value.status_code == 429
+    assert exc_info.value.headers["Retry-After"] == "30"
+
+    # Andra klienter och internt arbete påverkas inte
+    request_class_var.set(RequestClass("ip:5.6.7.8", "interactive"))
+    async with governor.slot(10):
+        pass
+    request_class_var.set(RequestClass("internal", "batch"))
+    async with governor.slot(10):
+        pass
+    assert governor.client_snapshot()["ip:1.2.3.4"]["quota_rejections"] == 1
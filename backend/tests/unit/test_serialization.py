@@ -0,0 +1,31 @@
+import json
+
+from src.models.schemas import AnalyzeResponse
+from src.utils.serialization import FastJSONResponse, dumps, loads, model_response
+from src.utils.sse import sse_event
+
+
+def test_dumps_is_compact_utf8_and_round_trips():
+    value = {"text": "Förslag på svenska", "count": 3, "nested": [1.5, None, True]}
+
+    raw = dumps(value)
+
+    assert raw == json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    assert loads(raw) == value
+    assert loads(raw.decode("utf-8")) == value
+    assert FastJSONResponse(value).body == raw
+    assert sse_event("tone", {"tone": "neutral"}) == 'event: tone\ndata: {"tone":"neutral"}\n\n'
+
+
+def test_model_response_serializes_without_revalidation():
+    # model_construct hoppar över valideringen; svaret ska ändå skrivas som det är
+    trusted = AnalyzeResponse.model_construct(suggestions=["Bara ett"], tone="neutral", alternative_text="Å")
+
+    response = model_response(trusted, 202, {"Retry-After": "5"})
+
+    assert response.status_code == 202
+    assert response.headers["retry-after"] == "5"
+    assert response.media_type == "application/json"
+    body = loads(response.body)
+    assert body["suggestions"] == ["Bara ett"]
+    assert body["alternative_text"] == "Å"
@@ -0,0 +1,79 @@
+from src.services.similarity import SimilarityIndex, estimate_similarity, signature
+
+TEXT = (
+    "Hej alla! Kvartalsrapporten blir tyvärr försenad med en vecka eftersom siffrorna från "
+    "ekonomiavdelningen inte är klara än. Vi skickar den så snart allt är kontrollerat och "
+    "återkommer med en ny tid för genomgången på fredag."
+)
+EDITED = TEXT.replace("en vecka", "ett par dagar")
+OTHER = (
+    "Välkommen till årets sommarfest! Vi träffas i parken vid sjön klockan fem, och alla "
+    "tar med något att grilla. Barn och respektive är varmt välkomna, anmäl dig senast tisdag."
+)
+RESULT = {"suggestions": ["A", "B"], "tone": "neutral", "alternative_text": "Alt"}
+SCOPE = ("klient", 0.7)
+
+
+def test_signature_similarity_tracks_edits():
+    assert estimate_similarity(signature(TEXT), signature(TEXT)) == 1.0
+    assert estimate_similarity(signature(TEXT), signature(EDITED)) > 0.8
+    assert estimate_similarity(signature(TEXT), signature(OTHER)) < 0.2
+    # Versaler och whitespace påverkar inte
+    assert signature(TEXT) == signature("  " + TEXT.upper().replace(" ", "\n "))
+
+
+def test_lookup_returns_most_similar_above_threshold():
+    index = SimilarityIndex(threshold=0.8, max_entries=100)
+    index.add(OTHER, SCOPE, {**RESULT, "tone": "positive"})
+    index.add(TEXT, SCOPE, RESULT)
+
+    match = index.lookup(EDITED, SCOPE)
+    assert match is not None
+    assert match[0] == RESULT
+    assert 0.8 <= match[1] < 1.0
+    unrelated = "Något helt annat som inte liknar någonting i indexet alls, tror jag."
+    assert index.lookup(unrelated, SCOPE) is None
+
+
+def test_short_texts_are_skipped():
+    index = SimilarityIndex(threshold=0.5, max_entries=10, min_chars=50)
+    index.add("Kort text", SCOPE, RESULT)
+
+    assert len(index) == 0
+    assert index.lookup("Kort text", SCOPE) is None
+
+
+def test_oldest_entry_is_replaced_when_full():
+    index = SimilarityIndex(threshold=0.9, max_entries=2)
+    index.add(TEXT, SCOPE, RESULT)
+    index.add(OTHER, SCOPE, RESULT)
+    index.add(TEXT + " Tredje texten.", SCOPE, {**RESULT, "tone": "negative"})
+
+    assert len(index) == 2
+    assert index.lookup(OTHER, SCOPE) is not None
+    match = index.lookup(TEXT, SCOPE)
+    assert match is not None
+    assert match[0]["tone"] == "negative"
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = tmp_path / "similarity.jsonl"
+    index = SimilarityIndex(threshold=0.8, max_entries=10)
+    index.add(TEXT, SCOPE, RESULT)
+    index.add(OTHER, SCOPE, {**RESULT, "tone": "positive"})
+    index.save(path)
+
+    restored = SimilarityIndex(threshold=0.8, max_entries=10)
+    assert restored.load(path) == 2
+    match = restored.lookup(EDITED, SCOPE)
+    assert match is not None
+    assert match[0] == RESULT
+
+
+def test_lookup_requires_same_client_and_temperature():
+    index = SimilarityIndex(threshold=0.8, max_entries=10)
+    index.add(TEXT, SCOPE, RESULT)
+
+    assert index.lookup(TEXT, ("klient", 1.2)) is None
+    assert index.lookup(TEXT, ("annan", 0.7)) is None
+    assert index.lookup(EDITED, SCOPE) is not None
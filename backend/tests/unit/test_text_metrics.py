@@ -0,0 +1,67 @@
+import pytest
+
+from src.services.text_metrics import compute_batch, compute_metrics, fallback_suggestions
+
+TEXT = (
+    "Hej alla! Kvartalsrapporten blir tyvärr försenad med en vecka eftersom siffrorna från "
+    "ekonomiavdelningen inte är klara än. Vi skickar den så snart allt är kontrollerat och "
+    "återkommer med en ny tid för genomgången på fredag."
+)
+
+
+def test_sentence_length_and_lix():
+    metrics = compute_metrics(TEXT)
+
+    assert metrics.words == 35
+    assert metrics.sentences == 3
+    assert metrics.max_sentence_length == 18
+    # LIX = ord per mening + 100 * långa ord / ord
+    assert metrics.lix == pytest.approx(35 / 3 + 100 * 9 / 35, abs=0.05)
+
+
+def test_passive_forms_are_detected():
+    assert compute_metrics("Mötet blev inställt.").passive_ratio == 1.0
+    assert compute_metrics("Budgeten godkändes av styrelsen. Planen ska genomföras.").passive_ratio == 1.0
+    # Particip efter artikel är ett attribut, och genitiv plural är inte s-passiv
+    assert compute_metrics("Det blev en lyckad dag. Vi tackar kollegornas insats.").passive_ratio == 0.0
+
+
+def test_lexicon_tone_with_negation():
+    assert compute_metrics("Tack för ett fantastiskt och lyckat möte!").tone == "positive"
+    assert compute_metrics("Leveransen är försenad och kunden är missnöjd.").tone == "negative"
+    assert compute_metrics("Det var inte bra alls.").tone == "negative"
+    assert compute_metrics("Mötet börjar klockan nio.").tone == "neutral"
+
+
+def test_repeated_content_words():
+    metrics = compute_metrics("Projektet går framåt. Projektet har budget. Projektet avslutas i maj och och och.")
+
+    assert metrics.repeated_words == {"projektet": 3}
+    assert metrics.repetition_ratio > 0
+
+
+def test_empty_text_has_zero_metrics():
+    metrics = compute_metrics("  ... ")
+
+    assert (metrics.words, metrics.sentences, metrics.lix) == (0, 0, 0.0)
+    assert len(fallback_suggestions(metrics)) == 2
+
+
+def test_fallback_suggestions_follow_the_metrics():
+    long_passive = " ".join(["Rapporten skrevs av gruppen som arbetade med frågan under hela hösten"] * 3) + "."
+    suggestions = fallback_suggestions(compute_metrics(long_passive))
+
+    assert len(suggestions) == 3
+    assert suggestions[0].startswith("Dela upp långa meningar")
+    assert any(s.startswith("Använd aktiva verb – 100 %") for s in suggestions)
+
+
+def test_batch_keeps_order():
+    texts = [TEXT, "Kort.", "", "Tack! Bra jobbat."]
+    assert compute_batch(texts, use_numpy=False) == [compute_metrics(text) for text in texts]
+
+
+def test_numpy_batch_matches_python():
+    pytest.importorskip("numpy")
+    texts = [TEXT, "Kort.", "", "Tack! Bra jobbat."] * 10
+    assert compute_batch(texts, use_numpy=True) == compute_batch(texts, use_numpy=False)
@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.utils.instrumentation import stage, upstream_attempt
+from src.utils.profiler import SamplingProfiler
+from src.utils.tracing import Trace, TraceStore, span, trace_var
+
+
+def _traced(cid: str = "cid-1") -> Trace:
+    trace = Trace("POST", "/analyze")
+    trace.correlation_id = cid
+    return trace
+
+
+@pytest.mark.asyncio
+async def test_stages_attempts_and_backoff_become_spans_only_when_traced():
+    with stage("prompt_build", "analyze"):
+        pass  # Utan spår: inga spans, inget fel
+
+    trace = _traced()
+    token = trace_var.set(trace)
+    try:
+        root = trace.start("request", {})
+        with stage("prompt_build", "analyze"):
+            pass
+        with pytest.raises(TimeoutError), upstream_attempt("analyze"):
+            raise TimeoutError
+        with span("backoff", attempt=1):
+            await asyncio.sleep(0.01)
+        root.ended = time.perf_counter()
+    finally:
+        trace_var.reset(token)
+
+    data = trace.as_dict()
+    names = [s["name"] for s in data["span_list"]]
+    assert names == ["request", "prompt_build", "upstream_attempt", "backoff"]
+    attempt = data["span_list"][2]
+    assert attempt["attributes"] == {"operation": "analyze", "outcome": "timeout"}
+    assert data["totals_ms"]["backoff"] >= 10
+    assert data["correlation_id"] == "cid-1"
+    waterfall = trace.waterfall()
+    assert waterfall.startswith("POST /analyze None")
+    assert "| backoff attempt=1" in waterfall
+
+
+def test_trace_store_is_a_ring_buffer():
+    store = TraceStore(max_traces=2)
+    for cid in ("a", "b", "c"):
+        store.add(_traced(cid))
+
+    assert store.get("a") is None
+    assert store.get("c") is not None
+    assert [t["correlation_id"] for t in store.recent(10)] == ["c", "b"]
+
+
+def test_profiler_collects_collapsed_stacks_from_busy_thread():
+    stop = threading.Event()
+
+    def busy_loop():
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=busy_loop)
+    worker.start()
+    profiler = SamplingProfiler(interval_seconds=0.001)
+    key = object()
+    try:
+        profiler.start(key, worker.ident)
+        time.sleep(0.1)
+    finally:
+        session = profiler.stop(key)
+        stop.set()
+        worker.join()
+
+    assert session is not None
+    assert sum(session.stacks.values()) > 0
+    stack, count = session.collapsed().splitlines()[0].rsplit(" ", 1)
+    assert "busy_loop" in stack.split(";")[-1]
+    assert int(count) > 0
@@ -1,11 +1,11 @@
-import { useState } from 'react'
+import { useEffect, useState } from 'react'
 import { TextAnalyzer } from '@components/TextAnalyzer'
 import { ResultsCard } from '@components/ResultsCard'
 import { HistoryPanel } from '@components/HistoryPanel'
 import { Toast, useToast } from '@components/Toast'
 import { ConfirmModal } from '@components/ConfirmModal'
 import { useTextAnalyzer } from '@hooks/useTextAnalyzer'
-import { storageService } from '@services/storage'
+import { apiClient } from '@services/api'
 import type { AnalyzeResponse } from '@types/api'
 import { DEFAULT_TEMPERATURE } from '@constants'
 
@@ -19,6 +19,15 @@ export default function App() {
   const [generatedText, setGeneratedText] = useState<string | null>(null)
   const { toasts, success, error } = useToast()
 
+  useEffect(() => {
+    apiClient
+      .importLegacyHistory()
+      .then((imported) => {
+        if (imported > 0) setRefreshHistory((t) => t + 1)
+      })
+      .catch((err) => console.error('Failed to upload legacy history:', err))
+  }, [])
+
   const handleResultsReceived = (analysisResult: AnalyzeResponse) => {
     setResult(analysisResult)
     setGeneratedText(null)  // Rensa tidigare generated text
@@ -47,11 +56,15 @@ export default function App() {
     setRefreshHistory((t) => t + 1)
   }
 
-  const confirmClear = () => {
-    storageService.clearResults()
+  const confirmClear = async () => {
     setShowClearConfirm(false)
-    setRefreshHistory((t) => t + 1)
-    success('Historik rensad')
+    try {
+      await apiClient.clearHistory()
+      setRefreshHistory((t) => t + 1)
+      success('Historik rensad')
+    } catch {
+      error('Kunde inte rensa historiken')
+    }
   }
 
   return (
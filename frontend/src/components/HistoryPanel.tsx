@@ -1,5 +1,6 @@
-import { useState } from 'react'
+import { useEffect, useState } from 'react'
 import { useHistory } from '@hooks/useHistory'
+import { DEBOUNCE_DELAY_MS } from '@constants'
 
 interface HistoryPanelProps {
   refreshTrigger?: number
@@ -8,16 +9,32 @@ interface HistoryPanelProps {
 }
 
 export function HistoryPanel({ refreshTrigger, onClearRequest, onResultDeleted }: HistoryPanelProps) {
-  const { results, loading, deleteResult } = useHistory(refreshTrigger)
   const [expanded, setExpanded] = useState(false)
+  const [search, setSearch] = useState('')
+  const [query, setQuery] = useState('')
+  // Ingenting hämtas förrän panelen öppnas
+  const { results, loading, loadingMore, error, hasMore, loadMore, deleteResult } = useHistory(
+    refreshTrigger,
+    expanded,
+    query
+  )
+
+  useEffect(() => {
+    const timer = setTimeout(() => setQuery(search), DEBOUNCE_DELAY_MS)
+    return () => clearTimeout(timer)
+  }, [search])
 
-  const handleDelete = (id: string) => {
-    deleteResult(id)
-    onResultDeleted?.()
+  const handleDelete = async (id: number) => {
+    try {
+      await deleteResult(id)
+      onResultDeleted?.()
+    } catch (err) {
+      console.error('Failed to delete history item:', err)
+    }
   }
 
-  const formatDate = (ts: number) => {
-    return new Date(ts).toLocaleString('sv-SE', { dateStyle: 'short', timeStyle: 'short' })
+  const formatDate = (seconds: number) => {
+    return new Date(seconds * 1000).toLocaleString('sv-SE', { dateStyle: 'short', timeStyle: 'short' })
   }
 
   return (
@@ -27,18 +44,30 @@ export function HistoryPanel({ refreshTrigger, onClearRequest, onResultDeleted }
         className="w-full px-4 py-3 flex items-center justify-between hover:bg-gray-50 dark:hover:bg-gray-800 font-medium transition-colors"
         aria-expanded={expanded}
       >
-        <span>Historik ({results.length})</span>
+        <span>Historik{expanded && !loading ? ` (${results.length}${hasMore ? '+' : ''})` : ''}</span>
         <span className={`transform transition-transform ${expanded ? 'rotate-180' : ''}`}>▼</span>
       </button>
 
       {expanded && (
         <div className="border-t border-gray-200 dark:border-gray-700 p-4 space-y-2">
-          {loading ? (
+          <input
+            type="search"
+            value={search}
+            onChange={(e) => setSearch(e.target.value)}
+            placeholder="Sök i historiken..."
+            aria-label="Sök i historiken"
+            className="w-full px-3 py-2 text-sm rounded border border-gray-300 dark:border-gray-600 bg-white dark:bg-gray-800"
+          />
+          {error ? (
+            <p className="text-sm text-red-600 dark:text-red-400">Kunde inte hämta historiken.</p>
+          ) : loading ? (
             <div className="flex items-center justify-center py-6">
               <div className="animate-pulse text-sm text-gray-500">Laddar...</div>
             </div>
           ) : results.length === 0 ? (
-            <p className="text-sm text-gray-500 dark:text-gray-400">Ingen historik än.</p>
+            <p className="text-sm text-gray-500 dark:text-gray-400">
+              {query ? 'Inga träffar.' : 'Ingen historik än.'}
+            </p>
           ) : (
             <>
               <div className="space-y-2 max-h-64 overflow-y-auto">
@@ -49,12 +78,12 @@ export function HistoryPanel({ refreshTrigger, onClearRequest, onResultDeleted }
                   >
                     <div className="flex items-start justify-between gap-2 mb-1">
                       <span className="text-xs text-gray-500 dark:text-gray-400">
-                        {formatDate(r.timestamp)}
+                        {formatDate(r.created_at)}
                       </span>
                       <button
                         onClick={() => handleDelete(r.id)}
                         className="text-xs px-2 py-1 rounded hover:bg-red-100 dark:hover:bg-red-900/30 text-red-600 dark:text-red-400"
-                        aria-label={`Radera resultat från ${formatDate(r.timestamp)}`}
+                        aria-label={`Radera resultat från ${formatDate(r.created_at)}`}
                       >
                         Radera
                       </button>
@@ -62,11 +91,20 @@ export function HistoryPanel({ refreshTrigger, onClearRequest, onResultDeleted }
                     <p className="text-sm truncate text-gray-700 dark:text-gray-300">{r.text}</p>
                     <div className="flex gap-2 mt-2">
                       <span className="text-xs bg-primary-100 dark:bg-primary-900/30 text-primary-700 dark:text-primary-300 px-2 py-1 rounded">
-                        {r.result.tone}
+                        {r.tone ?? 'genererad'}
                       </span>
                     </div>
                   </div>
                 ))}
+                {hasMore && (
+                  <button
+                    onClick={loadMore}
+                    disabled={loadingMore}
+                    className="w-full py-2 text-sm text-primary-700 dark:text-primary-300 hover:bg-gray-50 dark:hover:bg-gray-800 rounded disabled:opacity-50"
+                  >
+                    {loadingMore ? 'Laddar...' : 'Visa fler'}
+                  </button>
+                )}
               </div>
               <button
                 onClick={onClearRequest}
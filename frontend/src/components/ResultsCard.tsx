@@ -77,6 +77,19 @@ export function ResultsCard({ result, originalText, temperature, onGeneratedText
         </span>
       </div>
 
+      {result.reused && (
+        <p className="mb-3 text-xs text-gray-600 dark:text-gray-400">
+          Återanvänd analys av en nästan likadan text
+          {result.similarity != null && ` (likhet ${Math.round(result.similarity * 100)} %)`}
+        </p>
+      )}
+
+      {result.fallback && (
+        <p className="mb-3 text-xs text-gray-600 dark:text-gray-400">
+          AI-tjänsten svarade inte – förslagen bygger på textens meningslängd, LIX och ordval
+        </p>
+      )}
+
       <div className="space-y-3">
         <div>
           <h3 className={`text-sm font-medium ${config.text} mb-2`}>Förbättringsförslag</h3>
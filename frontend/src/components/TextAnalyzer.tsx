@@ -1,7 +1,6 @@
 import { useState } from 'react'
 import { useTextAnalyzer } from '@hooks/useTextAnalyzer'
 import type { AnalyzeResponse } from '@types/api'
-import { storageService } from '@services/storage'
 import { TemperatureControl } from './TemperatureControl'
 import { DEFAULT_TEMPERATURE, TEXT_MAX_LENGTH } from '@constants'
 import { formatApiError } from '@utils/errorFormatter'
@@ -13,7 +12,7 @@ interface TextAnalyzerProps {
 }
 
 export function TextAnalyzer({ onResultReceived, onOriginalTextChange, onTemperatureChange }: TextAnalyzerProps) {
-  const { text, loading, error, setText, analyze, clearResult } = useTextAnalyzer()
+  const { text, loading, error, partial, setText, analyze, clearResult } = useTextAnalyzer()
   const [temperature, setTemperature] = useState(DEFAULT_TEMPERATURE)
   const maxChars = TEXT_MAX_LENGTH
   const charCount = text.length
@@ -29,7 +28,7 @@ export function TextAnalyzer({ onResultReceived, onOriginalTextChange, onTempera
     onOriginalTextChange?.(text)
     const result = await analyze(text, temperature)
     if (result) {
-      storageService.saveResult(text, result)
+      // Servern sparar resultatet i historiken
       onResultReceived?.(result)
     }
   }
@@ -85,6 +84,32 @@ export function TextAnalyzer({ onResultReceived, onOriginalTextChange, onTempera
         </div>
       )}
 
+      {loading && partial && (partial.suggestions.length > 0 || partial.tone || partial.metrics) && (
+        <div
+          className="p-3 border border-gray-200 dark:border-gray-700 rounded-lg text-sm space-y-2"
+          aria-live="polite"
+          aria-busy="true"
+        >
+          {partial.metrics && (
+            <div className="text-xs text-gray-500 dark:text-gray-400">
+              LIX {Math.round(partial.metrics.lix)} · {Math.round(partial.metrics.avg_sentence_length)} ord per mening ·{' '}
+              {Math.round(partial.metrics.passive_ratio * 100)} % passiv form
+            </div>
+          )}
+          {partial.tone && (
+            <div className="text-xs text-gray-500 dark:text-gray-400">Ton: {partial.tone}</div>
+          )}
+          <ul className="list-disc pl-5 space-y-1">
+            {partial.suggestions.map((suggestion, idx) => (
+              <li key={idx}>{suggestion}</li>
+            ))}
+          </ul>
+          {partial.alternative_text && (
+            <p className="text-gray-600 dark:text-gray-300 whitespace-pre-wrap">{partial.alternative_text}</p>
+          )}
+        </div>
+      )}
+
       <button
         onClick={handleAnalyze}
         disabled={!text.trim() || loading}
@@ -13,3 +13,10 @@ export const API_GENERATE = '/generate'
 
 // UI
 export const DEBOUNCE_DELAY_MS = 300
+
+// Historik (hämtas sidvis från servern)
+export const HISTORY_PAGE_SIZE = 20
+// Servern skriver historiken i batchar (HISTORY_FLUSH_SECONDS); vänta in nyss sparade resultat
+export const HISTORY_REFRESH_DELAY_MS = 700
+// Poster per anrop när den gamla localStorage-historiken laddas upp (servern tar högst 500)
+export const HISTORY_IMPORT_BATCH_SIZE = 100
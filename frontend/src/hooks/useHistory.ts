@@ -1,34 +1,84 @@
-import { useState, useEffect } from 'react'
-import { storageService, type SavedResult } from '@services/storage'
+import { useState, useEffect, useRef } from 'react'
+import { apiClient } from '@services/api'
+import type { HistoryItem, HistoryPage } from '@types/api'
+import { HISTORY_PAGE_SIZE, HISTORY_REFRESH_DELAY_MS } from '@constants'
 
-export const useHistory = (refreshTrigger?: number) => {
-  const [results, setResults] = useState<SavedResult[]>([])
-  const [loading, setLoading] = useState(true)
+// Historiken hämtas sida för sida från servern, och först när den visas (enabled)
+export const useHistory = (refreshTrigger?: number, enabled: boolean = true, query: string = '') => {
+  const [results, setResults] = useState<HistoryItem[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [loading, setLoading] = useState(false)
+  const [loadingMore, setLoadingMore] = useState(false)
+  const [error, setError] = useState<string | null>(null)
+  // Svar på äldre anrop (t.ex. en tidigare sökning) ignoreras
+  const requestId = useRef(0)
+  const lastTrigger = useRef(refreshTrigger)
+
+  const fetchPage = (cursor?: string): Promise<HistoryPage> => {
+    const q = query.trim()
+    return q
+      ? apiClient.searchHistory(q, { cursor, limit: HISTORY_PAGE_SIZE })
+      : apiClient.getHistory({ cursor, limit: HISTORY_PAGE_SIZE })
+  }
 
   useEffect(() => {
+    if (!enabled) return
+    const id = ++requestId.current
+    const delay = lastTrigger.current !== refreshTrigger ? HISTORY_REFRESH_DELAY_MS : 0
+    lastTrigger.current = refreshTrigger
     setLoading(true)
-    const loadResults = () => {
-      setResults(storageService.getResults())
-      setLoading(false)
-    }
-    // Simulera async load för konsistent UX
-    const timer = setTimeout(loadResults, 50)
+    const timer = setTimeout(() => {
+      fetchPage()
+        .then((page) => {
+          if (id !== requestId.current) return
+          setResults(page.items)
+          setNextCursor(page.next_cursor ?? null)
+          setError(null)
+        })
+        .catch((err: Error) => {
+          if (id === requestId.current) setError(err.message)
+        })
+        .finally(() => {
+          if (id === requestId.current) setLoading(false)
+        })
+    }, delay)
     return () => clearTimeout(timer)
-  }, [refreshTrigger])
+  }, [refreshTrigger, enabled, query])
+
+  const loadMore = async () => {
+    if (!nextCursor || loadingMore) return
+    const id = requestId.current
+    setLoadingMore(true)
+    try {
+      const page = await fetchPage(nextCursor)
+      if (id !== requestId.current) return
+      setResults((prev) => [...prev, ...page.items])
+      setNextCursor(page.next_cursor ?? null)
+    } catch (err) {
+      setError((err as Error).message)
+    } finally {
+      setLoadingMore(false)
+    }
+  }
 
-  const deleteResult = (id: string) => {
-    storageService.deleteResult(id)
-    setResults(storageService.getResults())
+  const deleteResult = async (id: number) => {
+    await apiClient.deleteHistoryItem(id)
+    setResults((prev) => prev.filter((r) => r.id !== id))
   }
 
-  const clearResults = () => {
-    storageService.clearResults()
+  const clearResults = async () => {
+    await apiClient.clearHistory()
     setResults([])
+    setNextCursor(null)
   }
 
   return {
     results,
     loading,
+    loadingMore,
+    error,
+    hasMore: nextCursor !== null,
+    loadMore,
     deleteResult,
     clearResults
   }
@@ -1,12 +1,13 @@
 import { useState } from 'react'
 import { apiClient } from '@services/api'
-import type { AnalyzeResponse } from '@types/api'
+import type { AnalyzeResponse, PartialAnalysis } from '@types/api'
 
 interface UseTextAnalyzerState {
   text: string
   loading: boolean
   error: string | null
   result: AnalyzeResponse | null
+  partial: PartialAnalysis | null
 }
 
 export const useTextAnalyzer = () => {
@@ -14,7 +15,8 @@ export const useTextAnalyzer = () => {
     text: '',
     loading: false,
     error: null,
-    result: null
+    result: null,
+    partial: null
   })
 
   const setText = (text: string) => {
@@ -22,14 +24,17 @@ export const useTextAnalyzer = () => {
   }
 
   const analyze = async (text: string, temperature: number = 0.7): Promise<AnalyzeResponse | null> => {
-    setState((s) => ({ ...s, loading: true, error: null }))
+    setState((s) => ({ ...s, loading: true, error: null, partial: null }))
     try {
-      const result = await apiClient.analyze(text, temperature)
-      setState((s) => ({ ...s, result, loading: false }))
+      // Strömmat svar: förslag och ton visas medan resten genereras
+      const result = await apiClient.analyze(text, temperature, (partial) => {
+        setState((s) => ({ ...s, partial }))
+      })
+      setState((s) => ({ ...s, result, loading: false, partial: null }))
       return result
     } catch (error) {
       const message = error instanceof Error ? error.message : 'Unknown error'
-      setState((s) => ({ ...s, error: message, loading: false }))
+      setState((s) => ({ ...s, error: message, loading: false, partial: null }))
       return null
     }
   }
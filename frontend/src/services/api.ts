@@ -1,22 +1,34 @@
 import axios, { AxiosInstance } from 'axios'
-import { AnalyzeResponseSchema, GenerateResponseSchema, type AnalyzeResponse, type GenerateResponse } from '@types/api'
+import { AnalyzeResponseSchema, GenerateResponseSchema, HistoryPageSchema, TextMetricsSchema, type AnalyzeResponse, type GenerateResponse, type HistoryPage, type PartialAnalysis } from '@types/api'
+import { readServerSentEvents } from '@utils/sse'
+import { storageService } from '@services/storage'
+import { HISTORY_IMPORT_BATCH_SIZE } from '@constants'
 
 // Använd VITE_API_BASE_URL från .env eller fallback till port 8002
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8002'
 
 class ApiClient {
   private client: AxiosInstance
+  private baseURL: string
 
   constructor(baseURL: string) {
     console.log('🔧 API Client initialized with baseURL:', baseURL)
+    this.baseURL = baseURL
     this.client = axios.create({
       baseURL,
       timeout: 90000,
-      headers: { 'Content-Type': 'application/json' }
+      headers: { 'Content-Type': 'application/json', 'X-Client-Id': storageService.getClientId() }
     })
   }
 
-  async analyze(text: string, temperature: number = 0.7): Promise<AnalyzeResponse> {
+  async analyze(
+    text: string,
+    temperature: number = 0.7,
+    onPartial?: (partial: PartialAnalysis) => void
+  ): Promise<AnalyzeResponse> {
+    if (onPartial) {
+      return this.analyzeStream(text, temperature, onPartial)
+    }
     try {
       console.log('📤 Sending request to:', `${this.client.defaults.baseURL}/analyze`)
       const response = await this.client.post<unknown>('/analyze', { text, temperature })
@@ -34,6 +46,61 @@ class ApiClient {
     }
   }
 
+  private async analyzeStream(
+    text: string,
+    temperature: number,
+    onPartial: (partial: PartialAnalysis) => void
+  ): Promise<AnalyzeResponse> {
+    const response = await fetch(`${this.baseURL}/analyze/stream`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        Accept: 'text/event-stream',
+        'X-Client-Id': storageService.getClientId()
+      },
+      body: JSON.stringify({ text, temperature })
+    })
+    if (!response.ok) {
+      const body = await response.json().catch(() => ({}))
+      throw new Error(`API error: ${response.status} ${body.message || body.detail || response.statusText}`)
+    }
+
+    let partial: PartialAnalysis = { suggestions: [] }
+    for await (const { event, data } of readServerSentEvents(response)) {
+      switch (event) {
+        case 'metrics':
+          partial = { ...partial, metrics: TextMetricsSchema.parse(data) }
+          break
+        case 'suggestion':
+          partial = { ...partial, suggestions: [...partial.suggestions, data as string] }
+          break
+        case 'tone':
+          partial = { ...partial, tone: data as PartialAnalysis['tone'] }
+          break
+        case 'alternative_text_delta':
+          partial = { ...partial, alternative_text: (partial.alternative_text ?? '') + (data as string) }
+          break
+        case 'alternative_text':
+          partial = { ...partial, alternative_text: data as string }
+          break
+        case 'reset':
+          // Servern gör ett nytt försök; kasta det som visats hittills (måtten gäller fortfarande)
+          partial = { suggestions: [], metrics: partial.metrics }
+          break
+        case 'result':
+          return AnalyzeResponseSchema.parse(data)
+        case 'error': {
+          const { message } = data as { code: string; message: string }
+          throw new Error(`API error: ${message}`)
+        }
+        default:
+          continue
+      }
+      onPartial(partial)
+    }
+    throw new Error('API error: stream ended without result')
+  }
+
   async generate(text: string, suggestions: string[], selected: boolean[], temperature: number = 0.7): Promise<GenerateResponse> {
     try {
       console.log('📤 Sending generate request...')
@@ -56,6 +123,51 @@ class ApiClient {
       throw error
     }
   }
+
+  // Historiken hämtas en sida i taget; nästa sida med cursor = next_cursor
+  async getHistory(options: { cursor?: string; limit?: number; tone?: string } = {}): Promise<HistoryPage> {
+    return this.historyRequest('/history', options)
+  }
+
+  async searchHistory(q: string, options: { cursor?: string; limit?: number } = {}): Promise<HistoryPage> {
+    return this.historyRequest('/history/search', { ...options, q })
+  }
+
+  async deleteHistoryItem(id: number): Promise<void> {
+    await this.client.delete(`/history/${id}`)
+  }
+
+  async clearHistory(): Promise<void> {
+    await this.client.delete('/history')
+  }
+
+  // Äldre versioner sparade historiken i localStorage. Den laddas upp i delar och tas bort
+  // lokalt först när servern tagit emot allt; misslyckas något försöks det igen vid nästa start.
+  async importLegacyHistory(): Promise<number> {
+    const legacy = storageService.getLegacyResults()
+    let imported = 0
+    for (let start = 0; start < legacy.length; start += HISTORY_IMPORT_BATCH_SIZE) {
+      const items = legacy
+        .slice(start, start + HISTORY_IMPORT_BATCH_SIZE)
+        .map(({ text, result, timestamp }) => ({ text, result, timestamp }))
+      const response = await this.client.post<{ imported: number }>('/history/import', { items })
+      imported += response.data.imported
+    }
+    if (legacy.length > 0) storageService.clearLegacyResults()
+    return imported
+  }
+
+  private async historyRequest(path: string, params: Record<string, string | number | undefined>): Promise<HistoryPage> {
+    try {
+      const response = await this.client.get<unknown>(path, { params })
+      return HistoryPageSchema.parse(response.data)
+    } catch (error) {
+      if (axios.isAxiosError(error)) {
+        throw new Error(`History error: ${error.response?.status} ${error.response?.data?.detail || error.message}`)
+      }
+      throw error
+    }
+  }
 }
 
 export const apiClient = new ApiClient(API_BASE_URL)
@@ -0,0 +1,79 @@
+import { SessionEventSchema, type SessionEvent } from '@types/api'
+import { storageService } from '@services/storage'
+
+const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8002'
+
+// En WebSocket per editor (/ws/session). Servern väntar tills användaren slutat skriva och
+// avbryter själv analyser av äldre text; klienten skickar bara ändringarna.
+export class EditorSessionClient {
+  private socket: WebSocket
+  private text = ''
+  private version = 0
+  private temperature = 0.7
+
+  constructor(onEvent: (event: SessionEvent) => void, baseURL: string = API_BASE_URL) {
+    const url = new URL('/ws/session', baseURL.replace(/^http/, 'ws'))
+    url.searchParams.set('client_id', storageService.getClientId())
+    this.socket = new WebSocket(url)
+    this.socket.onmessage = (message) => {
+      const parsed = SessionEventSchema.safeParse(JSON.parse(message.data as string))
+      if (parsed.success) {
+        // Delta som inte passar serverns text: skicka hela texten igen
+        const data = parsed.data.data as { code?: string } | null
+        if (parsed.data.event === 'error' && data?.code === 'http_error_409') {
+          this.send({ type: 'text', text: this.text, version: ++this.version, temperature: this.temperature })
+        }
+        onEvent(parsed.data)
+      }
+    }
+  }
+
+  // Skickar bara den ändrade delen (gemensamt prefix och suffix skärs bort); returnerar versionen
+  update(text: string, temperature: number = 0.7): number {
+    const previous = this.text
+    this.text = text
+    this.version += 1
+    // Temperaturen följer bara med hela texter
+    if (this.version === 1 || temperature !== this.temperature) {
+      this.temperature = temperature
+      this.send({ type: 'text', text, version: this.version, temperature })
+      return this.version
+    }
+    let start = 0
+    while (start < previous.length && start < text.length && previous[start] === text[start]) start++
+    let suffix = 0
+    while (
+      suffix < previous.length - start &&
+      suffix < text.length - start &&
+      previous[previous.length - 1 - suffix] === text[text.length - 1 - suffix]
+    ) suffix++
+    this.send({
+      type: 'delta',
+      start,
+      end: previous.length - suffix,
+      insert: text.slice(start, text.length - suffix),
+      version: this.version
+    })
+    return this.version
+  }
+
+  generate(suggestions: string[], selected: boolean[], temperature: number = 0.7): void {
+    this.send({ type: 'generate', suggestions, selected_suggestions: selected, temperature })
+  }
+
+  cancel(): void {
+    this.send({ type: 'cancel' })
+  }
+
+  close(): void {
+    this.socket.close()
+  }
+
+  private send(message: Record<string, unknown>): void {
+    if (this.socket.readyState === WebSocket.CONNECTING) {
+      this.socket.addEventListener('open', () => this.socket.send(JSON.stringify(message)), { once: true })
+      return
+    }
+    this.socket.send(JSON.stringify(message))
+  }
+}
@@ -1,57 +1,62 @@
 import type { AnalyzeResponse } from '@types/api'
 
-export interface SavedResult {
+// Historiken ligger på servern (GET /history); lokalt sparas bara klientens id,
+// som skickas som X-Client-Id så att servern kan hålla isär historiken per webbläsare
+const CLIENT_ID_KEY = 'ai_feedback_client_id'
+const LEGACY_RESULTS_KEY = 'ai_feedback_results'
+
+// Så sparade äldre versioner varje resultat lokalt
+export interface LegacyResult {
   id: string
   text: string
   result: AnalyzeResponse
   timestamp: number
 }
 
-const STORAGE_KEY = 'ai_feedback_results'
+const newClientId = (): string =>
+  typeof crypto !== 'undefined' && 'randomUUID' in crypto
+    ? crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`
+
+let cachedClientId: string | null = null
 
 export const storageService = {
-  saveResult: (text: string, result: AnalyzeResponse): SavedResult => {
-    const saved: SavedResult = {
-      id: Math.random().toString(36).substr(2, 9),
-      text,
-      result,
-      timestamp: Date.now()
-    }
-    const existing = storageService.getResults()
-    existing.unshift(saved)
+  getClientId: (): string => {
+    if (cachedClientId) return cachedClientId
     try {
-      localStorage.setItem(STORAGE_KEY, JSON.stringify(existing))
+      cachedClientId = localStorage.getItem(CLIENT_ID_KEY)
+      if (!cachedClientId) {
+        cachedClientId = newClientId()
+        localStorage.setItem(CLIENT_ID_KEY, cachedClientId)
+      }
     } catch (error) {
-      console.error('Failed to save to localStorage:', error)
+      console.error('Failed to access localStorage:', error)
+      cachedClientId = cachedClientId ?? newClientId()
     }
-    return saved
+    return cachedClientId
   },
 
-  getResults: (): SavedResult[] => {
-    try {
-      const data = localStorage.getItem(STORAGE_KEY)
-      return data ? JSON.parse(data) : []
-    } catch (error) {
-      console.error('Failed to read from localStorage:', error)
-      return []
-    }
+  resetClientId: (): void => {
+    cachedClientId = null
   },
 
-  deleteResult: (id: string): void => {
-    const existing = storageService.getResults()
-    const filtered = existing.filter((r) => r.id !== id)
+  // Den gamla historiken laddas upp till servern (apiClient.importLegacyHistory) och tas
+  // bort först när uppladdningen har lyckats
+  getLegacyResults: (): LegacyResult[] => {
     try {
-      localStorage.setItem(STORAGE_KEY, JSON.stringify(filtered))
+      const data = JSON.parse(localStorage.getItem(LEGACY_RESULTS_KEY) ?? '[]')
+      return Array.isArray(data) ? data : []
     } catch (error) {
-      console.error('Failed to delete from localStorage:', error)
+      console.error('Failed to read legacy history from localStorage:', error)
+      return []
     }
   },
 
-  clearResults: (): void => {
+  clearLegacyResults: (): void => {
     try {
-      localStorage.removeItem(STORAGE_KEY)
+      localStorage.removeItem(LEGACY_RESULTS_KEY)
     } catch (error) {
-      console.error('Failed to clear localStorage:', error)
+      console.error('Failed to clear legacy history:', error)
     }
   }
 }
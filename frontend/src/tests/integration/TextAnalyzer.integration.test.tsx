@@ -7,7 +7,7 @@ import * as apiModule from '@services/api'
 vi.mock('@services/api')
 vi.mock('@services/storage', () => ({
   storageService: {
-    saveResult: vi.fn()
+    getClientId: vi.fn(() => 'test-client')
   }
 }))
 
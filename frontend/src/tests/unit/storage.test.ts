@@ -4,39 +4,33 @@ import { storageService } from '@services/storage'
 describe('storageService', () => {
   beforeEach(() => {
     localStorage.clear()
+    storageService.resetClientId()
   })
 
-  it('should save and retrieve results', () => {
-    const result = {
-      suggestions: ['Test 1', 'Test 2'],
-      tone: 'positive' as const
-    }
-    const saved = storageService.saveResult('Test text', result)
-    expect(saved.id).toBeDefined()
-    expect(saved.text).toBe('Test text')
+  it('should create and persist a client id', () => {
+    const id = storageService.getClientId()
+    expect(id).toMatch(/^[A-Za-z0-9_-]{1,64}$/)
+    expect(localStorage.getItem('ai_feedback_client_id')).toBe(id)
 
-    const retrieved = storageService.getResults()
-    expect(retrieved).toHaveLength(1)
-    expect(retrieved[0].id).toBe(saved.id)
+    storageService.resetClientId()
+    expect(storageService.getClientId()).toBe(id)
   })
 
-  it('should delete a result', () => {
-    const result = {
-      suggestions: ['Test 1', 'Test 2'],
-      tone: 'neutral' as const
-    }
-    const saved = storageService.saveResult('Text 1', result)
-    storageService.deleteResult(saved.id)
-    expect(storageService.getResults()).toHaveLength(0)
-  })
+  it('should keep the legacy localStorage history until it is cleared', () => {
+    const legacy = [
+      {
+        id: 'abc',
+        text: 'Hej',
+        result: { suggestions: ['A', 'B'], tone: 'neutral', alternative_text: 'Hej!' },
+        timestamp: 1700000000000
+      }
+    ]
+    localStorage.setItem('ai_feedback_results', JSON.stringify(legacy))
+    storageService.getClientId()
+    expect(storageService.getLegacyResults()).toEqual(legacy)
 
-  it('should clear all results', () => {
-    const result = {
-      suggestions: ['Test'],
-      tone: 'negative' as const
-    }
-    storageService.saveResult('Text', result)
-    storageService.clearResults()
-    expect(storageService.getResults()).toHaveLength(0)
+    storageService.clearLegacyResults()
+    expect(localStorage.getItem('ai_feedback_results')).toBeNull()
+    expect(storageService.getLegacyResults()).toEqual([])
   })
 })
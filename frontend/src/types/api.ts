@@ -1,13 +1,45 @@
 import { z } from 'zod'
 
+// Lokala textmått (POST /analyze/fast och SSE-händelsen "metrics")
+export const TextMetricsSchema = z.object({
+  words: z.number(),
+  sentences: z.number(),
+  avg_sentence_length: z.number(),
+  max_sentence_length: z.number(),
+  long_sentence_ratio: z.number(),
+  lix: z.number(),
+  passive_ratio: z.number(),
+  repetition_ratio: z.number(),
+  repeated_words: z.record(z.number()),
+  positive_words: z.number(),
+  negative_words: z.number(),
+  tone: z.enum(['positive', 'neutral', 'negative']),
+  tone_score: z.number()
+})
+
+export type TextMetrics = z.infer<typeof TextMetricsSchema>
+
 export const AnalyzeResponseSchema = z.object({
   suggestions: z.array(z.string()).min(2).max(3),
   tone: z.enum(['positive', 'neutral', 'negative']),
-  alternative_text: z.string()
+  alternative_text: z.string(),
+  // Satt när servern återanvänt analysen av en nästan likadan text
+  reused: z.boolean().optional(),
+  similarity: z.number().nullable().optional(),
+  // Satt när AI-tjänsten inte svarade och förslagen kommer från de lokala textmåtten
+  fallback: z.boolean().optional()
 })
 
 export type AnalyzeResponse = z.infer<typeof AnalyzeResponseSchema>
 
+// Delresultat medan /analyze/stream fortfarande tar emot tokens
+export interface PartialAnalysis {
+  suggestions: string[]
+  tone?: AnalyzeResponse['tone']
+  alternative_text?: string
+  metrics?: TextMetrics
+}
+
 export const GenerateRequestSchema = z.object({
   text: z.string().min(1).max(5000),
   suggestions: z.array(z.string()).min(1),
@@ -22,3 +54,32 @@ export const GenerateResponseSchema = z.object({
 })
 
 export type GenerateResponse = z.infer<typeof GenerateResponseSchema>
+
+// Serverhistorik (GET /history, GET /history/search)
+export const HistoryItemSchema = z.object({
+  id: z.number(),
+  kind: z.enum(['analyze', 'generate']),
+  created_at: z.number(),
+  tone: z.enum(['positive', 'neutral', 'negative']).nullable().optional(),
+  text: z.string(),
+  result: z.record(z.unknown())
+})
+
+export type HistoryItem = z.infer<typeof HistoryItemSchema>
+
+export const HistoryPageSchema = z.object({
+  items: z.array(HistoryItemSchema),
+  next_cursor: z.string().nullable().optional()
+})
+
+export type HistoryPage = z.infer<typeof HistoryPageSchema>
+
+// /ws/session: varje serverhändelse har samma namn som i SSE-strömmarna plus ready/cancelled/error
+export const SessionEventSchema = z.object({
+  event: z.string(),
+  operation: z.enum(['session', 'analyze', 'generate']),
+  version: z.number(),
+  data: z.unknown()
+})
+
+export type SessionEvent = z.infer<typeof SessionEventSchema>
@@ -0,0 +1,43 @@
+/**
+ * Minimal Server-Sent Events-läsare för fetch-responser (EventSource stöder inte POST)
+ */
+
+export interface ServerSentEvent {
+  event: string
+  data: unknown
+}
+
+function parseBlock(block: string): ServerSentEvent | null {
+  let event = 'message'
+  const dataLines: string[] = []
+  for (const line of block.split('\n')) {
+    if (line.startsWith('event:')) {
+      event = line.slice(6).trim()
+    } else if (line.startsWith('data:')) {
+      dataLines.push(line.slice(5).trimStart())
+    }
+  }
+  if (dataLines.length === 0) return null
+  return { event, data: JSON.parse(dataLines.join('\n')) }
+}
+
+export async function* readServerSentEvents(response: Response): AsyncGenerator<ServerSentEvent> {
+  if (!response.body) return
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true }).replace(/\r\n/g, '\n')
+    let boundary = buffer.indexOf('\n\n')
+    while (boundary !== -1) {
+      const parsed = parseBlock(buffer.slice(0, boundary))
+      buffer = buffer.slice(boundary + 2)
+      if (parsed) yield parsed
+      boundary = buffer.indexOf('\n\n')
+    }
+  }
+  const rest = parseBlock(buffer)
+  if (rest) yield rest
+}